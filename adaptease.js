@@ -121,6 +121,14 @@ const originalElementHTML = new Map();
             // New: Base URL for the Python API backend that provides text processing services.
             pythonApiBaseUrl: 'http://127.0.0.1:5000/api', // New: Base URL for your Python API
 
+            // Persistent result cache (IndexedDB), shared by every page of the site and kept across visits.
+            // Results are keyed by operation, language and content hash of the text, and the least recently used ones
+            // are evicted beyond the entry/size bounds. Entries older than the max age are fetched again.
+            persistentCacheEnabled: true,
+            persistentCacheMaxEntries: 2000,
+            persistentCacheMaxBytes: 10 * 1024 * 1024,
+            persistentCacheMaxAgeDays: 7,
+
             // NEW: Configuration for OpenDyslexic font
             // Flag to determine if the OpenDyslexic font should be loaded.
             loadOpenDyslexicFont: true, // Set to true to load OpenDyslexic
@@ -217,6 +225,418 @@ const originalElementHTML = new Map();
  
     }
 
+    // --- Persistent result cache ---
+    // The in-memory maps of the widget are keyed by DOM elements, so they are lost at every navigation. Results are also
+    // stored in IndexedDB, keyed by operation + language + content hash of the text: a returning reader (or a reader of
+    // another page showing the same paragraphs) gets them without any request.
+    // The content hash is the SHA-256 of the normalized text, computed exactly as the server does (cache.content_hash),
+    // so that results missing from IndexedDB can be asked to the cacheable GET endpoint '/api/results/...' first, which
+    // browsers and CDNs answer without reaching the model. Only the texts missing from both go to '/api/batch'.
+    // Without IndexedDB or WebCrypto (e.g. pages not served over HTTPS), everything goes to '/api/batch' as before.
+    const RESULT_DB_NAME = 'adaptease-results';
+    const RESULT_STORE_NAME = 'results';
+    let resultDbPromise = null;
+
+    // Normalizes a text before hashing it: same rules of the server (NFC, uniform line endings, collapsed spaces,
+    // stripped lines, at most one empty line between paragraphs).
+    function normalizeTextForHash(text) {
+        let normalized = text.normalize('NFC').replace(/\r\n/g, '\n').replace(/\r/g, '\n');
+        normalized = normalized.split('\n').map((line) => line.replace(/[ \t\f\v\u00a0]+/g, ' ').trim()).join('\n');
+        return normalized.replace(/\n{3,}/g, '\n\n').trim();
+    }
+
+    // Returns the content hash of a text (hex SHA-256 of its normalized form).
+    async function contentHashOf(text) {
+        const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(normalizeTextForHash(text)));
+        return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    // Opens (once) the IndexedDB database of the results. Resolves to null when IndexedDB can't be used.
+    function openResultDb() {
+        if (!resultDbPromise) {
+            resultDbPromise = new Promise((resolve) => {
+                if (!WIDGET_CONFIG.persistentCacheEnabled || !window.indexedDB || !(window.crypto && crypto.subtle)) {
+                    resolve(null);
+                    return;
+                }
+                const request = indexedDB.open(RESULT_DB_NAME, 1);
+                request.onupgradeneeded = () => {
+                    const store = request.result.createObjectStore(RESULT_STORE_NAME, { keyPath: 'key' });
+                    store.createIndex('lastUsed', 'lastUsed');
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => {
+                    console.warn("AdaptEase: Persistent cache unavailable.", request.error);
+                    resolve(null);
+                };
+            });
+        }
+        return resultDbPromise;
+    }
+
+    // Runs a transaction on the results store, resolving once it is complete.
+    function withResultStore(db, mode, work) {
+        return new Promise((resolve, reject) => {
+            const transaction = db.transaction(RESULT_STORE_NAME, mode);
+            const output = work(transaction.objectStore(RESULT_STORE_NAME));
+            transaction.oncomplete = () => resolve(output);
+            transaction.onerror = () => reject(transaction.error);
+            transaction.onabort = () => reject(transaction.error);
+        });
+    }
+
+    // Reads the stored results of the given keys: resolves to a Map key -> processedText (fresh entries only),
+    // refreshing their last use for the LRU eviction.
+    async function readStoredResults(db, keys) {
+        const found = new Map();
+        const maxAgeMs = WIDGET_CONFIG.persistentCacheMaxAgeDays * 24 * 3600 * 1000;
+        await withResultStore(db, 'readwrite', (store) => {
+            keys.forEach((key) => {
+                const request = store.get(key);
+                request.onsuccess = () => {
+                    const entry = request.result;
+                    if (entry && Date.now() - entry.storedAt < maxAgeMs) {
+                        found.set(key, entry.processedText);
+                        entry.lastUsed = Date.now();
+                        store.put(entry);
+                    }
+                };
+            });
+        });
+        return found;
+    }
+
+    // Stores the given results (a Map key -> processedText), then evicts the least recently used entries beyond the bounds.
+    async function storeResults(db, results) {
+        const now = Date.now();
+        await withResultStore(db, 'readwrite', (store) => {
+            results.forEach((processedText, key) => {
+                const size = JSON.stringify(processedText).length * 2;
+                store.put({ key: key, processedText: processedText, size: size, storedAt: now, lastUsed: now });
+            });
+        });
+        await evictStoredResults(db);
+    }
+
+    // Walks the entries from the most recently used one and deletes every entry beyond the entry count or size bounds.
+    function evictStoredResults(db) {
+        return withResultStore(db, 'readwrite', (store) => {
+            let entries = 0;
+            let bytes = 0;
+            const request = store.index('lastUsed').openCursor(null, 'prev');
+            request.onsuccess = () => {
+                const cursor = request.result;
+                if (!cursor) {
+                    return;
+                }
+                entries += 1;
+                bytes += cursor.value.size || 0;
+                if (entries > WIDGET_CONFIG.persistentCacheMaxEntries || bytes > WIDGET_CONFIG.persistentCacheMaxBytes) {
+                    cursor.delete();
+                }
+                cursor.continue();
+            };
+        });
+    }
+
+    // Asks the cacheable GET endpoint for an already computed result. Resolves to the processed text, or null if the
+    // server doesn't have it (404) or can't be reached.
+    async function fetchStoredResult(operation, lang, hash) {
+        try {
+            const response = await fetch(`${WIDGET_CONFIG.pythonApiBaseUrl}/results/${operation}/${lang}/${hash}`);
+            if (!response.ok) {
+                return null;
+            }
+            return (await response.json()).processed_text;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    // --- Viewport-first priority ---
+    // Every batch item carries a priority (0: visible, 1: within one screen of the viewport, 2: further down the page)
+    // and the server generates the most urgent ones first. Batches are sent under a page session id: while a batch
+    // is pending, paragraphs scrolling into view are promoted, and the items of a language the reader switched away
+    // from (or of a page the reader left) are dropped.
+    const PRIORITY_VISIBLE = 0;
+    const PRIORITY_NEAR = 1;
+    const PRIORITY_BACKGROUND = 2;
+    const PROMOTION_DELAY_MS = 100;
+    const PAGE_SESSION_ID = (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    let batchCounter = 0;
+
+    // Ids of the pending batch items, by language.
+    const pendingBatchItems = new Map();
+
+    // Returns the priority of an element from its position relative to the viewport.
+    function viewportPriorityOf(element) {
+        const rect = element.getBoundingClientRect();
+        const viewportHeight = window.innerHeight || document.documentElement.clientHeight;
+        if (rect.bottom >= 0 && rect.top <= viewportHeight) {
+            return PRIORITY_VISIBLE;
+        }
+        if (rect.bottom >= -viewportHeight && rect.top <= 2 * viewportHeight) {
+            return PRIORITY_NEAR;
+        }
+        return PRIORITY_BACKGROUND;
+    }
+
+    // Sends a POST request with a JSON body to a session endpoint. Failures are only logged: priorities are a hint.
+    function postSessionUpdate(path, payload) {
+        return fetch(`${WIDGET_CONFIG.pythonApiBaseUrl}/session/${path}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ session: PAGE_SESSION_ID, ...payload })
+        }).catch((error) => console.warn(`AdaptEase: Session ${path} failed.`, error));
+    }
+
+    // Watches the elements of a pending batch (a Map id -> { element, priority }): when one of them gets closer to the
+    // viewport, its new priority is sent to the server (grouped every PROMOTION_DELAY_MS). Returns the function that
+    // stops watching.
+    function watchBatchPriorities(itemsById) {
+        if (!('IntersectionObserver' in window)) {
+            return () => {};
+        }
+        const idsByElement = new Map();
+        itemsById.forEach((item, id) => idsByElement.set(item.element, id));
+        let promotions = {};
+        let timer = null;
+
+        // Records the promotion of the elements entering a zone, and schedules the request.
+        const promote = (observed, priority) => {
+            observed.forEach((observedEntry) => {
+                const id = idsByElement.get(observedEntry.target);
+                const item = itemsById.get(id);
+                if (item && observedEntry.isIntersecting && priority < item.priority) {
+                    item.priority = priority;
+                    promotions[id] = priority;
+                }
+            });
+            if (!timer && Object.keys(promotions).length > 0) {
+                timer = setTimeout(() => {
+                    const priorities = promotions;
+                    promotions = {};
+                    timer = null;
+                    postSessionUpdate('promote', { priorities: priorities });
+                }, PROMOTION_DELAY_MS);
+            }
+        };
+
+        // One observer for the viewport, one for the viewport extended by one screen above and below.
+        const observers = [[PRIORITY_VISIBLE, '0px'], [PRIORITY_NEAR, '100% 0px']].map(([priority, rootMargin]) => {
+            const observer = new IntersectionObserver((observed) => promote(observed, priority), { rootMargin: rootMargin });
+            idsByElement.forEach((id, element) => observer.observe(element));
+            return observer;
+        });
+
+        return () => {
+            observers.forEach((observer) => observer.disconnect());
+            clearTimeout(timer);
+        };
+    }
+
+    // Drops the pending batch items of every language but the given one (all of them without a language).
+    function cancelPendingBatchItems(keptLang = null) {
+        pendingBatchItems.forEach((ids, lang) => {
+            if (lang !== keptLang && ids.size > 0) {
+                postSessionUpdate('cancel', { ids: Array.from(ids) });
+                ids.clear();
+            }
+        });
+    }
+
+    // When the reader leaves the page, everything still pending for it is dropped (sendBeacon survives the unload).
+    window.addEventListener('pagehide', () => {
+        const pending = Array.from(pendingBatchItems.values()).some((ids) => ids.size > 0);
+        if (pending && navigator.sendBeacon) {
+            navigator.sendBeacon(`${WIDGET_CONFIG.pythonApiBaseUrl}/session/cancel`, JSON.stringify({ session: PAGE_SESSION_ID }));
+        }
+    });
+
+    // --- Helper to process all the elements of a page ---
+    // Asynchronous function that gets the results of many elements at once. `entries` is a list of { element, text }
+    // objects and `operation` is 'chunk' or 'simplify'. Results are looked up in the persistent cache, then asked to the
+    // cacheable GET endpoint, and only the remaining texts are sent to '/api/batch' (see fetchBatchStreamFromApi).
+    // `onResult(element, processedText)` is called as soon as the result of each element arrives.
+    // It throws if the request fails, or if any element doesn't get its result.
+    async function fetchBatchStream(operation, lang, entries, onResult) {
+
+        // Visible elements go first, then the ones near the viewport, in page order among equals.
+        entries = entries
+            .map((entry) => ({ ...entry, priority: viewportPriorityOf(entry.element) }))
+            .sort((first, second) => first.priority - second.priority);
+
+        // Without a persistent cache, the whole page goes to the batch endpoint.
+        const db = await openResultDb();
+        if (!db) {
+            return fetchBatchStreamFromApi(operation, lang, entries, onResult);
+        }
+
+        // Key of every entry: operation, language and content hash of its text.
+        const keys = await Promise.all(entries.map(async (entry) => `${operation}:${lang}:${await contentHashOf(entry.text)}`));
+        const newResults = new Map();
+        let remaining = entries.map((entry, index) => ({ ...entry, key: keys[index] }));
+
+        // 1. Results stored in IndexedDB (a failing database is just skipped).
+        const stored = await readStoredResults(db, keys).catch(() => new Map());
+        remaining = remaining.filter((entry) => {
+            if (!stored.has(entry.key)) {
+                return true;
+            }
+            onResult(entry.element, stored.get(entry.key));
+            return false;
+        });
+
+        // 2. Results already computed by the server (possibly answered by the browser cache or a CDN).
+        const fetched = await Promise.all(remaining.map((entry) => fetchStoredResult(operation, lang, entry.key.split(':')[2])));
+        remaining = remaining.filter((entry, index) => {
+            if (fetched[index] === null || fetched[index] === undefined) {
+                return true;
+            }
+            onResult(entry.element, fetched[index]);
+            newResults.set(entry.key, fetched[index]);
+            return false;
+        });
+
+        // 3. Everything else is generated. Results are stored even if the batch fails halfway.
+        try {
+            if (remaining.length > 0) {
+                await fetchBatchStreamFromApi(operation, lang, remaining, (element, processedText, cacheable) => {
+                    onResult(element, processedText);
+
+                    // Error/fallback results are shown, but never stored: the next visit asks for them again.
+                    if (cacheable) {
+                        const entry = remaining.find((candidate) => candidate.element === element);
+                        newResults.set(entry.key, processedText);
+                    }
+                });
+            }
+        } finally {
+            if (newResults.size > 0) {
+                storeResults(db, newResults).catch((error) => console.warn("AdaptEase: Could not store results.", error));
+            }
+        }
+    }
+
+    // Asynchronous function that sends the texts of many elements to the '/api/batch' endpoint at once, asking for
+    // a streamed answer, with the same arguments of fetchBatchStream (onResult also gets a third argument, telling if
+    // the result can be stored, see isCacheableBatchResult).
+    // The server deduplicates the texts, answers the cached ones first and generates the others together, the most
+    // urgent ones (see viewportPriorityOf) first. Items dropped by a language switch fail the batch.
+    async function fetchBatchStreamFromApi(operation, lang, entries, onResult) {
+
+        // Every element gets an id unique within the page session, so that it can be promoted or dropped.
+        batchCounter += 1;
+        const itemsById = new Map(entries.map((entry, index) => [
+            `${operation}-${lang}-${batchCounter}-${index}`,
+            { element: entry.element, priority: entry.priority === undefined ? PRIORITY_VISIBLE : entry.priority }
+        ]));
+        const items = Array.from(itemsById.entries()).map(([id, item], index) => (
+            { id: id, text: entries[index].text, op: operation, lang: lang, priority: item.priority }
+        ));
+        const received = new Set();
+
+        // The items are pending until their result arrives, and promoted while the reader scrolls.
+        if (!pendingBatchItems.has(lang)) {
+            pendingBatchItems.set(lang, new Set());
+        }
+        const pendingIds = pendingBatchItems.get(lang);
+        itemsById.forEach((item, id) => pendingIds.add(id));
+        const stopWatching = watchBatchPriorities(itemsById);
+
+        // Handles the result of a single item.
+        const handleResult = (id, result) => {
+            pendingIds.delete(id);
+            if (result.error) {
+                throw new Error(result.error);
+            }
+            received.add(id);
+            onResult(itemsById.get(id).element, result.processed_text, isCacheableBatchResult(result));
+        };
+
+        try {
+            await readBatchResponse(items, handleResult);
+        } finally {
+            stopWatching();
+            itemsById.forEach((item, id) => pendingIds.delete(id));
+        }
+
+        // Every element must have its result.
+        if (received.size !== entries.length) {
+            throw new Error(`Batch ended with ${entries.length - received.size} missing result(s).`);
+        }
+    }
+
+    // Tells if a result of the batch endpoint can be stored. The server marks the results it refuses to cache itself
+    // (e.g. the ["[Error during chunking: ...]", original text] fallback list); older servers don't send the flag, so
+    // their error lists are recognized by their first item.
+    function isCacheableBatchResult(result) {
+        if (typeof result.cacheable === 'boolean') {
+            return result.cacheable;
+        }
+        const processedText = result.processed_text;
+        return !(Array.isArray(processedText) && typeof processedText[0] === 'string' && processedText[0].startsWith('[Error'));
+    }
+
+    // Asynchronous function that sends batch items to the '/api/batch' endpoint and passes every result to
+    // handleResult(id, result), as soon as it arrives when the server streams them.
+    async function readBatchResponse(items, handleResult) {
+
+        // Makes a POST request to the batch endpoint, asking for a streamed response.
+        const response = await fetch(`${WIDGET_CONFIG.pythonApiBaseUrl}/batch`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ items: items, stream: true, session: PAGE_SESSION_ID })
+        });
+
+        // Checks if the API response was successful.
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({ detail: "Unknown server error" }));
+            throw new Error(`HTTP error! Status: ${response.status}. ${errorData.error || errorData.detail}`);
+        }
+
+        // A server without streaming support answers with a plain JSON document, keyed by id.
+        if (!response.body || !(response.headers.get('Content-Type') || '').includes('application/x-ndjson')) {
+            const data = await response.json();
+            Object.entries(data.results || {}).forEach(([id, result]) => handleResult(id, result));
+
+        } else {
+
+            // Reads the body incrementally, splitting it in lines (one event per line).
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            // Handles a single event line.
+            const handleLine = (line) => {
+                if (!line.trim()) {
+                    return;
+                }
+                const event = JSON.parse(line);
+                if (event.event === 'result') {
+                    handleResult(event.id, event);
+                } else if (event.event === 'error') {
+                    throw new Error(event.error);
+                }
+            };
+
+            // Consumes the stream until it ends.
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) {
+                    break;
+                }
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.forEach(handleLine);
+            }
+            handleLine(buffer + decoder.decode());
+        }
+    }
+
     // --- Function to set up all the widget's JS logic ---
     // This is the main function that initializes all the interactive logic of the AdaptEase widget.
     // It takes translations data as an argument to populate UI text.
@@ -787,8 +1207,9 @@ const originalElementHTML = new Map();
                     // If the selected language is different from the current one.
                     if (selectedLang !== currentLanguage) {
             
-                        // Updates the current language.
+                        // Updates the current language, and drops what is still pending for the other languages.
                         currentLanguage = selectedLang;
+                        cancelPendingBatchItems(currentLanguage);
                         // Updates all UI text to the new language.
                         updateUIText(currentLanguage);
             
@@ -1065,6 +1486,9 @@ const originalElementHTML = new Map();
                             cachedChunkedHTML_perLang.set(originalClickLanguage, langCacheChunked);
                         }
 
+                        // Elements that need the API, sent all together after the loop.
+                        const pendingApiElements = [];
+
                         // Iterates over each target text element to process or retrieve from cache.
                         for (const element of targetTextElements) {
                             
@@ -1108,59 +1532,9 @@ const originalElementHTML = new Map();
 
                                 // If an API call is needed for this operation.
                                 if (thisOperationWouldNeedApi) {
-                                    try {
-                            
-                                        // Makes a POST request to the text-in-blocks API endpoint.
-                                        const response = await fetch(`${WIDGET_CONFIG.pythonApiBaseUrl}/text-in-blocks`, {
-                                            method: 'POST',
-                                            headers: { 'Content-Type': 'application/json' },
-                                            body: JSON.stringify({ text: originalTextContentForApi, lang: originalClickLanguage })
-                                        });
-                            
-                                        // Checks if the API response was successful.
-                                        if (!response.ok) {
-                            
-                                            // Parses error data from the response.
-                                            const errorData = await response.json().catch(() => ({ detail: "Unknown server error" }));
-                            
-                                            // Throws an error with details.
-                                            throw new Error(`HTTP error! Status: ${response.status}. ${errorData.error || errorData.detail}`);
-                            
-                                        }
-                            
-                                        // Parses the successful response as JSON.
-                                        const data = await response.json();
-                            
-                                        // Checks if the processed text is valid (an array).
-                                        if (data.processed_text !== undefined && Array.isArray(data.processed_text)) {
-                            
-                                            // Joins the processed text chunks with line breaks.
-                                            const newChunkedHTML = data.processed_text.join('<br><br>');
-                            
-                                            // If the current language matches the click language, update the DOM.
-                                            if (currentLanguage === originalClickLanguage) {
-                                                element.innerHTML = newChunkedHTML;
-                                            }
-                            
-                                            // Caches the processed HTML.
-                                            langCacheChunked.set(element, newChunkedHTML);
-                            
-                                        } else {
-                            
-                                            // Throws an error if the API response format is invalid.
-                                            throw new Error("Invalid processed_text format from API.");
-                            
-                                        }
-                                    } catch (error) {
-                            
-                                        // Logs any errors during API processing.
-                                        console.error("Error activating TextInBlocks for element:", error);
-                            
-                                        // Reversion to original will be handled by updateUIText if state is correctly set
-                                        // Sets the error flag.
-                                        errorDuringActivation = true;
-                                        break; // Exit loop on error
-                                    }
+
+                                    // Queues the element: the whole page is sent in a single batch request below.
+                                    pendingApiElements.push({ element: element, text: originalTextContentForApi });
                                 } else {
                             
                                     // Activating, element not in cache, but this operation was deemed cache-only
@@ -1175,6 +1549,38 @@ const originalElementHTML = new Map();
                             }
                         }
 
+                        // Sends all the queued elements in a single batch request.
+                        // Every element is rendered and cached as soon as its result arrives.
+                        if (pendingApiElements.length > 0) {
+                            try {
+                                await fetchBatchStream('chunk', originalClickLanguage, pendingApiElements, (element, processedText) => {
+
+                                    // Checks if the processed text is valid (an array).
+                                    if (!Array.isArray(processedText)) {
+                                        throw new Error("Invalid processed_text format from API.");
+                                    }
+
+                                    // Joins the processed text chunks with line breaks.
+                                    const newChunkedHTML = processedText.join('<br><br>');
+
+                                    // If the current language matches the click language, update the DOM.
+                                    if (currentLanguage === originalClickLanguage) {
+                                        element.innerHTML = newChunkedHTML;
+                                    }
+
+                                    // Caches the processed HTML.
+                                    langCacheChunked.set(element, newChunkedHTML);
+                                });
+                            } catch (error) {
+
+                                // Logs any errors during API processing.
+                                console.error("Error activating TextInBlocks for the page:", error);
+
+                                // Sets the error flag.
+                                errorDuringActivation = true;
+                            }
+                        }
+
                         // If an error occurred during activation.
                         if (errorDuringActivation) {
 
@@ -1407,6 +1813,9 @@ const originalElementHTML = new Map();
                             cachedSimplifiedText_perLang.set(originalClickLanguage, langCacheSimplified);
                         }
 
+                        // Elements that need the API, sent all together after the loop.
+                        const pendingApiElements = [];
+
                         // Iterates over each target text element to process or retrieve from cache.
                         for (const element of targetTextElements) {
 
@@ -1444,56 +1853,9 @@ const originalElementHTML = new Map();
 
                                 // If an API call is needed for this operation.
                                 if (thisOperationWouldNeedApi) {
-                                    try {
-                                        
-                                        // Makes a POST request to the simplify-text API endpoint.
-                                        const response = await fetch(`${WIDGET_CONFIG.pythonApiBaseUrl}/simplify-text`, { // Ensure correct endpoint
-                                            method: 'POST',
-                                            headers: { 'Content-Type': 'application/json' },
-                                            body: JSON.stringify({ text: originalTextContentForApi, lang: originalClickLanguage })
-                                        });
-                                        
-                                        // Checks if the API response was successful.
-                                        if (!response.ok) {
-                                            
-                                            // Parses error data from the response.
-                                            const errorData = await response.json().catch(() => ({ detail: "Unknown server error" }));
-                                            
-                                            // Throws an error with details.
-                                            throw new Error(`HTTP error! Status: ${response.status}. ${errorData.error || errorData.detail}`);
-                                        }
-                                        
-                                        // Parses the successful response as JSON.
-                                        const data = await response.json();
-                                        
-                                        // Adjust for simplify-text potentially returning string or array
-                                        // Checks if the processed text is valid (string or array).
-                                        if (data.processed_text !== undefined && (Array.isArray(data.processed_text) || typeof data.processed_text === 'string')) {
-                                            
-                                            // Joins array elements with line breaks, or uses the string directly.
-                                            const newSimplifiedHTML = Array.isArray(data.processed_text) ? data.processed_text.join('<br><br>') : data.processed_text;
-                                            
-                                            // If the current language matches the click language, update the DOM.
-                                            if (currentLanguage === originalClickLanguage) {
-                                                element.innerHTML = newSimplifiedHTML;
-                                            }
-                                            
-                                            // Caches the processed HTML.
-                                            langCacheSimplified.set(element, newSimplifiedHTML);
-                                        } else {
-                                            // Throws an error if the API response format is invalid.
-                                            throw new Error("Invalid processed_text format from API for simplified text.");
-                                        }
-                                    } catch (error) {
-                                        
-                                        // Logs any errors during API processing.
-                                        console.error("Error activating SimplifiedText for element:", error);
-                                        
-                                        // Reversion to original will be handled by updateUIText
-                                        // Sets the error flag.
-                                        errorDuringActivation = true;
-                                        break;
-                                    }
+
+                                    // Queues the element: the whole page is sent in a single batch request below.
+                                    pendingApiElements.push({ element: element, text: originalTextContentForApi });
                                 } else {
                                     
                                     // If activating, but no API call was expected (meaning it should have been in cache),
@@ -1506,6 +1868,38 @@ const originalElementHTML = new Map();
                             }
                         }
 
+                        // Sends all the queued elements in a single batch request.
+                        // Every element is rendered and cached as soon as its result arrives.
+                        if (pendingApiElements.length > 0) {
+                            try {
+                                await fetchBatchStream('simplify', originalClickLanguage, pendingApiElements, (element, processedText) => {
+
+                                    // Checks if the processed text is valid (string or array).
+                                    if (!Array.isArray(processedText) && typeof processedText !== 'string') {
+                                        throw new Error("Invalid processed_text format from API for simplified text.");
+                                    }
+
+                                    // Joins array elements with line breaks, or uses the string directly.
+                                    const newSimplifiedHTML = Array.isArray(processedText) ? processedText.join('<br><br>') : processedText;
+
+                                    // If the current language matches the click language, update the DOM.
+                                    if (currentLanguage === originalClickLanguage) {
+                                        element.innerHTML = newSimplifiedHTML;
+                                    }
+
+                                    // Caches the processed HTML.
+                                    langCacheSimplified.set(element, newSimplifiedHTML);
+                                });
+                            } catch (error) {
+
+                                // Logs any errors during API processing.
+                                console.error("Error activating SimplifiedText for the page:", error);
+
+                                // Sets the error flag.
+                                errorDuringActivation = true;
+                            }
+                        }
+
                         // If an error occurred during activation.
                         if (errorDuringActivation) {
                             
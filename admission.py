@@ -0,0 +1,272 @@
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+# --- 1. Request Context ---
+# Every API request carries a RequestContext: its deadline, and a flag telling if it has been cancelled
+# (e.g. the client disconnected from a streamed response). The generation code checks it between the decoding
+# steps (see generation.CancellationStoppingCriteria), so abandoned or late requests stop using the model.
+# The context of the current request is kept in a contextvar, so that it doesn't have to be passed through every
+# function between the Flask endpoints and the generation: the code that hands work over to other threads
+# (batch scheduler, thread pools) captures it explicitly.
+# A request also has a priority (lower values are served first), which can change while it waits: the widget sends the
+# paragraphs in the viewport with PRIORITY_VISIBLE and promotes the others as they scroll into view (see section 3).
+# A child context (e.g. an item of a page-level batch) has its own priority (or follows the one of its parent, with
+# priority=None), and shares the deadline and the cancellation of its parent.
+# A request context also carries the trace of the request (see tracing.py), shared by its children.
+# PRIORITY_IDLE is the priority of the background precomputations (see precompute.py), which only run without live requests.
+PRIORITY_VISIBLE = 0
+PRIORITY_NEAR = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_IDLE = 3
+DEFAULT_PRIORITY = PRIORITY_VISIBLE
+
+# Raised when a request has been cancelled or its deadline has expired
+class RequestCancelledError(RuntimeError):
+    pass
+
+# Raised when the request queue is full: the caller should retry after retry_after seconds
+class QueueFullError(RuntimeError):
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RequestContext:
+
+    def __init__(self, timeout=None, priority=DEFAULT_PRIORITY, parent=None, trace=None):
+
+        # Absolute deadline (time.monotonic based), None for no deadline. A child never outlives its parent.
+        self.deadline = time.monotonic() + timeout if timeout else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+        self._priority = priority
+        self.parent = parent
+        self.trace = trace if trace is not None or parent is None else parent.trace
+        self._cancelled = threading.Event()
+
+        # Generation slots held by this request (see AdmissionController.admit)
+        self._held_slots = 0
+
+    # Priority of the request (the current one of the parent, for a child created with priority=None)
+    @property
+    def priority(self):
+        if self._priority is None:
+            return self.parent.priority if self.parent is not None else DEFAULT_PRIORITY
+        return self._priority
+
+    @priority.setter
+    def priority(self, priority):
+        self._priority = priority
+
+    # True if this request (or its parent) holds a generation slot
+    def holds_slot(self):
+        return self._held_slots > 0 or (self.parent is not None and self.parent.holds_slot())
+
+    # Cancels the request (e.g. because the client went away)
+    def cancel(self):
+        self._cancelled.set()
+
+    # True if this request (or its parent) has been cancelled
+    def _cancel_requested(self):
+        return self._cancelled.is_set() or (self.parent is not None and self.parent._cancel_requested())
+
+    # True once the request has been cancelled or its deadline has expired
+    @property
+    def cancelled(self):
+        return self._cancel_requested() or (self.deadline is not None and time.monotonic() >= self.deadline)
+
+    # Seconds left before the deadline (None without a deadline)
+    def remaining(self):
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    # Raises RequestCancelledError if the request shouldn't go on
+    def check(self):
+        if self._cancel_requested():
+            raise RequestCancelledError("Request cancelled.")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise RequestCancelledError("Request deadline exceeded.")
+
+# The context of the request being served (None outside of a request, e.g. in scripts)
+current_request_context = contextvars.ContextVar("adaptease_request_context", default=None)
+
+def get_request_context():
+    return current_request_context.get()
+
+# Priority of a request context (the default one without a context)
+def priority_of(request_context):
+    return request_context.priority if request_context is not None else DEFAULT_PRIORITY
+
+# Helper that runs fn with the given request context as the current one
+def run_with_request_context(request_context, fn, *args, **kwargs):
+    token = current_request_context.set(request_context)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        current_request_context.reset(token)
+
+# --- 2. Admission Control ---
+# AdmissionController bounds the number of requests using the model: at most max_concurrent of them generate at the
+# same time (they share the batches of the scheduler), at most max_queued more wait for a slot, and the others are
+# rejected right away with QueueFullError, so that a traffic spike turns into fast 429s instead of an unbounded backlog.
+# Queued requests give up when their deadline expires (or when they are cancelled) with RequestCancelledError.
+# A request whose context (or an ancestor of it) already holds a slot runs under that slot: a fan-out (e.g. the
+# paragraphs of an article, generated concurrently in their own threads, see model.iter_unit_results) takes one slot.
+# A free slot goes to the waiting request with the lowest priority value (the oldest one among equals), read when the
+# slot frees up, so that promoted requests overtake the others.
+class AdmissionController:
+
+    def __init__(self, max_concurrent=16, max_queued=64, retry_after=5):
+
+        # Limits, and the Retry-After suggested to the rejected requests
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queued = max(0, int(max_queued))
+        self.retry_after = retry_after
+
+        # Current state: active requests (and their contexts), and the (request_context, ticket) pairs of the waiting ones
+        self._active = 0
+        self._admitted = []
+        self._waiters = []
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+        # Statistics
+        self._counters = {"admitted": 0, "rejected": 0, "expired_in_queue": 0}
+
+    # Context manager that holds a generation slot for the duration of the block.
+    @contextmanager
+    def admit(self, request_context=None):
+
+        # Already admitted
+        if request_context is not None and request_context.holds_slot():
+            yield
+            return
+
+        with self._condition:
+
+            # Queue full: rejected right away
+            if self._active >= self.max_concurrent and len(self._waiters) >= self.max_queued:
+                self._counters["rejected"] += 1
+                raise QueueFullError(
+                    f"Server busy: {self._active} requests generating and {len(self._waiters)} waiting.",
+                    retry_after=self.retry_after
+                )
+
+            # Wait for a slot (and for our turn), giving up when the request is cancelled or its deadline expires
+            waiter = (request_context, next(self._tickets))
+            self._waiters.append(waiter)
+            try:
+                while self._active >= self.max_concurrent or self._next_waiter() is not waiter:
+                    if request_context is not None and request_context.cancelled:
+                        self._counters["expired_in_queue"] += 1
+                        request_context.check()
+                    remaining = request_context.remaining() if request_context is not None else None
+                    self._condition.wait(min(remaining, 0.5) if remaining is not None else 0.5)
+            finally:
+                self._waiters.remove(waiter)
+
+                # The next waiter may be able to go on as well
+                self._condition.notify_all()
+
+            self._active += 1
+            self._admitted.append(request_context)
+            self._counters["admitted"] += 1
+            if request_context is not None:
+                request_context._held_slots += 1
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._admitted.remove(request_context)
+                if request_context is not None:
+                    request_context._held_slots -= 1
+                self._condition.notify_all()
+
+    # The waiter that gets the next free slot (the caller must hold the condition lock)
+    def _next_waiter(self):
+        return min(self._waiters, key=lambda waiter: (priority_of(waiter[0]), waiter[1]))
+
+    # Number of active or waiting requests more urgent than the given priority (e.g. the live requests, for PRIORITY_IDLE)
+    def count_more_urgent(self, priority):
+        with self._condition:
+            contexts = self._admitted + [request_context for request_context, _ in self._waiters]
+            return sum(1 for request_context in contexts if priority_of(request_context) < priority)
+
+    # Returns the state and the counters of the admission control
+    def stats(self):
+        with self._condition:
+            return {
+                "active": self._active,
+                "waiting": len(self._waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queued": self.max_queued,
+                **self._counters,
+            }
+
+# --- 3. Client Sessions ---
+# The widget sends the work of a page under a session id (one per page view), with an id for every item. While the
+# items wait, the widget can promote them (they scrolled into view) or drop them (the reader switched language or
+# left the page): SessionRegistry maps the (session, item id) pairs to the request contexts doing their work.
+# Entries are removed as soon as the work of an item is over, so the registry only holds the pending items.
+class SessionRegistry:
+
+    def __init__(self):
+        self._contexts = {}
+        self._lock = threading.Lock()
+
+    # Registers the request context working on the given items of a session
+    def register(self, session, item_ids, request_context):
+        with self._lock:
+            items = self._contexts.setdefault(session, {})
+            for item_id in item_ids:
+                items.setdefault(item_id, []).append(request_context)
+
+    # Removes the request context of the given items (their work is over)
+    def release(self, session, item_ids, request_context):
+        with self._lock:
+            items = self._contexts.get(session, {})
+            for item_id in item_ids:
+                contexts = [context for context in items.get(item_id, []) if context is not request_context]
+                if contexts:
+                    items[item_id] = contexts
+                else:
+                    items.pop(item_id, None)
+            if not items:
+                self._contexts.pop(session, None)
+
+    # Promotes pending items ({item_id: priority}) and returns how many requests were promoted. Priorities only go up
+    # (lower values): an item shared by several ids (identical texts) keeps the most urgent priority asked for it.
+    def promote(self, session, priorities):
+        promoted = 0
+        with self._lock:
+            items = self._contexts.get(session, {})
+            for item_id, priority in priorities.items():
+                for context in items.get(item_id, []):
+                    if priority < context.priority:
+                        context.priority = priority
+                        promoted += 1
+        return promoted
+
+    # Cancels the pending items of a session (all of them without item_ids) and returns how many requests were cancelled
+    def cancel(self, session, item_ids=None):
+        with self._lock:
+            items = self._contexts.get(session, {})
+            contexts = {
+                id(context): context
+                for item_id, item_contexts in items.items() if item_ids is None or item_id in item_ids
+                for context in item_contexts
+            }
+        for context in contexts.values():
+            context.cancel()
+        return len(contexts)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._contexts),
+                "pending_items": sum(len(items) for items in self._contexts.values()),
+            }
@@ -0,0 +1,36 @@
+import functools
+import hmac
+import os
+from flask import request, jsonify
+
+
+# --- 1. Admin Endpoints ---
+# The endpoints that change the state of the whole service (cache invalidation, profiling windows) are admin endpoints:
+# the app allows cross-origin requests and listens on every interface, so they can't be left open to any client.
+# They are disabled unless ADAPTEASE_ADMIN_TOKEN is set, and then every request must carry that token in its
+# Authorization header ("Authorization: Bearer <token>"). The front (router.py) checks it too, before broadcasting the
+# request to its replicas (which get the same environment, so the same token).
+ADMIN_TOKEN = os.getenv("ADAPTEASE_ADMIN_TOKEN", "")
+
+# Helper that returns the error response of the current request if it is not allowed on an admin endpoint, or None
+def admin_request_error():
+
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled: set ADAPTEASE_ADMIN_TOKEN to enable them"}), 403
+
+    # The comparison takes the same time whatever the number of matching characters
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"error": "Missing or invalid admin token"}), 401, {"WWW-Authenticate": "Bearer"}
+
+    return None
+
+# Decorator for the admin endpoints: the view only runs for the requests carrying the admin token
+def admin_endpoint(view):
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        error = admin_request_error()
+        return error if error is not None else view(*args, **kwargs)
+
+    return wrapper
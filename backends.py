@@ -0,0 +1,764 @@
+import os
+import re
+import threading
+import time
+
+from tracing import log
+
+# --- 1. Inference Backends ---
+# generate_text_from_llm (model.py) doesn't talk to a model directly but to an inference backend, selected by configuration.
+# Every backend exposes the same small interface:
+# - load(): loads the weights (slow, called once, in the background, see BackendLoader)
+# - build_prompt_text(system_prompt, user_prompt, enable_thinking): formats the prompts in a single string
+# - count_tokens(text): size of a text in tokens (used for the token limits and to group requests by length)
+# - generate_batch(prompt_texts, max_new_tokens, settings, prefix=None, request_contexts=None, stats=None, monitors=None):
+#   one answer per prompt, in the same order
+# - stream_generate(prompt_text, max_new_tokens, settings, prefix=None, request_context=None, stats=None, monitor=None):
+#   yields the decoded answer piece by piece
+# - stats(): JSON serializable info about the backend
+# prefix is an optional (prefix_key, prefix_text) pair: prefix_text is the constant beginning of all the prompts
+# (see model.prompt_prefix_text), which backends may use to skip its prefill.
+# request_contexts/request_context are the admission.RequestContext of the prompts (or None): the generation of
+# cancelled or expired requests must stop as soon as possible.
+# stats is an optional dictionary filled at the end of the generation with batch_size, prompt_tokens, output_tokens,
+# thinking_tokens, prefill_seconds, decode_seconds and decode_steps (see generation.fill_generation_stats). The transformers
+# backends also report the shape of the inputs: padded_prompt_length, max_new_tokens and cached_prefix_tokens (see
+# generation.fill_input_stats).
+# Backends with speculative decoding also report, for single-prompt generations, decoding_mode ("plain" or the speculative
+# method) and acceptance_rate.
+# monitors/monitor are the parsing.OutputMonitor of the prompts (or None): they read the output while it is decoded,
+# and the generation of a prompt must stop once its monitor is stopped.
+# Heavy dependencies (torch, transformers) are imported only by the backends that need them, when they are loaded.
+
+# Raised when the backend is needed but its weights are not loaded (yet, or because loading failed)
+class BackendNotReadyError(RuntimeError):
+    pass
+
+# Function that returns the resident memory (RSS) of the process, in MB.
+# /proc is read when available (Linux), otherwise we fall back to the peak RSS reported by the resource module.
+def resident_memory_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Function that picks the compute dtype for CPU inference: "bf16", "fp32" or "auto".
+# With "auto", bfloat16 is used only when the CPU has native bf16 instructions (AVX512-BF16/AMX), since
+# emulated bf16 matmuls are slower than fp32 ones. float16 is never used on CPU, where it is the slowest option.
+def cpu_compute_dtype(torch, preference="auto"):
+
+    # Explicit choices
+    if preference in ("bf16", "bfloat16"):
+        return torch.bfloat16
+    if preference in ("fp32", "float32"):
+        return torch.float32
+
+    # Automatic choice, from the CPU flags
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return torch.float32
+    return torch.bfloat16 if ("avx512_bf16" in flags or "amx_bf16" in flags) else torch.float32
+
+# Hugging Face transformers backend: the production one, running Qwen3-32B in half precision on the available GPUs.
+# Speculative (assisted) decoding can be enabled (see speculative.py):
+# - speculative: "off", "on" or "auto" (speculative decoding is used only when it is observed to be faster, per operation)
+# - speculative_method: "draft_model" or "prompt_lookup"
+# - draft_model_name: the draft model, which must share the tokenizer of the main model (default: default_draft_model_name)
+# - num_draft_tokens: tokens proposed by the draft model at every step of the main model
+# - prompt_lookup_tokens: max candidate tokens copied from the prompt at every step
+# - prompt_lookup_ngram_size: max length of the n-gram (the last tokens of the output) searched in the prompt
+# With mmap_weights, the weights of a model running on CPU are memory-mapped from its safetensors checkpoint instead of
+# being copied in private memory (see weights.py), so that the replicas of a host share them.
+class HFBackend:
+
+    name = "hf"
+    default_model_name = "Qwen/Qwen3-32B"
+    default_draft_model_name = "Qwen/Qwen3-0.6B"
+
+    def __init__(self, model_name=None, hf_token=None, prefix_cache_size=16, cpu_dtype="auto", warmup_tokens=16,
+                 speculative="off", speculative_method="draft_model", draft_model_name=None, num_draft_tokens=5,
+                 prompt_lookup_tokens=10, prompt_lookup_ngram_size=3, mmap_weights=False, **unused_options):
+        from speculative import SPECULATIVE_MODES, SPECULATIVE_METHODS
+
+        # Configuration: nothing is loaded until load() is called
+        self.model_name = model_name or self.default_model_name
+        self.hf_token = hf_token
+        self.prefix_cache_size = prefix_cache_size
+        self.cpu_dtype = cpu_dtype
+        self.warmup_tokens = warmup_tokens
+        self.mmap_weights = mmap_weights
+
+        # Speculative decoding configuration.
+        # Every operation has its own selector, since the draft tokens are not accepted as often for every task.
+        if speculative not in SPECULATIVE_MODES:
+            raise ValueError(f"Unknown speculative decoding mode '{speculative}'. Available modes: {', '.join(SPECULATIVE_MODES)}")
+        if speculative_method not in SPECULATIVE_METHODS:
+            raise ValueError(f"Unknown speculative decoding method '{speculative_method}'. Available methods: {', '.join(SPECULATIVE_METHODS)}")
+        self.speculative_mode = speculative
+        self.speculative_method = speculative_method if speculative != "off" else None
+        self.speculative_selectors = {}
+        self._selectors_lock = threading.Lock()
+        self.draft_model_name = (draft_model_name or self.default_draft_model_name) if self.speculative_method == "draft_model" else None
+        self.num_draft_tokens = max(1, int(num_draft_tokens))
+        self.prompt_lookup_tokens = max(1, int(prompt_lookup_tokens))
+        self.prompt_lookup_ngram_size = max(1, int(prompt_lookup_ngram_size))
+        self.draft_model = None
+
+        # Resident memory and decoding speed measured at startup (see _measure_startup), and how the weights were loaded
+        self.startup_metrics = {}
+        self.weights_report = {}
+
+        # Set by load()
+        self.model = None
+        self.tokenizer = None
+        self.device = None
+        self.terminator_ids = None
+        self.prefix_cache = None
+
+    # Keyword arguments of AutoModelForCausalLM.from_pretrained
+    def _model_load_kwargs(self, torch):
+
+        # torch_dtype=torch.float16: Loads the model weights in half-precision (FP16) to reduce memory usage and potentially speed up inference on compatible hardware.
+        # Without a GPU, the weights are loaded in bf16/fp32 instead (see cpu_compute_dtype), since fp16 is very slow on CPU.
+        # token: Used for authentication.
+        # trust_remote_code=True: Required for models with custom code.
+        # device_map="auto": Automatically distributes the model layers across available devices (e.g., multiple GPUs, or CPU if no GPU).
+        return {
+            "torch_dtype": torch.float16 if torch.cuda.is_available() else cpu_compute_dtype(torch, self.cpu_dtype),
+            "token": self.hf_token,
+            "trust_remote_code": True,
+            "device_map": "auto",
+        }
+
+    # Loads the tokenizer and the model
+    def load(self):
+
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+        from generation import resolve_terminator_ids
+        from prefix_cache import PrefixKVCache
+
+        # Determines the computational device to use for model inference.
+        # torch.cuda.is_available() checks if a CUDA-enabled GPU is present.
+        # If a GPU is available, 'cuda' is chosen; otherwise, it defaults to 'cpu'.
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        # Loads the tokenizer for the specified pre-trained model.
+        # The 'token' argument is used for authentication with Hugging Face Hub.
+        # 'trust_remote_code=True' is necessary for some models that include custom Python code in their repository.
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name, token=self.hf_token, trust_remote_code=True)
+
+        # Loads the pre-trained causal conversational language model.
+        model = self._prepare_model(self._load_model(torch, AutoModelForCausalLM), torch)
+
+        # Sets the model to evaluation mode.
+        # This disables features like dropout and batch normalization, which are used during training but not during inference.
+        model.eval()
+
+        # If the tokenizer pad id isn't configured
+        if tokenizer.pad_token_id is None:
+
+            # But we got the eos token id
+            if tokenizer.eos_token_id is not None:
+
+                # We then use the eos token as pad token.
+                log(f"Tokenizer pad_token_id not set. Using eos_token_id ({tokenizer.eos_token_id}) as pad_token_id.")
+
+                tokenizer.pad_token = tokenizer.eos_token
+
+            else:
+
+                # This is a more critical situation. Many models require a pad_token_id.
+                # For Qwen models, <|endoftext|> is often a good candidate if nothing else is set.
+                # ID for <|endoftext|> is often 151643 for Qwen models.
+                # However, forcing a pad_token_id without knowing the model can be risky.
+                log("Warning: tokenizer.pad_token_id and tokenizer.eos_token_id are not set. Generation might fail if padding is needed.", level="warning")
+
+                # As a last resort for some models, we might try:
+                # tokenizer.add_special_tokens({'pad_token': '[PAD]'})
+                # model.resize_token_embeddings(len(tokenizer))
+                # model.config.pad_token_id = tokenizer.pad_token_id
+                # But this is model-dependent. For now, we'll proceed and see if generate needs it.
+
+        # Ensure model config reflects the tokenizer's pad_token_id if set.
+        # This is usually handled, but being explicit can help.
+        if tokenizer.pad_token_id is not None:
+            model.config.pad_token_id = tokenizer.pad_token_id
+        if tokenizer.eos_token_id is not None:
+            model.config.eos_token_id = tokenizer.eos_token_id
+
+        # Setup info displaying about tokenizer state
+        log(f"Model and tokenizer loaded successfully ({self.model_name} on {self.device}).")
+
+        # Displaying info about the pad_token
+        if tokenizer.pad_token_id is not None:
+            log(f"Using pad_token_id: {tokenizer.pad_token_id} ({tokenizer.decode(tokenizer.pad_token_id)})")
+        else:
+            log("Warning: pad_token_id is None.", level="warning")
+
+        # Displaying info about the EOS token
+        if tokenizer.eos_token_id is not None:
+            log(f"Using eos_token_id: {tokenizer.eos_token_id} ({tokenizer.decode(tokenizer.eos_token_id)})")
+        else:
+            log("Warning: eos_token_id is None (this is unusual for generative models).", level="warning")
+
+        # The terminators only depend on the tokenizer, so we resolve them once.
+        self.terminator_ids = resolve_terminator_ids(tokenizer)
+        log(f"Using eos_token_id: {self.terminator_ids}, pad_token_id: {model.config.pad_token_id}")
+
+        # The KV-cache of the prompt prefixes (disabled with a size of 0)
+        if self.prefix_cache_size > 0:
+            self.prefix_cache = PrefixKVCache(model, tokenizer, max_entries=self.prefix_cache_size)
+
+        # The first call settles the padding/truncation state of the Rust backend of a fast tokenizer (its tokenizer.json
+        # may enable them): no later call pads or truncates (see generation.prepare_generation_inputs), so they only
+        # read that state and the request threads and the scheduler worker can tokenize at the same time.
+        tokenizer("")
+
+        self.model, self.tokenizer = model, tokenizer
+
+        # The draft model of the speculative decoding, if enabled
+        if self.draft_model_name:
+            self.draft_model = self._load_draft_model(torch, AutoTokenizer, AutoModelForCausalLM)
+        elif self.speculative_method == "draft_model":
+            log(f"Warning: the {self.name} backend has no default draft model. Speculative decoding disabled.", level="warning")
+            self.speculative_method = None
+        elif self.speculative_method == "prompt_lookup":
+            log(f"Prompt lookup decoding enabled ({self.prompt_lookup_tokens} candidate tokens, n-grams up to {self.prompt_lookup_ngram_size} tokens, mode: {self.speculative_mode}).")
+
+        # Resident memory and decoding speed, so that the deployment can be sized
+        self._measure_startup()
+
+    # Loads the draft model of the speculative decoding (None if it can't be used).
+    # The draft tokens are verified token id by token id, so the draft model must share the vocabulary of the main model.
+    def _load_draft_model(self, torch, AutoTokenizer, AutoModelForCausalLM):
+        try:
+            draft_tokenizer = AutoTokenizer.from_pretrained(self.draft_model_name, token=self.hf_token, trust_remote_code=True)
+            if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+                log(f"Warning: draft model {self.draft_model_name} doesn't share the tokenizer of {self.model_name}. Speculative decoding disabled.", level="warning")
+                self.speculative_method = None
+                return None
+
+            # Same placement and dtype of the main model, without the subclass transformations (e.g. quantization)
+            draft_model = AutoModelForCausalLM.from_pretrained(self.draft_model_name, **self._model_load_kwargs(torch))
+            draft_model.eval()
+
+            # Fixed number of draft tokens per step (transformers would otherwise adapt it with its own heuristic)
+            draft_model.generation_config.num_assistant_tokens = self.num_draft_tokens
+            draft_model.generation_config.num_assistant_tokens_schedule = "constant"
+            log(f"Draft model loaded ({self.draft_model_name}, {self.num_draft_tokens} tokens per step, mode: {self.speculative_mode}).")
+            return draft_model
+
+        except Exception as e:
+            log(f"Warning: could not load the draft model {self.draft_model_name}: {e}. Speculative decoding disabled.", level="warning")
+            self.speculative_method = None
+            return None
+
+    # Loads the weights of the main model, timing it. With mmap_weights, they are mapped from the checkpoint files when the
+    # model can use them as they are (see _can_map_weights); otherwise, or if mapping fails, from_pretrained loads them.
+    def _load_model(self, torch, AutoModelForCausalLM):
+        kwargs = self._model_load_kwargs(torch)
+        started = time.monotonic()
+
+        if self.mmap_weights and self._can_map_weights(kwargs, torch):
+            from weights import load_mapped_model
+            try:
+                model, report = load_mapped_model(self.model_name, torch, kwargs["torch_dtype"], token=self.hf_token)
+                self.weights_report = {"mode": "mmap", **report, "load_seconds": round(time.monotonic() - started, 2)}
+                log(f"Weights of {self.model_name} memory-mapped: {self.weights_report}")
+                return model
+            except Exception as e:
+                log(f"Warning: could not memory-map the weights of {self.model_name} ({e}). Loading them in private memory.", level="warning")
+                started = time.monotonic()
+        elif self.mmap_weights:
+            log(f"Warning: the weights of {self.model_name} can't be memory-mapped on this device or with quantization. Loading them in private memory.", level="warning")
+
+        model = AutoModelForCausalLM.from_pretrained(self.model_name, **kwargs)
+        self.weights_report = {"mode": "private", "load_seconds": round(time.monotonic() - started, 2)}
+        return model
+
+    # Mapped weights are used in place: the model must run on CPU, without quantization at load time
+    def _can_map_weights(self, kwargs, torch):
+        return not torch.cuda.is_available() and "quantization_config" not in kwargs
+
+    # Hook for the subclasses to transform the loaded model (e.g. quantization)
+    def _prepare_model(self, model, torch):
+        return model
+
+    # Measures the resident memory and the decoding speed (with a short greedy generation of warmup_tokens tokens).
+    # The warmup generation also pays the one-time costs (kernels selection, allocations) before the first real request.
+    def _measure_startup(self):
+
+        from weights import process_memory_mb
+        self.startup_metrics = {"resident_memory_mb": round(resident_memory_mb(), 1), "memory_mb": process_memory_mb()}
+        if self.warmup_tokens > 0:
+            try:
+                inputs = self.tokenizer(
+                    self.build_prompt_text("", "Hello!", enable_thinking=False), return_tensors="pt"
+                ).to(self.model.device)
+                started = time.monotonic()
+                output = self.model.generate(
+                    **inputs, max_new_tokens=self.warmup_tokens, min_new_tokens=self.warmup_tokens, do_sample=False
+                )
+                elapsed = time.monotonic() - started
+                generated = output.shape[1] - inputs.input_ids.shape[1]
+                self.startup_metrics["tokens_per_second"] = round(generated / elapsed, 2) if elapsed > 0 else None
+            except Exception as e:
+                log(f"Warning: could not measure the decoding speed: {e}", level="warning")
+
+        log(f"Backend '{self.name}' startup metrics: {self.startup_metrics}")
+
+    # Applies the tokenizer's chat template to format the messages into a single string.
+    def build_prompt_text(self, system_prompt, user_prompt, enable_thinking=True):
+        from generation import build_prompt_text
+        return build_prompt_text(self.tokenizer, system_prompt, user_prompt, enable_thinking=enable_thinking)
+
+    def count_tokens(self, text):
+        return len(self.tokenizer(text).input_ids)
+
+    # Returns the prefix cache entry of the given (prefix_key, prefix_text) pair (None if not available).
+    def _prefix_entry(self, prefix):
+
+        # No prefix cache, or prompts without a shared prefix
+        if self.prefix_cache is None or prefix is None:
+            return None
+
+        # Failing to compute a prefix must not fail the request: it just runs the full prefill
+        try:
+            return self.prefix_cache.get(*prefix)
+        except Exception as e:
+            log(f"Warning: could not compute the KV-cache of prefix {prefix[0]}: {e}", level="warning")
+            return None
+
+    # Returns the speculative decoding selector of an operation (the first element of the prefix key)
+    def _speculative_selector(self, prefix):
+        from speculative import SpeculativeDecodingSelector
+        operation = prefix[0][0] if prefix else "other"
+        with self._selectors_lock:
+            if operation not in self.speculative_selectors:
+                self.speculative_selectors[operation] = SpeculativeDecodingSelector(self.speculative_mode)
+            return self.speculative_selectors[operation]
+
+    # Returns the extra generate arguments of a speculative generation of batch_size prompts (None for plain decoding).
+    # Assisted generation in transformers only supports a single sequence, so batches always use plain decoding: speculative
+    # decoding helps when the load is low (and latency matters most), while the batches keep the throughput at high load.
+    def _speculative_kwargs(self, batch_size, selector):
+        if self.speculative_method is None or batch_size != 1 or not selector.use_draft():
+            return None
+        if self.speculative_method == "prompt_lookup":
+            return {"prompt_lookup_num_tokens": self.prompt_lookup_tokens, "max_matching_ngram_size": self.prompt_lookup_ngram_size}
+        return {"assistant_model": self.draft_model}
+
+    # Records the speed of a generation of a single sequence, so that the selector can compare the two decoding modes.
+    # The stats also get the decoding mode and, for speculative generations, the acceptance rate of the draft tokens.
+    def _record_decoding(self, speculative, stats, batch_size, selector):
+        from speculative import acceptance_rate
+        if self.speculative_method is None or batch_size != 1 or not stats.get("output_tokens"):
+            return
+
+        seconds = stats["prefill_seconds"] + stats["decode_seconds"]
+        steps = stats["decode_steps"] + 1
+        candidates = self.prompt_lookup_tokens if self.speculative_method == "prompt_lookup" else self.num_draft_tokens
+        rate = acceptance_rate(stats["output_tokens"], steps, candidates) if speculative else None
+        stats["decoding_mode"] = self.speculative_method if speculative else "plain"
+        stats["acceptance_rate"] = rate
+        if seconds > 0:
+            selector.record(speculative, stats["output_tokens"] / seconds, rate)
+
+    def generate_batch(self, prompt_texts, max_new_tokens, settings, prefix=None, request_contexts=None, stats=None, monitors=None):
+        from generation import generate_batch
+
+        # The prefix KV-cache isn't passed to assisted generations, which run the full prefill
+        selector = self._speculative_selector(prefix)
+        speculative = self._speculative_kwargs(len(prompt_texts), selector)
+        stats = {} if stats is None else stats
+        outputs = generate_batch(
+            self.model, self.tokenizer, prompt_texts, max_new_tokens, settings, self.terminator_ids,
+            prefix_cache=None if speculative else self.prefix_cache, prefix_entry=None if speculative else self._prefix_entry(prefix),
+            request_contexts=request_contexts, stats=stats, monitors=monitors, speculative=speculative
+        )
+        self._record_decoding(speculative is not None, stats, len(prompt_texts), selector)
+        return outputs
+
+    def stream_generate(self, prompt_text, max_new_tokens, settings, prefix=None, request_context=None, stats=None, monitor=None):
+        from generation import stream_generate
+
+        # Same choice of generate_batch, for a single sequence
+        selector = self._speculative_selector(prefix)
+        speculative = self._speculative_kwargs(1, selector)
+        stats = {} if stats is None else stats
+        yield from stream_generate(
+            self.model, self.tokenizer, prompt_text, max_new_tokens, settings, self.terminator_ids,
+            prefix_cache=None if speculative else self.prefix_cache, prefix_entry=None if speculative else self._prefix_entry(prefix),
+            request_context=request_context, stats=stats, monitor=monitor, speculative=speculative
+        )
+        self._record_decoding(speculative is not None, stats, 1, selector)
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "model_name": self.model_name,
+            "device": self.device,
+            "dtype": str(self.model.dtype).replace("torch.", "") if self.model is not None else None,
+            **self.startup_metrics,
+            "weights": self.weights_report or None,
+            "prefix_cache": self.prefix_cache.stats() if self.prefix_cache is not None else None,
+            "speculative": {
+                "method": self.speculative_method,
+                "mode": self.speculative_mode,
+                "draft_model_name": self.draft_model_name if self.speculative_method == "draft_model" else None,
+                "num_draft_tokens": self.num_draft_tokens if self.speculative_method == "draft_model" else None,
+                "prompt_lookup_tokens": self.prompt_lookup_tokens if self.speculative_method == "prompt_lookup" else None,
+                "prompt_lookup_ngram_size": self.prompt_lookup_ngram_size if self.speculative_method == "prompt_lookup" else None,
+                "operations": {operation: selector.stats() for operation, selector in list(self.speculative_selectors.items())},
+            } if self.speculative_method is not None else None,
+        }
+
+# Small model backend: the same transformers code path with a small chat model, in full precision on a single device.
+# It is meant for development and CI machines without a large GPU (it runs on CPU too).
+class SmallHFBackend(HFBackend):
+
+    name = "small"
+    default_model_name = "Qwen/Qwen3-0.6B"
+
+    # There is no smaller Qwen3: speculative decoding needs an explicit pair, e.g. Qwen/Qwen3-1.7B with Qwen/Qwen3-0.6B as draft
+    default_draft_model_name = None
+
+    def _model_load_kwargs(self, torch):
+        return {
+            "torch_dtype": torch.float16 if torch.cuda.is_available() else torch.float32,
+            "token": self.hf_token,
+            "trust_remote_code": True,
+            "device_map": "cuda" if torch.cuda.is_available() else "cpu",
+        }
+
+# CPU backend: a Qwen3 model with weight-only quantization, for GPU-less nodes.
+# Weights are stored in int8 (or int4) while the activations are computed in bf16/fp32 (see cpu_compute_dtype):
+# decoding on CPU is bound by the memory bandwidth, so smaller weights mean proportionally faster tokens, and a
+# quantized mid-size model fits in the memory of commodity servers.
+# - quantization: "int8", "int4" or "none". Quantization is done by torchao (through transformers' TorchAoConfig) when
+#   installed; without it, int8 falls back to torch's dynamic quantization of the linear layers (fp32 compute), while
+#   int4 requires torchao.
+# - model_size: the size of the Qwen3 model (e.g. "4B", "8B", "14B"), ignored when model_name is given.
+# - num_threads: torch intra-op threads (0 keeps the torch default, i.e. the number of physical cores).
+class CPUBackend(HFBackend):
+
+    name = "cpu"
+    default_model_name = "Qwen/Qwen3-8B"
+    QUANTIZATIONS = ("int8", "int4", "none")
+
+    def __init__(self, model_name=None, model_size=None, quantization="int8", num_threads=0, **options):
+
+        # An explicit model name wins over the model size
+        if not model_name and model_size:
+            model_name = f"Qwen/Qwen3-{model_size}"
+        super().__init__(model_name=model_name, **options)
+
+        # Unknown quantizations are a configuration error
+        if quantization not in self.QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}'. Available quantizations: {', '.join(self.QUANTIZATIONS)}")
+        self.quantization = quantization
+        self.num_threads = num_threads
+
+        # Actual quantization method, set by load()
+        self.quantization_method = None
+
+    # Returns the TorchAoConfig of the requested quantization, or None if torchao is not installed (or no quantization)
+    def _torchao_config(self):
+
+        if self.quantization == "none":
+            return None
+
+        try:
+            import torchao
+            from transformers import TorchAoConfig
+        except ImportError:
+            if self.quantization == "int4":
+                raise RuntimeError("int4 quantization requires torchao (pip install torchao).")
+            return None
+
+        if self.quantization == "int4":
+            from torchao.dtypes import Int4CPULayout
+            return TorchAoConfig("int4_weight_only", group_size=128, layout=Int4CPULayout())
+        return TorchAoConfig("int8_weight_only")
+
+    def _model_load_kwargs(self, torch):
+
+        # Threads used by the matmuls
+        if self.num_threads > 0:
+            torch.set_num_threads(self.num_threads)
+
+        kwargs = {
+            "torch_dtype": cpu_compute_dtype(torch, self.cpu_dtype),
+            "token": self.hf_token,
+            "trust_remote_code": True,
+            "device_map": "cpu",
+            "low_cpu_mem_usage": True,
+        }
+
+        # Weight-only quantization at load time, through torchao
+        quantization_config = self._torchao_config()
+        if quantization_config is not None:
+            kwargs["quantization_config"] = quantization_config
+            self.quantization_method = f"torchao-{self.quantization}"
+
+        # The dynamic quantization fallback works on fp32 linear layers only
+        elif self.quantization == "int8":
+            kwargs["torch_dtype"] = torch.float32
+
+        return kwargs
+
+    # Quantized weights are new tensors: only the unquantized model can keep the mapped ones
+    def _can_map_weights(self, kwargs, torch):
+        return super()._can_map_weights(kwargs, torch) and self.quantization == "none"
+
+    def _prepare_model(self, model, torch):
+
+        # Fallback without torchao: int8 dynamic quantization of the linear layers
+        if self.quantization == "int8" and self.quantization_method is None:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.quantization_method = "dynamic-int8"
+
+        log(f"CPU backend: {self.model_name}, quantization: {self.quantization_method or 'none'}, threads: {torch.get_num_threads()}.")
+        return model
+
+    def stats(self):
+        return {**super().stats(), "quantization": self.quantization_method or "none"}
+
+# Deterministic stub backend: no weights and no heavy dependencies, for tests and load tests of the HTTP path.
+# It recognizes the variable text at the end of the chunk/simplify prompts and answers with:
+# - chunk prompts (they end with a "Chunked Text" label): the sentences of the text, grouped in blocks written as the model
+#   does, the plain block on a line and the same block with its first word in bold on the next one
+# - simplify prompts: the text itself, with collapsed whitespaces
+# Every answer starts with a short think block when thinking is enabled, like the real model.
+# token_delay_ms simulates the decoding speed of a real model (per whitespace separated token).
+class StubBackend:
+
+    name = "stub"
+    default_model_name = "stub"
+
+    # The variable text is the last quoted block of the prompt, optionally followed by a label line, before the """ opener
+    _VARIABLE_TEXT_PATTERN = re.compile(r':\n"(?P<text>(?:(?!:\n").)*)"\n(?:\n(?P<label>[^\n]+)\n)?"""\s*$', re.DOTALL)
+    _SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+    # Number of sentences of every chunk block
+    SENTENCES_PER_BLOCK = 2
+
+    def __init__(self, model_name=None, token_delay_ms=0, **unused_options):
+        self.model_name = model_name or self.default_model_name
+        self.token_delay_seconds = max(0.0, token_delay_ms / 1000.0)
+        self._counters = {"batches": 0, "prompts": 0, "streams": 0}
+        self._lock = threading.Lock()
+
+    def load(self):
+        log("Stub backend ready: answers are generated deterministically from the prompts.")
+
+    def build_prompt_text(self, system_prompt, user_prompt, enable_thinking=True):
+        return f"<system>\n{system_prompt}\n<user>\n{user_prompt}\n<thinking>{'on' if enable_thinking else 'off'}\n<assistant>\n"
+
+    def count_tokens(self, text):
+        return len(text.split())
+
+    # Builds the deterministic answer of a prompt
+    def _answer(self, prompt_text, max_new_tokens):
+
+        # Thinking mode, as written by build_prompt_text
+        think_block = "<think>\nStub reasoning.\n</think>\n\n" if "\n<thinking>on\n" in prompt_text else ""
+
+        # Without a recognizable variable text, we answer with the last line of the user prompt
+        user_prompt = prompt_text.split("\n<user>\n", 1)[-1].split("\n<thinking>", 1)[0]
+        match = self._VARIABLE_TEXT_PATTERN.search(user_prompt + "\n")
+        if match is None:
+            return think_block + user_prompt.strip().split("\n")[-1]
+
+        # Simplification: the text itself
+        text = " ".join(match.group("text").split())
+        if match.group("label") is None:
+            answer = text
+
+        # Chunking: blocks of sentences, separated by an empty line
+        else:
+            sentences = [sentence for sentence in self._SENTENCE_END_PATTERN.split(text) if sentence]
+            blocks = [
+                " ".join(sentences[start:start + self.SENTENCES_PER_BLOCK])
+                for start in range(0, len(sentences), self.SENTENCES_PER_BLOCK)
+            ]
+
+            highlighted = [re.sub(r"^(\S+)", r"<b>\1</b>", block) for block in blocks]
+
+            # Fused chunk-and-simplify prompts ask for tagged sections: every block, then its simplification (itself)
+            if "<simplified>" in user_prompt:
+                answer = "\n".join(
+                    f"<original>\n{original}\n</original>\n<simplified>\n{block}\n</simplified>"
+                    for block, original in zip(blocks, highlighted)
+                )
+            else:
+                answer = "\n\n".join(block + "\n" + original for block, original in zip(blocks, highlighted))
+
+        # The token limit is respected, as a real model would do
+        tokens = (think_block + answer).split(" ")
+        return " ".join(tokens[:max(1, max_new_tokens)])
+
+    # Simulates the decoding time of the given text, token by token, stopping early if every request is cancelled
+    def _simulate_decoding(self, text, request_contexts=None):
+        if not self.token_delay_seconds:
+            return
+        for _ in range(self.count_tokens(text)):
+            if request_contexts and all(context is not None and context.cancelled for context in request_contexts):
+                return
+            time.sleep(self.token_delay_seconds)
+
+    # Fills the generation stats of the given prompts and answers, as the transformers backends do
+    def _fill_stats(self, stats, prompt_texts, answers, started):
+        if stats is None:
+            return
+        stats.update({
+            "batch_size": len(prompt_texts),
+            "prompt_tokens": sum(self.count_tokens(prompt_text) for prompt_text in prompt_texts),
+            "output_tokens": sum(self.count_tokens(answer) for answer in answers),
+            "row_prompt_tokens": [self.count_tokens(prompt_text) for prompt_text in prompt_texts],
+            "row_output_tokens": [self.count_tokens(answer) for answer in answers],
+            "thinking_tokens": sum(self.count_tokens(answer.split("</think>")[0]) + 1 for answer in answers if "</think>" in answer),
+            "prefill_seconds": 0.0,
+            "decode_seconds": time.monotonic() - started,
+            "decode_steps": max((self.count_tokens(answer) for answer in answers), default=0),
+        })
+
+    # Returns the part of the answer decoded before its monitor (if any) asked to stop, as a real generation would
+    @staticmethod
+    def _monitored(answer, monitor):
+        if monitor is None:
+            return answer
+        decoded = []
+        for piece in re.findall(r"\S+\s*|\s+", answer):
+            decoded.append(piece)
+            if monitor.feed(piece):
+                break
+        return "".join(decoded)
+
+    def generate_batch(self, prompt_texts, max_new_tokens, settings, prefix=None, request_contexts=None, stats=None, monitors=None):
+
+        with self._lock:
+            self._counters["batches"] += 1
+            self._counters["prompts"] += len(prompt_texts)
+
+        # A batch takes as long as its longest answer
+        started = time.monotonic()
+        answers = [
+            self._monitored(self._answer(prompt_text, max_new_tokens), monitor).strip()
+            for prompt_text, monitor in zip(prompt_texts, monitors or [None] * len(prompt_texts))
+        ]
+        self._simulate_decoding(max(answers, key=self.count_tokens, default=""), request_contexts)
+        self._fill_stats(stats, prompt_texts, answers, started)
+        return answers
+
+    def stream_generate(self, prompt_text, max_new_tokens, settings, prefix=None, request_context=None, stats=None, monitor=None):
+
+        with self._lock:
+            self._counters["streams"] += 1
+
+        # The answer is streamed word by word (keeping its whitespaces), until the request is cancelled
+        started = time.monotonic()
+        answer = self._monitored(self._answer(prompt_text, max_new_tokens), monitor)
+        for piece in re.findall(r"\S+\s*|\s+", answer):
+            if request_context is not None and request_context.cancelled:
+                return
+            self._simulate_decoding(piece)
+            yield piece
+        self._fill_stats(stats, [prompt_text], [answer], started)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": self.name, "model_name": self.model_name, **self._counters}
+
+# Registry of the available backends, by configuration name
+BACKENDS = {
+    HFBackend.name: HFBackend,
+    SmallHFBackend.name: SmallHFBackend,
+    CPUBackend.name: CPUBackend,
+    StubBackend.name: StubBackend,
+}
+
+# Function that registers a custom backend class under the given name
+def register_backend(name, backend_class):
+    BACKENDS[name] = backend_class
+
+# Function that instantiates (without loading it) the backend registered with the given name
+def create_backend(name, **options):
+
+    # Unknown backends are a configuration error
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}'. Available backends: {', '.join(BACKENDS)}")
+
+    return BACKENDS[name](**options)
+
+# --- 2. Background Loading ---
+# Loading the weights of a large model takes minutes. BackendLoader loads the backend in a background thread, so
+# that the process can bind its port and answer health checks (and serve cached results) in the meantime.
+class BackendLoader:
+
+    def __init__(self, backend):
+
+        # The backend to load and the state of the loading: "idle", "loading", "ready" or "failed"
+        self.backend = backend
+        self.state = "idle"
+        self.error = None
+        self.load_seconds = None
+
+        # Set once loading has ended (successfully or not)
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    # Starts loading the backend in the background (does nothing if already started)
+    def start(self):
+
+        with self._lock:
+            if self.state != "idle":
+                return
+            self.state = "loading"
+
+        threading.Thread(target=self._load, name="adaptease-backend-loader", daemon=True).start()
+
+    # Loads the backend, recording the outcome
+    def _load(self):
+
+        started = time.monotonic()
+        log(f"Loading inference backend '{self.backend.name}' ({self.backend.model_name})...")
+        try:
+            self.backend.load()
+            self.state = "ready"
+        except Exception as e:
+            log(f"Error while loading inference backend '{self.backend.name}': {e}", level="error")
+            self.error = str(e)
+            self.state = "failed"
+        finally:
+            self.load_seconds = time.monotonic() - started
+            self._done.set()
+
+    def ready(self):
+        return self.state == "ready"
+
+    # Returns the loaded backend, starting the loading if needed and waiting for it at most timeout seconds (None = forever).
+    def get(self, timeout=None):
+
+        self.start()
+        if not self._done.wait(timeout):
+            raise BackendNotReadyError(f"Inference backend '{self.backend.name}' is still loading.")
+        if self.state != "ready":
+            raise BackendNotReadyError(f"Inference backend '{self.backend.name}' failed to load: {self.error}")
+
+        return self.backend
+
+    # Returns the state of the loading
+    def status(self):
+        return {
+            "backend": self.backend.name,
+            "model_name": self.backend.model_name,
+            "state": self.state,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+        }
@@ -0,0 +1,4 @@
+# Benchmark suite of AdaptEase (see bench/README.md).
+# - bench.micro: micro-benchmarks of tokenization, chat templating and output parsing
+# - bench.load: end-to-end HTTP load test of server.py
+# - bench.compare: comparison of two result files
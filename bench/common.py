@@ -0,0 +1,86 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# --- 1. Shared Benchmark Helpers ---
+# Statistics, environment description and result files shared by every benchmark.
+# Result files are JSON documents with the same layout, so that any two of them can be compared (see bench/compare.py):
+# {"benchmark": ..., "timestamp": ..., "environment": {...}, "config": {...}, "results": {name: {metric: value}}}
+
+# Default folder of the result files
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Function that returns the p-th percentile (0-100) of values, with linear interpolation between the closest ranks
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+# Function that summarizes a list of durations (seconds) in milliseconds
+def summarize_latencies(durations):
+    return {
+        "count": len(durations),
+        "mean_ms": (sum(durations) / len(durations) * 1000.0) if durations else 0.0,
+        "p50_ms": percentile(durations, 50) * 1000.0,
+        "p95_ms": percentile(durations, 95) * 1000.0,
+        "p99_ms": percentile(durations, 99) * 1000.0,
+        "max_ms": max(durations) * 1000.0 if durations else 0.0,
+    }
+
+# Function that returns the commit of the working tree (None outside of a git checkout)
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+# Function that describes where the benchmark ran, so that results of different machines are not compared by mistake
+def environment_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": git_commit(),
+        "backend": os.getenv("ADAPTEASE_BACKEND"),
+        "model_name": os.getenv("ADAPTEASE_MODEL_NAME"),
+    }
+
+# Function that writes the results of a benchmark, returning the path of the file.
+# Without an explicit path, the file is named after the benchmark and the current time, in RESULTS_DIR.
+def write_results(benchmark, config, results, path=None):
+    document = {
+        "benchmark": benchmark,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment_info(),
+        "config": config,
+        "results": results,
+    }
+    path = path or os.path.join(RESULTS_DIR, f"{benchmark}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as results_file:
+        json.dump(document, results_file, indent=2, ensure_ascii=False)
+    return path
+
+# Function that prints the results as an aligned table, one row per benchmark
+def print_results(results, columns):
+    name_width = max([len("benchmark")] + [len(name) for name in results])
+    print("benchmark".ljust(name_width) + "".join(column.rjust(18) for column in columns))
+    for name, metrics in results.items():
+        cells = []
+        for column in columns:
+            value = metrics.get(column)
+            cells.append(("-" if value is None else f"{value:.3f}" if isinstance(value, float) else str(value)).rjust(18))
+        print(name.ljust(name_width) + "".join(cells))
+    sys.stdout.flush()
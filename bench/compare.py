@@ -0,0 +1,81 @@
+import argparse
+import json
+import sys
+
+# --- 1. Result Comparison ---
+# Compares two result files of the same benchmark (e.g. before and after a change), printing every numeric metric
+# of both runs and its relative change. With --max-regression, the command fails (exit code 1) when a latency metric
+# (*_ms) grew, or a throughput metric (*_per_second, *_rps) shrank, by more than the given percentage: it can gate a CI job.
+# Usage:
+#   python -m bench.compare bench/results/baseline.json bench/results/candidate.json --max-regression 10
+
+# Metrics where lower is better and higher is better. Other metrics (counts, sizes) are only reported.
+LOWER_IS_BETTER_SUFFIXES = ("_ms",)
+HIGHER_IS_BETTER_SUFFIXES = ("_per_second", "_rps")
+
+# Function that flattens the numeric metrics of a result file in {"benchmark.metric": value}
+def flatten_results(document):
+    return {
+        f"{name}.{metric}": value
+        for name, metrics in document["results"].items()
+        for metric, value in metrics.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+# Function that returns the change of a metric in percent (None when the baseline is 0)
+def relative_change(baseline, candidate):
+    return (candidate - baseline) / baseline * 100.0 if baseline else None
+
+# Function that tells if a change (in percent) of the given metric is a regression beyond threshold
+def is_regression(metric, change, threshold):
+    if change is None or threshold is None:
+        return False
+    if metric.endswith(LOWER_IS_BETTER_SUFFIXES):
+        return change > threshold
+    if metric.endswith(HIGHER_IS_BETTER_SUFFIXES):
+        return -change > threshold
+    return False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two AdaptEase benchmark result files.")
+    parser.add_argument("baseline", help="result file of the reference run")
+    parser.add_argument("candidate", help="result file of the run to evaluate")
+    parser.add_argument("--max-regression", type=float, default=None, help="fail if a latency/throughput metric regressed by more than this percentage")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as baseline_file, open(args.candidate, encoding="utf-8") as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+
+    # Results of different benchmarks, or of different machines, are not comparable
+    if baseline["benchmark"] != candidate["benchmark"]:
+        parser.error(f"cannot compare a {baseline['benchmark']} result with a {candidate['benchmark']} result")
+    for key in ("platform", "cpu_count"):
+        if baseline["environment"].get(key) != candidate["environment"].get(key):
+            print(f"Warning: the runs have a different {key} ({baseline['environment'].get(key)} vs {candidate['environment'].get(key)}).")
+    if baseline["config"] != candidate["config"]:
+        changed = sorted(key for key in set(baseline["config"]) | set(candidate["config"]) if baseline["config"].get(key) != candidate["config"].get(key))
+        print(f"Warning: the runs have a different configuration ({', '.join(changed)}).")
+
+    baseline_metrics, candidate_metrics = flatten_results(baseline), flatten_results(candidate)
+    regressions = []
+    name_width = max([len("metric")] + [len(metric) for metric in baseline_metrics])
+    print("metric".ljust(name_width) + "baseline".rjust(16) + "candidate".rjust(16) + "change".rjust(12))
+    for metric, baseline_value in baseline_metrics.items():
+        if metric not in candidate_metrics:
+            continue
+        candidate_value = candidate_metrics[metric]
+        change = relative_change(baseline_value, candidate_value)
+        regressed = is_regression(metric, change, args.max_regression)
+        if regressed:
+            regressions.append(metric)
+        print(
+            metric.ljust(name_width) + f"{baseline_value:16.3f}{candidate_value:16.3f}"
+            + ("-" if change is None else f"{change:+.1f}%").rjust(12) + ("  REGRESSION" if regressed else "")
+        )
+
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.max_regression}%.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
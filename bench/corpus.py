@@ -0,0 +1,132 @@
+import json
+import random
+
+# --- 1. Benchmark Corpora ---
+# The benchmarks need realistic input: news-like articles in every supported language, with the length spread of the
+# paragraphs a publisher actually serves (mostly short and medium paragraphs, a few long ones).
+# Articles are built offline and deterministically (for a given seed) from the sentence pools below, so two runs
+# of a benchmark process exactly the same texts. A real corpus can be used instead with load_corpus_file().
+
+# Sentence pools, one per language
+SENTENCE_POOLS = {
+    "en": [
+        "The city council approved the new budget after a long debate on Tuesday evening.",
+        "Public transport will be free for students under twenty-five starting next September.",
+        "According to the latest report, air quality in the historic centre has improved by twelve percent.",
+        "Several residents complained that the renovation works have been delayed for months.",
+        "The mayor said that the funds will be used to repair schools and local libraries.",
+        "Experts warn that rising temperatures could put pressure on the regional water supply.",
+        "A new cycling lane connecting the station to the university will open in spring.",
+        "Local businesses hope that the festival will bring more visitors to the old town.",
+        "The hospital has hired forty nurses to reduce waiting times in the emergency department.",
+        "Critics argue that the plan does not address the shortage of affordable housing.",
+        "Volunteers collected more than two tons of plastic from the river banks last weekend.",
+        "The museum will extend its opening hours during the summer months.",
+    ],
+    "it": [
+        "Il consiglio comunale ha approvato il nuovo bilancio dopo un lungo dibattito martedì sera.",
+        "Il trasporto pubblico sarà gratuito per gli studenti sotto i venticinque anni a partire da settembre.",
+        "Secondo l'ultimo rapporto, la qualità dell'aria nel centro storico è migliorata del dodici per cento.",
+        "Diversi residenti si sono lamentati dei lavori di ristrutturazione, in ritardo da mesi.",
+        "Il sindaco ha dichiarato che i fondi serviranno a riparare scuole e biblioteche di quartiere.",
+        "Gli esperti avvertono che l'aumento delle temperature potrebbe mettere sotto pressione le risorse idriche.",
+        "Una nuova pista ciclabile tra la stazione e l'università aprirà in primavera.",
+        "I commercianti sperano che il festival porti più visitatori nel centro storico.",
+        "L'ospedale ha assunto quaranta infermieri per ridurre i tempi di attesa al pronto soccorso.",
+        "I critici sostengono che il piano non affronti la carenza di alloggi a prezzi accessibili.",
+        "I volontari hanno raccolto più di due tonnellate di plastica lungo le rive del fiume.",
+        "Il museo prolungherà l'orario di apertura durante i mesi estivi.",
+    ],
+    "es": [
+        "El ayuntamiento aprobó el nuevo presupuesto tras un largo debate el martes por la noche.",
+        "El transporte público será gratuito para los estudiantes menores de veinticinco años desde septiembre.",
+        "Según el último informe, la calidad del aire en el centro histórico ha mejorado un doce por ciento.",
+        "Varios vecinos se quejaron de que las obras de renovación llevan meses de retraso.",
+        "El alcalde afirmó que los fondos se destinarán a reparar escuelas y bibliotecas de barrio.",
+        "Los expertos advierten que el aumento de las temperaturas podría presionar el suministro de agua.",
+        "Un nuevo carril bici que une la estación con la universidad se abrirá en primavera.",
+        "Los comerciantes esperan que el festival atraiga a más visitantes al casco antiguo.",
+        "El hospital ha contratado a cuarenta enfermeros para reducir las esperas en urgencias.",
+        "Los críticos sostienen que el plan no resuelve la falta de vivienda asequible.",
+        "Los voluntarios recogieron más de dos toneladas de plástico en las orillas del río.",
+        "El museo ampliará su horario de apertura durante los meses de verano.",
+    ],
+    "fr": [
+        "Le conseil municipal a approuvé le nouveau budget après un long débat mardi soir.",
+        "Les transports publics seront gratuits pour les étudiants de moins de vingt-cinq ans dès septembre.",
+        "Selon le dernier rapport, la qualité de l'air dans le centre historique s'est améliorée de douze pour cent.",
+        "Plusieurs habitants se sont plaints du retard de plusieurs mois des travaux de rénovation.",
+        "Le maire a déclaré que les fonds serviront à rénover les écoles et les bibliothèques de quartier.",
+        "Les experts préviennent que la hausse des températures pourrait peser sur l'approvisionnement en eau.",
+        "Une nouvelle piste cyclable reliant la gare à l'université ouvrira au printemps.",
+        "Les commerçants espèrent que le festival attirera davantage de visiteurs dans la vieille ville.",
+        "L'hôpital a recruté quarante infirmiers pour réduire l'attente aux urgences.",
+        "Les critiques estiment que le plan ne répond pas à la pénurie de logements abordables.",
+        "Des bénévoles ont ramassé plus de deux tonnes de plastique sur les berges du fleuve.",
+        "Le musée prolongera ses horaires d'ouverture pendant les mois d'été.",
+    ],
+    "de": [
+        "Der Stadtrat hat den neuen Haushalt nach einer langen Debatte am Dienstagabend verabschiedet.",
+        "Ab September ist der Nahverkehr für Studierende unter fünfundzwanzig Jahren kostenlos.",
+        "Laut dem neuesten Bericht hat sich die Luftqualität in der Altstadt um zwölf Prozent verbessert.",
+        "Mehrere Anwohner beschwerten sich, dass sich die Sanierungsarbeiten seit Monaten verzögern.",
+        "Der Bürgermeister sagte, das Geld werde für die Reparatur von Schulen und Stadtteilbibliotheken verwendet.",
+        "Fachleute warnen, dass steigende Temperaturen die regionale Wasserversorgung belasten könnten.",
+        "Ein neuer Radweg zwischen dem Bahnhof und der Universität wird im Frühjahr eröffnet.",
+        "Die Geschäftsleute hoffen, dass das Festival mehr Besucher in die Altstadt bringt.",
+        "Das Krankenhaus hat vierzig Pflegekräfte eingestellt, um die Wartezeiten in der Notaufnahme zu verkürzen.",
+        "Kritiker meinen, dass der Plan den Mangel an bezahlbarem Wohnraum nicht löst.",
+        "Freiwillige sammelten am Wochenende mehr als zwei Tonnen Plastik an den Flussufern.",
+        "Das Museum verlängert in den Sommermonaten seine Öffnungszeiten.",
+    ],
+}
+
+# Paragraph sizes (in sentences) and how often they occur
+PARAGRAPH_SIZES = {"short": (2, 3), "medium": (4, 6), "long": (8, 12)}
+PARAGRAPH_SIZE_WEIGHTS = {"short": 0.5, "medium": 0.4, "long": 0.1}
+
+# Function that builds a single paragraph of the given language, of the given size class
+def build_paragraph(rng, lang, size):
+    low, high = PARAGRAPH_SIZES[size]
+    return " ".join(rng.choice(SENTENCE_POOLS[lang]) for _ in range(rng.randint(low, high)))
+
+# Function that builds a deterministic corpus of count texts, as a list of {"id", "lang", "size", "text"} items.
+# Languages are taken in turn from langs, and the sizes are drawn with PARAGRAPH_SIZE_WEIGHTS.
+# Every text is unique: even with a small sentence pool, the texts never hit the result cache by accident.
+def build_corpus(count, langs=None, seed=0):
+    rng = random.Random(seed)
+    langs = list(langs or SENTENCE_POOLS)
+    sizes, weights = zip(*PARAGRAPH_SIZE_WEIGHTS.items())
+
+    corpus = []
+    for index in range(count):
+        lang = langs[index % len(langs)]
+        size = rng.choices(sizes, weights)[0]
+        text = f"{build_paragraph(rng, lang, size)} ({seed}-{index})"
+        corpus.append({"id": f"{lang}-{index}", "lang": lang, "size": size, "text": text})
+
+    return corpus
+
+# Function that reads a corpus from a JSON lines file, where every line has at least "text" and "lang"
+def load_corpus_file(path):
+    corpus = []
+    with open(path, encoding="utf-8") as corpus_file:
+        for index, line in enumerate(corpus_file):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            corpus.append({"id": item.get("id", str(index)), "lang": item.get("lang", "en"), "size": item.get("size", "custom"), "text": item["text"]})
+    return corpus
+
+# Function that builds the raw output the model would write when chunking text: an optional think block, then blocks of
+# sentences separated by an empty line, each written as its plain line followed by its highlighted line
+def fake_chunk_output(text, sentences_per_block=2, thinking=True):
+    sentences = [sentence for sentence in text.replace("? ", "?\n").replace("! ", "!\n").replace(". ", ".\n").split("\n") if sentence]
+    blocks = [" ".join(sentences[start:start + sentences_per_block]) for start in range(0, len(sentences), sentences_per_block)]
+    think_block = "<think>\nThe text talks about local news. I will group the sentences by topic.\n</think>\n\n" if thinking else ""
+    return think_block + "\n\n".join(f"**Chunk {number}:**\n{block}\n<b>{block.split(' ', 1)[0]}</b> {block.split(' ', 1)[-1]}" for number, block in enumerate(blocks, start=1))
+
+# Function that builds the raw output the model would write when simplifying text
+def fake_simplify_output(text, thinking=True):
+    think_block = "<think>\nShort sentences, common words.\n</think>\n\n" if thinking else ""
+    return think_block + "Here is the rewritten text chunk:\n" + text
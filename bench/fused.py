@@ -0,0 +1,124 @@
+import argparse
+import difflib
+import os
+import time
+
+# --- 1. Fused Simplification Benchmark ---
+# Compares the two simplification paths of simplify() (see section 4.1 of model.py) on the same corpus:
+# - two_stage: a chunking generation, then one simplification generation per chunk (batched together)
+# - fused: a single generation of the fused chunk-and-simplify prompt (falling back to two_stage on a malformed answer)
+# Every text is simplified with both paths, one at a time and without the result cache. Decoding is greedy, so that
+# the differences come from the paths and not from sampling. For every (language, mode), it reports the latency, the
+# generated (output) and prefilled (input) tokens per text, and for the fused path the speedup and token saving over the
+# two-stage one, how often its answer was malformed (fallback_ratio), and its output parity with the two-stage result:
+# same_blocks_ratio (same number of blocks) and similarity (word-level similarity of the whole simplified text, 0 to 1).
+# Usage (offline, on CPU):
+#   python -m bench.fused --backend small --langs en,it
+#   python -m bench.fused --backend small --model-name Qwen/Qwen3-1.7B --profile fast --texts 8
+#   python -m bench.fused --backend stub   # smoke run of the harness (the stub answers instantly)
+
+MODES = ("two_stage", "fused")
+
+# Function that returns the sum of the values of a counter whose labels match the given ones (by position)
+def counter_total(counter, **labels):
+    positions = [(counter.label_names.index(name), str(value)) for name, value in labels.items()]
+    return sum(value for key, value in counter.values().items() if all(key[index] == expected for index, expected in positions))
+
+# Function that returns the word-level similarity (0 to 1) of two simplification results
+def similarity(first, second):
+    from parsing import normalized_words
+    return difflib.SequenceMatcher(None, normalized_words(" ".join(first)), normalized_words(" ".join(second)), autojunk=False).ratio()
+
+def main(argv=None):
+    from bench.micro import configure_environment
+
+    parser = argparse.ArgumentParser(description="AdaptEase fused simplification benchmark (two-stage vs fused prompt).")
+    parser.add_argument("--backend", default="small", help="inference backend (default: small; stub only checks the harness)")
+    parser.add_argument("--model-name", default=None, help="model of the backend (e.g. a local path, for offline runs)")
+    parser.add_argument("--profile", default="fast", help="generation profile (thinking and token limits), decoded greedily")
+    parser.add_argument("--texts", type=int, default=4, help="texts per language of the generated corpus")
+    parser.add_argument("--langs", default="en,it", help="comma separated languages of the generated corpus")
+    parser.add_argument("--corpus", default=None, help="JSON lines corpus file ({\"text\", \"lang\"} per line) instead of the generated one")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated corpus")
+    parser.add_argument("--output", default=None, help="result file (default: bench/results/fused-<time>.json)")
+    args = parser.parse_args(argv)
+
+    # The result cache is emptied before every run: it must never be the persistent store of a server
+    configure_environment(args.backend, args.model_name)
+    os.environ["ADAPTEASE_CACHE_PATH"] = ""
+
+    # Imported after the configuration of the environment
+    import model
+    from bench.common import summarize_latencies, print_results, write_results
+    from bench.corpus import build_corpus, load_corpus_file
+
+    if args.profile not in model.GENERATION_PROFILES:
+        parser.error(f"unknown profile '{args.profile}'. Available: {', '.join(model.GENERATION_PROFILES)}")
+    model.GENERATION_PROFILES[args.profile]["do_sample"] = False
+
+    langs = args.langs.split(",")
+    corpus = load_corpus_file(args.corpus) if args.corpus else build_corpus(args.texts * len(langs), langs, seed=args.seed)
+
+    # Function that simplifies a text with the given path, returning its result, duration and token/fallback counts
+    def run(text, lang, mode):
+        model.SIMPLIFY_MODE = mode
+        model.result_cache.invalidate()
+        before = {
+            "output": counter_total(model.generation_tokens_total, kind="output"),
+            "input": counter_total(model.generation_tokens_total, kind="input"),
+            "fallbacks": sum(counter_total(model.generation_fallbacks_total, reason=reason) for reason in ("fused_malformed", "fused_incomplete", "fused_error")),
+        }
+        started = time.perf_counter()
+        result = model.simplify_with_llm(text, lang=lang, profile=args.profile)
+        elapsed = time.perf_counter() - started
+        return result, elapsed, {
+            "output": counter_total(model.generation_tokens_total, kind="output") - before["output"],
+            "input": counter_total(model.generation_tokens_total, kind="input") - before["input"],
+            "fallbacks": sum(counter_total(model.generation_fallbacks_total, reason=reason) for reason in ("fused_malformed", "fused_incomplete", "fused_error")) - before["fallbacks"],
+        }
+
+    # Warmup: the first generation of every path pays for lazy initializations
+    for mode in MODES:
+        run(corpus[0]["text"], corpus[0]["lang"], mode)
+
+    # Measures, grouped by (language, mode)
+    measures = {}
+    for item in corpus:
+        two_stage_result = None
+        for mode in MODES:
+            result, elapsed, counts = run(item["text"], item["lang"], mode)
+            two_stage_result = result if mode == "two_stage" else two_stage_result
+
+            group = measures.setdefault((item["lang"], mode), {"durations": [], "output": 0, "input": 0, "fallbacks": 0, "same_blocks": 0, "similarity": 0.0})
+            group["durations"].append(elapsed)
+            group["output"] += counts["output"]
+            group["input"] += counts["input"]
+            group["fallbacks"] += counts["fallbacks"] > 0
+            group["same_blocks"] += len(result) == len(two_stage_result)
+            group["similarity"] += similarity(result, two_stage_result)
+
+    # Results, with the gains of the fused path over the two-stage one of the same language
+    results = {}
+    for (lang, mode), group in measures.items():
+        texts = len(group["durations"])
+        result = summarize_latencies(group["durations"])
+        result["output_tokens_per_text"] = group["output"] / texts
+        result["input_tokens_per_text"] = group["input"] / texts
+        if mode == "fused":
+            two_stage = results[f"simplify.{lang}.two_stage"]
+            result["speedup"] = two_stage["mean_ms"] / result["mean_ms"] if result["mean_ms"] else None
+            result["output_token_saving"] = 1.0 - result["output_tokens_per_text"] / two_stage["output_tokens_per_text"] if two_stage["output_tokens_per_text"] else None
+            result["fallback_ratio"] = group["fallbacks"] / texts
+            result["same_blocks_ratio"] = group["same_blocks"] / texts
+            result["similarity"] = group["similarity"] / texts
+        results[f"simplify.{lang}.{mode}"] = result
+
+    print_results(results, ["p50_ms", "output_tokens_per_text", "input_tokens_per_text", "speedup", "fallback_ratio", "similarity"])
+    config = {
+        "backend": args.backend, "model_name": model.model_name, "profile": args.profile, "texts": len(corpus),
+        "langs": sorted({item["lang"] for item in corpus}), "corpus": args.corpus, "seed": args.seed,
+    }
+    print(f"Results written to {write_results('fused', config, results, args.output)}")
+
+if __name__ == "__main__":
+    main()
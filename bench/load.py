@@ -0,0 +1,322 @@
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 1. End-to-End HTTP Load Test ---
+# Drives server.py over HTTP with a multilingual corpus (see bench/corpus.py) and reports latency percentiles,
+# throughput and tokens/sec, per endpoint and per language.
+# Two load models are available:
+# - closed loop (--concurrency N): N clients, each sending its next request as soon as the previous one is answered
+# - open loop (--rate R): requests arrive at R per second (Poisson arrivals), whatever the state of the server.
+#   Latencies are measured from the scheduled arrival, so a slow server can't hide its queueing delay.
+# By default the server is started by the benchmark itself, offline, with the stub backend and without result cache
+# (so every request reaches the backend): --url targets an already running server instead.
+# Tokens/sec and the average batch size are read from the /metrics endpoint of the server, before and after the run.
+# Usage:
+#   python -m bench.load --concurrency 8 --requests 200
+#   python -m bench.load --rate 20 --duration 30 --endpoint chunk,simplify --stream
+#   python -m bench.load --backend small --concurrency 4 --requests 40    # tiny local model, CPU
+#   python -m bench.load --url http://localhost:5000 --concurrency 16 --duration 60
+
+# Repository root, where server.py lives
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Path and operation of every endpoint
+ENDPOINTS = {
+    "chunk": "/api/text-in-blocks",
+    "simplify": "/api/simplify-text",
+    "batch": "/api/batch",
+}
+
+# Function that returns a free TCP port of the local host
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+# Function that starts server.py in a subprocess, returning (process, base url).
+# The server output goes to log_path, so that it doesn't interleave with the report.
+def start_server(backend_name, model_name, stub_delay_ms, use_cache, log_path, extra_env=None):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "ADAPTEASE_BACKEND": backend_name,
+        "ADAPTEASE_PORT": str(port),
+        "ADAPTEASE_CACHE_PATH": "",
+        "ADAPTEASE_STUB_DELAY_MS": str(stub_delay_ms),
+        "ADAPTEASE_WARMUP_TOKENS": "0",
+        "PYTHONUNBUFFERED": "1",
+    })
+    if not use_cache:
+        env["ADAPTEASE_CACHE_MAX_ENTRIES"] = "0"
+    if model_name:
+        env["ADAPTEASE_MODEL_NAME"] = model_name
+    env.update(extra_env or {})
+
+    log_file = open(log_path, "w", encoding="utf-8") if log_path else subprocess.DEVNULL
+    process = subprocess.Popen([sys.executable, "server.py"], cwd=REPO_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    return process, f"http://127.0.0.1:{port}"
+
+# Function that waits until the server answers 200 on /readyz (the backend is loaded)
+def wait_until_ready(base_url, timeout, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"The server exited with code {process.returncode} before being ready.")
+        try:
+            with urllib.request.urlopen(base_url + "/readyz", timeout=5) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"The server at {base_url} was not ready after {timeout} seconds.")
+
+# Function that reads the /metrics endpoint as a {(name, labels): value} dictionary (None if not available)
+def scrape_metrics(base_url):
+    try:
+        with urllib.request.urlopen(base_url + "/metrics", timeout=10) as response:
+            text = response.read().decode("utf-8")
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return None
+
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, value = line.rsplit(" ", 1)
+        name, _, labels = series.partition("{")
+        samples[(name, "{" + labels if labels else "")] = float(value)
+    return samples
+
+# Function that sums the samples of a metric whose labels contain every given label="value" pair
+def metric_sum(samples, name, **labels):
+    return sum(
+        value for (sample_name, sample_labels), value in samples.items()
+        if sample_name == name and all(f'{label}="{label_value}"' in sample_labels for label, label_value in labels.items())
+    )
+
+# Function that builds the request of the index-th load request: (operation, lang, path, payload)
+def build_request(index, corpus, operations, stream, batch_items):
+    operation = operations[index % len(operations)]
+    item = corpus[index % len(corpus)]
+
+    # A page-level batch sends batch_items consecutive texts of the corpus at once
+    if operation == "batch":
+        items = [corpus[(index + offset) % len(corpus)] for offset in range(batch_items)]
+        payload = {
+            "items": [{"id": entry["id"], "text": entry["text"], "op": "chunk", "lang": entry["lang"]} for entry in items],
+            "stream": stream,
+        }
+        return operation, item["lang"], ENDPOINTS[operation], payload
+
+    return operation, item["lang"], ENDPOINTS[operation], {"text": item["text"], "lang": item["lang"], "stream": stream}
+
+# Function that sends a request and measures it: status, time to the first byte and total time (from scheduled_at)
+def send_request(base_url, path, payload, timeout, scheduled_at):
+    body = json.dumps(payload).encode("utf-8")
+    http_request = urllib.request.Request(base_url + path, data=body, headers={"Content-Type": "application/json"}, method="POST")
+    first_byte_at, status, error = None, None, None
+    try:
+        with urllib.request.urlopen(http_request, timeout=timeout) as response:
+            status = response.status
+            streamed = "ndjson" in response.headers.get("Content-Type", "")
+
+            # Responses are read line by line: for streams, the first line is the time to the first result
+            for line in response:
+                if first_byte_at is None:
+                    first_byte_at = time.perf_counter()
+                if streamed and line.strip() and json.loads(line).get("event") == "error":
+                    error = "stream error event"
+
+    except urllib.error.HTTPError as e:
+        status, error = e.code, f"HTTP {e.code}"
+    except Exception as e:
+        error = str(e) or type(e).__name__
+
+    finished_at = time.perf_counter()
+    return {
+        "status": status,
+        "error": error,
+        "latency": finished_at - scheduled_at,
+        "ttfb": (first_byte_at or finished_at) - scheduled_at,
+    }
+
+# Closed loop: concurrency clients send requests back to back, until total requests or the deadline
+def run_closed_loop(send, concurrency, total, deadline):
+    records, lock, counter = [], threading.Lock(), iter(range(total or sys.maxsize))
+
+    def client():
+        while time.perf_counter() < deadline:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            record = send(index, time.perf_counter())
+            with lock:
+                records.append(record)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+# Open loop: requests arrive with exponential inter-arrival times (rate per second), until total requests or the deadline.
+# max_in_flight bounds the client threads: beyond it, requests wait on the client side (and their latency grows).
+def run_open_loop(send, rate, total, deadline, max_in_flight, seed):
+    rng = random.Random(seed)
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        next_arrival, index = time.perf_counter(), 0
+        while (not total or index < total) and next_arrival < deadline:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(send, index, next_arrival))
+            index += 1
+            next_arrival += rng.expovariate(rate)
+    return [future.result() for future in futures]
+
+# Function that summarizes a group of request records
+def summarize_records(records, elapsed):
+    from bench.common import summarize_latencies
+    successes = [record for record in records if record["error"] is None and record["status"] == 200]
+    summary = summarize_latencies([record["latency"] for record in successes])
+    ttfb = summarize_latencies([record["ttfb"] for record in successes])
+    summary["ttfb_p50_ms"], summary["ttfb_p95_ms"] = ttfb["p50_ms"], ttfb["p95_ms"]
+    summary["requests"] = len(records)
+    summary["errors"] = len(records) - len(successes)
+    summary["throughput_rps"] = len(successes) / elapsed if elapsed else 0.0
+    summary["status_codes"] = {}
+    for record in records:
+        key = str(record["status"] or "no_response")
+        summary["status_codes"][key] = summary["status_codes"].get(key, 0) + 1
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AdaptEase end-to-end HTTP load test.")
+    parser.add_argument("--url", default=None, help="base url of a running server (default: start server.py locally)")
+    parser.add_argument("--backend", default="stub", help="backend of the started server (default: stub)")
+    parser.add_argument("--model-name", default=None, help="model of the started server (e.g. a local path, for offline runs)")
+    parser.add_argument("--stub-delay-ms", type=float, default=5.0, help="simulated per-token decoding time of the stub backend")
+    parser.add_argument("--cache", action="store_true", help="keep the in-memory result cache of the started server")
+    parser.add_argument("--server-env", action="append", default=[], help="extra KEY=VALUE environment of the started server (repeatable)")
+    parser.add_argument("--server-log", default=None, help="file receiving the output of the started server")
+    parser.add_argument("--ready-timeout", type=float, default=600, help="seconds to wait for the backend to be loaded")
+    parser.add_argument("--endpoint", default="chunk", help="comma separated operations, used in turn: chunk, simplify, batch")
+    parser.add_argument("--stream", action="store_true", help="ask for streamed (NDJSON) responses")
+    parser.add_argument("--batch-items", type=int, default=8, help="texts per request of the batch operation")
+    parser.add_argument("--concurrency", type=int, default=4, help="closed loop: number of concurrent clients")
+    parser.add_argument("--rate", type=float, default=None, help="open loop: requests per second (overrides --concurrency)")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="open loop: max requests in flight")
+    parser.add_argument("--requests", type=int, default=100, help="number of measured requests (0 = until --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="max seconds of the measure (0 = until --requests)")
+    parser.add_argument("--warmup", type=int, default=5, help="requests sent before the measure")
+    parser.add_argument("--timeout", type=float, default=300, help="client timeout of a request, in seconds")
+    parser.add_argument("--texts", type=int, default=200, help="number of texts of the generated corpus")
+    parser.add_argument("--langs", default="en,it,es,fr,de", help="comma separated languages of the generated corpus")
+    parser.add_argument("--corpus", default=None, help="JSON lines corpus file ({\"text\", \"lang\"} per line) instead of the generated one")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the corpus and of the arrivals")
+    parser.add_argument("--output", default=None, help="result file (default: bench/results/load-<time>.json)")
+    args = parser.parse_args(argv)
+
+    from bench.common import print_results, write_results
+    from bench.corpus import build_corpus, load_corpus_file
+
+    operations = args.endpoint.split(",")
+    unknown = [operation for operation in operations if operation not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown operation(s): {', '.join(unknown)}. Available: {', '.join(ENDPOINTS)}")
+    if not args.requests and not args.duration:
+        parser.error("either --requests or --duration must be set")
+
+    # The warmup texts come after the measured ones, so that they never warm the result cache for the measure
+    corpus = load_corpus_file(args.corpus) if args.corpus else build_corpus(args.texts + args.warmup, args.langs.split(","), seed=args.seed)
+    measured_corpus, warmup_corpus = corpus[:len(corpus) - args.warmup] or corpus, corpus[len(corpus) - args.warmup:] or corpus
+
+    # Server under test
+    process = None
+    base_url = args.url
+    if base_url is None:
+        extra_env = dict(entry.split("=", 1) for entry in args.server_env)
+        process, base_url = start_server(args.backend, args.model_name, args.stub_delay_ms, args.cache, args.server_log, extra_env)
+        print(f"Started server.py ({args.backend} backend) at {base_url}.")
+
+    try:
+        wait_until_ready(base_url, args.ready_timeout, process)
+
+        # Every request remembers its operation and language, to be summarized per group
+        def sender(requests_corpus):
+            def send(index, scheduled_at):
+                operation, lang, path, payload = build_request(index, requests_corpus, operations, args.stream, args.batch_items)
+                record = send_request(base_url, path, payload, args.timeout, scheduled_at)
+                record.update({"operation": operation, "lang": lang})
+                return record
+            return send
+
+        # Warmup, then the measure
+        if args.warmup:
+            run_closed_loop(sender(warmup_corpus), min(args.concurrency, args.warmup), args.warmup, float("inf"))
+        metrics_before = scrape_metrics(base_url)
+        deadline = time.perf_counter() + args.duration if args.duration else float("inf")
+        started = time.perf_counter()
+        if args.rate:
+            records = run_open_loop(sender(measured_corpus), args.rate, args.requests, deadline, args.max_in_flight, args.seed)
+        else:
+            records = run_closed_loop(sender(measured_corpus), args.concurrency, args.requests, deadline)
+        elapsed = time.perf_counter() - started
+        metrics_after = scrape_metrics(base_url)
+
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    # Summaries: overall, per operation and per language
+    results = {"all": summarize_records(records, elapsed)}
+    for key in ("operation", "lang"):
+        for value in sorted({record[key] for record in records}):
+            results[f"{key}:{value}"] = summarize_records([record for record in records if record[key] == value], elapsed)
+
+    # Server-side view of the same interval, when the server exposes /metrics
+    if metrics_before is not None and metrics_after is not None:
+        def delta(name, **labels):
+            return metric_sum(metrics_after, name, **labels) - metric_sum(metrics_before, name, **labels)
+        batches = delta("adaptease_generation_batch_size_count")
+        results["all"].update({
+            "output_tokens_per_second": delta("adaptease_generation_tokens_total", kind="output") / elapsed if elapsed else 0.0,
+            "input_tokens_per_second": delta("adaptease_generation_tokens_total", kind="input") / elapsed if elapsed else 0.0,
+            "average_batch_size": delta("adaptease_generation_batch_size_sum") / batches if batches else 0.0,
+            "fallbacks": delta("adaptease_fallbacks_total"),
+        })
+
+    print_results(results, ["requests", "errors", "p50_ms", "p95_ms", "p99_ms", "throughput_rps"])
+    if "output_tokens_per_second" in results["all"]:
+        print(f"Output tokens/sec: {results['all']['output_tokens_per_second']:.1f}, average batch size: {results['all']['average_batch_size']:.2f}")
+
+    config = {
+        "url": args.url, "backend": args.backend if args.url is None else None, "model_name": args.model_name,
+        "stub_delay_ms": args.stub_delay_ms, "cache": args.cache, "server_env": args.server_env,
+        "operations": operations, "stream": args.stream, "batch_items": args.batch_items,
+        "load_model": "open" if args.rate else "closed", "concurrency": None if args.rate else args.concurrency, "rate": args.rate,
+        "requests": args.requests, "duration": args.duration, "warmup": args.warmup,
+        "texts": len(measured_corpus), "corpus": args.corpus, "seed": args.seed, "elapsed_seconds": elapsed,
+    }
+    print(f"Results written to {write_results('load', config, results, args.output)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+# --- 1. Micro-Benchmarks ---
+# Benchmarks of the CPU-side steps of a request, isolated from the model generation:
+# - tokenize: token counting of the input text (used to size max_new_tokens)
+# - chat_template_chunk / chat_template_simplify: prompt formatting and chat templating
+# - cache_key: content-addressed key of a result
+# - parse_chunk_output: parsing of a raw chunking answer in chunk() (think block, labels, plain/highlighted split)
+# - stream_parse_chunk_output: the same answer parsed incrementally, piece by piece, as in the streamed responses
+# - clean_simplify_output: cleanup of a raw simplification answer
+# Every benchmark runs over the same deterministic corpus (see bench/corpus.py), for the given number of rounds.
+# Usage (offline, on CPU):
+#   python -m bench.micro                                  # stub backend (whitespace tokenizer, no weights)
+#   python -m bench.micro --backend small                  # real tokenizer and chat template of a small local model
+#   python -m bench.micro --output bench/results/base.json # explicit result file
+
+# The module of the server reads its configuration from the environment on import:
+# by default, benchmarks use the stub backend and never touch the persistent result cache.
+def configure_environment(backend_name, model_name=None):
+    os.environ["ADAPTEASE_BACKEND"] = backend_name
+    os.environ.setdefault("ADAPTEASE_CACHE_PATH", "")
+    os.environ.setdefault("ADAPTEASE_WARMUP_TOKENS", "0")
+    if model_name:
+        os.environ["ADAPTEASE_MODEL_NAME"] = model_name
+
+# Function that times fn over every input, for the given rounds (after a warmup round).
+# work_of(input) returns the amount of work of an input (e.g. its tokens), to report a throughput in units per second.
+def run_benchmark(fn, inputs, rounds, work_of=None):
+    from bench.common import summarize_latencies
+
+    # Warmup: caches, lazy imports and compiled regexes are ready before the measure
+    for item in inputs:
+        fn(item)
+
+    durations, work = [], 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for item in inputs:
+            call_started = time.perf_counter()
+            fn(item)
+            durations.append(time.perf_counter() - call_started)
+            if work_of is not None:
+                work += work_of(item)
+    elapsed = time.perf_counter() - started
+
+    results = summarize_latencies(durations)
+    results["ops_per_second"] = len(durations) / elapsed if elapsed else 0.0
+    if work_of is not None:
+        results["units_per_second"] = work / elapsed if elapsed else 0.0
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AdaptEase micro-benchmarks (tokenization, chat templating, output parsing).")
+    parser.add_argument("--backend", default="stub", help="inference backend whose tokenizer/chat template is measured (default: stub)")
+    parser.add_argument("--model-name", default=None, help="model of the backend (e.g. a local path, for offline runs)")
+    parser.add_argument("--texts", type=int, default=50, help="number of texts of the generated corpus")
+    parser.add_argument("--langs", default="en,it,es,fr,de", help="comma separated languages of the generated corpus")
+    parser.add_argument("--corpus", default=None, help="JSON lines corpus file ({\"text\", \"lang\"} per line) instead of the generated one")
+    parser.add_argument("--rounds", type=int, default=20, help="rounds over the corpus for every benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated corpus")
+    parser.add_argument("--only", default=None, help="comma separated benchmarks to run (default: all)")
+    parser.add_argument("--output", default=None, help="result file (default: bench/results/micro-<time>.json)")
+    args = parser.parse_args(argv)
+
+    configure_environment(args.backend, args.model_name)
+
+    # Imported after the configuration of the environment
+    import model
+    from parsing import ChunkStreamParser
+    from bench.common import print_results, write_results
+    from bench.corpus import build_corpus, load_corpus_file, fake_chunk_output, fake_simplify_output
+
+    corpus = load_corpus_file(args.corpus) if args.corpus else build_corpus(args.texts, args.langs.split(","), seed=args.seed)
+    llm_backend = model.get_backend()
+
+    # Inputs of the parsing benchmarks: the raw answers the model would write for the corpus texts
+    chunk_outputs = [(fake_chunk_output(item["text"]), item["text"]) for item in corpus]
+    simplify_outputs = [fake_simplify_output(item["text"]) for item in corpus]
+
+    # The streamed answer is decoded in word-sized pieces (whitespaces included)
+    def stream_parse(raw_output):
+        stream_parser = ChunkStreamParser()
+        for piece in re.findall(r"\S+\s*|\s+", raw_output):
+            stream_parser.feed(piece)
+        stream_parser.finish()
+
+    benchmarks = {
+        "tokenize": (
+            lambda item: llm_backend.count_tokens(item["text"]), corpus, lambda item: llm_backend.count_tokens(item["text"])
+        ),
+        "chat_template_chunk": (
+            lambda item: llm_backend.build_prompt_text(*model.build_chunk_prompts(item["text"], lang=item["lang"]), enable_thinking=True),
+            corpus, None
+        ),
+        "chat_template_simplify": (
+            lambda item: llm_backend.build_prompt_text(*model.build_simplify_prompts(item["text"], lang=item["lang"]), enable_thinking=True),
+            corpus, None
+        ),
+        "cache_key": (
+            lambda item: model.result_cache_key("chunk", item["text"], item["lang"]), corpus, None
+        ),
+        "parse_chunk_output": (lambda pair: model.parse_chunked_output(*pair), chunk_outputs, None),
+        "stream_parse_chunk_output": (lambda pair: stream_parse(pair[0]), chunk_outputs, None),
+        "clean_simplify_output": (model.clean_simplified_output, simplify_outputs, None),
+    }
+    selected = args.only.split(",") if args.only else list(benchmarks)
+    unknown = [name for name in selected if name not in benchmarks]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}. Available: {', '.join(benchmarks)}")
+
+    # The parsing functions print their diagnostics, which would dominate the measure: they are muted while timing
+    results = {}
+    for name in selected:
+        fn, inputs, work_of = benchmarks[name]
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            results[name] = run_benchmark(fn, inputs, args.rounds, work_of)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    print_results(results, ["p50_ms", "p95_ms", "p99_ms", "ops_per_second"])
+    config = {
+        "backend": args.backend, "model_name": llm_backend.model_name, "texts": len(corpus), "rounds": args.rounds,
+        "langs": sorted({item["lang"] for item in corpus}), "corpus": args.corpus, "seed": args.seed,
+    }
+    print(f"Results written to {write_results('micro', config, results, args.output)}")
+
+if __name__ == "__main__":
+    main()
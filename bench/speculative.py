@@ -0,0 +1,141 @@
+import argparse
+import os
+import time
+
+# --- 1. Speculative Decoding Benchmark ---
+# Measures the decoding speedup of speculative decoding (see speculative.py) per operation and language, on a real
+# transformers backend. Every text of the corpus is chunked and simplified with plain decoding and with every requested
+# speculative method, one prompt at a time (the only case where speculative decoding is used by the server).
+# Decoding is greedy in every mode, so the answers are expected to be the same and only the speed changes:
+# same_output_ratio reports how often that is actually the case (bf16 numerics can flip a close token choice).
+# For every (operation, language, mode), it reports the latency, the output tokens per second, the acceptance rate of
+# the draft tokens and the speedup over plain decoding.
+# Usage (offline, on CPU):
+#   python -m bench.speculative --backend small --methods prompt_lookup
+#   python -m bench.speculative --backend small --model-name Qwen/Qwen3-1.7B --methods prompt_lookup,draft_model --draft-model Qwen/Qwen3-0.6B
+#   python -m bench.speculative --prompt-lookup-tokens 20 --prompt-lookup-ngram 2 --output bench/results/pld-20-2.json
+
+OPERATIONS = ("chunk", "simplify")
+
+# Function that returns the extra generate arguments of a decoding mode (None for plain decoding)
+def speculative_kwargs(mode, llm_backend, args):
+    if mode == "prompt_lookup":
+        return {"prompt_lookup_num_tokens": args.prompt_lookup_tokens, "max_matching_ngram_size": args.prompt_lookup_ngram}
+    if mode == "draft_model":
+        return {"assistant_model": llm_backend.draft_model}
+    return None
+
+def main(argv=None):
+    from bench.micro import configure_environment
+
+    parser = argparse.ArgumentParser(description="AdaptEase speculative decoding benchmark (speedup per operation and language).")
+    parser.add_argument("--backend", default="small", help="transformers backend (default: small)")
+    parser.add_argument("--model-name", default=None, help="model of the backend (e.g. a local path, for offline runs)")
+    parser.add_argument("--methods", default="prompt_lookup", help="comma separated speculative methods: prompt_lookup, draft_model")
+    parser.add_argument("--draft-model", default=None, help="draft model of the draft_model method (default: the backend default)")
+    parser.add_argument("--draft-tokens", type=int, default=5, help="tokens proposed by the draft model at every step")
+    parser.add_argument("--prompt-lookup-tokens", type=int, default=10, help="max candidate tokens copied from the prompt at every step")
+    parser.add_argument("--prompt-lookup-ngram", type=int, default=3, help="max length of the n-gram searched in the prompt")
+    parser.add_argument("--profile", default="fast", help="generation profile (thinking and token limits), decoded greedily")
+    parser.add_argument("--max-new-tokens", type=int, default=256, help="cap on the tokens generated for every prompt")
+    parser.add_argument("--texts", type=int, default=4, help="texts per language of the generated corpus")
+    parser.add_argument("--langs", default="en,it", help="comma separated languages of the generated corpus")
+    parser.add_argument("--corpus", default=None, help="JSON lines corpus file ({\"text\", \"lang\"} per line) instead of the generated one")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated corpus")
+    parser.add_argument("--output", default=None, help="result file (default: bench/results/speculative-<time>.json)")
+    args = parser.parse_args(argv)
+
+    methods = [method for method in args.methods.split(",") if method]
+    unknown = [method for method in methods if method not in ("prompt_lookup", "draft_model")]
+    if unknown:
+        parser.error(f"unknown method(s): {', '.join(unknown)}. Available: prompt_lookup, draft_model")
+    if args.backend == "stub":
+        parser.error("the stub backend has no model to decode with: use a transformers backend (e.g. small)")
+
+    # The draft model is loaded by the backend itself (which checks that it shares the tokenizer of the model)
+    configure_environment(args.backend, args.model_name)
+    os.environ["ADAPTEASE_SPECULATIVE"] = "on" if "draft_model" in methods else "off"
+    os.environ["ADAPTEASE_SPECULATIVE_METHOD"] = "draft_model"
+    os.environ["ADAPTEASE_DRAFT_TOKENS"] = str(args.draft_tokens)
+    if args.draft_model:
+        os.environ["ADAPTEASE_DRAFT_MODEL"] = args.draft_model
+
+    # Imported after the configuration of the environment
+    import model
+    from generation import generate_batch
+    from bench.common import summarize_latencies, print_results, write_results
+    from bench.corpus import build_corpus, load_corpus_file
+
+    langs = args.langs.split(",")
+    corpus = load_corpus_file(args.corpus) if args.corpus else build_corpus(args.texts * len(langs), langs, seed=args.seed)
+    llm_backend = model.get_backend()
+    if "draft_model" in methods and llm_backend.draft_model is None:
+        parser.error("the draft model could not be loaded (see the log above)")
+    modes = ["plain"] + methods
+
+    # Formatted prompts, greedy settings and token limit of every (operation, text)
+    jobs = []
+    for operation in OPERATIONS:
+        build_prompts = model.build_chunk_prompts if operation == "chunk" else model.build_simplify_prompts
+        for item in corpus:
+            settings = dict(model.resolve_generation_profile(operation, item["lang"], args.profile), do_sample=False)
+            max_new_tokens = min(args.max_new_tokens, model.max_new_tokens_for(settings, model.count_text_tokens(item["text"])))
+            prompt_text = llm_backend.build_prompt_text(*build_prompts(item["text"], lang=item["lang"]), enable_thinking=settings["enable_thinking"])
+            jobs.append((operation, item["lang"], prompt_text, settings, max_new_tokens))
+
+    # Warmup: the first generation of every mode pays for lazy initializations
+    for mode in modes:
+        operation, lang, prompt_text, settings, max_new_tokens = jobs[0]
+        generate_batch(
+            llm_backend.model, llm_backend.tokenizer, [prompt_text], min(16, max_new_tokens), settings, llm_backend.terminator_ids,
+            speculative=speculative_kwargs(mode, llm_backend, args)
+        )
+
+    # Measures, grouped by (operation, language, mode)
+    measures = {}
+    for operation, lang, prompt_text, settings, max_new_tokens in jobs:
+        plain_output = None
+        for mode in modes:
+            stats = {}
+            started = time.perf_counter()
+            output = generate_batch(
+                llm_backend.model, llm_backend.tokenizer, [prompt_text], max_new_tokens, settings, llm_backend.terminator_ids,
+                stats=stats, speculative=speculative_kwargs(mode, llm_backend, args)
+            )[0]
+            elapsed = time.perf_counter() - started
+            plain_output = output if mode == "plain" else plain_output
+
+            group = measures.setdefault((operation, lang, mode), {"durations": [], "tokens": 0, "steps": 0, "same": 0})
+            group["durations"].append(elapsed)
+            group["tokens"] += stats["output_tokens"]
+            group["steps"] += stats["decode_steps"] + 1
+            group["same"] += output == plain_output
+
+    # Results, with the speedup of every speculative mode over plain decoding of the same (operation, language)
+    from speculative import acceptance_rate
+    results = {}
+    for (operation, lang, mode), group in measures.items():
+        seconds = sum(group["durations"])
+        result = summarize_latencies(group["durations"])
+        result["output_tokens"] = group["tokens"]
+        result["tokens_per_second"] = group["tokens"] / seconds if seconds else 0.0
+        result["same_output_ratio"] = group["same"] / len(group["durations"])
+        if mode != "plain":
+            candidates = args.prompt_lookup_tokens if mode == "prompt_lookup" else args.draft_tokens
+            result["acceptance_rate"] = acceptance_rate(group["tokens"], group["steps"], candidates)
+            plain = results[f"{operation}.{lang}.plain"]
+            result["speedup"] = result["tokens_per_second"] / plain["tokens_per_second"] if plain["tokens_per_second"] else None
+        results[f"{operation}.{lang}.{mode}"] = result
+
+    print_results(results, ["p50_ms", "tokens_per_second", "acceptance_rate", "speedup", "same_output_ratio"])
+    config = {
+        "backend": args.backend, "model_name": llm_backend.model_name, "methods": methods, "profile": args.profile,
+        "draft_model": llm_backend.draft_model_name if "draft_model" in methods else None, "draft_tokens": args.draft_tokens,
+        "prompt_lookup_tokens": args.prompt_lookup_tokens, "prompt_lookup_ngram": args.prompt_lookup_ngram,
+        "max_new_tokens": args.max_new_tokens, "texts": len(corpus), "langs": sorted({item["lang"] for item in corpus}),
+        "corpus": args.corpus, "seed": args.seed,
+    }
+    print(f"Results written to {write_results('speculative', config, results, args.output)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# --- 1. Cache Key Helpers ---
+# The same article paragraph is served to thousands of readers, but it can reach us with tiny
+# whitespace differences (different DOM serialization, trailing spaces, CRLF line endings...).
+# We normalize the text before hashing so those differences don't produce different keys.
+_HORIZONTAL_WHITESPACE_PATTERN = re.compile(r"[ \t\f\v\u00a0]+")
+_EXTRA_NEWLINES_PATTERN = re.compile(r"\n{3,}")
+
+# Function that normalizes a text for hashing purposes.
+# Paragraph breaks (double newlines) are preserved since they carry meaning for the chunker.
+def normalize_text(text):
+
+    # Unicode NFC normalization, so that composed/decomposed accents hash the same way
+    normalized = unicodedata.normalize("NFC", text)
+
+    # Uniform line endings
+    normalized = normalized.replace("\r\n", "\n").replace("\r", "\n")
+
+    # Collapse runs of spaces/tabs in a single space and strip every line
+    normalized = "\n".join(_HORIZONTAL_WHITESPACE_PATTERN.sub(" ", line).strip() for line in normalized.split("\n"))
+
+    # No more than one empty line between paragraphs
+    normalized = _EXTRA_NEWLINES_PATTERN.sub("\n\n", normalized)
+
+    # Finally, strip the whole text
+    return normalized.strip()
+
+# Function that returns the content hash of a text: the SHA-256 (hex) of its normalized form.
+# Clients can compute it on their side (adaptease.js does), to ask for a result by hash (see the GET results endpoint).
+def content_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+# Function that builds a content-addressed key for a generation result.
+# Everything that can change the output takes part in the key: the operation (chunk/simplify),
+# the language, the content hash of the text, the version of the prompts and the generation settings.
+# The text only takes part through its content hash, so the key can also be built from the hash alone (text_hash).
+def make_cache_key(operation, lang, text, prompt_version, settings, text_hash=None):
+
+    # We serialize the components in a stable way (sorted keys) before hashing them
+    payload = json.dumps({
+        "operation": operation,
+        "lang": lang.lower(),
+        "text_hash": text_hash or content_hash(text),
+        "prompt_version": prompt_version,
+        "settings": settings,
+    }, sort_keys=True, ensure_ascii=False)
+
+    # SHA-256 of the payload is our content address
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# --- 2. Two-Tier Result Cache ---
+# ResultCache keeps a bounded in-memory LRU (with TTL) in front of a persistent SQLite store.
+# - The memory tier answers repeated requests in microseconds and is local to the process.
+# - The disk tier survives restarts and can be shared between processes on the same host.
+# Values must be JSON serializable, since they are stored as JSON text on disk.
+class ResultCache:
+
+    def __init__(self, path=None, max_entries=1024, ttl_seconds=3600, disk_ttl_seconds=0):
+
+        # Memory tier: an OrderedDict used as LRU, mapping key -> (stored_at, value)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+
+        # Disk tier configuration. An empty/None path disables the disk tier.
+        # disk_ttl_seconds <= 0 means that disk entries never expire (until invalidated).
+        self.path = path or None
+        self.disk_ttl_seconds = disk_ttl_seconds
+        self._connection = None
+
+        # A single lock protects both tiers, since Flask serves requests from multiple threads.
+        self._lock = threading.Lock()
+
+        # Hit/miss counters, exposed through stats()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+        # If requested, we open (or create) the SQLite store
+        if self.path:
+            self._open_disk_store()
+
+    # Opens the SQLite database and creates the results table if needed
+    def _open_disk_store(self):
+
+        # Create the parent folder of the database if it doesn't exist
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # check_same_thread=False: the connection is shared between the Flask threads, guarded by our lock.
+        # The timeout lets concurrent processes wait on the file lock instead of failing immediately.
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+
+        # WAL mode allows readers and a writer to work concurrently on the same file
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, "
+            "operation TEXT, "
+            "lang TEXT, "
+            "value TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS results_operation_lang ON results (operation, lang)")
+        self._connection.commit()
+
+    # Stores a value in the memory tier, evicting the least recently used entries if over capacity
+    def _remember(self, key, value, stored_at):
+
+        # Insert (or refresh) the entry as the most recently used one
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+
+        # Evict from the least recently used end until we are within bounds
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    # Retrieves a value from the cache, or None if not present (or expired).
+    def get(self, key):
+
+        # Current time, used for TTL checks
+        now = time.time()
+
+        with self._lock:
+
+            # --- Memory tier ---
+            entry = self._memory.get(key)
+            if entry is not None:
+
+                # Check if the entry is still valid
+                stored_at, value = entry
+                if self.ttl_seconds <= 0 or now - stored_at < self.ttl_seconds:
+
+                    # Valid hit: mark it as the most recently used
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return value
+
+                # Expired: drop it from memory, the disk tier may still have it
+                del self._memory[key]
+                self._counters["expirations"] += 1
+
+            # --- Disk tier ---
+            if self._connection is not None:
+
+                # Look for the key in the SQLite store
+                row = self._connection.execute(
+                    "SELECT value, created_at FROM results WHERE key = ?", (key,)
+                ).fetchone()
+
+                if row is not None:
+
+                    # If the disk entry is expired, remove it and consider this a miss
+                    if self.disk_ttl_seconds > 0 and now - row[1] >= self.disk_ttl_seconds:
+                        self._connection.execute("DELETE FROM results WHERE key = ?", (key,))
+                        self._connection.commit()
+                        self._counters["expirations"] += 1
+
+                    else:
+
+                        # Disk hit: promote the value in the memory tier
+                        value = json.loads(row[0])
+                        self._remember(key, value, now)
+                        self._counters["disk_hits"] += 1
+                        return value
+
+            # Nothing found in both tiers
+            self._counters["misses"] += 1
+            return None
+
+    # Stores a value in both tiers.
+    # operation and lang are saved alongside the value so that they can be used for invalidation.
+    def set(self, key, value, operation=None, lang=None):
+
+        # Current time, used as insertion timestamp
+        now = time.time()
+
+        with self._lock:
+
+            # Memory tier
+            self._remember(key, value, now)
+
+            # Disk tier (INSERT OR REPLACE, since the same key may be recomputed after an expiration)
+            if self._connection is not None:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO results (key, operation, lang, value, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, operation, lang.lower() if lang else lang, json.dumps(value, ensure_ascii=False), now)
+                )
+                self._connection.commit()
+
+            self._counters["sets"] += 1
+
+    # Invalidates cache entries and returns how many of them were removed.
+    # - With a key, only that entry is removed.
+    # - With operation and/or lang, every entry matching them is removed.
+    # - Without arguments, the whole cache is cleared.
+    def invalidate(self, key=None, operation=None, lang=None):
+
+        with self._lock:
+
+            # Removed entries counter (max between the two tiers, since an entry can live in both)
+            removed_from_memory = 0
+            removed_from_disk = 0
+
+            # Single key invalidation
+            if key is not None:
+
+                # Remove it from memory
+                if self._memory.pop(key, None) is not None:
+                    removed_from_memory = 1
+
+                # Remove it from disk
+                if self._connection is not None:
+                    removed_from_disk = self._connection.execute("DELETE FROM results WHERE key = ?", (key,)).rowcount
+
+            # Filtered (or total) invalidation
+            else:
+
+                # Build the WHERE clause from the given filters
+                conditions, parameters = [], []
+                if operation is not None:
+                    conditions.append("operation = ?")
+                    parameters.append(operation)
+                if lang is not None:
+                    conditions.append("lang = ?")
+                    parameters.append(lang.lower())
+
+                # The memory tier doesn't know about operation/lang, so with filters we have to find the
+                # affected keys on disk first. Without a disk tier we can only clear memory entirely.
+                if self._connection is not None:
+                    where_clause = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+                    keys = [row[0] for row in self._connection.execute("SELECT key FROM results" + where_clause, parameters)]
+                    removed_from_disk = self._connection.execute("DELETE FROM results" + where_clause, parameters).rowcount
+                    for stale_key in keys:
+                        if self._memory.pop(stale_key, None) is not None:
+                            removed_from_memory += 1
+
+                # When there is nothing to filter on (or no disk tier), the memory tier is cleared as well
+                if not conditions or self._connection is None:
+                    removed_from_memory = max(removed_from_memory, len(self._memory))
+                    self._memory.clear()
+
+            # Persist the deletion
+            if self._connection is not None:
+                self._connection.commit()
+
+            # Update the counters and return
+            removed = max(removed_from_memory, removed_from_disk)
+            self._counters["invalidations"] += removed
+            return removed
+
+    # Returns the hit/miss counters alongside some info about the cache state
+    def stats(self):
+
+        with self._lock:
+
+            # Copy the counters so the caller can't alter our state
+            stats = dict(self._counters)
+
+            # Derived metrics
+            hits = stats["memory_hits"] + stats["disk_hits"]
+            lookups = hits + stats["misses"]
+            stats["hits"] = hits
+            stats["hit_ratio"] = (hits / lookups) if lookups else 0.0
+
+            # State of the tiers
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_max_entries"] = self.max_entries
+            stats["disk_path"] = self.path
+            stats["disk_entries"] = (
+                self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                if self._connection is not None else 0
+            )
+
+            return stats
@@ -0,0 +1,474 @@
+import threading
+import time
+import torch
+from transformers import TextIteratorStreamer, LogitsProcessor, LogitsProcessorList, StoppingCriteria, StoppingCriteriaList
+
+from tracing import log
+
+# --- 1. Generation Helpers ---
+# Model-agnostic helpers behind generate_text_from_llm (model.py).
+# They receive the model/tokenizer pair explicitly instead of relying on the globals of model.py, so that
+# the same code path can be exercised on CPU with a tiny causal LM (e.g. for the batching scheduler).
+
+# Function that formats the system/user prompts into a single string with the tokenizer's chat template.
+def build_prompt_text(tokenizer, system_prompt, user_prompt, enable_thinking=True):
+
+    # Construct the message list in the format expected by the chat template.
+    # This typically includes a system message to set the context/persona and a user message with the actual query.
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+    # Apply the tokenizer's chat template to format the messages into a single string.
+    # tokenize=False: Returns the raw string, not token IDs.
+    # add_generation_prompt=True: Adds a special token/sequence to indicate the model should start generating.
+    # enable_thinking=True: (Specific to some Qwen models) enables Chain of Tought "thinking" process for the model.
+    return tokenizer.apply_chat_template(
+        messages,
+        tokenize=False,
+        add_generation_prompt=True,
+        enable_thinking=enable_thinking
+    )
+
+# Function that returns the eos_token_id value to pass to model.generate.
+# Since the terminators depend only on the tokenizer, it is meant to be called once at load time.
+def resolve_terminator_ids(tokenizer):
+
+    # Define terminators robustly
+    terminators_ids = []
+    if tokenizer.eos_token_id is not None:
+        terminators_ids.append(tokenizer.eos_token_id)
+
+    # Qwen models often use <|im_end|> or <|eot_id|> as part of their chat protocol.
+    # For Qwen2-Instruct, <|endoftext|> is the EOS, and <|im_start|> / <|im_end|> are for chat.
+    # <|eot_id|> seems to be from older Qwen or specific fine-tunes.
+    # For Qwen/Qwen2-7B-Instruct, "<|eot_id|>" is NOT a special token by default,
+    # tokenizer.convert_tokens_to_ids("<|eot_id|>") would yield unk_token_id.
+    # Let's use the more common <|im_end|> if using a Qwen chat model.
+    im_end_token_id = tokenizer.convert_tokens_to_ids("<|im_end|>")
+    if isinstance(im_end_token_id, int) and im_end_token_id not in terminators_ids:
+
+        # Some tokenizers return unk_token_id if the token is not special but in vocab.
+        # Others return it only if truly unknown.
+        if im_end_token_id != tokenizer.unk_token_id:
+
+            # Only add if it's a specific known token
+            terminators_ids.append(im_end_token_id)
+
+    # Original attempt with <|eot_id|>
+    eot_id_token = tokenizer.convert_tokens_to_ids("<|eot_id|>")
+    if isinstance(eot_id_token, int) and eot_id_token not in terminators_ids:
+
+        # Ensure that the converted ID is not the tokenizer's unknown token ID,
+        # which would indicate that "<|eot_id|>" is not a recognized token in the vocabulary.
+        if eot_id_token != tokenizer.unk_token_id:
+            log(f"Adding <|eot_id|> ({eot_id_token}) to terminators.")
+            terminators_ids.append(eot_id_token)
+
+    # Ensure terminators_ids is not empty if possible, otherwise model might not stop correctly.
+    # If it's empty, generation will only stop at max_new_tokens.
+    if not terminators_ids:
+
+        # Pass None to eos_token_id to let the model use its default config (if any).
+        log("Warning: No specific terminator IDs found. Generation will rely on max_new_tokens.", level="warning")
+        return None
+
+    # Pass single int if only one, list if multiple
+    return terminators_ids[0] if len(terminators_ids) == 1 else terminators_ids
+
+# Function that counts the tokens of an already formatted prompt (used to group requests by length).
+def count_prompt_tokens(tokenizer, prompt_text):
+    return len(tokenizer(prompt_text).input_ids)
+
+# --- 2. Thinking Budget ---
+# The <think> section is thrown away by the post-processing, so every thinking token is decode time the reader never sees.
+# ThinkingBudgetLogitsProcessor gives every sequence of the batch a hard budget of thinking tokens: once a sequence
+# has opened <think> and spent the budget without closing it, the only token it is allowed to generate is </think>.
+# The processor is stateless (everything is read back from the generated tokens), since with assisted decoding the same
+# positions are scored more than once: once for the draft tokens, and again when the main model verifies them.
+class ThinkingBudgetLogitsProcessor(LogitsProcessor):
+
+    def __init__(self, think_start_token_id, think_end_token_id, prompt_length, budget):
+        self.think_start_token_id = think_start_token_id
+        self.think_end_token_id = think_end_token_id
+        self.prompt_length = prompt_length
+        self.budget = budget
+
+    def __call__(self, input_ids, scores):
+
+        # Tokens generated so far (the same number for every sequence of the batch)
+        generated = input_ids[:, self.prompt_length:]
+        if generated.shape[-1] == 0:
+            return scores
+
+        # Where every sequence opened its thinking (argmax returns the first match) and if it has been closed
+        is_start = generated == self.think_start_token_id
+        started = is_start.any(dim=-1)
+        thinking_since = is_start.int().argmax(dim=-1) + 1
+        closed = (generated == self.think_end_token_id).any(dim=-1)
+
+        # Budget spent: force the end of the thinking for these sequences
+        force = started & ~closed & (generated.shape[-1] - thinking_since >= self.budget)
+        if force.any():
+            scores = scores.masked_fill(force.unsqueeze(-1), float("-inf"))
+            scores[force, self.think_end_token_id] = 0.0
+
+        return scores
+
+# Function that builds the logits processors required by the generation settings (None if none is needed).
+def build_logits_processors(tokenizer, prompt_length, settings):
+
+    # The thinking budget only makes sense when the thinking is enabled and limited
+    budget = settings.get("thinking_budget", 0)
+    if not settings.get("enable_thinking") or budget <= 0:
+        return None
+
+    # Both tags must be single tokens of the vocabulary
+    think_start_token_id = tokenizer.convert_tokens_to_ids("<think>")
+    think_end_token_id = tokenizer.convert_tokens_to_ids("</think>")
+    if None in (think_start_token_id, think_end_token_id) or tokenizer.unk_token_id in (think_start_token_id, think_end_token_id):
+        log("Warning: <think>/</think> are not tokens of this tokenizer. The thinking budget can't be enforced.", level="warning")
+        return None
+
+    return LogitsProcessorList([
+        ThinkingBudgetLogitsProcessor(think_start_token_id, think_end_token_id, prompt_length, budget)
+    ])
+
+# --- 2.1 Cancellation ---
+# A generation keeps running until max_new_tokens even if nobody is waiting for it anymore.
+# CancellationStoppingCriteria checks, at every decoding step, the request context of every sequence of the batch
+# (see admission.RequestContext): the sequences of cancelled or expired requests are finished right away,
+# and generate returns as soon as no sequence is left.
+class CancellationStoppingCriteria(StoppingCriteria):
+
+    def __init__(self, request_contexts, stop_event=None):
+
+        # One context (or None) per sequence of the batch, and an optional event that stops all of them
+        self.request_contexts = request_contexts
+        self.stop_event = stop_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        stop_all = self.stop_event is not None and self.stop_event.is_set()
+        return torch.tensor(
+            [stop_all or (context is not None and context.cancelled) for context in self.request_contexts],
+            dtype=torch.bool,
+            device=input_ids.device
+        )
+
+# --- 2.2 Generation Timing ---
+# GenerationTimer is a stopping criterion that never stops anything: it is called after every decoding step, so its first
+# call marks the end of the prefill (prompt processing and first token) and the following ones count the decode steps.
+class GenerationTimer(StoppingCriteria):
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_token_at = None
+        self.steps = 0
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        self.steps += 1
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+    # Prefill and decode times, measured until now
+    def timings(self):
+        ended = time.monotonic()
+        first_token_at = self.first_token_at or ended
+        return {
+            "prefill_seconds": first_token_at - self.started,
+            "decode_seconds": ended - first_token_at,
+            "decode_steps": max(0, self.steps - 1),
+        }
+
+# --- 2.3 Output Monitoring ---
+# The answers are read while they are decoded, so that degenerate generations (loops, endless lists, commentary after
+# the last chunk) stop right away instead of running until max_new_tokens (see parsing.OutputMonitor).
+
+# IncrementalDecoder turns the tokens of a sequence, one at a time, into the text they add.
+# As TextStreamer does, it decodes the tokens of the current line together (a character can span several tokens),
+# holds back incomplete characters, and starts over at every new line so that the decoding cost stays bounded.
+class IncrementalDecoder:
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self._ids = []
+        self._printed = 0
+
+    def push(self, token_id):
+        self._ids.append(token_id)
+        text = self.tokenizer.decode(self._ids, skip_special_tokens=True)
+
+        # Incomplete character: wait for the next tokens
+        if text.endswith("\ufffd"):
+            return ""
+
+        new_text = text[self._printed:]
+        if text.endswith("\n"):
+            self._ids, self._printed = [], 0
+        else:
+            self._printed = len(text)
+        return new_text
+
+# OutputMonitorStoppingCriteria feeds the new tokens of every sequence to its monitor (None for the sequences that are
+# not monitored), and finishes the sequences whose monitor asks to stop.
+# A step usually adds one token, but an assisted (speculative) step can add several of them: every token since the
+# previous call is fed, in order.
+class OutputMonitorStoppingCriteria(StoppingCriteria):
+
+    def __init__(self, tokenizer, monitors, prompt_length):
+        self.monitors = monitors
+        self.decoders = [IncrementalDecoder(tokenizer) if monitor is not None else None for monitor in monitors]
+        self.seen_length = prompt_length
+
+    def __call__(self, input_ids, scores, **kwargs):
+        new_tokens = input_ids[:, self.seen_length:].tolist()
+        self.seen_length = input_ids.shape[-1]
+        stops = []
+        for row, token_ids in enumerate(new_tokens):
+            monitor = self.monitors[row]
+            for token_id in token_ids:
+                if monitor is None or monitor.stopped:
+                    break
+                monitor.feed(self.decoders[row].push(token_id))
+            stops.append(monitor is not None and monitor.stopped)
+        return torch.tensor(stops, dtype=torch.bool, device=input_ids.device)
+
+# Function that builds the stopping criteria for the given request contexts, timer and output monitors
+# (None if there is nothing to do).
+def build_stopping_criteria(request_contexts, stop_event=None, timer=None, tokenizer=None, monitors=None, prompt_length=0):
+    criteria = [timer] if timer is not None else []
+    if stop_event is not None or any(context is not None for context in request_contexts or []):
+        criteria.append(CancellationStoppingCriteria(request_contexts, stop_event))
+    if any(monitor is not None for monitor in monitors or []):
+        criteria.append(OutputMonitorStoppingCriteria(tokenizer, monitors, prompt_length))
+    return StoppingCriteriaList(criteria) if criteria else None
+
+# Function that fills the stats of a finished generation: prompt/output/thinking tokens (summed over the batch, and per
+# row in row_prompt_tokens/row_output_tokens) and the prefill/decode times of the timer.
+# generated_ids are the generated tokens of every row (prompt excluded).
+def fill_generation_stats(stats, tokenizer, model_inputs, generated_ids, pad_token_id, timer):
+
+    stats.update(timer.timings())
+    stats["batch_size"] = len(generated_ids)
+    stats["prompt_tokens"] = int(model_inputs["attention_mask"].sum()) if model_inputs.get("attention_mask") is not None else int(model_inputs["input_ids"].numel())
+    stats["row_prompt_tokens"] = (
+        model_inputs["attention_mask"].sum(dim=-1).tolist() if model_inputs.get("attention_mask") is not None
+        else [model_inputs["input_ids"].shape[-1]] * len(generated_ids)
+    )
+
+    # Output tokens exclude the padding of the rows that finished early; thinking tokens are the ones up to </think>
+    # (or all of them, if the thinking was never closed)
+    think_start_token_id = tokenizer.convert_tokens_to_ids("<think>")
+    think_end_token_id = tokenizer.convert_tokens_to_ids("</think>")
+    output_tokens = thinking_tokens = 0
+    stats["row_output_tokens"] = []
+    for row in generated_ids.tolist():
+        row = [token for token in row if token != pad_token_id]
+        output_tokens += len(row)
+        stats["row_output_tokens"].append(len(row))
+        if think_end_token_id in row:
+            thinking_tokens += row.index(think_end_token_id) + 1
+        elif think_start_token_id in row:
+            thinking_tokens += len(row)
+    stats["output_tokens"] = output_tokens
+    stats["thinking_tokens"] = thinking_tokens
+
+# Function that fills the stats of a generation with the shape of its inputs: the (padded) prompt length, the token limit
+# and the prefix tokens whose prefill was skipped (see prepare_generation_inputs), which end up in the request traces.
+def fill_input_stats(stats, model_inputs, prompt_length, max_new_tokens, prefix_entry=None):
+    stats["padded_prompt_length"] = prompt_length
+    stats["max_new_tokens"] = max_new_tokens
+    stats["cached_prefix_tokens"] = len(prefix_entry["ids"]) if "past_key_values" in model_inputs else 0
+
+# --- 3. Generation ---
+# Function that tokenizes a batch of formatted prompts into the inputs of model.generate.
+# Without a prefix, prompts are simply left-padded, so that every sequence ends right where its generation starts.
+# With a prefix (see prefix_cache.py) shared by every prompt, the prefill of the prefix is skipped: its past_key_values
+# are reused and only the suffixes are padded, in the middle of the sequences ([prefix][padding][suffix]).
+# The attention mask hides the padding, and since position ids are derived from the attention mask, every suffix
+# continues right after the positions of the cached prefix.
+# It returns the generate keyword arguments and the (padded) prompt length.
+def prepare_generation_inputs(model, tokenizer, prompt_texts, prefix_cache=None, prefix_entry=None):
+
+    # --- Prefix reuse ---
+    if prefix_cache is not None and prefix_entry is not None:
+
+        # The prefix can be reused only if every prompt starts with its exact tokens (and continues after them)
+        prefix_ids = prefix_entry["ids"]
+        encoded = tokenizer(prompt_texts).input_ids
+        if all(len(ids) > len(prefix_ids) and ids[:len(prefix_ids)] == prefix_ids for ids in encoded):
+
+            # Pad every suffix (on its left) to the longest one
+            suffixes = [ids[len(prefix_ids):] for ids in encoded]
+            suffix_length = max(len(suffix) for suffix in suffixes)
+            pad_token_id = model.config.pad_token_id if model.config.pad_token_id is not None else 0
+            input_ids = [prefix_ids + [pad_token_id] * (suffix_length - len(suffix)) + suffix for suffix in suffixes]
+            attention_mask = [[1] * len(prefix_ids) + [0] * (suffix_length - len(suffix)) + [1] * len(suffix) for suffix in suffixes]
+
+            # The prefill of the prefix tokens is saved for every prompt of the batch
+            prefix_cache.record(len(prefix_ids) * len(prompt_texts), requests=len(prompt_texts))
+
+            return {
+                "input_ids": torch.tensor(input_ids, device=model.device),
+                "attention_mask": torch.tensor(attention_mask, device=model.device),
+                "past_key_values": prefix_cache.copy_for_batch(prefix_entry, len(prompt_texts)),
+            }, len(prefix_ids) + suffix_length
+
+        # The prompts don't start with the prefix tokens: regular path
+        prefix_cache.record(0, requests=len(prompt_texts))
+        log("Warning: prompts don't match the cached prefix tokens. Running the full prefill.", level="warning")
+
+    # --- Regular (left-padded) inputs ---
+    # Decoder-only models must be padded on the left in batched generation: with right padding the
+    # model would have to continue after the pad tokens of the shorter prompts.
+    # The prompts are tokenized without padding and padded here, like the suffixes above: tokenizer(..., padding=True)
+    # would switch the padding state of the Rust backend of a fast tokenizer, which is shared with the request threads
+    # counting tokens at the same time (they would fail with "Already borrowed", or lose the padding of this call).
+    encoded = tokenizer(prompt_texts).input_ids
+    prompt_length = max(len(ids) for ids in encoded)
+    pad_token_id = model.config.pad_token_id if model.config.pad_token_id is not None else 0
+    input_ids = [[pad_token_id] * (prompt_length - len(ids)) + ids for ids in encoded]
+
+    # The attention mask tells the model which tokens are actual input and which are padding,
+    # preventing attention to padding tokens.
+    attention_mask = [[0] * (prompt_length - len(ids)) + [1] * len(ids) for ids in encoded]
+    return {
+        "input_ids": torch.tensor(input_ids, device=model.device),
+        "attention_mask": torch.tensor(attention_mask, device=model.device),
+    }, prompt_length
+
+# Function that builds the keyword arguments of model.generate shared by the batched and the streamed generation.
+# request_contexts (one per prompt) and stop_event allow the generation to be cancelled (see CancellationStoppingCriteria).
+# timer optionally measures the prefill/decode times (see GenerationTimer).
+# monitors (one per prompt, or None) stop the degenerate generations early (see OutputMonitorStoppingCriteria).
+# speculative optionally holds the generate arguments of an assisted (speculative) decoding, for a single prompt:
+# {"assistant_model": draft_model} or {"prompt_lookup_num_tokens": ..., "max_matching_ngram_size": ...}.
+def build_generate_kwargs(model, tokenizer, model_inputs, prompt_length, max_new_tokens, settings, eos_token_id, request_contexts=None, stop_event=None, timer=None, monitors=None, speculative=None):
+
+    # Rely on what's set in model.config, which we tried to set at load time.
+    current_pad_token_id = model.config.pad_token_id
+    if current_pad_token_id is None:
+        log("Warning: model.config.pad_token_id is None. If model needs padding for generation, this might be an issue.", level="warning")
+
+    # We pass in input the attention mask (and the prefix cache, if any), the max tokens to generate the eos/pad tokens
+    # and the sampling configuration (temperature for the model creativity, top-p filtering value for tokens selection).
+    generate_kwargs = dict(
+        **model_inputs,
+        max_new_tokens=max_new_tokens,
+        eos_token_id=eos_token_id,
+        do_sample=settings["do_sample"],
+        temperature=settings["temperature"],
+        top_p=settings["top_p"],
+        pad_token_id=current_pad_token_id,
+        logits_processor=build_logits_processors(tokenizer, prompt_length, settings),
+        stopping_criteria=build_stopping_criteria(request_contexts, stop_event, timer, tokenizer, monitors, prompt_length)
+    )
+
+    # The draft tokens (of the draft model, or copied from the prompt) are verified by the model at every step
+    if speculative:
+        generate_kwargs.update(speculative)
+    return generate_kwargs
+
+# Function that generates an answer for every prompt in prompt_texts with a single batched model.generate call.
+# settings is the generation profile (see model.py): sampling configuration (do_sample, temperature, top_p)
+# and thinking configuration (enable_thinking, thinking_budget).
+# prefix_cache/prefix_entry optionally provide the cached KV of the prefix shared by all the prompts.
+# request_contexts optionally provides the request context of every prompt, to stop the generation of cancelled requests.
+# monitors optionally provides an output monitor (see parsing.OutputMonitor) for every prompt, which stops its generation
+# as soon as it turns degenerate: the caller reads the stop reason (and the text to keep) from the monitor itself.
+# If a stats dictionary is given, it is filled with the token counts and timings of the generation (see fill_generation_stats),
+# the shape of its inputs (see fill_input_stats) and the tokenization and detokenization times (tokenize_seconds,
+# detokenize_seconds).
+# speculative optionally enables the assisted (speculative) decoding of a single prompt (see build_generate_kwargs).
+# It returns the list of decoded answers, in the same order of prompt_texts.
+def generate_batch(model, tokenizer, prompt_texts, max_new_tokens, settings, eos_token_id, prefix_cache=None, prefix_entry=None, request_contexts=None, stats=None, monitors=None, speculative=None):
+
+    # Inputs of the model (left-padded, or reusing the prefix cache)
+    tokenize_started = time.monotonic()
+    model_inputs, prompt_length = prepare_generation_inputs(model, tokenizer, prompt_texts, prefix_cache, prefix_entry)
+    tokenize_seconds = time.monotonic() - tokenize_started
+
+    # With torch.no_grad to avoid computing gradients (and potential compute time waste)
+    timer = GenerationTimer()
+    with torch.no_grad():
+        outputs = model.generate(**build_generate_kwargs(
+            model, tokenizer, model_inputs, prompt_length, max_new_tokens, settings, eos_token_id,
+            request_contexts=request_contexts, timer=timer, monitors=monitors, speculative=speculative
+        ))
+    if stats is not None:
+        fill_generation_stats(stats, tokenizer, model_inputs, outputs[:, prompt_length:], model.config.pad_token_id, timer)
+        fill_input_stats(stats, model_inputs, prompt_length, max_new_tokens, prefix_entry)
+
+    # Extract only the newly generated tokens from the model's output.
+    # Every row has the same (padded) prompt length, so slicing from it
+    # effectively removes the input tokens, leaving only the responses.
+    # We decode every answer, stripped of any whitespaces.
+    detokenize_started = time.monotonic()
+    answers = [
+        tokenizer.decode(output_ids[prompt_length:], skip_special_tokens=True).strip()
+        for output_ids in outputs
+    ]
+    if stats is not None:
+        stats["tokenize_seconds"] = tokenize_seconds
+        stats["detokenize_seconds"] = time.monotonic() - detokenize_started
+    return answers
+
+# Function that generates the answer for a single prompt, yielding the decoded text piece by piece as it is produced.
+# model.generate runs in a background thread and pushes the decoded text in a TextIteratorStreamer,
+# which we consume here (streamers only support a batch of one, so streaming requests are not batched).
+# The generation stops when request_context is cancelled, or when the consumer stops iterating (e.g. client disconnected).
+# If a stats dictionary is given, it is filled at the end of the generation, as in generate_batch.
+# monitor optionally stops the generation when the output turns degenerate, and speculative enables the assisted
+# decoding, as in generate_batch.
+def stream_generate(model, tokenizer, prompt_text, max_new_tokens, settings, eos_token_id, prefix_cache=None, prefix_entry=None, request_context=None, stats=None, monitor=None, speculative=None):
+
+    # Inputs of the model, as in generate_batch (the detokenization is interleaved with the decoding by the streamer)
+    tokenize_started = time.monotonic()
+    model_inputs, prompt_length = prepare_generation_inputs(model, tokenizer, [prompt_text], prefix_cache, prefix_entry)
+    tokenize_seconds = time.monotonic() - tokenize_started
+
+    # skip_prompt=True: only the newly generated text is streamed.
+    # skip_special_tokens=True: same decoding of generate_batch (the <think> tags are kept).
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+    # Same generate arguments of generate_batch, plus the streamer.
+    # stop_event is set if the consumer leaves before the end, so that the background generation doesn't go on alone.
+    stop_event = threading.Event()
+    timer = GenerationTimer()
+    generation_kwargs = build_generate_kwargs(
+        model, tokenizer, model_inputs, prompt_length, max_new_tokens, settings, eos_token_id,
+        request_contexts=[request_context], stop_event=stop_event, timer=timer, monitors=[monitor], speculative=speculative
+    )
+    generation_kwargs["streamer"] = streamer
+
+    # Errors raised by generate in the background thread are kept, and re-raised to the consumer
+    errors, outputs = [], []
+    def run_generation():
+        try:
+            with torch.no_grad():
+                outputs.append(model.generate(**generation_kwargs))
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=run_generation, daemon=True)
+    thread.start()
+
+    # Yield the decoded pieces as soon as they are available
+    try:
+        for piece in streamer:
+            if piece:
+                yield piece
+    finally:
+        stop_event.set()
+
+    # Wait for generate to completely finish and surface its error, if any
+    thread.join()
+    if errors:
+        raise errors[0]
+    if stats is not None and outputs:
+        fill_generation_stats(stats, tokenizer, model_inputs, outputs[0][:, prompt_length:], model.config.pad_token_id, timer)
+        fill_input_stats(stats, model_inputs, prompt_length, max_new_tokens, prefix_entry)
+        stats["tokenize_seconds"] = tokenize_seconds
@@ -0,0 +1,167 @@
+import math
+import threading
+
+from tracing import log
+
+# --- 1. Prometheus Metrics ---
+# A minimal, dependency free implementation of the Prometheus text exposition format (version 0.0.4),
+# enough for the counters, gauges and histograms exposed by /metrics.
+# Every metric has a fixed set of label names, and its values are kept per combination of label values.
+# Collectors are functions called right before rendering, to refresh the gauges that are read from other
+# components (e.g. queue depth, cache state) instead of being updated as events happen.
+
+# Default latency buckets (seconds), from a few milliseconds up to a long generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+# Function that escapes a label value as required by the text format
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+# Function that formats a sample value (Prometheus uses +Inf/-Inf/NaN)
+def format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if math.isnan(value):
+            return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Base class of the metrics: name, help text, label names and values per label combination
+class Metric:
+
+    type_name = "untyped"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    # Returns the tuple of label values of a sample, checking that every label is given
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    # Formats the labels of a sample, with optional extra labels (e.g. the "le" of the histogram buckets)
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.label_names, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + "}"
+
+    # Returns the lines of the metric in the text format
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {format_value(value)}"]
+
+    # Returns a copy of the current values, by tuple of label values (e.g. for in-process benchmarks)
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+# Monotonic counter
+class Counter(Metric):
+
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+# Value that can go up and down
+class Gauge(Metric):
+
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+# Distribution of observed values in cumulative buckets, with their sum and count
+class Histogram(Metric):
+
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+
+            # Every label combination keeps its per-bucket counts, sum and count
+            state = self._values.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _render_sample(self, key, state):
+
+        # Buckets are cumulative in the text format
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, state["buckets"]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', format_value(float(bound)))])} {cumulative}")
+        lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', '+Inf')])} {state['count']}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {state['count']}")
+        return lines
+
+# Registry of the metrics of the process
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(Counter(name, help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._register(Gauge(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    # Registers a function called before every rendering
+    def add_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    # Returns every metric in the text exposition format
+    def render(self):
+
+        # Refresh the collected gauges. A failing collector must not break the whole endpoint.
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                log(f"Warning: metrics collector {getattr(collector, '__name__', collector)} failed: {e}", level="warning")
+
+        lines = []
+        for metric in list(self._metrics):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# The registry shared by the whole process
+registry = MetricsRegistry()
@@ -1,8 +1,23 @@
-import torch
 import json
-import re
 import os
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import hashlib
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from admission import AdmissionController, QueueFullError, RequestCancelledError, RequestContext, SessionRegistry
+from admission import get_request_context, run_with_request_context, priority_of, DEFAULT_PRIORITY, PRIORITY_IDLE
+from backends import BackendLoader, BackendNotReadyError, create_backend
+from cache import ResultCache, make_cache_key
+from scheduler import BatchScheduler, PriorityExecutor
+from precompute import PrecomputeQueue
+from prefix_cache import prefix_before_sentinel
+from parsing import THINK_PATTERN, CHUNK_LABEL_PATTERN, ChunkStreamParser, highlighted_text_of, OutputMonitor, DegenerateOutputError
+from parsing import parse_fused_blocks, normalized_words
+from metrics import registry
+from tracing import Trace, TraceWriter, span, traced, record_span, count, log, set_console_level
+from profiler import ProfilingWindow
+from segmentation import segment_text, merge_window_chunks, paragraph_spans
+from weights import process_memory_mb
 
 # --- 0. Language Configuration  ---
 LANGUAGE_MAP = {
@@ -17,6 +32,7 @@ LANGUAGE_MAP = {
 # File paths for files (in our case, the prompts)
 CHUNK_PROMPT_FILE_PATH = "assets/prompts/chunk_prompts.json"
 SIMPLIFY_PROMPT_FILE_PATH = "assets/prompts/simplify_prompts.json"
+FUSED_SIMPLIFY_PROMPT_FILE_PATH = "assets/prompts/fused_simplify_prompts.json"
 
 # --- 1. Global Configuration & Model Loading ---
 # Since this file will be called ONCE from a python flask application on the module import, 
@@ -33,86 +49,78 @@ SIMPLIFY_PROMPT_FILE_PATH = "assets/prompts/simplify_prompts.json"
 # 2. If you don't want to set the HF_TOKEN in your env, just paste your actual HF token in the second parameter.
 hf_token = os.getenv("HF_TOKEN", "YOUR_TOKEN")
 
-# Determines the computational device to use for model inference.
-# torch.cuda.is_available() checks if a CUDA-enabled GPU is present.
-# If a GPU is available, 'cuda' is chosen; otherwise, it defaults to 'cpu'.
-device = "cuda" if torch.cuda.is_available() else "cpu"
-
-# Defines the name of the pre-trained model to be loaded from Hugging Face.
-# This specific model is "Qwen/Qwen1.5-0.5B-Chat", a relatively small conversational model.
-model_name = "Qwen/Qwen3-32B"
-
-# Loads the tokenizer for the specified pre-trained model.
-# The 'token' argument is used for authentication with Hugging Face Hub.
-# 'trust_remote_code=True' is necessary for some models that include custom Python code in their repository.
-tokenizer = AutoTokenizer.from_pretrained(model_name, token=hf_token, trust_remote_code=True)
-
-# Loads the pre-trained causal conversational language model.
-# torch_dtype=torch.float16: Loads the model weights in half-precision (FP16) to reduce memory usage and potentially speed up inference on compatible hardware.
-# token: Used for authentication.
-# trust_remote_code=True: Required for models with custom code.
-# device_map="auto": Automatically distributes the model layers across available devices (e.g., multiple GPUs, or CPU if no GPU).
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    torch_dtype=torch.float16,
-    token=hf_token,
-    trust_remote_code=True,
-    device_map="auto"
+# --- 1.0 Inference Backend ---
+# The model lives behind an inference backend (see backends.py), selected by configuration. Importing this module
+# doesn't load any weight: the backend is loaded in the background by start_backend_loading() (or on first use),
+# so that the server can bind its port, answer health checks and serve cached results while the weights are still loading.
+# - ADAPTEASE_BACKEND_PRELOAD: "1" to start loading the backend as soon as the server starts, "0" to load it on the first request
+# - ADAPTEASE_BACKEND: "hf" (Qwen3-32B with transformers), "small" (a small chat model, runs on CPU),
+#   "cpu" (a quantized Qwen3 for GPU-less nodes) or "stub" (deterministic, no weights)
+# - ADAPTEASE_MODEL_NAME: overrides the model of the backend
+# - ADAPTEASE_BACKEND_WAIT: seconds a request waits for the backend to be loaded before failing (0 = forever)
+# - ADAPTEASE_STUB_DELAY_MS: simulated decoding time per token of the stub backend
+# - ADAPTEASE_CPU_DTYPE: compute dtype without a GPU, "bf16", "fp32" or "auto" (bf16 only with native CPU support)
+# - ADAPTEASE_WARMUP_TOKENS: tokens generated at startup to measure the decoding speed (0 = no warmup)
+# - ADAPTEASE_MMAP_WEIGHTS: "1" to memory-map the safetensors weights of a CPU model instead of copying them in private
+#   memory, so that the replicas of a host share a single copy through the page cache (see weights.py)
+# CPU backend ("cpu", weight-only quantized Qwen3 for GPU-less nodes):
+# - ADAPTEASE_QUANTIZATION: "int8", "int4" or "none"
+# - ADAPTEASE_MODEL_SIZE: size of the Qwen3 model, e.g. "4B", "8B" or "14B" (ignored if ADAPTEASE_MODEL_NAME is set)
+# - ADAPTEASE_CPU_THREADS: torch threads (0 = torch default)
+# Speculative decoding (transformers backends, see speculative.py):
+# - ADAPTEASE_SPECULATIVE: "off", "on" (always speculative) or "auto" (speculative only when it is observed to be faster)
+# - ADAPTEASE_SPECULATIVE_METHOD: "draft_model" (a small model drafts the tokens) or "prompt_lookup" (copied from the prompt)
+# - ADAPTEASE_DRAFT_MODEL: the draft model, sharing the tokenizer of the main model (default: Qwen/Qwen3-0.6B)
+# - ADAPTEASE_DRAFT_TOKENS: tokens proposed by the draft model at every step
+# - ADAPTEASE_PROMPT_LOOKUP_TOKENS: max candidate tokens copied from the prompt at every step
+# - ADAPTEASE_PROMPT_LOOKUP_NGRAM: max length of the n-gram searched in the prompt
+BACKEND_NAME = os.getenv("ADAPTEASE_BACKEND", "hf")
+BACKEND_PRELOAD = os.getenv("ADAPTEASE_BACKEND_PRELOAD", "1") == "1"
+BACKEND_WAIT_SECONDS = float(os.getenv("ADAPTEASE_BACKEND_WAIT", "600"))
+
+# The KV-cache of the constant prompt prefixes (see section 2.1), used by the transformers backends.
+# - ADAPTEASE_PREFIX_CACHE: "1" to reuse the prefixes KV-cache, "0" to always run the full prefill
+# - ADAPTEASE_PREFIX_CACHE_SIZE: max number of prefixes kept in memory
+PREFIX_CACHE_ENABLED = os.getenv("ADAPTEASE_PREFIX_CACHE", "1") == "1"
+PREFIX_CACHE_SIZE = int(os.getenv("ADAPTEASE_PREFIX_CACHE_SIZE", "16"))
+
+# The backend instance (not loaded yet) and its loader
+backend = create_backend(
+    BACKEND_NAME,
+    model_name=os.getenv("ADAPTEASE_MODEL_NAME") or None,
+    hf_token=hf_token,
+    prefix_cache_size=PREFIX_CACHE_SIZE if PREFIX_CACHE_ENABLED else 0,
+    token_delay_ms=float(os.getenv("ADAPTEASE_STUB_DELAY_MS", "0")),
+    cpu_dtype=os.getenv("ADAPTEASE_CPU_DTYPE", "auto"),
+    warmup_tokens=int(os.getenv("ADAPTEASE_WARMUP_TOKENS", "16")),
+    mmap_weights=os.getenv("ADAPTEASE_MMAP_WEIGHTS", "0") == "1",
+    quantization=os.getenv("ADAPTEASE_QUANTIZATION", "int8"),
+    model_size=os.getenv("ADAPTEASE_MODEL_SIZE") or None,
+    num_threads=int(os.getenv("ADAPTEASE_CPU_THREADS", "0")),
+    speculative=os.getenv("ADAPTEASE_SPECULATIVE", "off"),
+    speculative_method=os.getenv("ADAPTEASE_SPECULATIVE_METHOD", "draft_model"),
+    draft_model_name=os.getenv("ADAPTEASE_DRAFT_MODEL") or None,
+    num_draft_tokens=int(os.getenv("ADAPTEASE_DRAFT_TOKENS", "5")),
+    prompt_lookup_tokens=int(os.getenv("ADAPTEASE_PROMPT_LOOKUP_TOKENS", "10")),
+    prompt_lookup_ngram_size=int(os.getenv("ADAPTEASE_PROMPT_LOOKUP_NGRAM", "3"))
 )
+backend_loader = BackendLoader(backend)
 
-# Sets the model to evaluation mode.
-# This disables features like dropout and batch normalization, which are used during training but not during inference.
-model.eval()
+# Defines the name of the pre-trained model used by the backend (part of the prompt version of the cache keys).
+model_name = backend.model_name
 
-# If the tokenizer pad id isn't configured
-if tokenizer.pad_token_id is None:
+# Function that starts loading the backend in the background (called by the server at startup, unless disabled).
+def start_backend_loading():
+    if BACKEND_PRELOAD:
+        backend_loader.start()
 
-    # But we got the eos token id 
-    if tokenizer.eos_token_id is not None:
-
-        # We then use the eos token as pad token. 
-        print(f"Tokenizer pad_token_id not set. Using eos_token_id ({tokenizer.eos_token_id}) as pad_token_id.")
-        
-        tokenizer.pad_token = tokenizer.eos_token
-
-    else:
-
-        # This is a more critical situation. Many models require a pad_token_id.
-        # For Qwen models, <|endoftext|> is often a good candidate if nothing else is set.
-        # ID for <|endoftext|> is often 151643 for Qwen models.
-        # However, forcing a pad_token_id without knowing the model can be risky.
-        print("Warning: tokenizer.pad_token_id and tokenizer.eos_token_id are not set. Generation might fail if padding is needed.")
-        
-        # As a last resort for some models, we might try:
-        # tokenizer.add_special_tokens({'pad_token': '[PAD]'})
-        # model.resize_token_embeddings(len(tokenizer))
-        # model.config.pad_token_id = tokenizer.pad_token_id
-        # But this is model-dependent. For now, we'll proceed and see if generate needs it.
-
-# Ensure model config reflects the tokenizer's pad_token_id if set.
-# This is usually handled, but being explicit can help.
-if tokenizer.pad_token_id is not None:
-    model.config.pad_token_id = tokenizer.pad_token_id
-if tokenizer.eos_token_id is not None:
-    model.config.eos_token_id = tokenizer.eos_token_id
-
-# Setup info displaying about tokenizer state
-print("Model and tokenizer loaded successfully.")
-
-# Displaying info about the pad_token 
-if tokenizer.pad_token_id is not None:
-    print(f"Using pad_token_id: {tokenizer.pad_token_id} ({tokenizer.decode(tokenizer.pad_token_id)})")
-else:
-    print("Warning: pad_token_id is None.")
-
-# Displaying info about the EOS token 
-if tokenizer.eos_token_id is not None:
-    print(f"Using eos_token_id: {tokenizer.eos_token_id} ({tokenizer.decode(tokenizer.eos_token_id)})")
-else:
-    print("Warning: eos_token_id is None (this is unusual for generative models).")
+# Function that returns the loaded backend, waiting for it if it is still loading.
+# Raises BackendNotReadyError if it is not available within ADAPTEASE_BACKEND_WAIT seconds, or if loading failed.
+def get_backend():
+    return backend_loader.get(timeout=BACKEND_WAIT_SECONDS or None)
 
 # Loading prompts from the assets folder
-print("Loading prompts from the assets folder...")
+log("Loading prompts from the assets folder...")
 
 # --- Load prompts from the JSON file ---
 try:
@@ -124,7 +132,7 @@ try:
 except FileNotFoundError:
 
     # Print the exception and exit 
-    print(f"Error: Prompt file '{CHUNK_PROMPT_FILE_PATH}' not found.")
+    log(f"Error: Prompt file '{CHUNK_PROMPT_FILE_PATH}' not found.", level="error")
     exit()
 
 # Do the same for the simplify prompts
@@ -136,152 +144,842 @@ try:
 except FileNotFoundError:
 
     # Error handling as above 
-    print(f"Error: Prompt file '{SIMPLIFY_PROMPT_FILE_PATH}' not found.")
+    log(f"Error: Prompt file '{SIMPLIFY_PROMPT_FILE_PATH}' not found.", level="error")
+    exit()
+
+# And for the fused chunk-and-simplify prompts (see section 4.1)
+try:
+    with open(FUSED_SIMPLIFY_PROMPT_FILE_PATH, 'r', encoding='utf-8') as f:
+        fused_simplify_prompts = json.load(f)
+except FileNotFoundError:
+    log(f"Error: Prompt file '{FUSED_SIMPLIFY_PROMPT_FILE_PATH}' not found.", level="error")
     exit()
 
-print("Prompts loaded successfully.")
+log("Prompts loaded successfully.")
+
+# --- 1.1 Generation Profiles ---
+# Named generation profiles (e.g. fast/balanced/quality) are loaded from GENERATION_PROFILES_FILE_PATH. Every profile sets:
+# - enable_thinking / thinking_budget: thinking mode, and hard budget of thinking tokens after which </think> is forced
+# - output_ratio / min_output_tokens / max_new_tokens: the token limit of a request is computed from the size of its input
+#   (output_ratio tokens per input token, at least min_output_tokens, plus the thinking budget), capped at max_new_tokens
+# - do_sample / temperature / top_p: sampling settings
+# Profiles can be tuned per operation and language through the "overrides" section of the file, where "*" matches everything.
+GENERATION_PROFILES_FILE_PATH = "assets/profiles/generation_profiles.json"
+
+# As for the prompts, we load the profiles file and exit if it is missing
+try:
+    with open(GENERATION_PROFILES_FILE_PATH, 'r', encoding='utf-8') as f:
+        generation_profiles_config = json.load(f)
+
+except FileNotFoundError:
+    log(f"Error: Generation profiles file '{GENERATION_PROFILES_FILE_PATH}' not found.", level="error")
+    exit()
+
+# The available profiles, and the one used when the caller doesn't choose any
+GENERATION_PROFILES = generation_profiles_config["profiles"]
+DEFAULT_GENERATION_PROFILE = os.getenv("ADAPTEASE_DEFAULT_PROFILE", generation_profiles_config.get("default_profile", "balanced"))
+log(f"Generation profiles loaded: {', '.join(GENERATION_PROFILES)} (default: {DEFAULT_GENERATION_PROFILE}).")
+
+# Function that returns the generation settings of a profile for the given operation ("chunk"/"simplify") and language.
+# The result is a new dictionary, containing the profile name too (it is part of the cache key).
+def resolve_generation_profile(operation, lang="en", profile=None):
+
+    # Unknown profiles are an error of the caller
+    profile_name = profile or DEFAULT_GENERATION_PROFILE
+    if profile_name not in GENERATION_PROFILES:
+        raise ValueError(f"Unknown generation profile '{profile_name}'. Available profiles: {', '.join(GENERATION_PROFILES)}")
+
+    # Start from the base profile and apply the overrides, from the most generic to the most specific
+    settings = dict(GENERATION_PROFILES[profile_name])
+    operation_overrides = generation_profiles_config.get("overrides", {}).get(operation, {})
+    for language_key in ("*", lang.lower()):
+        for profile_key in ("*", profile_name):
+            settings.update(operation_overrides.get(language_key, {}).get(profile_key, {}))
+
+    settings["name"] = profile_name
+    return settings
+
+# Function that computes the max_new_tokens of a request from the size (in tokens) of its input text.
+def max_new_tokens_for(settings, input_tokens):
+
+    # Expected answer size, never below the minimum
+    output_tokens = max(settings["min_output_tokens"], int(settings["output_ratio"] * input_tokens))
+
+    # The thinking tokens come before the answer
+    if settings["enable_thinking"]:
+        output_tokens += settings["thinking_budget"]
+
+    # Hard cap of the profile
+    return min(settings["max_new_tokens"], output_tokens)
+
+# --- 1.2 Result Cache ---
+# Publishers serve the same paragraphs to thousands of readers, so we keep a server-side cache of the
+# chunk/simplify results. The cache is content-addressed: the key is a hash of the operation, the language,
+# the normalized text, the prompt version and the generation settings (see cache.make_cache_key).
+# It is made of a bounded in-memory LRU (with TTL) in front of a persistent SQLite store, so results survive restarts.
+# Configuration is done through env variables:
+# - ADAPTEASE_CACHE_PATH: path of the SQLite file (empty string to disable the disk tier)
+# - ADAPTEASE_CACHE_MAX_ENTRIES: max number of results kept in memory
+# - ADAPTEASE_CACHE_TTL: seconds a result stays valid in memory (0 = forever)
+# - ADAPTEASE_CACHE_DISK_TTL: seconds a result stays valid on disk (0 = until invalidated)
+CACHE_PATH = os.getenv("ADAPTEASE_CACHE_PATH", "cache/adaptease_results.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("ADAPTEASE_CACHE_MAX_ENTRIES", "2048"))
+CACHE_TTL_SECONDS = float(os.getenv("ADAPTEASE_CACHE_TTL", "3600"))
+CACHE_DISK_TTL_SECONDS = float(os.getenv("ADAPTEASE_CACHE_DISK_TTL", "0"))
+
+# The prompt version is a fingerprint of the prompt files and of the model in use:
+# editing a prompt (or switching model) automatically invalidates every stale result.
+# The generation settings are part of the key as well, through the resolved generation profile.
+with open(CHUNK_PROMPT_FILE_PATH, 'rb') as f_chunk, open(SIMPLIFY_PROMPT_FILE_PATH, 'rb') as f_simplify:
+    PROMPT_VERSION = hashlib.sha256(model_name.encode("utf-8") + f_chunk.read() + f_simplify.read()).hexdigest()[:16]
+
+# Simplification results of the fused mode (see section 4.1) have their own version, which also covers the fused prompts
+with open(FUSED_SIMPLIFY_PROMPT_FILE_PATH, 'rb') as f_fused:
+    FUSED_PROMPT_VERSION = hashlib.sha256(PROMPT_VERSION.encode("utf-8") + f_fused.read()).hexdigest()[:16]
+
+# The cache instance shared by the whole process
+result_cache = ResultCache(
+    path=CACHE_PATH,
+    max_entries=CACHE_MAX_ENTRIES,
+    ttl_seconds=CACHE_TTL_SECONDS,
+    disk_ttl_seconds=CACHE_DISK_TTL_SECONDS
+)
+log(f"Result cache ready (disk store: {CACHE_PATH or 'disabled'}, prompt version: {PROMPT_VERSION}).")
+
+# --- 1.3 Metrics ---
+# The generation side of the /metrics endpoint (see metrics.py, the request side lives in server.py).
+# Every generate call reports how its time was split between the prefill (prompt processing) and the decoding, how many
+# tokens went in and out (thinking included), and the size of its batch. Queue depths and cache efficiency are read from
+# their components right before every scrape, by the collector below.
+# The operation label is "chunk" or "simplify" (or "other" for generations outside of those operations).
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+RATE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+generation_prefill_seconds = registry.histogram(
+    "adaptease_generation_prefill_seconds", "Time spent processing the prompts of a generate call.", ["operation"]
+)
+generation_decode_seconds = registry.histogram(
+    "adaptease_generation_decode_seconds", "Time spent decoding the answers of a generate call.", ["operation"]
+)
+generation_time_to_first_token_seconds = registry.histogram(
+    "adaptease_generation_time_to_first_token_seconds", "Time between the start of a streamed generation and its first decoded text.", ["operation"]
+)
+generation_tokens_per_second = registry.histogram(
+    "adaptease_generation_decode_tokens_per_second", "Output tokens per second of decoding of a generate call (whole batch).",
+    ["operation"], buckets=TOKENS_PER_SECOND_BUCKETS
+)
+generation_batch_size = registry.histogram(
+    "adaptease_generation_batch_size", "Number of prompts of a generate call.", ["operation"], buckets=BATCH_SIZE_BUCKETS
+)
+generation_output_tokens = registry.histogram(
+    "adaptease_generation_output_tokens", "Output tokens of a single answer (thinking included).", ["operation"], buckets=TOKEN_BUCKETS
+)
+generation_tokens_total = registry.counter(
+    "adaptease_generation_tokens_total", "Tokens processed by the model, by kind (input, output or thinking).", ["operation", "kind"]
+)
+generation_fallbacks_total = registry.counter(
+    "adaptease_fallbacks_total", "Results replaced by a fallback or an error placeholder, by reason.", ["operation", "reason"]
+)
+generation_errors_total = registry.counter(
+    "adaptease_generation_errors_total", "Failed generate calls.", ["operation"]
+)
+generation_decoding_modes_total = registry.counter(
+    "adaptease_generation_decoding_mode_total", "Single-prompt generations by decoding mode (plain, draft_model or prompt_lookup).", ["operation", "mode"]
+)
+speculative_acceptance_rate = registry.histogram(
+    "adaptease_speculative_acceptance_rate", "Share of the draft tokens accepted by the model in a speculative generation.",
+    ["operation"], buckets=RATE_BUCKETS
+)
+generation_early_stops_total = registry.counter(
+    "adaptease_generation_early_stops_total", "Generations stopped by the output monitor, by reason (see section 2.4).", ["operation", "reason"]
+)
+
+# Gauges refreshed at every scrape
+scheduler_pending_requests = registry.gauge("adaptease_scheduler_pending_requests", "Requests waiting for a batch of the scheduler.")
+admission_requests = registry.gauge("adaptease_admission_requests", "Requests holding or waiting for a generation slot.", ["state"])
+admission_rejected_requests = registry.gauge("adaptease_admission_rejected_requests", "Requests rejected because the queue was full.")
+admission_expired_requests = registry.gauge("adaptease_admission_expired_requests", "Requests whose deadline expired while queued.")
+result_cache_lookups = registry.gauge("adaptease_result_cache_lookups", "Lookups of the result cache, by outcome.", ["outcome"])
+result_cache_hit_ratio = registry.gauge("adaptease_result_cache_hit_ratio", "Share of the result cache lookups that were hits.")
+result_cache_entries = registry.gauge("adaptease_result_cache_entries", "Results stored in the result cache, by tier.", ["tier"])
+backend_ready = registry.gauge("adaptease_backend_ready", "1 once the inference backend is loaded.")
+precompute_jobs = registry.gauge("adaptease_precompute_jobs", "Background precomputation jobs: pending ones, and counts by outcome.", ["state"])
+process_memory_bytes = registry.gauge("adaptease_process_memory_bytes", "Memory of the server process (resident, unique, shared, proportional).", ["kind"])
+
+# Function that records the statistics of a generate call (see backends.py for the keys of stats)
+def record_generation_metrics(operation, stats):
+    if not stats:
+        return
+    batch_size = max(1, stats.get("batch_size", 1))
+    generation_prefill_seconds.observe(stats.get("prefill_seconds", 0.0), operation=operation)
+    generation_decode_seconds.observe(stats.get("decode_seconds", 0.0), operation=operation)
+    generation_batch_size.observe(batch_size, operation=operation)
+    generation_output_tokens.observe(stats.get("output_tokens", 0) / batch_size, operation=operation)
+    for kind in ("prompt", "output", "thinking"):
+        generation_tokens_total.inc(stats.get(f"{kind}_tokens", 0), operation=operation, kind="input" if kind == "prompt" else kind)
+    if stats.get("decode_seconds"):
+        generation_tokens_per_second.observe(stats.get("output_tokens", 0) / stats["decode_seconds"], operation=operation)
+    if stats.get("decoding_mode"):
+        generation_decoding_modes_total.inc(operation=operation, mode=stats["decoding_mode"])
+    if stats.get("acceptance_rate") is not None:
+        speculative_acceptance_rate.observe(stats["acceptance_rate"], operation=operation)
+
+# Function that counts a fallback of the given operation
+def record_fallback(operation, reason):
+    generation_fallbacks_total.inc(operation=operation, reason=reason)
+
+# Operation label of a prompt prefix key
+def operation_of(prefix_key):
+    return prefix_key[0] if prefix_key else "other"
+
+# Collector of the gauges read from the scheduler, the admission control, the result cache and the backend
+def collect_component_metrics():
+    if batch_scheduler is not None:
+        scheduler_pending_requests.set(batch_scheduler.stats()["pending"])
+    admission = admission_controller.stats()
+    admission_requests.set(admission["active"], state="active")
+    admission_requests.set(admission["waiting"], state="waiting")
+    admission_rejected_requests.set(admission["rejected"])
+    admission_expired_requests.set(admission["expired_in_queue"])
+    cache_stats = result_cache.stats()
+    result_cache_lookups.set(cache_stats["memory_hits"], outcome="memory_hit")
+    result_cache_lookups.set(cache_stats["disk_hits"], outcome="disk_hit")
+    result_cache_lookups.set(cache_stats["misses"], outcome="miss")
+    result_cache_hit_ratio.set(cache_stats["hit_ratio"])
+    result_cache_entries.set(cache_stats["memory_entries"], tier="memory")
+    result_cache_entries.set(cache_stats["disk_entries"], tier="disk")
+    backend_ready.set(1 if backend_loader.ready() else 0)
+    if precompute_queue is not None:
+        precompute_stats = precompute_queue.stats()
+        for state in ("pending", "completed", "already_cached", "preempted", "failed", "dropped"):
+            precompute_jobs.set(precompute_stats[state], state=state)
+    for kind, megabytes in (process_memory_mb() or {}).items():
+        process_memory_bytes.set(int(megabytes * 2 ** 20), kind=kind)
+
+registry.add_collector(collect_component_metrics)
+
+# --- 1.4 Request Tracing and Profiling ---
+# The metrics tell how the server behaves on average; a trace tells where the time of one request went (see tracing.py):
+# every API request gets a Trace (started and finished by server.py, through start_trace and finish_trace), whose spans
+# cover the JSON parsing, the cache lookups, the prompt formatting, the chat template, the waits for a generation slot and
+# for a batch, the tokenization, prefill, decode and detokenization of its generations and the post-processing, with
+# its token counts, cache hits/misses and batch sizes. The diagnostic messages are events of the trace (see tracing.log).
+# Finished traces are appended as JSON lines to a file: the slow ones, a sample of the others and the profiled ones.
+# An admin can also open a profiling window over the next N requests (see profiler.py and /api/admin/profile), which
+# samples the Python stacks of every thread and runs the torch profiler while they are served.
+# - ADAPTEASE_TRACE_PATH: JSON lines file of the traces (empty to disable the file)
+# - ADAPTEASE_TRACE_SLOW_MS: requests taking at least this long are always written
+# - ADAPTEASE_TRACE_SAMPLE: share (0 to 1) of the other requests written as well
+# - ADAPTEASE_TRACE_MAX_MB: size after which the file is rotated (to <path>.1)
+# - ADAPTEASE_LOG_LEVEL: lowest level of the messages printed on the console ("info", "warning" or "error"); every
+#   message of a request is in its trace anyway
+# - ADAPTEASE_PROFILE_DIR: folder of the profiles of the profiling windows
+# - ADAPTEASE_PROFILE_INTERVAL_MS: interval between two samples of the Python stacks
+# - ADAPTEASE_PROFILE_MAX_SECONDS: a profiling window is closed after this long, even if its requests are not over
+TRACE_PATH = os.getenv("ADAPTEASE_TRACE_PATH", "traces/adaptease_traces.jsonl")
+TRACE_SLOW_MS = float(os.getenv("ADAPTEASE_TRACE_SLOW_MS", "10000"))
+TRACE_SAMPLE_RATE = float(os.getenv("ADAPTEASE_TRACE_SAMPLE", "0"))
+TRACE_MAX_MB = float(os.getenv("ADAPTEASE_TRACE_MAX_MB", "100"))
+set_console_level(os.getenv("ADAPTEASE_LOG_LEVEL", "info"))
+
+trace_writer = TraceWriter(
+    TRACE_PATH, slow_ms=TRACE_SLOW_MS, sample_rate=TRACE_SAMPLE_RATE, max_bytes=int(TRACE_MAX_MB * 2 ** 20)
+) if TRACE_PATH else None
+profiling_window = ProfilingWindow(
+    output_dir=os.getenv("ADAPTEASE_PROFILE_DIR", "profiles"),
+    sample_interval_ms=float(os.getenv("ADAPTEASE_PROFILE_INTERVAL_MS", "5")),
+    max_seconds=float(os.getenv("ADAPTEASE_PROFILE_MAX_SECONDS", "300"))
+)
+
+traced_requests_total = registry.counter(
+    "adaptease_traced_requests_total", "Finished request traces, by name and whether they were slow.", ["name", "slow"]
+)
+
+# Function that starts the trace of a request, enrolling it in the open profiling window (if any)
+def start_trace(name, **attributes):
+    trace = Trace(name, **attributes)
+    window_id = profiling_window.enroll()
+    if window_id is not None:
+        trace.set(profile=window_id)
+    return trace
+
+# Function that finishes the trace of a request and writes it (if it has to be kept)
+def finish_trace(trace, **attributes):
+    record = trace.finish(**attributes)
+    if record is None:
+        return
+    traced_requests_total.inc(name=record["name"], slow=str(record["duration_ms"] >= TRACE_SLOW_MS).lower())
+    if "profile" in record["attributes"]:
+        profiling_window.complete(record["attributes"]["profile"])
+    if trace_writer is not None:
+        trace_writer.write(record)
 
 # --- 2. Helper Function for LLM Generation ---
 # Afte the generic model configuration loading, we are now ready to define our core function. 
 # generate_text_from_llm is the core behind chunk and simplify, and given a certain system/user prompt carefully
 # built in the simplify/chunk function it will produce an output based on those. 
 # Note that, we are using QWEN in a conversational way to maximize the output instead of a simple causal text generation model.
-def generate_text_from_llm(system_prompt, user_prompt, max_new_tokens=32768):
-    
-    # Construct the message list in the format expected by the chat template.
-    # This typically includes a system message to set the context/persona and a user message with the actual query.
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt},
-    ]
-    
-    # Apply the tokenizer's chat template to format the messages into a single string.
-    # tokenize=False: Returns the raw string, not token IDs.
-    # add_generation_prompt=True: Adds a special token/sequence to indicate the model should start generating.
-    # enable_thinking=True: (Specific to some Qwen models) enables Chain of Tought "thinking" process for the model.
-    prompt_text = tokenizer.apply_chat_template(
-        messages,
-        tokenize=False,
-        add_generation_prompt=True, 
-        enable_thinking=True
+# The model-specific parts (chat template, terminators, batched generate) live in the inference backend (see backends.py).
+
+# Function that counts the tokens of a text (used to size the max_new_tokens of a request).
+def count_text_tokens(text):
+    return get_backend().count_tokens(text)
+
+# --- 2.1 Prompt Prefix KV-Cache ---
+# The prompt templates put the variable text (article or chunk) at the end, so every formatted prompt of an
+# (operation, language) pair starts with the same constant prefix: system prompt and instructions.
+# When enabled (see section 1.0), the transformers backends compute the past_key_values of those prefixes once and reuse
+# them for every request (see prefix_cache.py), so each request only pays the prefill of its own text.
+
+# Prompt templates of every operation, alongside the name of their variable text placeholder
+PROMPT_TEMPLATES = {
+    "chunk": (chunk_prompts, "article_text_input"),
+    "simplify": (simplify_prompts, "text_chunk"),
+    "simplify_fused": (fused_simplify_prompts, "article_text_input"),
+}
+
+# Sentinel replacing the variable text while looking for the constant prefix of a template
+VARIABLE_TEXT_SENTINEL = "\u2063ADAPTEASE_VARIABLE_TEXT\u2063"
+
+# Formatted prefixes already computed, by (operation, language, enable_thinking)
+prompt_prefix_texts = {}
+
+# Function that returns the constant beginning of the formatted prompts of an (operation, language) pair,
+# i.e. everything the chat template produces before the variable text.
+def prompt_prefix_text(operation, lang, enable_thinking):
+
+    # Already computed
+    prefix_key = (operation, lang.lower(), enable_thinking)
+    if prefix_key in prompt_prefix_texts:
+        return prompt_prefix_texts[prefix_key]
+
+    # Format the template with the sentinel in place of the variable text, and cut right before it
+    prompts, placeholder = PROMPT_TEMPLATES[operation]
+    system_prompt = prompts[lang.lower()].get("system_prompt", "")
+    user_prompt = prompts[lang.lower()].get("user_prompt", "").format(
+        **{placeholder: VARIABLE_TEXT_SENTINEL, "language_name": LANGUAGE_MAP.get(lang.lower())}
     )
-    
-    # Tokenize the formatted prompt text and convert it into PyTorch tensors.
-    # return_tensors="pt": Ensures the output is PyTorch tensors.
-    # .to(model.device): Moves the input tensors to the same device as the model (e.g., 'cuda' or 'cpu').
-    inputs = tokenizer(prompt_text, return_tensors="pt").to(model.device)
-    
-    # Extract the attention mask from the inputs if it exists.
-    # The attention mask tells the model which tokens are actual input and which are padding,
-    # preventing attention to padding tokens.
-    attention_mask = inputs.attention_mask if 'attention_mask' in inputs else None
-
-    # Define terminators robustly
-    terminators_ids = []
-    if tokenizer.eos_token_id is not None:
-        terminators_ids.append(tokenizer.eos_token_id)
-
-    # Qwen models often use <|im_end|> or <|eot_id|> as part of their chat protocol.
-    # Check for <|eot_id|> which we are using.
-    # For Qwen2-Instruct, <|endoftext|> is the EOS, and <|im_start|> / <|im_end|> are for chat.
-    # <|eot_id|> seems to be from older Qwen or specific fine-tunes.
-    # For Qwen/Qwen2-7B-Instruct, "<|eot_id|>" is NOT a special token by default,
-    # tokenizer.convert_tokens_to_ids("<|eot_id|>") would yield unk_token_id.
-    # Let's use the more common <|im_end|> if using a Qwen chat model.
-    # Or, if you are sure "<|eot_id|>" is correct for your *specific* Qwen3-8B, keep it.
-    
-    # Example for Qwen Chat models that use <|im_end|>
-    im_end_token_id = tokenizer.convert_tokens_to_ids("<|im_end|>")
-    if isinstance(im_end_token_id, int) and im_end_token_id not in terminators_ids:
+    rendered = get_backend().build_prompt_text(system_prompt, user_prompt, enable_thinking=enable_thinking)
+    prompt_prefix_texts[prefix_key] = prefix_before_sentinel(rendered, VARIABLE_TEXT_SENTINEL)
 
-         # Check if it's not the unknown token ID, or if unknown is fine.
-         # Some tokenizers return unk_token_id if the token is not special but in vocab.
-         # Others return it only if truly unknown.
-        if im_end_token_id != tokenizer.unk_token_id: 
+    return prompt_prefix_texts[prefix_key]
 
-            # Only add if it's a specific known token
-            terminators_ids.append(im_end_token_id)
-    
-    # Your original attempt with <|eot_id|>
-    eot_id_token = tokenizer.convert_tokens_to_ids("<|eot_id|>")
-    if isinstance(eot_id_token, int) and eot_id_token not in terminators_ids:
-
-        # Ensure that the converted ID is not the tokenizer's unknown token ID,
-        # which would indicate that "<|eot_id|>" is not a recognized token in the vocabulary.
-        if eot_id_token != tokenizer.unk_token_id:
-            print(f"Adding <|eot_id|> ({eot_id_token}) to terminators.")
-            terminators_ids.append(eot_id_token)
-
-    # Ensure terminators_ids is not empty if possible, otherwise model might not stop correctly.
-    # If it's empty, generation will only stop at max_new_tokens.
-    if not terminators_ids:
-
-        print("Warning: No specific terminator IDs found. Generation will rely on max_new_tokens.")
-        # Pass None to eos_token_id to let the model use its default config (if any).
-        # An empty list might also work for some versions of transformers.
-        effective_eos_token_id = None
-    
-    elif len(terminators_ids) == 1:
-        
-        # Pass single int if only one
-        effective_eos_token_id = terminators_ids[0] 
-    else:
-    
-        # Pass list if multiple
-        effective_eos_token_id = terminators_ids 
-
-    # Determine pad_token_id for generate call
-    # It's best if model.config.pad_token_id is set correctly during init.
-    # Explicitly passing it to generate overrides model.config.
-    # If tokenizer.pad_token_id is None now, and model requires it, it could error.
-    # Rely on what's set in model.config, which we tried to set earlier.
-    current_pad_token_id = model.config.pad_token_id
-    if current_pad_token_id is None:
-        print("Warning: model.config.pad_token_id is None. If model needs padding for generation, this might be an issue.")
-
-
-    print(f"\n--- Generating response with {len(inputs.input_ids[0])} input tokens (Max Tokens Allowed: {max_new_tokens})---")
-    print(f"Using eos_token_id: {effective_eos_token_id}, pad_token_id: {current_pad_token_id}")
-
-    # With torch.no_grad to avoid computing gradients (and potential compute time waste)
-    with torch.no_grad():
-
-        # We call the generate function from the model. 
-        # We pass in input the attention mask, the max tokens to generate the eos/pad tokens 
-        # and the standard value in term of temperate (model creativity) and top-p filtering value
-        # for tokens selection.
-        outputs = model.generate(
-            inputs.input_ids,
-            attention_mask=attention_mask,
-            max_new_tokens=max_new_tokens,
-            eos_token_id=effective_eos_token_id,
-            do_sample=True,
-            temperature=0.6,
-            top_p=0.9,
-            pad_token_id=current_pad_token_id # Use the ID from model.config (ideally set from tokenizer)
+# Function that returns the (prefix_key, prefix_text) pair passed to the backend for the prompts of an (operation, language)
+# pair, or None if the prompts don't share a known prefix.
+def prompt_prefix(prefix_key, settings):
+
+    # Prompts without a shared prefix
+    if prefix_key is None:
+        return None
+
+    operation, lang = prefix_key
+    return (operation, lang.lower(), settings["enable_thinking"]), prompt_prefix_text(operation, lang, settings["enable_thinking"])
+
+# Function that generates the answers of a batch of already formatted prompts with a single model.generate call.
+# prefix_key is the (operation, language) pair of the prompts, when all of them share its constant prefix.
+# request_contexts are the contexts of the requests of the prompts, whose generation stops once they are cancelled.
+# monitors are the output monitors of the prompts (see section 2.4), whose generation stops once they turn degenerate.
+def generate_batch_from_llm(prompt_texts, max_new_tokens, settings, prefix_key=None, request_contexts=None, monitors=None):
+
+    # The backend fills the statistics of the call, reported to /metrics
+    stats = {}
+    try:
+        outputs = get_backend().generate_batch(
+            prompt_texts, max_new_tokens, settings, prefix=prompt_prefix(prefix_key, settings),
+            request_contexts=request_contexts, stats=stats, monitors=monitors
         )
+    except Exception:
+        generation_errors_total.inc(operation=operation_of(prefix_key))
+        raise
+
+    record_generation_metrics(operation_of(prefix_key), stats)
+    record_generation_trace(operation_of(prefix_key), stats, request_contexts)
+    return outputs
+
+# Function that records the generation spans of a generate call (tokenize, prefill, decode, detokenize) in the trace of
+# every request it served (request_contexts, one per row of the batch), with the token counts of the row of the request,
+# the size of the batch and the shape of its inputs (padding, cached prefix, token limit, acceptance rate of the drafts). The backends measure durations only: the spans are laid back to back, ending now.
+def record_generation_trace(operation, stats, request_contexts):
+    if not stats:
+        return
+    ended = time.monotonic()
+    phases = [(phase, stats[f"{phase}_seconds"]) for phase in ("tokenize", "prefill", "decode", "detokenize") if f"{phase}_seconds" in stats]
+    batch_size = stats.get("batch_size", 1)
+    for row, request_context in enumerate(request_contexts or []):
+        trace = getattr(request_context, "trace", None)
+        if trace is None:
+            continue
+        prompt_tokens = stats.get("row_prompt_tokens", [])[row] if row < len(stats.get("row_prompt_tokens", [])) else stats.get("prompt_tokens", 0)
+        output_tokens = stats.get("row_output_tokens", [])[row] if row < len(stats.get("row_output_tokens", [])) else stats.get("output_tokens", 0)
+        trace.count(generations=1, prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+        start = ended - sum(seconds for _, seconds in phases)
+        for phase, seconds in phases:
+            attributes = {"operation": operation, "batch_size": batch_size}
+            if phase == "prefill":
+                attributes["prompt_tokens"] = prompt_tokens
+                attributes.update({key: stats[key] for key in ("padded_prompt_length", "cached_prefix_tokens") if key in stats})
+            elif phase == "decode":
+                attributes.update(output_tokens=output_tokens, decoding_mode=stats.get("decoding_mode", "plain"))
+                attributes.update({key: stats[key] for key in ("max_new_tokens", "acceptance_rate") if stats.get(key) is not None})
+            trace.add_span(phase, start, start + seconds, **attributes)
+            start += seconds
+
+# Function that runs a batch formed by the scheduler. Every payload is a dictionary with the prompt_text, its own
+# max_new_tokens, its request context and its output monitor (or None), while the group holds the (hashable) generation
+# settings and the prefix key shared by the whole batch. Since the requests of a batch have similar lengths, the batch
+# simply uses the largest of their limits.
+# Cancelled (or expired) requests get a RequestCancelledError as their result, instead of a truncated answer, and
+# the answers stopped by their monitor are cut before the degeneration (see apply_output_monitor).
+def generate_scheduled_batch(payloads, group):
+    settings_group, prefix_key = group
+
+    # Requests cancelled while waiting for their batch are not generated at all
+    live = [index for index, payload in enumerate(payloads) if not (payload["context"] and payload["context"].cancelled)]
+    results = [RequestCancelledError("Request cancelled before its generation.") for _ in payloads]
+    if not live:
+        return results
+
+    # The time every request waited for its batch goes to its trace
+    for index in live:
+        trace = getattr(payloads[index]["context"], "trace", None)
+        if trace is not None and payloads[index].get("queued_at") is not None:
+            record_span("batch_wait", payloads[index]["queued_at"], trace=trace, batch_size=len(live))
+
+    # Every generation starts with fresh monitors (a failed batch is retried one request at a time)
+    monitors = [payloads[index].get("monitor") for index in live]
+    for monitor in monitors:
+        if monitor is not None:
+            monitor.reset()
+
+    # Batched generation of the live requests
+    outputs = generate_batch_from_llm(
+        [payloads[index]["prompt_text"] for index in live],
+        max(payloads[index]["max_new_tokens"] for index in live),
+        dict(settings_group),
+        prefix_key,
+        [payloads[index]["context"] for index in live],
+        monitors
+    )
 
-    # Extract only the newly generated tokens from the model's output.
-    # outputs[0] contains the full sequence (input + generated).
-    # inputs.input_ids.shape[-1] gives the length of the input prompt.
-    # Slicing from this index effectively removes the input tokens, leaving only the response.
-    response_ids = outputs[0][inputs.input_ids.shape[-1]:]
-    
-    # We decode the answer 
-    response_text = tokenizer.decode(response_ids, skip_special_tokens=True)
-    
-    # We return the function stripped of any whitespaces.
-    return response_text.strip()
+    # Requests cancelled during the generation have been stopped early: their answers are incomplete
+    for index, output, monitor in zip(live, outputs, monitors):
+        context = payloads[index]["context"]
+        if context and context.cancelled:
+            results[index] = RequestCancelledError("Request cancelled during its generation.")
+        else:
+            results[index] = apply_output_monitor(monitor, output)
+
+    return results
+
+# Function that builds the hashable scheduler group of a request: only requests with the same generation settings
+# (and the same prompt prefix, so that its KV-cache can be shared) end up in the same batch.
+def scheduler_group_of(settings, prefix_key=None):
+    return (tuple(sorted(settings.items())), prefix_key)
+
+# --- 2.2 Admission Control ---
+# Requests that need the model take a generation slot (see admission.py): at most ADAPTEASE_MAX_CONCURRENT_GENERATIONS
+# of them generate at the same time (sharing the batches of the scheduler), at most ADAPTEASE_MAX_QUEUED_GENERATIONS wait
+# for a slot, and the others are rejected right away (the server answers 429 with Retry-After).
+# Cached results never take a slot. Every request has a deadline (see server.py): late or cancelled requests leave the
+# queue, and their generation is stopped by a stopping criterion.
+# - ADAPTEASE_RETRY_AFTER: seconds suggested to the rejected clients before retrying
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("ADAPTEASE_MAX_CONCURRENT_GENERATIONS", "16"))
+MAX_QUEUED_GENERATIONS = int(os.getenv("ADAPTEASE_MAX_QUEUED_GENERATIONS", "64"))
+RETRY_AFTER_SECONDS = int(os.getenv("ADAPTEASE_RETRY_AFTER", "5"))
+admission_controller = AdmissionController(
+    max_concurrent=MAX_CONCURRENT_GENERATIONS,
+    max_queued=MAX_QUEUED_GENERATIONS,
+    retry_after=RETRY_AFTER_SECONDS
+)
+
+# Errors that abort the whole request (instead of being turned into error placeholders): the client must be told
+# that the model is not available, that the server is busy, or that the request has been cancelled.
+REQUEST_ABORT_ERRORS = (BackendNotReadyError, QueueFullError, RequestCancelledError)
+
+# --- 2.3 Micro-Batching Scheduler ---
+# Concurrent readers would be served one model.generate call at a time. Instead, when batching is enabled,
+# requests arriving within a short window are left-padded together in a single batched generate call (see scheduler.py).
+# Configuration is done through env variables:
+# - ADAPTEASE_BATCHING: "1" to enable the scheduler, "0" to call the model directly
+# - ADAPTEASE_MAX_BATCH_SIZE: max number of prompts in a single generate call
+# - ADAPTEASE_BATCH_WAIT_MS: how long the scheduler waits for more requests before running a batch
+# - ADAPTEASE_BATCH_LENGTH_RATIO: max ratio between the longest and the shortest prompt of a batch (limits padding waste)
+# - ADAPTEASE_PRIORITY_AGING: seconds of waiting after which a request gains one priority level (0 = never), so that
+#   the paragraphs below the fold are delayed by the visible ones, but never starve
+BATCHING_ENABLED = os.getenv("ADAPTEASE_BATCHING", "1") == "1"
+MAX_BATCH_SIZE = int(os.getenv("ADAPTEASE_MAX_BATCH_SIZE", "8"))
+BATCH_WAIT_MS = float(os.getenv("ADAPTEASE_BATCH_WAIT_MS", "20"))
+BATCH_LENGTH_RATIO = float(os.getenv("ADAPTEASE_BATCH_LENGTH_RATIO", "1.5"))
+PRIORITY_AGING_SECONDS = float(os.getenv("ADAPTEASE_PRIORITY_AGING", "5"))
+
+# The scheduler instance shared by the whole process (None if batching is disabled)
+batch_scheduler = BatchScheduler(
+    generate_fn=generate_scheduled_batch,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=BATCH_WAIT_MS,
+    max_length_ratio=BATCH_LENGTH_RATIO,
+    priority_aging_seconds=PRIORITY_AGING_SECONDS
+) if BATCHING_ENABLED else None
+
+# The torch profiler of the profiling windows runs in the worker of the scheduler, where the batched generations run
+# (the streamed ones run in their own request threads)
+if batch_scheduler is not None:
+    profiling_window.torch_runner = lambda fn: batch_scheduler.call_in_worker(fn).result()
+
+# Function that generates the answer of the LLM for the given system/user prompt, with the given generation settings
+# (a resolved generation profile) and token limit.
+# The request goes through the batch scheduler (if enabled), so concurrent calls share the same generate call.
+# prefix_key is the (operation, language) pair whose prompt template produced user_prompt (None if any).
+# monitor is the output monitor of the answer (see section 2.4), or None.
+def generate_text_from_llm(system_prompt, user_prompt, settings, max_new_tokens, prefix_key=None, monitor=None):
+
+    # A single prompt is just a batch of one: errors are raised to the caller
+    output = generate_many_from_llm([(system_prompt, user_prompt, max_new_tokens)], settings, prefix_key, [monitor])[0]
+    if isinstance(output, Exception):
+        raise output
+
+    return output
+
+# Function that generates the answers for many (system_prompt, user_prompt, max_new_tokens) requests at once.
+# It returns a list in the same order of prompts, where every item is either the answer or the exception
+# raised while generating it, so that a single failure doesn't fail the other prompts.
+# monitors optionally provides the output monitor of every prompt.
+def generate_many_from_llm(prompts, settings, prefix_key=None, monitors=None):
+
+    # We collect the answers as they complete, placing each of them at the index of its prompt
+    outputs = [None] * len(prompts)
+    for index, output in iter_many_from_llm(prompts, settings, prefix_key, monitors):
+        outputs[index] = output
+
+    return outputs
+
+# Function that generates the answers for many (system_prompt, user_prompt, max_new_tokens) requests at once, yielding
+# (index, answer or exception) pairs as soon as each answer is ready (so not necessarily in order).
+# The whole fan-out holds a single generation slot of the admission control.
+def iter_many_from_llm(prompts, settings, prefix_key=None, monitors=None):
+
+    request_context = get_request_context()
+    waiting_started = time.monotonic()
+    with admission_controller.admit(request_context):
+        record_span("admission_wait", waiting_started)
+        yield from iter_admitted_many_from_llm(prompts, settings, prefix_key, request_context, monitors)
+
+# Function that does the actual work of iter_many_from_llm, once admitted.
+def iter_admitted_many_from_llm(prompts, settings, prefix_key, request_context, monitors=None):
+
+    # Format every prompt with the chat template
+    llm_backend = get_backend()
+    with span("apply_chat_template", prompts=len(prompts)):
+        requests = [
+            {
+                "prompt_text": llm_backend.build_prompt_text(system_prompt, user_prompt, enable_thinking=settings["enable_thinking"]),
+                "max_new_tokens": max_new_tokens,
+                "context": request_context,
+                "monitor": monitor,
+                "queued_at": time.monotonic(),
+            }
+            for (system_prompt, user_prompt, max_new_tokens), monitor in zip(prompts, monitors or [None] * len(prompts))
+        ]
+
+    # With the scheduler, we submit everything at once: the prompts land in the same collection window and share batches.
+    # The length of a request (used to group similar requests) is the size of its prompt, and its priority is the
+    # current one of its request context (read when the batches are formed, so promotions apply while it waits).
+    group = scheduler_group_of(settings, prefix_key)
+    if batch_scheduler is not None:
+        futures = {
+            batch_scheduler.submit(
+                request, length=llm_backend.count_tokens(request["prompt_text"]), group=group,
+                priority=lambda: priority_of(request_context)
+            ): index
+            for index, request in enumerate(requests)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.exception() or future.result()
+        return
+
+    # Without the scheduler, we directly run padded batches of at most MAX_BATCH_SIZE prompts
+    for start in range(0, len(requests), MAX_BATCH_SIZE):
+        batch = requests[start:start + MAX_BATCH_SIZE]
+        try:
+            for offset, output in enumerate(generate_scheduled_batch(batch, group)):
+                yield start + offset, output
+
+        except Exception as e:
+
+            # A failing batch is retried one prompt at a time, so that only the faulty prompts get the error
+            log(f"Error during batched generation ({e}). Retrying the {len(batch)} prompt(s) one by one.", level="error")
+            for offset, request in enumerate(batch):
+                try:
+                    yield start + offset, generate_scheduled_batch([request], group)[0]
+                except Exception as single_error:
+                    yield start + offset, single_error
+
+# Function that generates the answer for the given system/user prompt, yielding the decoded text piece by piece.
+# Streaming requests bypass the batch scheduler, since the text has to be delivered while it is being generated.
+# The optional monitor stops the generation when it turns degenerate: the caller applies it to the whole answer at the end.
+def stream_text_from_llm(system_prompt, user_prompt, settings, max_new_tokens, prefix_key=None, monitor=None):
+
+    # Streams take a generation slot too
+    request_context = get_request_context()
+    waiting_started = time.monotonic()
+    with admission_controller.admit(request_context):
+        record_span("admission_wait", waiting_started)
+
+        # Apply the tokenizer's chat template to format the messages into a single string.
+        llm_backend = get_backend()
+        with span("apply_chat_template", prompts=1):
+            prompt_text = llm_backend.build_prompt_text(system_prompt, user_prompt, enable_thinking=settings["enable_thinking"])
+
+        # Forward the decoded pieces to the caller (timing the first one), then tell it if the stream has been cut short
+        stats, started, first_piece = {}, time.monotonic(), True
+        for piece in llm_backend.stream_generate(
+            prompt_text, max_new_tokens, settings, prefix=prompt_prefix(prefix_key, settings),
+            request_context=request_context, stats=stats, monitor=monitor
+        ):
+            if first_piece and piece:
+                generation_time_to_first_token_seconds.observe(time.monotonic() - started, operation=operation_of(prefix_key))
+                first_piece = False
+            yield piece
+        record_generation_metrics(operation_of(prefix_key), stats)
+        record_generation_trace(operation_of(prefix_key), stats, [request_context])
+        if request_context is not None:
+            request_context.check()
+
+# --- 2.4 Output Monitoring ---
+# Every chunk/simplify answer is read while it is decoded by an OutputMonitor (see parsing.py): the generation stops as soon
+# as the chunk blocks cover the whole input text, or when the output turns degenerate (loops, repeated n-grams, endless
+# lists, far too long), instead of running until the end-of-sequence token or max_new_tokens.
+# Degenerate answers are cut right before the degeneration; when nothing usable is left, the answer is replaced by a
+# DegenerateOutputError, which the task functions turn into their usual error fallback (never cached).
+# - ADAPTEASE_OUTPUT_MONITOR: "1" to monitor the answers, "0" to always let the generation run to its end
+OUTPUT_MONITOR_ENABLED = os.getenv("ADAPTEASE_OUTPUT_MONITOR", "1") == "1"
+
+# Function that returns a new monitor for an answer of operation on source_text (None if monitoring is disabled)
+def output_monitor_for(operation, source_text):
+    return OutputMonitor(operation, source_text) if OUTPUT_MONITOR_ENABLED else None
+
+# Function that applies a monitor to the answer it read: the answer is returned as it is unless the monitor stopped it,
+# in which case the text to keep (or a DegenerateOutputError) is returned instead. A covered chunk answer is kept up to
+# its last block (the last decoded piece may have started what follows).
+def apply_output_monitor(monitor, raw_output):
+    if monitor is None or not monitor.stopped:
+        return raw_output
+
+    # Why the generation stopped early is always reported
+    generation_early_stops_total.inc(operation=monitor.operation, reason=monitor.stop_reason)
+    log(f"Generation of a {monitor.operation} answer stopped early ({monitor.stop_reason}) after {len(monitor.text)} characters.", level="warning")
+    accepted_text = monitor.accepted_text()
+    if accepted_text is None:
+        return DegenerateOutputError(f"Degenerate output ({monitor.stop_reason}) before any usable answer.")
+    return accepted_text.strip()
+
+# --- 2.5 Long Article Segmentation ---
+# Articles longer than the window budget are not chunked in a single prompt: they are split on paragraph and sentence
+# boundaries (see segmentation.py) into windows that are chunked together, as one fan-out sharing the scheduler batches,
+# and whose blocks are merged back in order. The latency of a long article is then close to the one of a single window.
+# - ADAPTEASE_SEGMENT_MAX_TOKENS: max tokens of the text of a window (0 = never split)
+SEGMENT_MAX_TOKENS = int(os.getenv("ADAPTEASE_SEGMENT_MAX_TOKENS", "768"))
+
+# Function that returns the windows of an article to chunk (a single one for the texts within the budget)
+def segment_for_chunking(article_text_input, lang="en"):
+    return segment_text(article_text_input, lang, SEGMENT_MAX_TOKENS, count_text_tokens)
+
+# Function that builds the chunking prompts and output monitors of the windows of an article
+@traced("prompt_format")
+def window_chunk_prompts(windows, settings, lang="en"):
+    prompts = [
+        (*build_chunk_prompts(window["text"], lang=lang), max_new_tokens_for(settings, count_text_tokens(window["text"])))
+        for window in windows
+    ]
+    return prompts, [output_monitor_for("chunk", window["text"]) for window in windows]
 
 # --- 3. Task-Specific Functions (chunk_article, simplify_chunk) ---
 
+# Function that returns the content-addressed cache key of an operation ("chunk"/"simplify") on a text.
+# The generation settings of the key are the ones of the resolved generation profile (name included).
+# The text can be given by its content hash instead (text=None, text_hash=cache.content_hash(text)).
+def result_cache_key(operation, text, lang, profile=None, text_hash=None):
+    return make_cache_key(operation, lang, text, prompt_version_of(operation), resolve_generation_profile(operation, lang, profile), text_hash=text_hash)
+
+# Function that returns the prompt version of the results of an operation (simplification results depend on the mode)
+def prompt_version_of(operation):
+    return FUSED_PROMPT_VERSION if operation == "simplify" and SIMPLIFY_MODE == "fused" else PROMPT_VERSION
+
+# Function that returns the cached result of an operation on the text with the given content hash, or None.
+# It never generates anything: it serves the GET results endpoint, which can be cached by browsers and CDNs.
+def lookup_cached_result(operation, text_hash, lang, profile=None):
+    cached = result_cache.get(result_cache_key(operation, None, lang, profile, text_hash=text_hash))
+    return as_chunk_result(cached) if operation == "chunk" and cached is not None else cached
+
+# Functions that tell if a result is good enough to be stored in the cache: error placeholders and fallbacks
+# must not be cached, otherwise a transient failure would stick forever.
+# - For chunking, only the complete (parsed, plain, highlighted) triple is cached, never the error/fallback lists.
+# - For simplification, the result is cached only if nothing went wrong, neither in the chunking nor in any chunk.
+def is_cacheable_chunk_result(output):
+    return isinstance(output, tuple) and len(output) == 3
+
+def is_cacheable_simplify_result(output):
+    return bool(output) and not any(
+        isinstance(item, str) and item.startswith(("[Error during chunking:", "[Error simplifying chunk:"))
+        for item in output
+    )
+
+# Function that looks a result up in the result cache, recording the lookup (and its outcome) in the current trace
+def lookup_result(cache_key, operation):
+    with span("cache_lookup", operation=operation) as attributes:
+        cached = result_cache.get(cache_key)
+        attributes["hit"] = cached is not None
+    count(**{"cache_hits" if cached is not None else "cache_misses": 1})
+    return cached
+
+# Helper that serves a result from the result cache, or computes (and stores) it on a miss.
+# compute_fn is called only on a miss, while is_cacheable tells if the computed result is good enough to be stored.
+# The optional report is filled as described in section 7 (a hit reuses every unit, a miss of a single unit regenerates it).
+def cached_result(operation, text, lang, profile, compute_fn, is_cacheable, report=None):
+
+    # Content-addressed key of this request
+    cache_key = result_cache_key(operation, text, lang, profile)
+
+    # Cache lookup
+    cached = lookup_result(cache_key, operation)
+    if cached is not None:
+        log(f"--- Cache HIT for {operation} (Language: {lang.upper()}, key: {cache_key[:12]}) ---")
+        if report is not None:
+            report.update(cached_reuse_report(text))
+        return cached
+
+    # Cache miss: we compute the result and store it if valid
+    log(f"--- Cache MISS for {operation} (Language: {lang.upper()}, key: {cache_key[:12]}) ---")
+    result = compute_fn()
+    if is_cacheable(result):
+        result_cache.set(cache_key, result, operation=operation, lang=lang)
+    if report is not None and not report:
+        fill_reuse_report(report, 1)
+
+    return result
+
+# Function that removes results from the cache and returns how many entries were removed.
+# If a text is given, only the results for that text are removed (for the given operation, or both of them,
+# with every generation profile), otherwise everything matching the operation/lang filters is removed (everything, without filters).
+# The results of the paragraphs of a text (see section 7) are removed with it, so that they are not reused to rebuild it.
+def invalidate_cached_results(operation=None, lang=None, text=None):
+
+    # Filter based invalidation
+    if text is None:
+        return result_cache.invalidate(operation=operation, lang=lang)
+
+    # Text based invalidation: we rebuild the keys of that text for every requested operation/language
+    operations = [operation] if operation else ["chunk", "simplify"]
+    languages = [lang] if lang else list(LANGUAGE_MAP.keys())
+    texts = [text] + [unit for unit in article_units(text) if unit != text]
+    return sum(
+        result_cache.invalidate(key=result_cache_key(op, piece, lng, profile_name))
+        for op in operations for lng in languages for profile_name in GENERATION_PROFILES for piece in texts
+    )
+
 # Function that given a chunk of text, will try to split it in different, digestible smaller pieces. 
 # Given the target language, we'll instruct the LLM to do the translation.
-def chunk(article_text_input, lang="en"):
+# Results are served from the result cache when available.
+# profile is the name of the generation profile to use (None for the default one).
+# The optional report dictionary tells which paragraphs were reused (see section 7).
+def chunk(article_text_input, lang="en", profile=None, report=None):
+
+    # Cached lookup (or LLM call on a miss)
+    result = cached_result(
+        "chunk", article_text_input, lang, profile,
+        compute_fn=lambda: chunk_with_llm(article_text_input, lang=lang, profile=profile, report=report),
+        is_cacheable=is_cacheable_chunk_result, report=report
+    )
+
+    # JSON (the disk tier) has no tuples, so we always give back the triple in its original form
+    return as_chunk_result(result)
+
+# Function that converts a cached chunking result (a list of three lists, once read back from JSON) in its original triple form.
+def as_chunk_result(result):
+    return tuple(result) if isinstance(result, list) and len(result) == 3 and all(isinstance(r, list) for r in result) else result
+
+# Function that performs the actual chunking through the LLM, bypassing the cache of the whole article.
+def chunk_with_llm(article_text_input, lang="en", profile=None, report=None):
+
+    # Articles with several paragraphs are processed paragraph by paragraph, reusing the cached ones (see section 7)
+    units = article_units(article_text_input)
+    if len(units) > 1:
+        return units_with_llm("chunk", units, article_text_input, lang=lang, profile=profile, report=report)
 
     # Activation call
-    print(f"\n--- Calling LLM for Chunking (Language: {lang.upper()}) ---")
+    log(f"--- Calling LLM for Chunking (Language: {lang.upper()}) ---")
+
+    # Long articles are chunked window by window (see section 2.5)
+    windows = segment_for_chunking(article_text_input, lang)
+    if len(windows) > 1:
+        return chunk_windows_with_llm(article_text_input, windows, lang=lang, profile=profile)
+
+    # System/user prompts for the required language
+    chunking_system_prompt, chunking_user_prompt = build_chunk_prompts(article_text_input, lang=lang)
     
+    # LLM call to process the text 
+    try:
+
+        # Generation settings, and token limit proportional to the size of the article
+        settings = resolve_generation_profile("chunk", lang, profile)
+        max_new_tokens = max_new_tokens_for(settings, count_text_tokens(article_text_input))
+
+        # Raw output containing the answer from the LLM. This include the CoT blocks.
+        raw_llm_output = generate_text_from_llm(
+            chunking_system_prompt, chunking_user_prompt, settings, max_new_tokens, prefix_key=("chunk", lang),
+            monitor=output_monitor_for("chunk", article_text_input)
+        )
+        log("--- Raw Chunked Text from LLM: DONE ---")
+
+        # Cleanup and parsing of the raw output
+        return parse_chunked_output(raw_llm_output, article_text_input)
+
+    # Without a model (or a generation slot) there is nothing to fall back to: the caller has to retry later
+    except REQUEST_ABORT_ERRORS:
+        raise
+
+    except Exception as e:
+
+        # If something happens during those phases, print the error and return the sample article 
+        log(f"Error during chunking LLM call: {e}", level="error")
+        record_fallback("chunk", "chunk_error")
+        return [f"[Error during chunking: {e}]", article_text_input.strip()]
+
+# Function that chunks the windows of a long article together, and merges their blocks in the order of the article.
+# A window whose generation fails fails the whole article, with the same fallback of chunk_with_llm.
+def chunk_windows_with_llm(article_text_input, windows, lang="en", profile=None):
+
+    log(f"Article split into {len(windows)} windows of at most {SEGMENT_MAX_TOKENS} tokens.")
+    settings = resolve_generation_profile("chunk", lang, profile)
+    prompts, monitors = window_chunk_prompts(windows, settings, lang=lang)
+
+    try:
+
+        # Every window is generated (and parsed) on its own, then the blocks are merged
+        window_results = []
+        for window, raw_llm_output in zip(windows, generate_many_from_llm(prompts, settings, prefix_key=("chunk", lang), monitors=monitors)):
+            if isinstance(raw_llm_output, Exception):
+                raise raw_llm_output
+            window_results.append(parse_chunked_output(raw_llm_output, window["text"]))
+        log("--- Raw Chunked Windows from LLM: DONE ---")
+
+        return merge_window_chunks(window_results, windows)
+
+    # Without a model (or a generation slot) there is nothing to fall back to: the caller has to retry later
+    except REQUEST_ABORT_ERRORS:
+        raise
+
+    except Exception as e:
+        log(f"Error during windowed chunking LLM call: {e}", level="error")
+        record_fallback("chunk", "chunk_error")
+        return [f"[Error during chunking: {e}]", article_text_input.strip()]
+
+# Function that builds the system/user prompts to chunk an article in the required language.
+@traced("prompt_format")
+def build_chunk_prompts(article_text_input, lang="en"):
+
     # We extract the language from which we'll load the specific prompt from the file, given the language map.
     language_name = LANGUAGE_MAP.get(lang.lower())
 
@@ -291,90 +989,89 @@ def chunk(article_text_input, lang="en"):
 
     # Replace placeholders in the user prompt with the one passed in input 
     chunking_user_prompt = chunking_user_prompt.format(article_text_input=article_text_input, language_name=language_name)
-    
-    # LLM call to process the text 
-    try:
 
-        # Raw output containing the answer from the LLM. This include the CoT blocks.
-        raw_llm_output = generate_text_from_llm(chunking_system_prompt, chunking_user_prompt, max_new_tokens=4096)
-        print("\n--- Raw Chunked Text from LLM: DONE ---")
-        
+    return chunking_system_prompt, chunking_user_prompt
 
-        # --- More Targeted Python Cleanup based on the model output ---
-        cleaned_output = raw_llm_output
+# Function that cleans and parses the raw chunking output of the LLM.
+# It returns the (parsed_chunks, plain_text_chunks, highlighted_text_chunks) triple, or the whole
+# article as a single chunk if nothing could be parsed.
+@traced("postprocess")
+def parse_chunked_output(raw_llm_output, article_text_input):
 
-        # 1. Remove <think> block if present
-        think_pattern = re.compile(r"<think>.*?</think>\s*\n*", re.DOTALL | re.IGNORECASE)
-        cleaned_output = think_pattern.sub("", cleaned_output).strip()
-        
-        # 2. Remove "**Chunk X:**" labels if present (and any leading/trailing whitespace around them)
-        # This regex looks for "**Chunk" followed by digits, then ":**" and optional whitespace.
-        chunk_label_pattern = re.compile(r"^\s*\*\*Chunk\s*\d+:\*\*\s*\n?", re.MULTILINE | re.IGNORECASE)
-        cleaned_output = chunk_label_pattern.sub("", cleaned_output).strip()
-        
-        # 3. Sometimes, after removing labels, there might be extra empty lines at the start.
-        # Let's also strip leading/trailing whitespace from the whole block again.
-        cleaned_output = cleaned_output.strip()
+    # --- More Targeted Python Cleanup based on the model output ---
+    cleaned_output = raw_llm_output
 
-        # If cleaning resulted in an empty string
-        if not cleaned_output: 
+    # 1. Remove <think> block if present
+    cleaned_output = THINK_PATTERN.sub("", cleaned_output).strip()
+    
+    # 2. Remove "**Chunk X:**" labels if present (and any leading/trailing whitespace around them)
+    # This regex looks for "**Chunk" followed by digits, then ":**" and optional whitespace.
+    cleaned_output = CHUNK_LABEL_PATTERN.sub("", cleaned_output).strip()
+    
+    # 3. Sometimes, after removing labels, there might be extra empty lines at the start.
+    # Let's also strip leading/trailing whitespace from the whole block again.
+    cleaned_output = cleaned_output.strip()
 
-            # Print the info in the console and return the sample input article 
-            print("Warning: LLM output became empty after cleanup. Using the whole text as one chunk.")
-            return [article_text_input.strip()]
+    # If cleaning resulted in an empty string
+    if not cleaned_output: 
 
-        # Now parse the cleaned output using a simple list cohmprension split 
-        parsed_chunks = [chunk.strip() for chunk in cleaned_output.split('\n\n') if chunk.strip()]
+        # Print the info in the console and return the sample input article 
+        log("Warning: LLM output became empty after cleanup. Using the whole text as one chunk.", level="warning")
+        record_fallback("chunk", "empty_output")
+        return [article_text_input.strip()]
 
-        # As above, if the cleaning strip resulted in an empty string 
-        if not parsed_chunks:
+    # Now parse the cleaned output using a simple list cohmprension split 
+    parsed_chunks = [chunk.strip() for chunk in cleaned_output.split('\n\n') if chunk.strip()]
 
-            # Print the info in the console and return the sample input article 
-            print("Warning: Could not parse chunks from LLM output after cleanup. Using the whole text as one chunk for safety.")
-            return [article_text_input.strip()]
-        
-        # VISUAL INFO: PRINT CHUNKED ARTICLES (NOT NEEDED IF NOT EXPLICITED)
-        """
-        print("--- Cleaned and Parsed Chunks ---")
-        for i, p_chunk in enumerate(parsed_chunks):
-            print(f"Chunk {i+1}: {p_chunk}")
-        """
-
-        # After the chunk is sanitized, we can split it even further into two different lists: 
-        # One with the plain text and one with the highlighted text. 
-        # We still need to try this because we don't know if the LLM will always output the text in the correct format. 
-        # If the try fails, we will return the original chunk as a fallback.
-        # We use the newlines to split the text into two lists.    
-        try:
+    # As above, if the cleaning strip resulted in an empty string 
+    if not parsed_chunks:
 
-            # Sometimes, the LLM returns chunks in this format: ["chunk1_not_highlighted\nChunk1_highlighted", "chunk2..."]
-            # So we need to parse, if possible, this potential output. 
-            plain_text_chunks = [chunk.split('\n')[0] for chunk in parsed_chunks]
-            highlighted_text_chunks = [chunk.split('\n')[1] for chunk in parsed_chunks]
+        # Print the info in the console and return the sample input article 
+        log("Warning: Could not parse chunks from LLM output after cleanup. Using the whole text as one chunk for safety.", level="warning")
+        record_fallback("chunk", "empty_output")
+        return [article_text_input.strip()]
+    
+    # VISUAL INFO: PRINT CHUNKED ARTICLES (NOT NEEDED IF NOT EXPLICITED)
+    """
+    log("--- Cleaned and Parsed Chunks ---")
+    for i, p_chunk in enumerate(parsed_chunks):
+        log(f"Chunk {i+1}: {p_chunk}")
+    """
 
-        except Exception as e:
-            
-            # If an exception occur, the format we were trying to split wasn't correct and we just return 
-            # the parsed chunks three times instead.
-            print(f"Error during chunk splitting: {e}")
-            return parsed_chunks, parsed_chunks, parsed_chunks
+    # After the chunk is sanitized, we can split it even further into two different lists: 
+    # One with the plain text and one with the highlighted text. 
+    # We still need to try this because we don't know if the LLM will always output the text in the correct format. 
+    # If the try fails, we will return the original chunk as a fallback.
+    # We use the newlines to split the text into two lists.    
+    try:
 
-        # After this, we return the sanitized, splitted output of the LLM.
-        return parsed_chunks, plain_text_chunks, highlighted_text_chunks
+        # Sometimes, the LLM returns chunks in this format: ["chunk1_not_highlighted\nChunk1_highlighted", "chunk2..."]
+        # So we need to parse, if possible, this potential output. 
+        plain_text_chunks = [chunk.split('\n')[0] for chunk in parsed_chunks]
+        highlighted_text_chunks = [chunk.split('\n')[1] for chunk in parsed_chunks]
 
     except Exception as e:
+        
+        # If an exception occur, the format we were trying to split wasn't correct and we just return 
+        # the parsed chunks three times instead.
+        log(f"Error during chunk splitting: {e}", level="error")
+        record_fallback("chunk", "unsplit_chunks")
+        return parsed_chunks, parsed_chunks, parsed_chunks
 
-        # If something happens during those phases, print the error and return the sample article 
-        print(f"Error during chunking LLM call: {e}")
-        return [f"[Error during chunking: {e}]", article_text_input.strip()]
+    # After this, we return the sanitized, splitted output of the LLM.
+    return parsed_chunks, plain_text_chunks, highlighted_text_chunks
 
 # Function that, given a text chunk, will simplify it removing paraphrases, metaphors, difficult terms etc.
 # We do this in the required language, as above.
-def simplify_chunk(text_chunk, lang="en"):
+def simplify_chunk(text_chunk, lang="en", profile=None):
+
+    # A single chunk is just a batch of one
+    return simplify_chunks([text_chunk], lang=lang, profile=profile)[0]
+
+# Function that builds the system/user prompts to simplify a text chunk in the required language.
+@traced("prompt_format")
+def build_simplify_prompts(text_chunk, lang="en"):
 
-    # Activation call
-    print(f"\n--- Calling LLM for Simplifying Chunk (Language: {lang.upper()}): '{text_chunk[:50]}...' ---")
-    
     # As above, by the language passed in input, we fetch the right element from the language map 
     language_name = LANGUAGE_MAP.get(lang.lower())
 
@@ -385,54 +1082,126 @@ def simplify_chunk(text_chunk, lang="en"):
     # Replace placeholders in the user prompt
     simplification_user_prompt = simplification_user_prompt.format(text_chunk=text_chunk, language_name=language_name)  
 
-    # Call the LLM
-    try:
+    return simplification_system_prompt, simplification_user_prompt
 
-        # Raw output containing the answer from the LLM. This include the CoT blocks.
-        raw_llm_output = generate_text_from_llm(simplification_system_prompt, simplification_user_prompt, max_new_tokens=4096)
+# Function that cleans the raw output of the LLM for a simplified chunk.
+@traced("postprocess")
+def clean_simplified_output(raw_llm_output):
 
-        # Coping the output into the final output string 
-        simplified_text = raw_llm_output
+    # Coping the output into the final output string 
+    simplified_text = raw_llm_output
 
-        # Remove the <think> block if present
-        think_pattern = re.compile(r"<think>.*?</think>\s*\n*", re.DOTALL | re.IGNORECASE)
-        simplified_text = think_pattern.sub("", simplified_text).strip()
+    # Remove the <think> block if present
+    simplified_text = THINK_PATTERN.sub("", simplified_text).strip()
 
-        # Further attempt to clean common unwanted prefixes if the model still adds them
-        common_prefixes_to_remove = [
-            "Here is the rewritten text chunk:",
-            "Rewritten Text Chunk:",
-            "Simplified Chunk:",
-            "Here's the rewritten text chunk:"
-        ]
+    # Further attempt to clean common unwanted prefixes if the model still adds them
+    common_prefixes_to_remove = [
+        "Here is the rewritten text chunk:",
+        "Rewritten Text Chunk:",
+        "Simplified Chunk:",
+        "Here's the rewritten text chunk:"
+    ]
 
-        # For each element of the above list, we iterate through each of them 
-        for prefix in common_prefixes_to_remove:
+    # For each element of the above list, we iterate through each of them 
+    for prefix in common_prefixes_to_remove:
 
-            # We control if the string starts with one of them 
-            if simplified_text.lower().startswith(prefix.lower()):
+        # We control if the string starts with one of them 
+        if simplified_text.lower().startswith(prefix.lower()):
 
-                # If so, we strip the string from that prefix and break, 
-                # Removing only the first matching prefix
-                simplified_text = simplified_text[len(prefix):].lstrip()
-                break
+            # If so, we strip the string from that prefix and break, 
+            # Removing only the first matching prefix
+            simplified_text = simplified_text[len(prefix):].lstrip()
+            break
 
-        # After the string has been sanitized, we return it 
-        return simplified_text
-    
-    except Exception as e:
-    
-        # If something happens during those phases, print the error and return the sample article 
-        print(f"Error during chunking LLM call: {e}")
-        print(f"Error during simplification LLM call: {e}")
-        return f"[Error simplifying chunk: {text_chunk[:50]}... - {e}]"
+    # After the string has been sanitized, we return it 
+    return simplified_text
+
+# Function that simplifies all the given text chunks at once.
+# All the prompts are sent to the model together (through the batch scheduler, or as padded batches), so the
+# latency of an article approaches the one of its slowest chunk instead of the sum of all of them.
+# Results keep the order of text_chunks, and a failing chunk gets its error placeholder without failing the others.
+def simplify_chunks(text_chunks, lang="en", profile=None):
+
+    # We collect the simplified chunks as they complete, placing each of them at the index of its chunk
+    simplified_chunks_list = [None] * len(text_chunks)
+    for index, simplified_text in iter_simplified_chunks(text_chunks, lang=lang, profile=profile):
+        simplified_chunks_list[index] = simplified_text
+
+    # We return the simplified list, in the same order of the input chunks
+    return simplified_chunks_list
+
+# Function that simplifies all the given text chunks at once, yielding (index, simplified_text) pairs
+# as soon as each chunk is ready (so not necessarily in order).
+def iter_simplified_chunks(text_chunks, lang="en", profile=None):
+
+    # Activation call
+    log(f"--- Calling LLM for Simplifying {len(text_chunks)} Chunk(s) (Language: {lang.upper()}) ---")
+
+    # Generation settings shared by every chunk
+    settings = resolve_generation_profile("simplify", lang, profile)
+
+    # Build the prompts of every chunk (each with a token limit proportional to its size) and generate all of them together
+    prompts = [
+        (*build_simplify_prompts(text_chunk, lang=lang), max_new_tokens_for(settings, count_text_tokens(text_chunk)))
+        for text_chunk in text_chunks
+    ]
+    monitors = [output_monitor_for("simplify", text_chunk) for text_chunk in text_chunks]
+    for index, raw_llm_output in iter_many_from_llm(prompts, settings, prefix_key=("simplify", lang), monitors=monitors):
+
+        # The whole request has been cancelled: there is no point in going on with the other chunks
+        if isinstance(raw_llm_output, REQUEST_ABORT_ERRORS):
+            raise raw_llm_output
+
+        try:
+
+            # The generation of this chunk failed: we re-raise its error, handled right below
+            if isinstance(raw_llm_output, Exception):
+                raise raw_llm_output
+
+            # Raw output containing the answer from the LLM. This include the CoT blocks.
+            simplified_text = clean_simplified_output(raw_llm_output)
+            log(f"Chunk {index} Simplified: OK")
+
+        except Exception as e:
+
+            # If something happens during those phases, print the error and use the error placeholder for this chunk
+            log(f"Error during simplification LLM call: {e}", level="error")
+            record_fallback("simplify", "simplify_chunk_error")
+            simplified_text = f"[Error simplifying chunk: {text_chunks[index][:50]}... - {e}]"
+
+        yield index, simplified_text
 
 # --- 4. Text Simplification Orchestrator (New) ---
 # Function that Chunks an article and then simplifies each chunk.
-def simplify(article_text_input, lang="en"):
+# Results are served from the result cache when available.
+# The optional report dictionary tells which paragraphs were reused (see section 7).
+def simplify(article_text_input, lang="en", profile=None, report=None):
+
+    # Cached lookup (or LLM calls on a miss)
+    return cached_result(
+        "simplify", article_text_input, lang, profile,
+        compute_fn=lambda: simplify_with_llm(article_text_input, lang=lang, profile=profile, report=report),
+        is_cacheable=is_cacheable_simplify_result, report=report
+    )
+
+# Function that performs the actual simplification through the LLM, bypassing the cache of the whole article.
+def simplify_with_llm(article_text_input, lang="en", profile=None, report=None):
+
+    # Articles with several paragraphs are processed paragraph by paragraph, reusing the cached ones (see section 7).
+    # The blocks of a paragraph are simplified on their own anyway, so the result is the one of the whole article.
+    units = article_units(article_text_input)
+    if len(units) > 1:
+        return units_with_llm("simplify", units, article_text_input, lang=lang, profile=profile, report=report)
+
+    # Fused mode: a single generation chunks and simplifies the article, unless its answer is malformed (see section 4.1)
+    if uses_fused_simplification(article_text_input, lang):
+        simplified_blocks = simplify_fused_with_llm(article_text_input, lang=lang, profile=profile)
+        if simplified_blocks is not None:
+            return simplified_blocks
+        log("Fused simplification failed: falling back to the two-stage simplification.", level="warning")
     
     # --- Stage 1: Chunk the article ---
-    print("\n--- Attempting to Chunk Article ---")
+    log("--- Attempting to Chunk Article ---")
     
     # We call the chunk_article function. It should returns three elements: 
     # - parsed_chunks (which contain everything, highlighted and non text)
@@ -440,13 +1209,16 @@ def simplify(article_text_input, lang="en"):
     # - highlighted_text_chunks (text with highlight content and markdown)
     # We only need the parsed chunks because more context (highlighted and not) means more stability 
     # in the semplification.
-    parsed_chunks, _, _ = chunk(article_text_input, lang=lang)
+    # When chunking fails, chunk returns the error/fallback list instead of the triple (checked below), and when the
+    # LLM output couldn't be parsed, the whole article as a single chunk (a plain list), which we simplify as it is.
+    chunk_result = chunk(article_text_input, lang=lang, profile=profile)
+    parsed_chunks = chunk_result[0] if is_cacheable_chunk_result(chunk_result) else chunk_result
 
     # If the parsed chunks are empty 
     if not parsed_chunks:
 
         # We log it and return an empty list 
-        print("Critical Error: chunk_article returned no data (e.g., None or empty list).")
+        log("Critical Error: chunk_article returned no data (e.g., None or empty list).", level="error")
         return [] 
 
     # If chunk_article returns an error, it will be a list like:
@@ -458,13 +1230,13 @@ def simplify(article_text_input, lang="en"):
     if is_chunking_error:
 
         # Print the error 
-        print(f"Chunking Error: {parsed_chunks[0]}")
+        log(f"Chunking Error: {parsed_chunks[0]}", level="error")
 
         # This checks if the parsed_chunks list contains more than one element. When chunk_article encounters an error, 
         # it's designed to return a list where the first element is an error message (e.g., "[Error during chunking: ...]") 
         # and the second element might be the original input text as a fallback.
         if len(parsed_chunks) > 1 and isinstance(parsed_chunks[1], str): 
-            print(f"Original text (fallback, if provided by error handler): '{parsed_chunks[1][:100]}...'")
+            log(f"Original text (fallback, if provided by error handler): '{parsed_chunks[1][:100]}...'")
         
         # If a chunking error occurred, return the parsed_chunks directly.
         # This list will contain the error message and potentially the original text as a fallback,
@@ -472,44 +1244,670 @@ def simplify(article_text_input, lang="en"):
         return parsed_chunks 
 
     # Console INFO about how many chunks have been processed 
-    print(f"\nArticle processed into {len(parsed_chunks)} chunk(s):")
+    log(f"Article processed into {len(parsed_chunks)} chunk(s):")
 
     # Info about the state of the chunking, it may not directly split into various chunks and returns as one
     if len(parsed_chunks) == 1 and parsed_chunks[0] == article_text_input.strip() and not is_chunking_error:
-        print("(Note: Article may not have been split by the LLM; was processed as a single chunk)")
+        log("(Note: Article may not have been split by the LLM; was processed as a single chunk)")
 
     # VISUAL PURPOSE: Iterate through the parsed chunks and print each one for verification.
     """
     for i, chunk_text_iter in enumerate(parsed_chunks):
-        print(f"Chunk {i+1}: {chunk_text_iter}")
+        log(f"Chunk {i+1}: {chunk_text_iter}")
     """
         
     # --- Stage 2: Simplify each chunk ---
-    print("\n--- Attempting to Simplify Chunks ---")
+    log("--- Attempting to Simplify Chunks ---")
     
-    # Initially, the simplified chunk list is empty (no chunks simplified)
-    simplified_chunks_list = []
+    # All the chunks are simplified together: their prompts share the same batched generate calls
+    # instead of costing one full sequential generation each.
+    return simplify_chunks(parsed_chunks, lang=lang, profile=profile)
+
+# --- 4.1 Fused Chunk-and-Simplify ---
+# The two-stage simplification prefills the text twice (chunking, then every chunk) and waits for two generations in a row.
+# In the fused mode, a single prompt per language (see FUSED_SIMPLIFY_PROMPT_FILE_PATH) asks for the chunks and their
+# simplified version in one answer, every block written as an <original> section followed by a <simplified> one (see
+# parsing.parse_fused_blocks). Malformed answers (untagged text, truncated sections, part of the article left out) and
+# failed generations fall back to the two-stage path, so the mode never returns less than the two-stage one would.
+# Articles longer than the window budget (see section 2.5) always use the two-stage path, whose chunking is windowed.
+# Fused results are cached under their own prompt version (see prompt_version_of), so switching mode never serves the
+# results of the other one. bench/fused.py compares the two paths (latency, generated tokens, output parity).
+# - ADAPTEASE_SIMPLIFY_MODE: "two_stage" (default) or "fused"
+SIMPLIFY_MODES = ("two_stage", "fused")
+SIMPLIFY_MODE = os.getenv("ADAPTEASE_SIMPLIFY_MODE", "two_stage")
+if SIMPLIFY_MODE not in SIMPLIFY_MODES:
+    raise ValueError(f"Unknown simplification mode '{SIMPLIFY_MODE}'. Available modes: {', '.join(SIMPLIFY_MODES)}")
+
+# Minimum size (in words) of the original sections of a fused answer, relative to the article: below it, the model
+# left part of the article out
+FUSED_MIN_COVERAGE_RATIO = 0.6
+
+# Function that tells if an article is simplified with the fused prompt (fused mode, and a single window)
+def uses_fused_simplification(article_text_input, lang="en"):
+    return SIMPLIFY_MODE == "fused" and len(segment_for_chunking(article_text_input, lang)) == 1
+
+# Function that builds the system/user prompts to chunk and simplify an article in a single answer.
+@traced("prompt_format")
+def build_fused_simplify_prompts(article_text_input, lang="en"):
+    language_name = LANGUAGE_MAP.get(lang.lower())
+    system_prompt = fused_simplify_prompts[lang.lower()].get("system_prompt", "")
+    user_prompt = fused_simplify_prompts[lang.lower()].get("user_prompt", "")
+    return system_prompt, user_prompt.format(article_text_input=article_text_input, language_name=language_name)
+
+# Function that returns the generation settings and the token limit of a fused answer. The answer holds both the chunks and
+# their simplified version, so its expected size is the sum of the two stages (the thinking budget is the simplification one).
+def fused_generation_settings(article_text_input, lang="en", profile=None):
+    settings = resolve_generation_profile("simplify", lang, profile)
+    chunk_settings = resolve_generation_profile("chunk", lang, profile)
+    answer_settings = dict(settings, output_ratio=settings["output_ratio"] + chunk_settings["output_ratio"])
+    return settings, max_new_tokens_for(answer_settings, count_text_tokens(article_text_input))
+
+# Function that parses a fused answer into the simplified blocks (the same list simplify() returns), or returns None
+# when the answer is malformed.
+@traced("postprocess")
+def parse_fused_output(raw_llm_output, article_text_input):
+    blocks = parse_fused_blocks(THINK_PATTERN.sub("", raw_llm_output).strip())
+    if blocks is None:
+        log("Warning: Fused simplification output is not in the expected format.", level="warning")
+        record_fallback("simplify", "fused_malformed")
+        return None
+
+    # The original sections must cover (most of) the article, otherwise a part of it would be silently lost
+    covered_words = sum(len(normalized_words(original)) for original, _ in blocks)
+    if covered_words < FUSED_MIN_COVERAGE_RATIO * len(normalized_words(article_text_input)):
+        log(f"Warning: Fused simplification output covers {covered_words} words of the article only.", level="warning")
+        record_fallback("simplify", "fused_incomplete")
+        return None
+
+    return [clean_simplified_output(simplified) for _, simplified in blocks]
+
+# Function that chunks and simplifies an article with a single generation of the fused prompt.
+# It returns the simplified blocks, or None when the answer can't be used (the caller falls back to the two-stage path).
+def simplify_fused_with_llm(article_text_input, lang="en", profile=None):
+
+    log(f"--- Calling LLM for Fused Simplification (Language: {lang.upper()}) ---")
+    settings, max_new_tokens = fused_generation_settings(article_text_input, lang=lang, profile=profile)
+    try:
+        raw_llm_output = generate_text_from_llm(
+            *build_fused_simplify_prompts(article_text_input, lang=lang), settings, max_new_tokens,
+            prefix_key=("simplify_fused", lang), monitor=output_monitor_for("simplify_fused", article_text_input)
+        )
 
-    # For each parsed chunk
-    for i, chunk_text_iter in enumerate(parsed_chunks): 
-        
-        # VISUAL INFO: Print the preview of the chunk to be simplified 
-        """
-        preview_text = chunk_text_iter
-        print(f"Simplifying Chunk {i+1}/{len(parsed_chunks)} (starts with: '{preview_text}...')")
-        """
+    # Without a model (or a generation slot) the two-stage path would fail as well: the caller has to retry later
+    except REQUEST_ABORT_ERRORS:
+        raise
+
+    except Exception as e:
+        log(f"Error during fused simplification LLM call: {e}", level="error")
+        record_fallback("simplify", "fused_error")
+        return None
+
+    log("--- Raw Fused Simplification from LLM: DONE ---")
+    return parse_fused_output(raw_llm_output, article_text_input)
+
+# Streaming variant of simplify_fused_with_llm, used by stream_simplify: it yields progress events while the answer is
+# generated, and returns the simplified blocks (or None, as simplify_fused_with_llm does). The blocks are only sent once
+# the whole answer has been validated, since a malformed answer is replaced by the two-stage result.
+def stream_fused_simplify(article_text_input, lang="en", profile=None):
+
+    log(f"--- Streaming LLM Fused Simplification (Language: {lang.upper()}) ---")
+    settings, max_new_tokens = fused_generation_settings(article_text_input, lang=lang, profile=profile)
+    monitor = output_monitor_for("simplify_fused", article_text_input)
+    raw_pieces, last_progress = [], 0.0
+    try:
+        for piece in stream_text_from_llm(
+            *build_fused_simplify_prompts(article_text_input, lang=lang), settings, max_new_tokens,
+            prefix_key=("simplify_fused", lang), monitor=monitor
+        ):
+            raw_pieces.append(piece)
+            if time.monotonic() - last_progress >= STREAM_PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                raw_output = "".join(raw_pieces)
+                phase = "thinking" if "<think>" in raw_output and "</think>" not in raw_output else "writing"
+                yield {"event": "progress", "stage": "simplifying", "phase": phase, "generated": len(raw_pieces)}
+
+        raw_llm_output = apply_output_monitor(monitor, "".join(raw_pieces))
+        if isinstance(raw_llm_output, Exception):
+            raise raw_llm_output
+
+    except REQUEST_ABORT_ERRORS:
+        raise
+
+    except Exception as e:
+        log(f"Error during streamed fused simplification LLM call: {e}", level="error")
+        record_fallback("simplify", "fused_error")
+        return None
+
+    return parse_fused_output(raw_llm_output, article_text_input)
+
+# --- 5. Streaming Variants ---
+# The functions above return only after the whole generation (including the discarded <think> block) has finished.
+# The streaming variants below yield events as soon as something is ready, so the widget can render the blocks
+# as they arrive. Every event is a dictionary with an "event" field:
+# - {"event": "progress", "stage": ..., "phase": ..., ...}: the model is working (e.g. still thinking)
+# - {"event": "chunk", "index": i, "text": ...}: a finished block, at position i of the final list
+# - {"event": "done", "result": ..., "cached": ..., "reuse": ...}: the final result, the same chunk()/simplify() would
+#   return, with the reuse report of its paragraphs (see section 7)
+# Results are read from and stored in the result cache exactly as in the non-streaming functions.
+
+# Minimum interval (in seconds) between two progress events
+STREAM_PROGRESS_INTERVAL = float(os.getenv("ADAPTEASE_STREAM_PROGRESS_INTERVAL", "0.5"))
+
+# Streaming variant of chunk(). Chunk events carry the displayable (highlighted) text of each block.
+def stream_chunk(article_text_input, lang="en", profile=None):
+
+    # Cache lookup: on a hit, every block is immediately available
+    cache_key = result_cache_key("chunk", article_text_input, lang, profile)
+    cached = lookup_result(cache_key, "chunk")
+    if cached is not None:
+        log(f"--- Cache HIT for streamed chunk (Language: {lang.upper()}, key: {cache_key[:12]}) ---")
+        result = as_chunk_result(cached)
+        for index, block in enumerate(result[0]):
+            yield {"event": "chunk", "index": index, "text": highlighted_text_of(block)}
+        yield {"event": "done", "result": result, "cached": True, "reuse": cached_reuse_report(article_text_input)}
+        return
+
+    # Activation call
+    log(f"--- Streaming LLM Chunking (Language: {lang.upper()}) ---")
+    chunking_system_prompt, chunking_user_prompt = build_chunk_prompts(article_text_input, lang=lang)
+    settings = resolve_generation_profile("chunk", lang, profile)
+    units = article_units(article_text_input)
+    windows = segment_for_chunking(article_text_input, lang) if len(units) == 1 else None
+    report = {}
+
+    # The incremental parser recognizes the blocks while the text is being decoded
+    parser = ChunkStreamParser()
+    raw_pieces = []
+    last_progress = 0.0
+    monitor = output_monitor_for("chunk", article_text_input)
+
+    try:
+
+        # Articles with several paragraphs: the paragraphs are processed on their own, reusing the cached ones (see section 7)
+        if len(units) > 1:
+            result = yield from stream_units("chunk", units, article_text_input, lang=lang, profile=profile, report=report)
 
-        # Print the number of chunks currently in simplification out of all the chunks 
-        print(f"Simplifying chunk {i} of {len(parsed_chunks)}.")
+        # Long articles: the windows are generated together, and their blocks are sent as the windows complete
+        elif len(windows) > 1:
+            result = yield from stream_chunk_windows(windows, settings, lang=lang)
 
-        # We pass the chunked text block to the simplify function alongside the desired lang
-        simplified_chunk_text = simplify_chunk(chunk_text_iter, lang=lang)
+        else:
 
-        # After the inference, we append it to the list 
-        simplified_chunks_list.append(simplified_chunk_text)
+            # Consume the decoded pieces
+            max_new_tokens = max_new_tokens_for(settings, count_text_tokens(article_text_input))
+            for piece in stream_text_from_llm(chunking_system_prompt, chunking_user_prompt, settings, max_new_tokens, prefix_key=("chunk", lang), monitor=monitor):
+                raw_pieces.append(piece)
 
-        # We print the result
-        print(f"Chunk {i} Simplified: OK")
+                # Every completed block is sent right away
+                yield from chunk_events(parser, parser.feed(piece))
+
+                # While the model is thinking, we periodically report that it is still working
+                if parser.phase != "writing" and time.monotonic() - last_progress >= STREAM_PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    yield {"event": "progress", "stage": "chunking", "phase": parser.phase, "generated": parser.thinking_pieces}
+
+            # The last block is complete only when the generation ends
+            yield from chunk_events(parser, parser.finish())
+
+            # The final result is parsed from the whole output (cut before any degeneration), exactly as chunk() does
+            raw_llm_output = apply_output_monitor(monitor, "".join(raw_pieces))
+            if isinstance(raw_llm_output, Exception):
+                raise raw_llm_output
+            result = parse_chunked_output(raw_llm_output, article_text_input)
+
+    # Without a model (or a generation slot) there is nothing to fall back to: the caller has to retry later
+    except REQUEST_ABORT_ERRORS:
+        raise
+
+    except Exception as e:
 
-    # We return the simplified list
-    return simplified_chunks_list
\ No newline at end of file
+        # Same fallback of chunk_with_llm
+        log(f"Error during streamed chunking LLM call: {e}", level="error")
+        record_fallback("chunk", "chunk_error")
+        result = [f"[Error during chunking: {e}]", article_text_input.strip()]
+
+    # Store the result (if valid) and send it
+    if is_cacheable_chunk_result(result):
+        result_cache.set(cache_key, result, operation="chunk", lang=lang)
+    if not report:
+        fill_reuse_report(report, 1)
+    yield {"event": "done", "result": result, "cached": False, "reuse": report}
+
+# Helper of stream_chunk for long articles: it chunks the windows together and yields the chunk events of the blocks as
+# soon as all the windows before them are complete (a progress event is sent for every completed window).
+# The last block of the completed windows is held back until the next window is complete, since the two may be merged
+# (see segmentation.merge_window_chunks). It returns the merged result, as chunk_windows_with_llm does.
+def stream_chunk_windows(windows, settings, lang="en"):
+
+    log(f"Article split into {len(windows)} windows of at most {SEGMENT_MAX_TOKENS} tokens.")
+    prompts, monitors = window_chunk_prompts(windows, settings, lang=lang)
+    window_results = [None] * len(windows)
+    completed = emitted = 0
+
+    for index, raw_llm_output in iter_many_from_llm(prompts, settings, prefix_key=("chunk", lang), monitors=monitors):
+        if isinstance(raw_llm_output, Exception):
+            raise raw_llm_output
+        window_results[index] = parse_chunked_output(raw_llm_output, windows[index]["text"])
+        completed += 1
+        yield {"event": "progress", "stage": "chunking", "phase": "windows", "completed": completed, "total": len(windows)}
+
+        # Blocks of the leading completed windows, except the last one
+        ready = next((position for position, result in enumerate(window_results) if result is None), len(windows))
+        if ready == len(windows):
+            break
+        blocks = merge_window_chunks(window_results[:ready], windows[:ready])[0]
+        for block_index in range(emitted, len(blocks) - 1):
+            yield {"event": "chunk", "index": block_index, "text": highlighted_text_of(blocks[block_index])}
+        emitted = max(emitted, len(blocks) - 1)
+
+    # Every window is complete: the remaining blocks
+    result = merge_window_chunks(window_results, windows)
+    for block_index in range(emitted, len(result[0])):
+        yield {"event": "chunk", "index": block_index, "text": highlighted_text_of(result[0][block_index])}
+    return result
+
+# Helper that turns the blocks just returned by the parser into chunk events (with their position in the final list).
+def chunk_events(parser, blocks):
+    first_index = parser.emitted_blocks - len(blocks)
+    for offset, block in enumerate(blocks):
+        yield {"event": "chunk", "index": first_index + offset, "text": highlighted_text_of(block)}
+
+# Streaming variant of simplify(). Progress events are sent during the chunking stage,
+# then every simplified chunk is sent as soon as it is ready (possibly out of order, see its index).
+def stream_simplify(article_text_input, lang="en", profile=None):
+
+    # Cache lookup: on a hit, every simplified chunk is immediately available
+    cache_key = result_cache_key("simplify", article_text_input, lang, profile)
+    cached = lookup_result(cache_key, "simplify")
+    if cached is not None:
+        log(f"--- Cache HIT for streamed simplify (Language: {lang.upper()}, key: {cache_key[:12]}) ---")
+        for index, simplified_text in enumerate(cached):
+            yield {"event": "chunk", "index": index, "text": simplified_text}
+        yield {"event": "done", "result": cached, "cached": True, "reuse": cached_reuse_report(article_text_input)}
+        return
+
+    # Articles with several paragraphs: the paragraphs are processed on their own, reusing the cached ones (see section 7)
+    units = article_units(article_text_input)
+    if len(units) > 1:
+        report = {}
+        result = yield from stream_units("simplify", units, article_text_input, lang=lang, profile=profile, report=report)
+        if is_cacheable_simplify_result(result):
+            result_cache.set(cache_key, result, operation="simplify", lang=lang)
+        yield {"event": "done", "result": result, "cached": False, "reuse": report}
+        return
+
+    # Fused mode: the blocks are sent once the single answer is complete, or the two-stage path runs instead (see section 4.1)
+    if uses_fused_simplification(article_text_input, lang):
+        simplified_blocks = yield from stream_fused_simplify(article_text_input, lang=lang, profile=profile)
+        if simplified_blocks is not None:
+            for index, simplified_text in enumerate(simplified_blocks):
+                yield {"event": "chunk", "index": index, "text": simplified_text}
+            if is_cacheable_simplify_result(simplified_blocks):
+                result_cache.set(cache_key, simplified_blocks, operation="simplify", lang=lang)
+            yield {"event": "done", "result": simplified_blocks, "cached": False, "reuse": reuse_report(1)}
+            return
+        log("Fused simplification failed: falling back to the two-stage simplification.", level="warning")
+
+    # --- Stage 1: Chunk the article (streamed, so we can report its progress) ---
+    chunk_result = None
+    for event in stream_chunk(article_text_input, lang=lang, profile=profile):
+
+        # Chunking progress is forwarded, while the chunks themselves are only counted
+        if event["event"] == "progress":
+            yield event
+        elif event["event"] == "chunk":
+            yield {"event": "progress", "stage": "chunking", "phase": "writing", "chunks": event["index"] + 1}
+        else:
+            chunk_result = event["result"]
+
+    # The parsed chunks are the first element of the triple. When the LLM output couldn't be parsed,
+    # chunk returns the whole article as a single chunk (a plain list), which we simplify as it is.
+    parsed_chunks = chunk_result[0] if isinstance(chunk_result, tuple) else chunk_result
+
+    # If chunk returned an error list (or no data), there is nothing to simplify: the list itself is the result
+    if not parsed_chunks or parsed_chunks[0].startswith("[Error during chunking:"):
+        log(f"Chunking Error: {parsed_chunks[0] if parsed_chunks else 'no data'}", level="error")
+        yield {"event": "done", "result": parsed_chunks or [], "cached": False, "reuse": reuse_report(1)}
+        return
+
+    # --- Stage 2: Simplify the chunks, sending each of them as soon as it is ready ---
+    yield {"event": "progress", "stage": "simplifying", "phase": "writing", "chunks": len(parsed_chunks)}
+    simplified_chunks_list = [None] * len(parsed_chunks)
+    for index, simplified_text in iter_simplified_chunks(parsed_chunks, lang=lang, profile=profile):
+        simplified_chunks_list[index] = simplified_text
+        yield {"event": "chunk", "index": index, "text": simplified_text}
+
+    # Store the result (if valid) and send it
+    if is_cacheable_simplify_result(simplified_chunks_list):
+        result_cache.set(cache_key, simplified_chunks_list, operation="simplify", lang=lang)
+    yield {"event": "done", "result": simplified_chunks_list, "cached": False, "reuse": reuse_report(1)}
+
+# --- 6. Page-Level Batches ---
+# The widget sends all the paragraphs of a page in a single request (see /api/batch) instead of one request per paragraph.
+# Every item is a {"id", "text", "op", "lang"} dictionary, where op is "chunk" or "simplify":
+# - identical items (same operation, language and normalized text, i.e. the same cache key) are processed once
+# - cached results are served right away
+# - the misses are processed concurrently, so that their prompts land in the same collection window of the
+#   batch scheduler and share the batched generate calls
+# Items can carry a "priority" (see admission.py: 0 for the paragraphs in the viewport, higher values for the ones
+# further down the page). Every item runs in a child context of the request with its own priority, which orders the
+# items waiting for a worker, for a generation slot and for a batch of the scheduler. When the batch carries a session
+# id, its pending items are registered in session_registry, so that the widget can promote them as they scroll into view
+# or drop them (see the /api/session endpoints).
+# Configuration is done through env variables:
+# - ADAPTEASE_MAX_BATCH_ITEMS: max number of items of a single batch request
+# - ADAPTEASE_BATCH_ITEM_WORKERS: max number of items processed concurrently (shared by all the batch requests)
+MAX_BATCH_ITEMS = int(os.getenv("ADAPTEASE_MAX_BATCH_ITEMS", "256"))
+BATCH_ITEM_WORKERS = int(os.getenv("ADAPTEASE_BATCH_ITEM_WORKERS", "16"))
+batch_item_executor = PriorityExecutor(max_workers=BATCH_ITEM_WORKERS, thread_name_prefix="adaptease-batch-item")
+session_registry = SessionRegistry()
+
+# The computation (bypassing the cache) and the cacheability check of every operation
+OPERATIONS = {
+    "chunk": (chunk_with_llm, is_cacheable_chunk_result),
+    "simplify": (simplify_with_llm, is_cacheable_simplify_result),
+}
+
+# Function that computes the result of an operation on a text and stores it in the cache (if valid).
+def compute_and_cache(operation, text, lang, profile, cache_key):
+    compute_fn, is_cacheable = OPERATIONS[operation]
+    result = compute_fn(text, lang=lang, profile=profile)
+    if is_cacheable(result):
+        result_cache.set(cache_key, result, operation=operation, lang=lang)
+    return result
+
+# Function that runs compute_and_cache for a unique item of a batch, in its own request context
+def run_batch_item(item_context, session, unique_item, profile, cache_key):
+    try:
+        item_context.check()
+        return run_with_request_context(
+            item_context, compute_and_cache, unique_item["operation"], unique_item["text"], unique_item["lang"], profile, cache_key
+        )
+    finally:
+        if session is not None:
+            session_registry.release(session, unique_item["ids"], item_context)
+
+# Function that processes the items of a page-level batch, yielding a dictionary for every unique item as soon as it is ready:
+# {"ids": [...], "operation": ..., "lang": ..., "result": ..., "cached": ...}, where ids are the ids of the items sharing
+# that result and result is what chunk()/simplify() would return (or the exception raised while computing it).
+# session is the optional session id of the batch (see above).
+def iter_batch_results(items, profile=None, session=None):
+
+    # Deduplication: items with the same cache key share the same result (and the most urgent of their priorities)
+    unique_items = {}
+    for item in items:
+        lang = item.get("lang") or "en"
+        cache_key = result_cache_key(item["op"], item["text"], lang, profile)
+        unique_item = unique_items.setdefault(
+            cache_key, {"ids": [], "operation": item["op"], "text": item["text"], "lang": lang, "priority": item.get("priority", DEFAULT_PRIORITY)}
+        )
+        unique_item["ids"].append(item["id"])
+        unique_item["priority"] = min(unique_item["priority"], item.get("priority", DEFAULT_PRIORITY))
+
+    # Cache lookup. The misses are submitted right away, so they are generated while the hits are being sent.
+    hits, futures = [], {}
+    request_context = get_request_context()
+    for cache_key, unique_item in unique_items.items():
+        cached = lookup_result(cache_key, unique_item["operation"])
+        if cached is not None:
+            hits.append((unique_item, as_chunk_result(cached) if unique_item["operation"] == "chunk" else cached))
+        else:
+            # The items run in a child context of this request (deadline and cancellation included), with their own priority
+            item_context = RequestContext(priority=unique_item["priority"], parent=request_context)
+            if session is not None:
+                session_registry.register(session, unique_item["ids"], item_context)
+            future = batch_item_executor.submit(
+                contextvars.copy_context().run, run_batch_item, item_context, session, unique_item, profile, cache_key,
+                priority=lambda item_context=item_context: item_context.priority
+            )
+            futures[future] = unique_item
+    log(f"--- Batch of {len(items)} item(s): {len(unique_items)} unique, {len(hits)} cached, {len(futures)} to generate ---")
+
+    # The summary of a unique item, without its text
+    def summary_of(unique_item):
+        return {"ids": unique_item["ids"], "operation": unique_item["operation"], "lang": unique_item["lang"]}
+
+    # Cached results first, then the generated ones as soon as each of them is ready
+    for unique_item, result in hits:
+        yield {**summary_of(unique_item), "result": result, "cached": True}
+    for future in as_completed(futures):
+        yield {**summary_of(futures[future]), "result": future.exception() or future.result(), "cached": False}
+
+
+# --- 7. Incremental Re-Processing ---
+# Articles are edited after publication, often by a word or a sentence. Since their result is cached by the hash of the
+# whole text, any edit used to regenerate the whole article. Articles with several paragraphs are now processed paragraph
+# by paragraph: every paragraph is a unit whose result is stored under its own content-addressed key (the same key of a
+# chunk()/simplify() call on that paragraph alone, so the per-paragraph requests of the widget and the pre-rendered
+# archive share them). After an edit, the unchanged paragraphs are served from the cache and only the edited ones are
+# generated again: the cost of an edit follows the size of the paragraphs it touches, not the size of the article.
+# - A paragraph border is always a block border (see segmentation.py), so a paragraph needs no context from its
+#   neighbours: units are independent, and are generated together (sharing the scheduler batches).
+# - Paragraphs above the window budget are still split into windows (section 2.5), within the paragraph.
+# - The result of the whole article is cached as well, so an unchanged article is still a single lookup.
+# The callers can pass a report dictionary, filled with {"units": n, "reused": [...], "regenerated": [...]} (the
+# indices of the paragraphs served from the cache and of the generated ones), which the endpoints send back.
+# - ADAPTEASE_INCREMENTAL: "1" to process multi-paragraph articles paragraph by paragraph, "0" to process them whole
+INCREMENTAL_ENABLED = os.getenv("ADAPTEASE_INCREMENTAL", "1") == "1"
+unit_executor = ThreadPoolExecutor(max_workers=BATCH_ITEM_WORKERS, thread_name_prefix="adaptease-unit")
+
+incremental_units_total = registry.counter(
+    "adaptease_incremental_units_total", "Paragraphs of multi-paragraph articles, by outcome (reused or regenerated).", ["operation", "outcome"]
+)
+
+# Function that returns the units of an article: its paragraphs, or the whole text (a single unit)
+def article_units(article_text_input):
+    if not INCREMENTAL_ENABLED:
+        return [article_text_input]
+    units = [article_text_input[start:end] for start, end in paragraph_spans(article_text_input)]
+    return units if len(units) > 1 else [article_text_input]
+
+# Function that returns the reuse report of units_count units, given the indices of the reused ones (the others were regenerated)
+def reuse_report(units_count, reused=()):
+    reused = set(reused)
+    return {"units": units_count, "reused": sorted(reused), "regenerated": [index for index in range(units_count) if index not in reused]}
+
+# Function that returns the reuse report of an article served whole from the cache (every unit reused)
+def cached_reuse_report(article_text_input):
+    units_count = len(article_units(article_text_input))
+    return reuse_report(units_count, range(units_count))
+
+# Function that fills the reuse report of the caller (if any)
+def fill_reuse_report(report, units_count, reused=()):
+    if report is not None:
+        report.update(reuse_report(units_count, reused))
+
+# Function that tells if a result is the error list of a failed chunking (for both operations, see simplify_with_llm)
+def is_chunking_error(result):
+    return isinstance(result, list) and bool(result) and isinstance(result[0], str) and result[0].startswith("[Error during chunking:")
+
+# Function that yields (index, result, reused) for every unit of an article, as soon as each one is ready.
+# Cached units come first; the others are generated concurrently and stored. Identical units (same cache key) are
+# generated once.
+# The generated units run in a child context of the current request, which holds a single generation slot for all of
+# them (see AdmissionController.admit): an article takes one slot, whatever its number of paragraphs. If a unit fails
+# (or the caller stops iterating), the child context is cancelled, so that the other units stop using the model.
+def iter_unit_results(operation, units, lang="en", profile=None):
+
+    indices_of = {}
+    for index, unit in enumerate(units):
+        indices_of.setdefault(result_cache_key(operation, unit, lang, profile), []).append(index)
+
+    hits, misses = [], []
+    for cache_key, indices in indices_of.items():
+        cached = lookup_result(cache_key, operation)
+        if cached is not None:
+            hits.append((indices, as_chunk_result(cached) if operation == "chunk" else cached))
+        else:
+            misses.append((cache_key, indices))
+
+    def yield_hits():
+        for indices, result in hits:
+            incremental_units_total.inc(len(indices), operation=operation, outcome="reused")
+            for index in indices:
+                yield index, result, True
+
+    if not misses:
+        yield from yield_hits()
+        return
+
+    # The misses are submitted before the hits are sent, so they are generated in the meantime
+    units_context = RequestContext(priority=None, parent=get_request_context())
+    waiting_started = time.monotonic()
+    with admission_controller.admit(units_context):
+        record_span("admission_wait", waiting_started, units=len(misses))
+        futures = {
+            unit_executor.submit(
+                contextvars.copy_context().run, run_with_request_context, units_context,
+                compute_and_cache, operation, units[indices[0]], lang, profile, cache_key
+            ): indices
+            for cache_key, indices in misses
+        }
+        try:
+            yield from yield_hits()
+            for future in as_completed(futures):
+                incremental_units_total.inc(len(futures[future]), operation=operation, outcome="regenerated")
+                result = future.result()
+                for index in futures[future]:
+                    yield index, result, False
+        except BaseException:
+            units_context.cancel()
+            for future in futures:
+                future.cancel()
+            raise
+
+# Function that combines the results of the units (in order) into the result of the article.
+# A failed chunking fails the whole article (with the usual error list); unparsed chunking results become a single
+# block with their own text, and make the article result a list (not cached), as in merge_window_chunks.
+def combine_unit_results(operation, unit_results, units, article_text_input):
+    failed = next((result for result in unit_results if is_chunking_error(result)), None)
+    if failed is not None:
+        return [failed[0], article_text_input.strip()]
+    if operation == "chunk":
+        return merge_window_chunks(unit_results, [{"text": unit, "continues_paragraph": False} for unit in units])
+    return [item for result in unit_results for item in result]
+
+# Function that processes the units of an article (reusing the cached ones) and returns the result of the whole article
+def units_with_llm(operation, units, article_text_input, lang="en", profile=None, report=None):
+
+    unit_results, reused = [None] * len(units), []
+    for index, result, was_reused in iter_unit_results(operation, units, lang=lang, profile=profile):
+        unit_results[index] = result
+        if was_reused:
+            reused.append(index)
+
+    log(f"Article of {len(units)} paragraphs: {len(reused)} reused, {len(units) - len(reused)} regenerated.")
+    fill_reuse_report(report, len(units), reused)
+    return combine_unit_results(operation, unit_results, units, article_text_input)
+
+# Streaming variant of units_with_llm: it yields a progress event for every completed unit and the chunk events of the
+# items (blocks, or simplified chunks) as soon as all the units before them are complete, then returns the result
+def stream_units(operation, units, article_text_input, lang="en", profile=None, report=None):
+
+    stage = "chunking" if operation == "chunk" else "simplifying"
+    unit_results, reused = [None] * len(units), []
+    completed = emitted = 0
+
+    for index, result, was_reused in iter_unit_results(operation, units, lang=lang, profile=profile):
+        unit_results[index] = result
+        if was_reused:
+            reused.append(index)
+        completed += 1
+        yield {"event": "progress", "stage": stage, "phase": "units", "completed": completed, "total": len(units), "reused": len(reused)}
+
+        # Items of the leading completed units (nothing more is sent once a unit failed)
+        ready = next((position for position, unit_result in enumerate(unit_results) if unit_result is None), len(units))
+        combined = combine_unit_results(operation, unit_results[:ready], units[:ready], article_text_input)
+        if is_chunking_error(combined):
+            continue
+        items = combined[0] if operation == "chunk" else combined
+        for item_index in range(emitted, len(items)):
+            text = highlighted_text_of(items[item_index]) if operation == "chunk" else items[item_index]
+            yield {"event": "chunk", "index": item_index, "text": text}
+        emitted = len(items)
+
+    log(f"Article of {len(units)} paragraphs: {len(reused)} reused, {len(units) - len(reused)} regenerated.")
+    fill_reuse_report(report, len(units), reused)
+    return combine_unit_results(operation, unit_results, units, article_text_input)
+
+# --- 8. Idle-Time Precomputation ---
+# Readers who chunk a paragraph often simplify it next, and readers of a multilingual site switch language: both
+# actions ask for new generations on the same texts. When enabled, every text requested to the server queues the
+# likely next requests on it as background jobs (see precompute.py): the other operation in the same language, and
+# both operations in the secondary languages of the site. The jobs run only while the server is idle, with
+# PRIORITY_IDLE, and any live request preempts them (their generation stops and they go back to the queue), so idle
+# capacity turns into cache hits without slowing readers down. Results are stored with the same cache keys of the
+# live requests, and the jobs whose result is already cached cost a lookup.
+# - ADAPTEASE_PRECOMPUTE: "1" to precompute the likely next requests while idle, "0" to disable it
+# - ADAPTEASE_PRECOMPUTE_LANGS: comma separated secondary languages of the site (e.g. "it,fr"), empty for none
+# - ADAPTEASE_PRECOMPUTE_OTHER_OPERATION: "1" to precompute the other operation ("chunk" for "simplify" and vice versa)
+# - ADAPTEASE_PRECOMPUTE_QUEUE_SIZE: max pending jobs (the oldest ones are dropped first)
+# - ADAPTEASE_PRECOMPUTE_JOBS_PER_HOUR: max jobs started per hour (0 = no limit)
+# - ADAPTEASE_PRECOMPUTE_MAX_AGE: seconds after which a pending job is dropped (0 = never)
+# - ADAPTEASE_PRECOMPUTE_IDLE_SECONDS: seconds without live requests before a job starts
+# - ADAPTEASE_PRECOMPUTE_MAX_CHARS: texts longer than this are never precomputed (0 = no limit)
+PRECOMPUTE_ENABLED = os.getenv("ADAPTEASE_PRECOMPUTE", "0") == "1"
+PRECOMPUTE_LANGUAGES = [lang for lang in os.getenv("ADAPTEASE_PRECOMPUTE_LANGS", "").replace(" ", "").split(",") if lang]
+PRECOMPUTE_OTHER_OPERATION = os.getenv("ADAPTEASE_PRECOMPUTE_OTHER_OPERATION", "1") == "1"
+PRECOMPUTE_QUEUE_SIZE = int(os.getenv("ADAPTEASE_PRECOMPUTE_QUEUE_SIZE", "256"))
+PRECOMPUTE_JOBS_PER_HOUR = int(os.getenv("ADAPTEASE_PRECOMPUTE_JOBS_PER_HOUR", "600"))
+PRECOMPUTE_MAX_AGE_SECONDS = float(os.getenv("ADAPTEASE_PRECOMPUTE_MAX_AGE", "3600"))
+PRECOMPUTE_IDLE_SECONDS = float(os.getenv("ADAPTEASE_PRECOMPUTE_IDLE_SECONDS", "2"))
+PRECOMPUTE_MAX_CHARS = int(os.getenv("ADAPTEASE_PRECOMPUTE_MAX_CHARS", "4000"))
+
+unknown_precompute_languages = [lang for lang in PRECOMPUTE_LANGUAGES if lang not in LANGUAGE_MAP]
+if unknown_precompute_languages:
+    raise ValueError(f"Unknown ADAPTEASE_PRECOMPUTE_LANGS language(s): {', '.join(unknown_precompute_languages)}. Available: {', '.join(LANGUAGE_MAP)}")
+
+# Function that returns how many live requests are using or waiting for the model: the ones holding or waiting for a
+# generation slot, and the batch items waiting for a worker
+def live_request_count():
+    return admission_controller.count_more_urgent(PRIORITY_IDLE) + batch_item_executor.stats()["pending"]
+
+# Function that runs a background job (an (operation, text, lang, profile, cache_key) tuple) under its request context.
+# It returns False when the result is already cached, and raises RequestCancelledError when the job has been
+# preempted (its result, cut short, is not cacheable anyway).
+# Every job has its own trace, as the API requests.
+def run_precompute_job(job, request_context):
+    operation, text, lang, profile, cache_key = job
+    request_context.trace = start_trace("precompute", operation=operation, lang=lang, profile=profile, text_chars=len(text))
+    outcome = "failed"
+    try:
+        if run_with_request_context(request_context, lookup_result, cache_key, operation) is not None:
+            outcome = "already_cached"
+            return False
+        run_with_request_context(
+            request_context, log, f"--- Background precomputation of {operation} (Language: {lang.upper()}, key: {cache_key[:12]}) ---"
+        )
+        run_with_request_context(request_context, compute_and_cache, operation, text, lang, profile, cache_key)
+        request_context.check()
+        outcome = "completed"
+        return True
+    except RequestCancelledError:
+        outcome = "preempted"
+        raise
+    finally:
+        finish_trace(request_context.trace, outcome=outcome)
+
+# The queue instance shared by the whole process (None if precomputation is disabled)
+precompute_queue = PrecomputeQueue(
+    run_fn=run_precompute_job,
+    live_load_fn=live_request_count,
+    max_pending=PRECOMPUTE_QUEUE_SIZE,
+    max_jobs_per_hour=PRECOMPUTE_JOBS_PER_HOUR,
+    max_age_seconds=PRECOMPUTE_MAX_AGE_SECONDS,
+    idle_seconds=PRECOMPUTE_IDLE_SECONDS
+) if PRECOMPUTE_ENABLED else None
+
+# Function that queues the likely next requests after a request for an operation on a text (called by the endpoints).
+# The newest jobs run first, so the jobs are submitted from the least likely to the most likely: the secondary
+# languages, then the other operation in the language of the request.
+def schedule_precompute(operation, text, lang="en", profile=None):
+    if precompute_queue is None or (PRECOMPUTE_MAX_CHARS and len(text) > PRECOMPUTE_MAX_CHARS):
+        return
+    operations = [operation] + ([other for other in OPERATIONS if other != operation] if PRECOMPUTE_OTHER_OPERATION else [])
+    targets = [(op, other_lang) for other_lang in PRECOMPUTE_LANGUAGES if other_lang != lang for op in reversed(operations)]
+    targets += [(op, lang) for op in operations if op != operation]
+    for op, target_lang in targets:
+        cache_key = result_cache_key(op, text, target_lang, profile)
+        precompute_queue.submit(cache_key, (op, text, target_lang, profile, cache_key))
@@ -0,0 +1,338 @@
+import re
+
+# --- 1. Output Cleanup Patterns ---
+# Patterns shared by the post-processing of chunk() / simplify_chunk() and by the incremental parser below.
+
+# The <think> block (Chain of Thought) produced by the model before its actual answer
+THINK_PATTERN = re.compile(r"<think>.*?</think>\s*\n*", re.DOTALL | re.IGNORECASE)
+
+# "**Chunk X:**" labels the model sometimes adds before each chunk (and any leading/trailing whitespace around them)
+CHUNK_LABEL_PATTERN = re.compile(r"^\s*\*\*Chunk\s*\d+:\*\*\s*\n?", re.MULTILINE | re.IGNORECASE)
+
+# Opening/closing tags of the thinking phase
+THINK_OPEN_TAG = "<think>"
+THINK_CLOSE_TAG = "</think>"
+
+# Function that returns the displayable version of a chunk block.
+# Sometimes, the LLM returns chunks in this format: "chunk_not_highlighted\nchunk_highlighted", so when the block
+# has at least two lines we use the second one (the highlighted text), otherwise the block itself.
+def highlighted_text_of(block):
+    lines = block.split('\n')
+    return lines[1] if len(lines) > 1 else block
+
+# --- 2. Incremental Chunk Parser ---
+# ChunkStreamParser consumes the output of the model piece by piece (as it is decoded) and recognizes the chunk
+# blocks as soon as they are complete, so that they can be sent to the reader before the generation has finished.
+# - While the model is in its thinking phase, nothing is emitted (the think block is thrown away anyway),
+#   but the parser keeps track of how much has been generated, so that progress can be reported.
+# - After </think>, the output is split on empty lines: a block is complete once the next one has started.
+class ChunkStreamParser:
+
+    def __init__(self):
+
+        # Text received but not yet consumed
+        self._buffer = ""
+
+        # Current phase: "starting" (we don't know yet if there is a think block), "thinking" or "writing"
+        self.phase = "starting"
+
+        # Number of pieces received during the thinking phase and number of blocks emitted so far
+        self.thinking_pieces = 0
+        self.emitted_blocks = 0
+
+    # Cleans a raw block, returning None if nothing is left
+    def _clean_block(self, block):
+        block = CHUNK_LABEL_PATTERN.sub("", block).strip()
+        return block or None
+
+    # Feeds a decoded piece of text and returns the list of the blocks completed thanks to it
+    def feed(self, piece):
+
+        self._buffer += piece
+
+        # Until we see some actual text, we can't know if the model is going to think first
+        if self.phase == "starting":
+
+            # Leading whitespaces don't tell us anything
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return []
+
+            # The output starts with the think tag: thinking phase
+            if stripped.lower().startswith(THINK_OPEN_TAG):
+                self.phase = "thinking"
+
+            # The output can't start with the think tag anymore: the model is directly writing its answer
+            elif not THINK_OPEN_TAG.startswith(stripped.lower()[:len(THINK_OPEN_TAG)]):
+                self.phase = "writing"
+
+            # Still ambiguous (e.g. only "<thi" received so far)
+            else:
+                return []
+
+        # Thinking phase: we only look for the closing tag, dropping everything before it
+        if self.phase == "thinking":
+            self.thinking_pieces += 1
+            close_index = self._buffer.lower().find(THINK_CLOSE_TAG)
+            if close_index == -1:
+                return []
+            self._buffer = self._buffer[close_index + len(THINK_CLOSE_TAG):].lstrip()
+            self.phase = "writing"
+
+        # Writing phase: every block followed by an empty line is complete
+        *complete_blocks, self._buffer = self._buffer.split('\n\n')
+        return self._emit(complete_blocks)
+
+    # Signals the end of the generation and returns the last pending block(s)
+    def finish(self):
+
+        # If the think block was never closed, there is no answer at all
+        if self.phase != "writing":
+            return []
+
+        remaining, self._buffer = self._buffer, ""
+        return self._emit(remaining.split('\n\n'))
+
+    # Returns the block being written (not complete yet), or "" outside of the writing phase
+    def pending_block(self):
+        return self._buffer if self.phase == "writing" else ""
+
+    # Cleans the given blocks and returns the non-empty ones
+    def _emit(self, blocks):
+        emitted = [cleaned for cleaned in (self._clean_block(block) for block in blocks) if cleaned]
+        self.emitted_blocks += len(emitted)
+        return emitted
+
+# --- 3. Output Monitor ---
+# Without supervision, a generation only ends at the end-of-sequence token or at max_new_tokens. A model that starts
+# looping ("the the the...", the same sentence over and over), writing an endless list, or adding commentary after the
+# last chunk burns decode time until the token limit: those are the slowest requests of all.
+# OutputMonitor reads the answer while it is being decoded (see generation.OutputMonitorStoppingCriteria) and tells
+# when the generation should stop, and why (stop_reason):
+# - "covered": chunking only, the blocks written so far cover the whole input text, so nothing useful can follow
+# - "repetition": the output repeats the same span of words over and over (in the answer or in the thinking)
+# - "repeated_ngram": the answer keeps coming back to the same n-gram, far more often than the input text does
+# - "runaway_list": the answer turned into an endless list
+# - "excess_blocks": chunking only, more blocks than the input text has sentences
+# - "runaway_output": the answer is far longer than the input text could justify
+# After a degenerate stop, accepted_text() returns the output cut right before the degeneration (for chunking, at the
+# end of the last complete block), or None when nothing usable is left.
+
+# Raised (or returned in place of an answer) when the output degenerated before any usable answer was written
+class DegenerateOutputError(RuntimeError):
+    pass
+
+# Lines starting like list items ("- ", "* ", "1. ", "2) "...)
+LIST_ITEM_PATTERN = re.compile(r"^(?:[-*\u2022]|\d+[.)])$")
+
+# Sentence ends of the input text (to bound the number of chunk blocks)
+SENTENCE_END_PATTERN = re.compile(r"[.!?\u3002]+(?=\s|$)")
+
+# Function that returns the normalized words of a text (lowercase, no markup or punctuation), used to compare the
+# chunk blocks with the input text
+def normalized_words(text):
+    return re.findall(r"\w+", re.sub(r"</?\w+>", " ", text).lower())
+
+class OutputMonitor:
+
+    # Default limits
+    # - repeat_min_words / repeat_copies: a span repeated repeat_copies times in a row, covering at least repeat_min_words words
+    # - max_period: longest repeated span (in words) that is detected
+    # - ngram_size / ngram_slack: an n-gram of the answer may occur 2 * (its occurrences in the input) + ngram_slack times
+    #   (every chunk block is written twice: plain and highlighted)
+    # - max_list_items: consecutive list lines
+    # - length_ratio / length_slack: max answer words, relative to the input words
+    REPEAT_MIN_WORDS = 16
+    REPEAT_COPIES = 3
+    MAX_PERIOD = 64
+    NGRAM_SIZE = 8
+    NGRAM_SLACK = 2
+    MAX_LIST_ITEMS = 40
+    LENGTH_RATIO = {"chunk": 3.0, "simplify": 2.5, "simplify_fused": 5.0}
+    LENGTH_SLACK = 64
+
+    # Words of the input text compared with the end of the chunk blocks to detect the full coverage
+    COVERAGE_TAIL_WORDS = 8
+
+    def __init__(self, operation, source_text):
+
+        self.operation = operation
+        self.source_text = source_text
+        self.stop_reason = None
+
+        # Whole decoded output, and the offset of the first character of the answer (after the think block)
+        self.text = ""
+        self.answer_start = None
+        self._parser = ChunkStreamParser()
+
+        # Input text: words (raw and normalized), n-gram counts and number of sentences
+        source_words = source_text.lower().split()
+        self._source_normalized = normalized_words(source_text)
+        self._source_ngrams = {}
+        for index in range(len(source_words) - self.NGRAM_SIZE + 1):
+            ngram = tuple(source_words[index:index + self.NGRAM_SIZE])
+            self._source_ngrams[ngram] = self._source_ngrams.get(ngram, 0) + 1
+        self._max_blocks = len(SENTENCE_END_PATTERN.findall(source_text)) + 2
+        self._max_answer_words = int(self.LENGTH_RATIO.get(operation, 3.0) * len(source_words)) + self.LENGTH_SLACK
+
+        # Words of the output (with their offset in text) and state of the detectors
+        self._scan_from = 0
+        self._words, self._offsets = [], []
+        self._answer_words = 0
+        self._match_runs = [0] * (self.MAX_PERIOD + 1)
+        self._ngrams = {}
+        self._list_items, self._list_start = 0, None
+        self._covered_words = []
+        self._cut = None
+
+    # Starts over, for a new generation of the same answer
+    def reset(self):
+        self.__init__(self.operation, self.source_text)
+
+    # True once the generation should stop
+    @property
+    def stopped(self):
+        return self.stop_reason is not None
+
+    # Feeds a decoded piece of text and returns True if the generation should stop
+    def feed(self, piece):
+        if self.stopped or not piece:
+            return self.stopped
+
+        self.text += piece
+
+        # Blocks completed by this piece (the parser also follows the thinking phase)
+        blocks = self._parser.feed(piece)
+        if self.answer_start is None and self._parser.phase == "writing":
+            close_index = self.text.lower().find(THINK_CLOSE_TAG)
+            self.answer_start = close_index + len(THINK_CLOSE_TAG) if close_index != -1 else len(self.text) - len(self.text.lstrip())
+
+        # Every word followed by a whitespace is complete
+        for match in re.finditer(r"\S+", self.text[self._scan_from:]):
+            if self._scan_from + match.end() >= len(self.text):
+                break
+            self._add_word(match.group().lower(), self._scan_from + match.start())
+            if self.stopped:
+                return True
+        self._scan_from = self._offsets[-1] + len(self._words[-1]) if self._words else 0
+
+        # Chunking: too many blocks, or every sentence of the input already written
+        if self.operation == "chunk" and self.answer_start is not None:
+            if self._parser.emitted_blocks > self._max_blocks:
+                self._stop("excess_blocks", self.text.rfind("\n\n"))
+            else:
+                self._check_coverage(blocks)
+
+        return self.stopped
+
+    # Updates the detectors with a complete word, found at offset in text
+    def _add_word(self, word, offset):
+        index = len(self._words)
+        self._words.append(word)
+        self._offsets.append(offset)
+        in_answer = self.answer_start is not None and offset >= self.answer_start
+
+        # Same span of words repeated again and again: for every period, the number of consecutive words
+        # equal to the word one period before
+        for period in range(1, min(self.MAX_PERIOD, index) + 1):
+            if self._words[index - period] == word:
+                self._match_runs[period] += 1
+                run = self._match_runs[period]
+                if run >= max(period * (self.REPEAT_COPIES - 1), self.REPEAT_MIN_WORDS):
+                    # The first copy is kept: the cut is at the start of the second one
+                    return self._stop("repetition", self._offsets[index - run + 1])
+            else:
+                self._match_runs[period] = 0
+
+        if not in_answer:
+            return
+        self._answer_words += 1
+
+        # The same n-gram, far more often than in the input
+        if self._answer_words >= self.NGRAM_SIZE:
+            ngram = tuple(self._words[index - self.NGRAM_SIZE + 1:index + 1])
+            self._ngrams[ngram] = self._ngrams.get(ngram, 0) + 1
+            if self._ngrams[ngram] > 2 * self._source_ngrams.get(ngram, 0) + self.NGRAM_SLACK:
+                return self._stop("repeated_ngram", self._offsets[index - self.NGRAM_SIZE + 1])
+
+        # Endless list: consecutive lines starting with a list marker
+        line_start = self.text.rfind("\n", 0, offset) + 1
+        if not self.text[line_start:offset].strip():
+            if LIST_ITEM_PATTERN.match(word):
+                if self._list_items == 0:
+                    self._list_start = line_start
+                self._list_items += 1
+                if self._list_items > self.MAX_LIST_ITEMS:
+                    return self._stop("runaway_list", self._list_start)
+            else:
+                self._list_items = 0
+
+        # Far longer than the input
+        if self._answer_words > self._max_answer_words:
+            return self._stop("runaway_output", offset)
+
+    # Stops with the given reason when the chunk blocks written so far end with the end of the input text.
+    # The block being written counts as well, once its highlighted line is complete.
+    def _check_coverage(self, blocks):
+        self._covered_words.extend(word for block in blocks for word in normalized_words(block.split("\n")[0]))
+        covered_words = self._covered_words
+
+        pending = CHUNK_LABEL_PATTERN.sub("", self._parser.pending_block()).strip("\n")
+        if pending.count("\n") >= 1 and self._parser.pending_block().endswith("\n"):
+            covered_words = covered_words + normalized_words(pending.split("\n")[0])
+
+        # The cut is at the end of the covering blocks: a piece may bring the start of what follows along with them
+        tail = self._source_normalized[-self.COVERAGE_TAIL_WORDS:]
+        if tail and covered_words[-len(tail):] == tail and len(covered_words) >= 0.8 * len(self._source_normalized):
+            self._stop("covered", len(self.text) if covered_words is not self._covered_words else len(self.text) - len(self._parser.pending_block()))
+
+    def _stop(self, reason, cut):
+        self.stop_reason = reason
+        self._cut = cut
+
+    # Returns the output to keep after a stop (the whole output if the generation was not stopped by a degeneration),
+    # or None if the degeneration started before any usable answer
+    def accepted_text(self):
+        if self.stop_reason is None:
+            return self.text
+        if self.stop_reason == "covered":
+            return self.text[:self._cut]
+
+        # Degenerated while thinking: there is no answer at all
+        if self.answer_start is None or self._cut <= self.answer_start:
+            return None
+        answer = self.text[self.answer_start:self._cut]
+
+        # Chunking keeps the complete blocks only, simplification everything before the degeneration
+        if self.operation == "chunk":
+            answer = answer[:answer.rfind("\n\n")] if "\n\n" in answer else ""
+        answer = answer.rstrip()
+        return self.text[:self.answer_start] + answer if answer.strip() else None
+
+# --- 4. Fused Chunk-and-Simplify Output ---
+# In the fused simplification mode the model chunks and simplifies the text in a single answer, where every block is
+# written as an <original>...</original> section (the chunk) followed by a <simplified>...</simplified> section.
+FUSED_BLOCK_PATTERN = re.compile(
+    r"<original>\s*(?P<original>.*?)\s*</original>\s*<simplified>\s*(?P<simplified>.*?)\s*</simplified>",
+    re.DOTALL | re.IGNORECASE
+)
+
+# What may surround the blocks of a well-formed answer: whitespace and the quotes closing the prompt
+FUSED_FILLER_PATTERN = re.compile(r'^[\s"\'`]*$')
+
+# Function that parses a fused answer (think block already removed) into its (original, simplified) pairs.
+# It returns None when the answer is malformed: no block, an empty section, or any other text between or around the
+# blocks (e.g. an unclosed section of a truncated answer).
+def parse_fused_blocks(answer):
+    blocks, position = [], 0
+    for match in FUSED_BLOCK_PATTERN.finditer(answer):
+        if not FUSED_FILLER_PATTERN.match(answer[position:match.start()]):
+            return None
+        if not match.group("original") or not match.group("simplified"):
+            return None
+        blocks.append((match.group("original"), match.group("simplified")))
+        position = match.end()
+
+    if not blocks or not FUSED_FILLER_PATTERN.match(answer[position:]):
+        return None
+    return blocks
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import PRIORITY_IDLE, RequestCancelledError, RequestContext
+from tracing import log
+
+# --- 1. Idle-Time Background Queue ---
+# Readers who chunk a paragraph often simplify it next, and switching language asks for the same paragraphs again: the
+# likely next requests are known before they arrive. PrecomputeQueue holds them as background jobs and runs them only
+# while the server is idle, so that spare capacity turns into cache hits for the next click.
+#
+# The queue doesn't know anything about models: it calls run_fn(job, request_context), which does the work under the
+# given request context (priority PRIORITY_IDLE) and returns True if something was generated (False if the result was
+# already there), and live_load_fn(), which returns how many live requests are using or waiting for the model.
+# - Jobs are keyed (e.g. by cache key): a job already pending is not queued twice, it is only refreshed.
+# - The most recently submitted job runs first: it belongs to the content readers are looking at right now. Jobs older
+#   than max_age_seconds are dropped, and so is the oldest job when max_pending are already queued.
+# - A job starts only after idle_seconds without live requests, one job at a time, and at most max_jobs_per_hour of
+#   them start in any hour (0 = no limit).
+# - Live traffic preempts the running job: its request context is cancelled (the generation stops at the next decoding
+#   step) and the job goes back to the queue, until it has been preempted max_attempts times.
+class PrecomputeQueue:
+
+    def __init__(self, run_fn, live_load_fn, max_pending=256, max_jobs_per_hour=0, max_age_seconds=3600,
+                 idle_seconds=2.0, poll_seconds=0.25, max_attempts=3):
+
+        # The work and load functions, and the budgets
+        self.run_fn = run_fn
+        self.live_load_fn = live_load_fn
+        self.max_pending = max(1, int(max_pending))
+        self.max_jobs_per_hour = max(0, int(max_jobs_per_hour))
+        self.max_age_seconds = max_age_seconds
+        self.idle_seconds = max(0.0, idle_seconds)
+        self.poll_seconds = max(0.01, poll_seconds)
+        self.max_attempts = max(1, int(max_attempts))
+
+        # Pending jobs as {key: (job, submitted_at, attempts)}, the newest last, and the start times of the last hour
+        self._pending = OrderedDict()
+        self._started = deque()
+        self._running_key = None
+        self._condition = threading.Condition()
+        self._running = True
+
+        # Statistics
+        self._counters = {"submitted": 0, "completed": 0, "already_cached": 0, "preempted": 0, "failed": 0, "dropped": 0}
+
+        # The jobs run in their own thread, so that the worker can watch the load and preempt them
+        self._job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="adaptease-precompute-job")
+        self._worker = threading.Thread(target=self._run, name="adaptease-precompute", daemon=True)
+        self._worker.start()
+
+    # Queues a job (or refreshes the pending one with the same key). Returns False if the queue is stopped.
+    def submit(self, key, job):
+        with self._condition:
+            if not self._running:
+                return False
+            if key == self._running_key:
+                return True
+            attempts = self._pending.pop(key, (None, None, 0))[2]
+            self._pending[key] = (job, time.monotonic(), attempts)
+            self._counters["submitted"] += 1
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self._counters["dropped"] += 1
+            self._condition.notify()
+        return True
+
+    # Drops the expired jobs and the start times older than an hour (the caller must hold the condition lock)
+    def _expire(self, now):
+        while self._pending and self.max_age_seconds > 0 and now - next(iter(self._pending.values()))[1] > self.max_age_seconds:
+            self._pending.popitem(last=False)
+            self._counters["dropped"] += 1
+        while self._started and now - self._started[0] > 3600:
+            self._started.popleft()
+
+    # Seconds before the hourly budget allows another job (0 if it already does; the caller must hold the condition lock)
+    def _budget_wait(self, now):
+        if not self.max_jobs_per_hour or len(self._started) < self.max_jobs_per_hour:
+            return 0.0
+        return self._started[0] + 3600 - now
+
+    # Worker loop: waits for pending jobs, for the budget and for an idle server, then runs the newest job
+    def _run(self):
+        idle_since = None
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                self._expire(now)
+                if not self._running:
+                    return
+                if not self._pending:
+                    idle_since = None
+                    self._condition.wait()
+                    continue
+                budget_wait = self._budget_wait(now)
+                if budget_wait > 0:
+                    self._condition.wait(budget_wait)
+                    continue
+
+            # The server must have been idle for idle_seconds in a row
+            if self.live_load_fn() > 0:
+                idle_since = None
+            elif idle_since is None:
+                idle_since = time.monotonic()
+            if idle_since is None or time.monotonic() - idle_since < self.idle_seconds:
+                with self._condition:
+                    self._condition.wait(self.poll_seconds)
+                continue
+
+            with self._condition:
+                if not self._running or not self._pending:
+                    continue
+                key, (job, submitted_at, attempts) = self._pending.popitem(last=True)
+                self._running_key = key
+                self._started.append(time.monotonic())
+
+            outcome = self._run_job(job)
+
+            with self._condition:
+                self._running_key = None
+                self._counters[outcome] += 1
+
+                # A job whose result was already there generated nothing: it doesn't use the hourly budget
+                if outcome == "already_cached":
+                    self._started.pop()
+
+                # A preempted job goes back to the queue (as the newest one: it was the most relevant), unless the key
+                # has been submitted again meanwhile
+                if outcome == "preempted" and self._running and key not in self._pending:
+                    if attempts + 1 < self.max_attempts:
+                        self._pending[key] = (job, submitted_at, attempts + 1)
+                    else:
+                        self._counters["dropped"] += 1
+
+            # Live traffic is back: the next job waits for a new idle period
+            if outcome == "preempted":
+                idle_since = None
+
+    # Runs a job in the job thread, cancelling it as soon as live requests show up. Returns the outcome of the job.
+    def _run_job(self, job):
+        request_context = RequestContext(priority=PRIORITY_IDLE)
+        future = self._job_executor.submit(self.run_fn, job, request_context)
+        while not future.done():
+            if not request_context.cancelled and (not self._running or self.live_load_fn() > 0):
+                request_context.cancel()
+            try:
+                future.result(timeout=self.poll_seconds)
+            except Exception:
+                pass
+
+        try:
+            return "completed" if future.result() else "already_cached"
+        except RequestCancelledError:
+            return "preempted"
+        except Exception as e:
+            log(f"Error during a background precomputation: {e}", level="error")
+            return "failed"
+
+    # Returns the state and the counters of the queue
+    def stats(self):
+        with self._condition:
+            return {
+                "pending": len(self._pending),
+                "running": self._running_key is not None,
+                "started_last_hour": len(self._started),
+                "max_pending": self.max_pending,
+                "max_jobs_per_hour": self.max_jobs_per_hour,
+                **self._counters,
+            }
+
+    # Stops the queue: the running job is preempted and the pending ones are dropped
+    def shutdown(self, wait=True):
+        with self._condition:
+            self._running = False
+            self._pending.clear()
+            self._condition.notify_all()
+        if wait:
+            self._worker.join()
+        self._job_executor.shutdown(wait=wait)
@@ -0,0 +1,94 @@
+import copy
+import threading
+from collections import OrderedDict
+
+from tracing import log
+
+# --- 1. Prompt Prefix KV-Cache ---
+# Every chunk/simplify request of a given (operation, language) pair shares the same system prompt and the same long
+# instruction preamble: only the text to process (placed at the end of the prompt templates) changes between calls.
+# Instead of re-running the prefill over that constant prefix at every request, PrefixKVCache computes its
+# past_key_values once and hands out copies of it, so each request only prefills its own variable suffix.
+# Entries are kept in a small LRU, since every entry holds the keys/values of every layer of the model.
+class PrefixKVCache:
+
+    def __init__(self, model, tokenizer, max_entries=16):
+
+        # Model and tokenizer used to compute the prefixes
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_entries = max(1, int(max_entries))
+
+        # LRU of prefix_key -> {"text", "ids", "cache"}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Statistics: how many requests reused a prefix and how many prefill tokens they saved
+        self._counters = {"computed": 0, "requests": 0, "mismatches": 0, "saved_tokens": 0}
+
+    # Returns the entry of the given prefix, computing its past_key_values on the first use.
+    # prefix_text must be the exact beginning of the formatted prompts that will use it.
+    def get(self, prefix_key, prefix_text):
+
+        with self._lock:
+
+            # Already computed (and still the same text): mark as most recently used
+            entry = self._entries.get(prefix_key)
+            if entry is not None and entry["text"] == prefix_text:
+                self._entries.move_to_end(prefix_key)
+                return entry
+
+            # Prefill of the prefix, keeping its keys/values in a DynamicCache.
+            # torch/transformers are imported here, so that prefix_before_sentinel can be used without them.
+            import torch
+            from transformers import DynamicCache
+            ids = self.tokenizer(prefix_text).input_ids
+            with torch.no_grad():
+                cache = self.model(
+                    input_ids=torch.tensor([ids], device=self.model.device),
+                    past_key_values=DynamicCache(),
+                    use_cache=True
+                ).past_key_values
+
+            # Store it, evicting the least recently used prefix if needed
+            entry = {"text": prefix_text, "ids": ids, "cache": cache}
+            self._entries[prefix_key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._counters["computed"] += 1
+
+            log(f"Computed KV-cache for prompt prefix {prefix_key} ({len(ids)} tokens).")
+            return entry
+
+    # Returns a private copy of the prefix past_key_values for a batch of batch_size sequences.
+    # generate extends the cache in place, so the stored one must never be handed out directly.
+    def copy_for_batch(self, entry, batch_size):
+        cache = copy.deepcopy(entry["cache"])
+        if batch_size > 1:
+            cache.batch_repeat_interleave(batch_size)
+        return cache
+
+    # Records the outcome of a request: saved_tokens prefill tokens were saved (0 if the prefix couldn't be reused)
+    def record(self, saved_tokens, requests=1):
+        with self._lock:
+            if saved_tokens:
+                self._counters["requests"] += requests
+                self._counters["saved_tokens"] += saved_tokens
+            else:
+                self._counters["mismatches"] += requests
+
+    # Returns the statistics of the prefix cache
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = {str(key): len(entry["ids"]) for key, entry in self._entries.items()}
+            stats["average_saved_tokens"] = (stats["saved_tokens"] / stats["requests"]) if stats["requests"] else 0.0
+            return stats
+
+# Function that cuts the formatted prompt of a template right before its variable text.
+# rendered_with_sentinel is the whole formatted prompt where the variable text has been replaced by the sentinel.
+# The prefix ends at the last newline before the sentinel, so that the tokenization of the prefix is not affected
+# by the text that follows it (tokens never span across a newline followed by text).
+def prefix_before_sentinel(rendered_with_sentinel, sentinel):
+    head = rendered_with_sentinel.split(sentinel)[0]
+    return head[:head.rfind("\n") + 1]
@@ -0,0 +1,258 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# --- 1. Offline Pre-Rendering ---
+# Publishers know their articles before the readers arrive: this command computes the chunk/simplify results of a whole
+# archive in advance, and writes them in the persistent result store of the server (ADAPTEASE_CACHE_PATH), so that the
+# live service answers them as cache hits. It runs the same code path of the server (same prompts, generation profile,
+# batching and cache keys), without the HTTP layer.
+# - Input: a JSON lines file ({"text", optional "lang" and "id"} per line) or a directory of .jsonl/.txt/.md files.
+#   Articles are split into paragraphs (on empty lines), since the widget requests one paragraph (page element) at a time.
+# - Deduplication: paragraphs repeated across the archive (bylines, disclaimers, boilerplate) are processed once per
+#   operation and language, i.e. once per cache key.
+# - Sharding: tasks are spread over --shards shards by a hash of their (text, language), so that independent runs
+#   (processes, GPUs or machines sharing the store) never process the same task. --processes starts the local workers
+#   itself, one per device of --devices.
+# - Resume: every finished task is appended to the checkpoint of its shard; an interrupted run started again with the same
+#   arguments skips what is already done (and the results already in the store), while failed tasks are retried.
+# - Report: progress is printed while the run goes, and the throughput of the run is written next to the checkpoints.
+# Usage:
+#   python prerender.py --input archive.jsonl --langs en,it --ops chunk,simplify
+#   python prerender.py --input articles/ --shards 4 --shard-index 0        # one shard of four (e.g. one per machine)
+#   python prerender.py --input archive.jsonl --processes 2 --devices 0,1   # two local workers, one per GPU
+
+# Extensions read from an input directory
+TEXT_EXTENSIONS = (".txt", ".md")
+JSONL_EXTENSIONS = (".jsonl",)
+
+# Function that yields the articles of the input ({"id", "text", "lang"} dictionaries, lang may be None), in a stable order
+def iter_articles(path):
+    paths = [path] if os.path.isfile(path) else sorted(
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(path)
+        for name in names if name.endswith(TEXT_EXTENSIONS + JSONL_EXTENSIONS)
+    )
+    for file_path in paths:
+        with open(file_path, encoding="utf-8") as input_file:
+            if not file_path.endswith(JSONL_EXTENSIONS) and file_path != path:
+                yield {"id": file_path, "text": input_file.read(), "lang": None}
+                continue
+            for line_number, line in enumerate(input_file, start=1):
+                if line.strip():
+                    item = json.loads(line)
+                    yield {"id": item.get("id", f"{file_path}:{line_number}"), "text": item["text"], "lang": item.get("lang")}
+
+# Function that splits an article into the paragraphs the widget would send (or returns it whole)
+def split_paragraphs(text, split=True):
+    from segmentation import paragraph_spans
+    if not split:
+        return [text.strip()] if text.strip() else []
+    return [text[start:end] for start, end in paragraph_spans(text)]
+
+# Function that returns the shard of a (text, language) pair. The normalized text is hashed, so that the same paragraph
+# always lands in the same shard, and both operations of a paragraph run in the same worker (simplify reuses its chunks).
+def shard_of(text, lang, shards):
+    from cache import normalize_text
+    digest = hashlib.sha256(f"{lang.lower()}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % shards
+
+# Function that reads the checkpoint of a shard, returning the keys of the finished tasks
+def read_checkpoint(path):
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get("status") == "ok":
+                    done.add(entry["key"])
+    return done
+
+# --- 2. Worker ---
+# Function that runs the tasks of one shard in this process
+def run_shard(args):
+    import model
+
+    # Pre-rendering without the persistent store would throw every result away
+    if not model.CACHE_PATH:
+        sys.exit("Error: the persistent result store is disabled (ADAPTEASE_CACHE_PATH is empty): nothing would be kept.")
+
+    started = time.monotonic()
+    operations = args.ops.split(",")
+    langs = args.langs.split(",") if args.langs else None
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    shard_name = f"{args.shard_index}-of-{args.shards}"
+    checkpoint_path = os.path.join(args.checkpoint_dir, f"checkpoint-{shard_name}.jsonl")
+    done = read_checkpoint(checkpoint_path)
+
+    # Tasks of this shard, deduplicated by cache key. Chunking runs first, so that simplify finds the chunks in the cache.
+    counts = {"articles": 0, "paragraphs": 0, "duplicates": 0, "other_shards": 0, "checkpointed": 0, "cached": 0}
+    tasks = {operation: {} for operation in operations}
+    for article in iter_articles(args.input):
+        counts["articles"] += 1
+        for paragraph in split_paragraphs(article["text"], split=not args.no_split):
+            for lang in langs or [article["lang"] or "en"]:
+                counts["paragraphs"] += 1
+                if shard_of(paragraph, lang, args.shards) != args.shard_index:
+                    counts["other_shards"] += 1
+                    continue
+                for operation in operations:
+                    key = model.result_cache_key(operation, paragraph, lang, args.profile)
+                    if key in tasks[operation]:
+                        counts["duplicates"] += 1
+                    elif key in done:
+                        counts["checkpointed"] += 1
+                    else:
+                        tasks[operation][key] = (paragraph, lang)
+
+    total = sum(len(operation_tasks) for operation_tasks in tasks.values())
+    print(f"Shard {shard_name}: {counts['articles']} article(s), {counts['paragraphs']} paragraph(s) x language, "
+          f"{total} task(s) to run ({counts['duplicates']} duplicate(s), {counts['checkpointed']} already checkpointed).")
+
+    # The backend is loaded once, before the clock of the generation starts
+    model.get_backend()
+    generation_started = time.monotonic()
+    outcome = {"generated": 0, "failed": 0}
+    input_tokens = 0
+    last_report = time.monotonic()
+
+    # Function that computes a task and stores its result, returning its status (a result that can't be cached is a failure)
+    def run_task(operation, key, text, lang):
+        if model.result_cache.get(key) is not None:
+            return "cached"
+        compute_fn, is_cacheable = model.OPERATIONS[operation]
+        result = compute_fn(text, lang=lang, profile=args.profile)
+        if not is_cacheable(result):
+            return "failed"
+        model.result_cache.set(key, result, operation=operation, lang=lang)
+        return "generated"
+
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint_file, ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for operation in operations:
+
+            # Concurrent tasks share the batches of the scheduler
+            futures = {
+                executor.submit(run_task, operation, key, text, lang): (key, text)
+                for key, (text, lang) in tasks[operation].items()
+            }
+            for future in as_completed(futures):
+                key, text = futures[future]
+                try:
+                    status = future.result()
+                except Exception as e:
+                    print(f"Error pre-rendering {operation} task {key[:12]}: {e}")
+                    status = "failed"
+
+                # Checkpoint: the failed tasks are written too, but only the successful ones are skipped on resume
+                if status == "cached":
+                    counts["cached"] += 1
+                else:
+                    outcome[status] += 1
+                    input_tokens += model.count_text_tokens(text) if status == "generated" else 0
+                checkpoint_file.write(json.dumps({"key": key, "operation": operation, "status": "failed" if status == "failed" else "ok"}) + "\n")
+                checkpoint_file.flush()
+
+                # Periodic progress
+                finished = outcome["generated"] + outcome["failed"] + counts["cached"]
+                if time.monotonic() - last_report >= args.report_interval:
+                    last_report = time.monotonic()
+                    elapsed = last_report - generation_started
+                    print(f"Shard {shard_name}: {finished}/{total} task(s) done, {finished / elapsed:.2f} task(s)/s, {outcome['failed']} failed.")
+
+    # Throughput report of the shard
+    elapsed = time.monotonic() - generation_started
+    report = {
+        "shard": shard_name,
+        "input": args.input,
+        "operations": operations,
+        "langs": langs,
+        "profile": args.profile or model.DEFAULT_GENERATION_PROFILE,
+        **counts,
+        "tasks": total,
+        **outcome,
+        "generated_input_tokens": input_tokens,
+        "setup_seconds": generation_started - started,
+        "generation_seconds": elapsed,
+        "tasks_per_second": (outcome["generated"] + outcome["failed"]) / elapsed if elapsed else 0.0,
+        "input_tokens_per_second": input_tokens / elapsed if elapsed else 0.0,
+    }
+    with open(os.path.join(args.checkpoint_dir, f"report-{shard_name}.json"), "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"Shard {shard_name} finished: {outcome['generated']} generated, {counts['cached']} already cached, {outcome['failed']} failed "
+          f"in {elapsed:.1f}s ({report['tasks_per_second']:.2f} task(s)/s, {report['input_tokens_per_second']:.1f} input token(s)/s).")
+    return report
+
+# --- 3. Local Workers ---
+# Function that starts one worker process per local shard (each of them pinned to a device, if given) and sums their reports.
+# The shards of this command (--shards/--shard-index, e.g. one per machine) are split again among the processes.
+def run_processes(args, argv):
+    devices = args.devices.split(",") if args.devices else []
+    total_shards = args.shards * args.processes
+    workers = []
+    for process_index in range(args.processes):
+        shard_index = args.shard_index * args.processes + process_index
+        env = dict(os.environ)
+        if devices:
+            env["CUDA_VISIBLE_DEVICES"] = devices[process_index % len(devices)]
+        command = [sys.executable, os.path.abspath(__file__), *argv, "--processes", "1", "--shards", str(total_shards), "--shard-index", str(shard_index)]
+        workers.append((shard_index, subprocess.Popen(command, env=env)))
+        print(f"Started worker {shard_index}-of-{total_shards}" + (f" on device {env['CUDA_VISIBLE_DEVICES']}." if devices else "."))
+
+    failed = [shard_index for shard_index, worker in workers if worker.wait() != 0]
+
+    # Summary of the reports of the workers
+    reports = []
+    for shard_index, _ in workers:
+        report_path = os.path.join(args.checkpoint_dir, f"report-{shard_index}-of-{total_shards}.json")
+        if os.path.exists(report_path):
+            with open(report_path, encoding="utf-8") as report_file:
+                reports.append(json.load(report_file))
+    generated = sum(report["generated"] for report in reports)
+    elapsed = max((report["generation_seconds"] for report in reports), default=0.0)
+    print(f"All workers finished: {generated} generated, {sum(report['cached'] for report in reports)} already cached, "
+          f"{sum(report['failed'] for report in reports)} failed, {generated / elapsed if elapsed else 0.0:.2f} task(s)/s overall.")
+    if failed:
+        sys.exit(f"Error: worker(s) {', '.join(map(str, failed))} exited with an error.")
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="Pre-render the AdaptEase results of an article archive into the persistent result store.")
+    parser.add_argument("--input", required=True, help="JSON lines file ({\"text\", \"lang\", \"id\"} per line) or directory of .jsonl/.txt/.md files")
+    parser.add_argument("--ops", default="chunk,simplify", help="comma separated operations: chunk, simplify")
+    parser.add_argument("--langs", default=None, help="comma separated languages (default: the lang of every article, or en)")
+    parser.add_argument("--profile", default=None, help="generation profile (default: the default profile of the server)")
+    parser.add_argument("--no-split", action="store_true", help="process every article as a whole instead of paragraph by paragraph")
+    parser.add_argument("--shards", type=int, default=1, help="total number of shards")
+    parser.add_argument("--shard-index", type=int, default=0, help="shard processed by this command (0-based)")
+    parser.add_argument("--processes", type=int, default=1, help="local worker processes, each with its own share of the shard")
+    parser.add_argument("--devices", default=None, help="comma separated CUDA devices assigned in turn to the worker processes")
+    parser.add_argument("--concurrency", type=int, default=None, help="tasks in flight per worker (default: ADAPTEASE_MAX_CONCURRENT_GENERATIONS)")
+    parser.add_argument("--checkpoint-dir", default="cache/prerender", help="folder of the checkpoints and reports")
+    parser.add_argument("--report-interval", type=float, default=30.0, help="seconds between two progress lines")
+    args = parser.parse_args(argv)
+
+    unknown = [operation for operation in args.ops.split(",") if operation not in ("chunk", "simplify")]
+    if unknown:
+        parser.error(f"unknown operation(s): {', '.join(unknown)}. Available: chunk, simplify")
+    if not 0 <= args.shard_index < args.shards:
+        parser.error("--shard-index must be between 0 and --shards - 1")
+
+    # Several local workers: this process only coordinates them
+    if args.processes > 1:
+        return run_processes(args, list(argv))
+
+    # Every task holds a generation slot: the default concurrency fills the slots without overflowing the admission queue
+    os.environ.setdefault("ADAPTEASE_WARMUP_TOKENS", "0")
+    args.concurrency = args.concurrency or int(os.getenv("ADAPTEASE_MAX_CONCURRENT_GENERATIONS", "16"))
+    run_shard(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from tracing import log
+
+# --- 1. Sampling Profiler ---
+# StackSampler takes the Python stack of every thread of the process every interval_seconds (sys._current_frames) and
+# counts the folded stacks ("thread;outer_function (file:line);...;inner_function (file:line)", the input format of
+# flamegraph.pl and speedscope). Samples of threads waiting on a lock, a queue or a socket (their innermost Python frame
+# is in one of IDLE_FILES) are skipped: they are idle (e.g. the workers of an empty pool), and would hide the threads
+# doing the work.
+IDLE_FILES = ("threading.py", "queue.py", "thread.py", "selectors.py", "socket.py", "socketserver.py")
+
+class StackSampler:
+
+    def __init__(self, interval_seconds=0.005):
+        self.interval_seconds = max(0.001, interval_seconds)
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="adaptease-stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    # Stops the sampling and returns the folded stacks
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join([names.get(thread_id, str(thread_id))] + stack[::-1])] += 1
+            self.samples += 1
+
+# Function that returns the functions with the most samples at the top of the stack (self time), as (function, share)
+def top_functions(stacks, limit=20):
+    leaves = Counter()
+    for stack, samples in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += samples
+    total = sum(leaves.values()) or 1
+    return [(function, round(samples / total, 4)) for function, samples in leaves.most_common(limit)]
+
+# --- 2. Profiling Window ---
+# An admin opens a profiling window for the next N traced requests (see the /api/admin/profile endpoint): when the first
+# of them starts, the profilers start, and when the last of them ends, they stop and write their output to output_dir,
+# under the id of the window:
+# - <id>.folded: the Python stacks sampled in every thread (StackSampler)
+# - <id>.torch.json and <id>.torch.txt: the chrome trace and the operator summary of the torch profiler, when torch is
+#   loaded (the stub backend never loads it), with CUDA activities if a GPU is available
+# A window is closed after max_seconds from its opening anyway (whether its requests came or not), or on demand (close).
+# Both profilers cover the whole process while the window is open, so they also see the concurrent requests; the traces
+# of the profiled requests carry the window id (attribute "profile") and are always written (see tracing.TraceWriter).
+# The torch profiler must be started and stopped by the same thread, and it records the operators of that thread: it
+# runs in a thread of the window, and every call to it goes through torch_runner(fn), which runs fn in the thread doing
+# the generations (e.g. the worker of the batch scheduler, see model.py) and returns its result. Without a runner, the
+# calls run in the thread of the window itself. Profiling and writing the output never block the profiled requests.
+class ProfilingWindow:
+
+    def __init__(self, output_dir="profiles", sample_interval_ms=5, max_seconds=300, torch_runner=None):
+        self.output_dir = output_dir
+        self.sample_interval_seconds = sample_interval_ms / 1000.0
+        self.max_seconds = max_seconds
+        self.torch_runner = torch_runner
+        self._lock = threading.Lock()
+        self._state = "idle"
+        self._window = None
+        self._report = None
+
+    # Opens a window for the next requests. Raises RuntimeError if a window is already open.
+    def arm(self, requests, torch_profiler=True, sampling=True):
+        with self._lock:
+            if self._state != "idle":
+                raise RuntimeError(f"A profiling window is already {self._state}.")
+            self._state = "armed"
+            self._window = window = {
+                "id": time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}-{os.getpid()}",
+                "requests": max(1, int(requests)), "enrolled": 0, "finished": 0,
+                "torch": torch_profiler, "sampling": sampling, "armed_at": time.time(),
+            }
+
+        # A window whose requests never come (or never end) is closed anyway
+        timer = threading.Timer(self.max_seconds, self._close, args=(window["id"], "expired"))
+        timer.daemon = True
+        timer.start()
+        return self.status()
+
+    # Enrolls a starting request in the open window, if it still needs requests (starting the profilers with the first
+    # one). Returns the window id, or None.
+    def enroll(self):
+        with self._lock:
+            window = self._window
+            if self._state not in ("armed", "running") or window["enrolled"] >= window["requests"]:
+                return None
+            window["enrolled"] += 1
+            if self._state == "armed":
+                self._start(window)
+            return window["id"]
+
+    # Tells the window that a request enrolled in it has ended (stopping the profilers after the last one)
+    def complete(self, window_id):
+        with self._lock:
+            window = self._window
+            if self._state != "running" or window["id"] != window_id:
+                return
+            window["finished"] += 1
+            if window["finished"] < window["requests"]:
+                return
+        self._close(window_id)
+
+    # Closes the open window right away (e.g. armed on a replica that gets no traffic). Returns False if none is open.
+    def close(self):
+        with self._lock:
+            window_id = self._window["id"] if self._state in ("armed", "running") else None
+        return window_id is not None and self._close(window_id, "closed")
+
+    # Closes the given window (if it is still open), stopping the profilers and writing their output in the background
+    def _close(self, window_id, reason=None):
+        with self._lock:
+            window = self._window
+            if self._state not in ("armed", "running") or window["id"] != window_id:
+                return False
+            self._state = "stopping"
+            window["closed_by"] = reason
+        threading.Thread(target=self._stop, args=(window,), name="adaptease-profiler-stop", daemon=True).start()
+        return True
+
+    # Starts the profilers (the caller must hold the lock)
+    def _start(self, window):
+        self._state = "running"
+        window["started"] = time.monotonic()
+        window["sampler"] = StackSampler(self.sample_interval_seconds) if window["sampling"] else None
+        if window["sampler"] is not None:
+            window["sampler"].start()
+
+        # The torch profiler, only if the backend already loaded torch
+        window["torch_thread"] = None
+        torch = sys.modules.get("torch") if window["torch"] else None
+        if window["torch"] and torch is None:
+            window["torch_note"] = "torch is not loaded by this backend"
+        elif torch is not None:
+            window["torch_started"], window["torch_stop"] = threading.Event(), threading.Event()
+            window["torch_thread"] = threading.Thread(
+                target=self._run_torch_profiler, args=(window, torch), name="adaptease-torch-profiler", daemon=True
+            )
+            window["torch_thread"].start()
+
+    # Runs fn in the thread doing the generations (see torch_runner)
+    def _in_generation_thread(self, fn):
+        return self.torch_runner(fn) if self.torch_runner is not None else fn()
+
+    # Lifetime of the torch profiler of a window: started when the window starts, stopped (and exported) when it closes,
+    # both in the generation thread
+    def _run_torch_profiler(self, window, torch):
+        def start():
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            profiler = torch.profiler.profile(activities=activities, record_shapes=True)
+            profiler.start()
+            return profiler
+
+        def stop(profiler, prefix):
+            profiler.stop()
+            profiler.export_chrome_trace(prefix + ".torch.json")
+            with open(prefix + ".torch.txt", "w", encoding="utf-8") as f:
+                f.write(profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=30))
+            return [prefix + ".torch.json", prefix + ".torch.txt"]
+
+        try:
+            profiler = self._in_generation_thread(start)
+        except Exception as e:
+            window["torch_note"] = f"torch profiler unavailable: {e}"
+            return
+        finally:
+            window["torch_started"].set()
+
+        window["torch_stop"].wait()
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            window["torch_files"] = self._in_generation_thread(lambda: stop(profiler, os.path.join(self.output_dir, window["id"])))
+        except Exception as e:
+            window["torch_note"] = f"torch profiler failed: {e}"
+
+    # Stops the profilers and writes their output
+    def _stop(self, window):
+        started = window.get("started")
+        report = {
+            "id": window["id"], "requests": window["finished"],
+            "seconds": round(time.monotonic() - started, 3) if started is not None else 0.0,
+            "expired": window["closed_by"] == "expired", "closed": window["closed_by"] == "closed", "files": [],
+        }
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            prefix = os.path.join(self.output_dir, window["id"])
+
+            if window.get("sampler") is not None:
+                stacks = window["sampler"].stop()
+                with open(prefix + ".folded", "w", encoding="utf-8") as f:
+                    f.writelines(f"{stack} {samples}\n" for stack, samples in stacks.most_common())
+                report["files"].append(prefix + ".folded")
+                report["samples"] = window["sampler"].samples
+                report["top_functions"] = top_functions(stacks)
+
+            if window.get("torch_thread") is not None:
+                window["torch_started"].wait()
+                window["torch_stop"].set()
+                window["torch_thread"].join()
+                report["files"] += window.get("torch_files", [])
+            if window.get("torch_note"):
+                report["torch"] = window["torch_note"]
+
+        except Exception as e:
+            report["error"] = str(e)
+            log(f"Error writing the profiles of window {window['id']}: {e}", level="error")
+
+        log(f"Profiling window {window['id']} closed: {report['requests']} request(s), {report['seconds']} s, files: {report['files']}")
+        with self._lock:
+            self._state, self._window, self._report = "idle", None, report
+
+    # State of the window (and the report of the last closed one)
+    def status(self):
+        with self._lock:
+            window = self._window
+            return {
+                "state": self._state,
+                "window": {key: window[key] for key in ("id", "requests", "enrolled", "finished", "torch", "sampling")} if window else None,
+                "last_report": self._report,
+            }
@@ -0,0 +1,268 @@
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# --- 1. Model Replicas ---
+# A single server process holds a single copy of the model: one device (or one CPU socket) does all the work, and a slow
+# generation delays everything queued behind it. ReplicaPool runs N copies of server.py on the same host, each one
+# pinned to its own devices (CUDA_VISIBLE_DEVICES) or CPU cores (scheduler affinity), listening on its own local port.
+# The front process (router.py) sends every request to the least loaded replica, so the throughput grows with the replicas.
+# - All the replicas share the persistent result store (ADAPTEASE_CACHE_PATH, SQLite in WAL mode): a result computed by
+#   one replica is a cache hit for the others. The in-memory tier stays local to every replica.
+# - A health checker probes every replica: a replica is routable once its /readyz answers 200 (model loaded). Replicas
+#   whose process exited, or that stopped answering their probes, are restarted, with an exponential backoff when they
+#   keep failing.
+
+# Raised when no replica can take a request
+class NoReplicaAvailableError(RuntimeError):
+    pass
+
+# Function that parses a CPU set ("0-7", "0,2,4" or "0-3+8-11", where "+" separates ranges within a set) into a set of cores
+def parse_cpu_set(spec):
+    cores = set()
+    for part in spec.replace("+", ",").split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cores.update(range(int(first), int(last) + 1))
+        elif part.strip():
+            cores.add(int(part))
+    return cores
+
+class Replica:
+
+    def __init__(self, index, port, devices=None, cpus=None):
+        self.index = index
+        self.port = port
+        self.devices = devices
+        self.cpus = cpus
+
+        # Process and state, updated by the pool
+        self.process = None
+        self.state = "stopped"
+        self.in_flight = 0
+        self.served = 0
+        self.restarts = 0
+        self.failed_probes = 0
+        self.started_at = None
+        self.next_start_at = 0.0
+
+    # Number of requests the replica is working on: the load used by the routing
+    @property
+    def load(self):
+        return self.in_flight
+
+    def stats(self):
+        return {
+            "index": self.index,
+            "port": self.port,
+            "pid": self.process.pid if self.process is not None else None,
+            "state": self.state,
+            "devices": self.devices,
+            "cpus": sorted(self.cpus) if self.cpus else None,
+            "in_flight": self.in_flight,
+            "served": self.served,
+            "restarts": self.restarts,
+        }
+
+class ReplicaPool:
+
+    def __init__(self, count, base_port=5100, devices=None, cpu_sets=None, command=None, host="127.0.0.1",
+                 health_interval=2.0, probe_timeout=2.0, max_failed_probes=5, startup_timeout=120.0, max_backoff=60.0, env=None):
+
+        # One replica per port. Devices and CPU sets are assigned in turn (e.g. 4 replicas on 2 GPUs: 2 replicas per GPU).
+        devices = devices or []
+        cpu_sets = cpu_sets or []
+        self.replicas = [
+            Replica(
+                index, base_port + index,
+                devices=devices[index % len(devices)].replace("+", ",") if devices else None,
+                cpus=parse_cpu_set(cpu_sets[index % len(cpu_sets)]) if cpu_sets else None
+            )
+            for index in range(count)
+        ]
+        self.command = command or [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")]
+        self.host = host
+        self.health_interval = health_interval
+        self.probe_timeout = probe_timeout
+        self.max_failed_probes = max_failed_probes
+        self.startup_timeout = startup_timeout
+        self.max_backoff = max_backoff
+        self.env = env
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._checker = None
+        self._next_index = 0
+
+    # --- Processes ---
+    # Starts a replica process, with its port, devices and CPU cores
+    def _start(self, replica):
+        env = dict(self.env if self.env is not None else os.environ)
+        env["ADAPTEASE_PORT"] = str(replica.port)
+        env["ADAPTEASE_REPLICA_INDEX"] = str(replica.index)
+        if replica.devices is not None:
+            env["CUDA_VISIBLE_DEVICES"] = replica.devices
+        if replica.cpus:
+            env.setdefault("ADAPTEASE_CPU_THREADS", str(len(replica.cpus)))
+
+        replica.process = subprocess.Popen(self.command, env=env)
+
+        # The affinity of the process is inherited by the threads it creates (torch's included)
+        if replica.cpus and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(replica.process.pid, replica.cpus)
+            except OSError as e:
+                print(f"Warning: could not pin replica {replica.index} to CPUs {sorted(replica.cpus)}: {e}")
+
+        replica.state = "starting"
+        replica.failed_probes = 0
+        replica.started_at = time.monotonic()
+        print(f"Replica {replica.index} started (pid {replica.process.pid}, port {replica.port}"
+              + (f", devices {replica.devices}" if replica.devices is not None else "")
+              + (f", {len(replica.cpus)} CPU cores" if replica.cpus else "") + ").")
+
+    # Stops a replica process (SIGTERM, then SIGKILL if it doesn't exit)
+    def _stop(self, replica, timeout=10.0):
+        if replica.process is not None and replica.process.poll() is None:
+            replica.process.terminate()
+            try:
+                replica.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                replica.process.kill()
+                replica.process.wait()
+        replica.state = "stopped"
+
+    # Schedules the restart of a failed replica, with an exponential backoff on the consecutive failures
+    def _schedule_restart(self, replica, reason):
+        backoff = min(self.max_backoff, 2.0 ** min(replica.restarts, 10))
+        print(f"Replica {replica.index} {reason}: restarting it in {backoff:.0f}s.")
+        self._stop(replica, timeout=5.0)
+        replica.state = "restarting"
+        replica.restarts += 1
+        replica.next_start_at = time.monotonic() + backoff
+
+    def start(self):
+        for replica in self.replicas:
+            self._start(replica)
+        self._checker = threading.Thread(target=self._check_loop, name="adaptease-replica-health", daemon=True)
+        self._checker.start()
+
+    def stop(self):
+        self._stop_event.set()
+        for replica in self.replicas:
+            self._stop(replica)
+
+    # --- Health Checking ---
+    # Probes the readiness of a replica: "ready" (200), "loading" (any other answer) or None (no answer)
+    def _probe(self, replica):
+        connection = http.client.HTTPConnection(self.host, replica.port, timeout=self.probe_timeout)
+        try:
+            connection.request("GET", "/readyz")
+            response = connection.getresponse()
+            response.read()
+            return "ready" if response.status == 200 else "loading"
+        except (OSError, http.client.HTTPException):
+            return None
+        finally:
+            connection.close()
+
+    # Checks every replica once: restarts the exited and unresponsive ones, and updates the state of the others
+    def check(self):
+        for replica in self.replicas:
+            if replica.state == "restarting":
+                if time.monotonic() >= replica.next_start_at:
+                    self._start(replica)
+                continue
+            if replica.state == "stopped":
+                continue
+
+            # The process exited (crash, out of memory...)
+            exit_code = replica.process.poll()
+            if exit_code is not None:
+                self._schedule_restart(replica, f"exited with code {exit_code}")
+                continue
+
+            # The server of a replica answers its probes (with a 503) while the model is loading: replicas that stopped
+            # answering, or never started to, are restarted
+            status = self._probe(replica)
+            if status is None:
+                replica.failed_probes += 1
+                if replica.state == "starting":
+                    if time.monotonic() - replica.started_at > self.startup_timeout:
+                        self._schedule_restart(replica, f"didn't answer within {self.startup_timeout:.0f}s")
+                elif replica.failed_probes >= self.max_failed_probes:
+                    self._schedule_restart(replica, f"failed {replica.failed_probes} health checks")
+                continue
+
+            # A replica that stays healthy for a while gets its backoff reset
+            replica.failed_probes = 0
+            if status == "ready" and replica.state != "ready":
+                print(f"Replica {replica.index} is ready.")
+                if time.monotonic() - replica.started_at > self.max_backoff:
+                    replica.restarts = 0
+            replica.state = status
+
+    def _check_loop(self):
+        while not self._stop_event.wait(self.health_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Error during the replica health check: {e}")
+
+    # --- Routing ---
+    # Returns the least loaded replica that can take a request (excluding the given ones), or None.
+    # Ready replicas are preferred; while no replica is ready, the loading ones still answer (e.g. cached results, or the 503
+    # telling the client to retry). Ties go round-robin, so that idle replicas share the requests evenly.
+    def _pick(self, exclude=()):
+        candidates = [replica for replica in self.replicas if replica.state == "ready" and replica.index not in exclude]
+        if not candidates:
+            candidates = [replica for replica in self.replicas if replica.state == "loading" and replica.index not in exclude]
+        if not candidates:
+            return None
+        self._next_index += 1
+        return min(candidates, key=lambda replica: (replica.load, (replica.index - self._next_index) % len(self.replicas)))
+
+    # Takes the least loaded replica for a request: it counts as busy (for the routing) until it is released
+    def take(self, exclude=()):
+        with self._lock:
+            replica = self._pick(exclude)
+            if replica is None:
+                raise NoReplicaAvailableError("No model replica is available.")
+            replica.in_flight += 1
+            return replica
+
+    def release(self, replica):
+        with self._lock:
+            replica.in_flight -= 1
+            replica.served += 1
+
+    # Takes the least loaded replica for the duration of a block
+    @contextmanager
+    def acquire(self, exclude=()):
+        replica = self.take(exclude)
+        try:
+            yield replica
+        finally:
+            self.release(replica)
+
+    # Marks a replica as unreachable (a connection to it failed): it is not routed to until its next successful probe
+    def mark_unreachable(self, replica):
+        with self._lock:
+            if replica.state in ("ready", "loading"):
+                replica.state = "unreachable"
+                replica.failed_probes += 1
+
+    def ready_count(self):
+        return sum(1 for replica in self.replicas if replica.state == "ready")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "replicas": [replica.stats() for replica in self.replicas],
+                "ready": self.ready_count(),
+                "in_flight": sum(replica.in_flight for replica in self.replicas),
+            }
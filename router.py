@@ -0,0 +1,256 @@
+import atexit
+import http.client
+import json
+import os
+import signal
+import sys
+from flask import Flask, request, jsonify, Response, stream_with_context
+from flask_cors import CORS
+from metrics import registry
+from replicas import ReplicaPool, NoReplicaAvailableError
+from auth import admin_endpoint
+
+
+# --- 1. Multi-Replica Front ---
+# Serving mode with several copies of the model on the same host (see replicas.py): this process doesn't load any model,
+# it starts ADAPTEASE_REPLICAS copies of server.py (each one pinned to its own devices or CPU cores) and forwards every
+# request to the least loaded one. Streamed responses are forwarded as they are produced.
+# Configuration is done through env variables (the other ADAPTEASE_* variables are passed on to the replicas):
+# - ADAPTEASE_REPLICAS: number of replicas
+# - ADAPTEASE_REPLICA_BASE_PORT: local port of the first replica (the others follow)
+# - ADAPTEASE_REPLICA_DEVICES: comma separated CUDA devices of the replicas, assigned in turn ("0,1,2,3"; "0+1,2+3" for two
+#   devices per replica)
+# - ADAPTEASE_REPLICA_CPUS: comma separated CPU core sets of the replicas, assigned in turn ("0-15,16-31"; "0-7+16-23" to
+#   join ranges), for CPU backends (one replica per socket, for example)
+# - ADAPTEASE_REPLICA_HEALTH_INTERVAL: seconds between two health checks of the replicas
+# - ADAPTEASE_REPLICA_STARTUP_TIMEOUT: seconds a new replica has to start answering its health checks
+# Usage:
+#   ADAPTEASE_REPLICAS=4 ADAPTEASE_REPLICA_DEVICES=0,1,2,3 python router.py
+REPLICA_COUNT = int(os.getenv("ADAPTEASE_REPLICAS", "2"))
+REPLICA_BASE_PORT = int(os.getenv("ADAPTEASE_REPLICA_BASE_PORT", "5100"))
+REPLICA_DEVICES = [devices for devices in os.getenv("ADAPTEASE_REPLICA_DEVICES", "").split(",") if devices]
+REPLICA_CPUS = [cpus for cpus in os.getenv("ADAPTEASE_REPLICA_CPUS", "").split(",") if cpus]
+REPLICA_HEALTH_INTERVAL = float(os.getenv("ADAPTEASE_REPLICA_HEALTH_INTERVAL", "2"))
+REPLICA_STARTUP_TIMEOUT = float(os.getenv("ADAPTEASE_REPLICA_STARTUP_TIMEOUT", "120"))
+
+# Timeout of the forwarded requests: the deadline of the requests (enforced by the replicas) plus a margin
+PROXY_TIMEOUT_SECONDS = float(os.getenv("ADAPTEASE_REQUEST_TIMEOUT", "120")) + 30
+
+# Seconds after which clients should retry when no replica is available
+NO_REPLICA_RETRY_AFTER_SECONDS = 10
+
+# Request headers forwarded to the replicas (the others, e.g. Host or Connection, are about the connection to this process)
+FORWARDED_REQUEST_HEADERS = ("Content-Type", "Accept", "Accept-Language", "User-Agent", "If-None-Match", "Authorization")
+
+# Response headers not forwarded back to the clients (the body is re-chunked by this server)
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "content-length", "server", "date"}
+
+app = Flask(__name__)
+CORS(app)
+
+replica_pool = ReplicaPool(
+    REPLICA_COUNT,
+    base_port=REPLICA_BASE_PORT,
+    devices=REPLICA_DEVICES,
+    cpu_sets=REPLICA_CPUS,
+    health_interval=REPLICA_HEALTH_INTERVAL,
+    startup_timeout=REPLICA_STARTUP_TIMEOUT
+)
+
+# --- 1.1 Routing Metrics ---
+routed_requests_total = registry.counter(
+    "adaptease_router_requests_total", "Requests forwarded to the replicas, by replica and status code.", ["replica", "status"]
+)
+router_retries_total = registry.counter(
+    "adaptease_router_retries_total", "Requests sent again to another replica after a connection failure."
+)
+replica_in_flight = registry.gauge("adaptease_replica_in_flight_requests", "Requests being served by a replica.", ["replica"])
+replica_up = registry.gauge("adaptease_replica_ready", "1 if the replica is ready to generate.", ["replica"])
+replica_restarts = registry.gauge("adaptease_replica_restarts", "Restarts of a replica since its last stable start.", ["replica"])
+
+# Collector of the replica gauges
+def collect_replica_metrics():
+    for replica in replica_pool.stats()["replicas"]:
+        label = str(replica["index"])
+        replica_in_flight.set(replica["in_flight"], replica=label)
+        replica_up.set(1 if replica["state"] == "ready" else 0, replica=label)
+        replica_restarts.set(replica["restarts"], replica=label)
+
+registry.add_collector(collect_replica_metrics)
+
+# --- 2. Forwarding ---
+# Function that sends the current request to a replica and returns the (replica, connection, response) triple, the body
+# of the response not read yet. The replica stays taken until relay_response has sent the whole body.
+# Connection failures (the replica just crashed, or is restarting) are retried on the other replicas: the chunk/simplify
+# requests have no side effect, so sending them again is safe.
+def forward_current_request():
+    body = request.get_data()
+    headers = {name: request.headers[name] for name in FORWARDED_REQUEST_HEADERS if name in request.headers}
+    path = request.full_path if request.query_string else request.path
+    tried = set()
+
+    while True:
+        replica = replica_pool.take(exclude=tried)
+        connection = http.client.HTTPConnection(replica_pool.host, replica.port, timeout=PROXY_TIMEOUT_SECONDS)
+        try:
+            connection.request(request.method, path, body=body or None, headers=headers)
+            response = connection.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            replica_pool.release(replica)
+            print(f"Replica {replica.index} unreachable ({e}): retrying the request on another replica.")
+            replica_pool.mark_unreachable(replica)
+            router_retries_total.inc()
+            tried.add(replica.index)
+            continue
+
+        routed_requests_total.inc(replica=str(replica.index), status=str(response.status))
+        return replica, connection, response
+
+# Function that builds the Flask response of a replica response, streaming its body as it arrives, then releases the replica
+def relay_response(replica, connection, response):
+
+    def body():
+        try:
+            while True:
+                data = response.read1(65536)
+                if not data:
+                    break
+                yield data
+        finally:
+            connection.close()
+            replica_pool.release(replica)
+
+    headers = [(name, value) for name, value in response.getheaders() if name.lower() not in HOP_BY_HOP_HEADERS]
+    return Response(stream_with_context(body()), status=response.status, headers=headers, direct_passthrough=True)
+
+# Helper that forwards the current request to a replica and relays its answer
+def proxy_current_request():
+    try:
+        return relay_response(*forward_current_request())
+    except NoReplicaAvailableError as e:
+        response = jsonify({"error": str(e), "replicas": replica_pool.stats()["replicas"]})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(NO_REPLICA_RETRY_AFTER_SECONDS)
+        return response
+
+# --- 3. Endpoints ---
+# The model endpoints (and the read-only info endpoints) are forwarded to the least loaded replica
+@app.route('/api/text-in-blocks', methods=['POST'])
+@app.route('/api/simplify-text', methods=['POST'])
+@app.route('/api/batch', methods=['POST'])
+@app.route('/api/results/<operation>/<lang>/<content_hash>', methods=['GET'])
+@app.route('/api/profiles', methods=['GET'])
+@app.route('/api/cache/stats', methods=['GET'])
+@app.route('/api/prefix-cache/stats', methods=['GET'])
+def forwarded_endpoint(**_):
+    return proxy_current_request()
+
+# Helper that sends a POST request to every live replica and returns the JSON answers of the ones that answered 200
+def broadcast_post(path, body):
+    return [answer for _, answer in broadcast_request("POST", path, body or b"{}")]
+
+# Helper that sends a request to every live replica and returns the (replica index, JSON answer) pairs of the ones
+# that answered 200. The admin token of the current request (if any) goes with it.
+def broadcast_request(method, path, body=None):
+    answers = []
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    if "Authorization" in request.headers:
+        headers["Authorization"] = request.headers["Authorization"]
+    for replica in replica_pool.replicas:
+        if replica.state not in ("ready", "loading"):
+            continue
+        connection = http.client.HTTPConnection(replica_pool.host, replica.port, timeout=PROXY_TIMEOUT_SECONDS)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            if response.status == 200:
+                answers.append((replica.index, json.loads(response.read())))
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            print(f"Error sending {path} to replica {replica.index}: {e}")
+        finally:
+            connection.close()
+    return answers
+
+# Cache invalidation goes to every replica: the persistent store is shared, but every replica has its own memory tier.
+# The answer is the number of results removed from the store (the largest count of the replicas, the first one to run
+# removes them from the disk). It is an admin endpoint (see auth.py): the token is checked here before the broadcast, and
+# the validation errors are answered by the replicas.
+@app.route('/api/cache/invalidate', methods=['POST'])
+@admin_endpoint
+def cache_invalidate_endpoint():
+    answers = broadcast_post("/api/cache/invalidate", request.get_data())
+    if not answers:
+        return proxy_current_request()
+    return jsonify({"invalidated": max((answer.get("invalidated", 0) for answer in answers), default=0), "replicas": len(answers)})
+
+# The batches of a session may be served by any replica: its promotions and cancellations go to all of them, and the
+# counts are summed. Their validation errors are answered by the replicas (the first one that rejects them).
+@app.route('/api/session/promote', methods=['POST'])
+@app.route('/api/session/cancel', methods=['POST'])
+def session_endpoint():
+    body = request.get_data()
+    key = "promoted" if request.path.endswith("/promote") else "cancelled"
+    answers = broadcast_post(request.path, body)
+    if not answers:
+        return proxy_current_request()
+    return jsonify({key: sum(answer.get(key, 0) for answer in answers), "replicas": len(answers)})
+
+# Every replica profiles its own requests: a profiling window is opened on all of them, and the state is read from all
+# of them, keyed by replica index (and closed on all of them). Its validation errors (or a window already open) are
+# answered by the replicas. It is an admin endpoint (see auth.py): the token is checked here before the broadcast.
+@app.route('/api/admin/profile', methods=['GET', 'POST', 'DELETE'])
+@admin_endpoint
+def admin_profile_endpoint():
+    answers = broadcast_request(request.method, request.path, (request.get_data() or b"{}") if request.method == "POST" else None)
+    if not answers:
+        return proxy_current_request()
+    return jsonify({"replicas": {str(index): answer for index, answer in answers}})
+
+# Metrics of the front (routing, replicas). Every replica exposes its own /metrics on its local port.
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# The front is alive as long as this process is
+@app.route('/healthz', methods=['GET'])
+def healthz_endpoint():
+    return jsonify({"status": "ok"})
+
+# The front is ready as soon as one replica is
+@app.route('/readyz', methods=['GET'])
+def readyz_endpoint():
+    stats = replica_pool.stats()
+    return jsonify(stats), 200 if stats["ready"] else 503
+
+@app.route('/api/replicas', methods=['GET'])
+def replicas_endpoint():
+    return jsonify(replica_pool.stats())
+
+# --- 4. Run ---
+# The front is served like server.py (ADAPTEASE_SERVER and ADAPTEASE_PORT), and stops its replicas when it exits.
+SERVER_MODE = os.getenv("ADAPTEASE_SERVER", "dev")
+SERVER_PORT = int(os.getenv("ADAPTEASE_PORT", "5000"))
+SERVER_THREADS = int(os.getenv("ADAPTEASE_SERVER_THREADS", str(64 * max(1, REPLICA_COUNT))))
+
+def shutdown(*_):
+    replica_pool.stop()
+    sys.exit(0)
+
+if __name__ == '__main__':
+
+    # The replicas listen on their own ports: ADAPTEASE_PORT is the port of the front only
+    atexit.register(replica_pool.stop)
+    signal.signal(signal.SIGTERM, shutdown)
+    print(f"Starting {REPLICA_COUNT} replica(s) on ports {REPLICA_BASE_PORT}-{REPLICA_BASE_PORT + REPLICA_COUNT - 1}.")
+    replica_pool.start()
+
+    if SERVER_MODE == 'production':
+        try:
+            from waitress import serve
+        except ImportError:
+            raise SystemExit("ADAPTEASE_SERVER=production requires waitress (pip install waitress).")
+        print(f"Serving the replica front in production mode on port {SERVER_PORT} with {SERVER_THREADS} threads.")
+        serve(app, host='0.0.0.0', port=SERVER_PORT, threads=SERVER_THREADS, channel_timeout=int(PROXY_TIMEOUT_SECONDS) + 30)
+    else:
+        app.run(debug=False, use_reloader=False, threaded=True, host='0.0.0.0', port=SERVER_PORT)
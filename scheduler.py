@@ -0,0 +1,322 @@
+import itertools
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from tracing import log
+
+# --- 1. Dynamic Micro-Batching Scheduler ---
+# model.generate is much more efficient on a batch of prompts than on a single one, but every Flask request
+# carries a single prompt. The BatchScheduler sits in front of the model: concurrent requests are collected for a
+# short (configurable) window, grouped and sent to the model together, and every decoded answer goes back to its caller.
+#
+# The scheduler doesn't know anything about models: it only calls generate_fn(payloads, group) -> list of results,
+# where payloads are the submitted items of one batch (all sharing the same group) and results are in the same order.
+# - group: requests can be batched together only if they share the group (e.g. the same generation settings).
+# - length: size of the request (e.g. prompt tokens). Only requests of similar length end up in the same batch,
+#   so that short prompts are not padded to the size of a very long one.
+# - priority: lower values are served first (a number, or a function returning the current one, read every time a
+#   batch is formed, so that a request promoted while it waits moves ahead). Every priority_aging_seconds of waiting
+#   improve the priority of a request by one level, so that low priority requests are delayed but never starve.
+class BatchScheduler:
+
+    def __init__(self, generate_fn, max_batch_size=8, max_wait_ms=20, max_length_ratio=1.5, priority_aging_seconds=5.0):
+
+        # The batched generation function and the batching limits
+        self.generate_fn = generate_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_seconds = max(0.0, max_wait_ms / 1000.0)
+        self.max_length_ratio = max(1.0, max_length_ratio)
+        self.priority_aging_seconds = priority_aging_seconds
+
+        # Pending requests, in arrival order. Every request is a dict with payload, length, group, priority, future and arrival time.
+        self._pending = []
+        self._condition = threading.Condition()
+        self._running = True
+
+        # Functions to run in the worker thread between two batches (see call_in_worker), as (future, fn, args) tuples
+        self._calls = []
+
+        # Statistics: number of batches, number of requests and batch size distribution
+        self._batch_sizes = Counter()
+        self._requests_served = 0
+
+        # The worker thread that forms and runs the batches. It is a daemon, so it won't block the process exit.
+        self._worker = threading.Thread(target=self._run, name="adaptease-batch-scheduler", daemon=True)
+        self._worker.start()
+
+    # Submits a request and returns a concurrent.futures.Future that will hold its result.
+    def submit(self, payload, length=0, group=None, priority=None):
+
+        # The future the caller will wait on
+        future = Future()
+
+        with self._condition:
+
+            # A stopped scheduler doesn't accept work anymore
+            if not self._running:
+                raise RuntimeError("BatchScheduler has been shut down.")
+
+            # Enqueue the request and wake up the worker
+            self._pending.append({
+                "payload": payload,
+                "length": length,
+                "group": group,
+                "priority": priority,
+                "future": future,
+                "arrival": time.monotonic(),
+            })
+            self._condition.notify()
+
+        return future
+
+    # Convenience method: submits a request and blocks until its result is ready
+    def run(self, payload, length=0, group=None, priority=None):
+        return self.submit(payload, length=length, group=group, priority=priority).result()
+
+    # Runs fn(*args) in the worker thread, between two batches, and returns a Future that will hold its result. This is
+    # for the tools that must run in the thread doing the generations (e.g. the torch profiler, see profiler.py).
+    def call_in_worker(self, fn, *args):
+        future = Future()
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("BatchScheduler has been shut down.")
+            self._calls.append((future, fn, args))
+            self._condition.notify()
+        return future
+
+    # Current priority level of a pending request (its priority, improved by its waiting time)
+    def _level(self, request, now):
+        priority = request["priority"]() if callable(request["priority"]) else (request["priority"] or 0)
+        if self.priority_aging_seconds > 0:
+            priority -= int((now - request["arrival"]) / self.priority_aging_seconds)
+        return priority
+
+    # Picks the next batch from the pending requests (the caller must hold the condition lock).
+    # The most urgent request (the oldest among equals) is always part of the batch, and it is completed with the
+    # requests of the same group, the most urgent ones first and then those whose length is closest to its own,
+    # within the allowed length ratio.
+    def _take_batch(self):
+
+        # The anchor of the batch is the most urgent pending request
+        now = time.monotonic()
+        levels = {id(request): self._level(request, now) for request in self._pending}
+        anchor = min(self._pending, key=lambda request: (levels[id(request)], request["arrival"]))
+
+        # Candidates: same group, sorted by priority level and by their distance in length from the anchor
+        candidates = sorted(
+            (request for request in self._pending if request is not anchor and request["group"] == anchor["group"]),
+            key=lambda request: (levels[id(request)], abs(request["length"] - anchor["length"]))
+        )
+
+        # Greedily grow the batch while the longest/shortest ratio stays within bounds
+        batch = [anchor]
+        shortest = longest = anchor["length"]
+        for request in candidates:
+
+            # Stop when the batch is full
+            if len(batch) >= self.max_batch_size:
+                break
+
+            # Check the padding waste this request would introduce
+            new_shortest = min(shortest, request["length"])
+            new_longest = max(longest, request["length"])
+            if new_longest > max(new_shortest, 1) * self.max_length_ratio:
+                continue
+
+            # Accept it
+            batch.append(request)
+            shortest, longest = new_shortest, new_longest
+
+        # Remove the batched requests from the pending list (preserving the order of the others)
+        batched_ids = {id(request) for request in batch}
+        self._pending = [request for request in self._pending if id(request) not in batched_ids]
+
+        return batch
+
+    # Worker loop: waits for requests, lets the collection window elapse and runs the batches
+    def _run(self):
+
+        while True:
+
+            with self._condition:
+
+                # Sleep until there is something to do
+                while self._running and not self._pending and not self._calls:
+                    self._condition.wait()
+
+                # The calls to run in the worker come first, without waiting for a batch
+                calls, self._calls = self._calls, []
+                if not calls:
+
+                    # On shutdown, exit once the pending requests have been drained
+                    if not self._running and not self._pending:
+                        return
+
+                    # Collection window: we wait for more requests until the window of the oldest request elapses,
+                    # or until there are enough pending requests to fill a batch.
+                    deadline = self._pending[0]["arrival"] + self.max_wait_seconds
+                    while self._running and len(self._pending) < self.max_batch_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+
+                    # Form the batch
+                    batch = self._take_batch()
+
+            # Outside the lock (new requests can be enqueued meanwhile), we run the calls or the batch
+            if calls:
+                for future, fn, args in calls:
+                    try:
+                        future.set_result(fn(*args))
+                    except BaseException as e:
+                        future.set_exception(e)
+            else:
+                self._execute(batch)
+
+    # Runs a batch through generate_fn and dispatches the results (or the error) to the futures
+    def _execute(self, batch):
+
+        # Requests whose caller already gave up are not worth generating
+        batch = [request for request in batch if request["future"].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        try:
+
+            # Batched generation
+            results = self.generate_fn([request["payload"] for request in batch], batch[0]["group"])
+
+            # Sanity check: we need exactly one result per request
+            if len(results) != len(batch):
+                raise RuntimeError(f"generate_fn returned {len(results)} results for a batch of {len(batch)} requests.")
+
+            # Every caller gets its own result
+            for request, result in zip(batch, results):
+                request["future"].set_result(result)
+
+        except Exception as e:
+
+            # A failing batch is retried one request at a time, so that a single faulty request
+            # (e.g. one too long for the available memory) doesn't fail the others.
+            log(f"Error during batched generation of {len(batch)} request(s): {e}", level="error")
+            for request in batch:
+
+                # A single request has nothing to be isolated from
+                if len(batch) == 1:
+                    request["future"].set_exception(e)
+                    continue
+
+                try:
+                    request["future"].set_result(self.generate_fn([request["payload"]], request["group"])[0])
+                except Exception as single_error:
+                    request["future"].set_exception(single_error)
+
+        finally:
+
+            # Update the statistics
+            with self._condition:
+                self._batch_sizes[len(batch)] += 1
+                self._requests_served += len(batch)
+
+    # Returns the scheduler statistics (pending requests and batch size distribution)
+    def stats(self):
+
+        with self._condition:
+
+            batches = sum(self._batch_sizes.values())
+            return {
+                "pending": len(self._pending),
+                "batches": batches,
+                "requests": self._requests_served,
+                "average_batch_size": (self._requests_served / batches) if batches else 0.0,
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_seconds * 1000.0,
+            }
+
+    # Stops the scheduler. Pending requests are still served before the worker exits.
+    def shutdown(self, wait=True):
+
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        if wait:
+            self._worker.join()
+
+# --- 2. Priority Thread Pool ---
+# A ThreadPoolExecutor runs its tasks in submission order. PriorityExecutor runs the most urgent pending task first
+# (lowest priority value, the oldest one among equals), reading the priorities when a worker becomes free, so that tasks
+# promoted while they wait (e.g. a paragraph scrolling into view) overtake the others.
+class PriorityExecutor:
+
+    def __init__(self, max_workers=16, thread_name_prefix="adaptease-priority"):
+        self.max_workers = max(1, int(max_workers))
+        self.thread_name_prefix = thread_name_prefix
+
+        # Pending tasks as (priority, sequence, future, fn, args, kwargs), and the worker threads (started on demand)
+        self._pending = []
+        self._sequence = itertools.count()
+        self._workers = []
+        self._idle = 0
+        self._condition = threading.Condition()
+        self._running = True
+
+    # Submits fn(*args, **kwargs) and returns its Future. priority is a number or a function returning the current one.
+    def submit(self, fn, *args, priority=0, **kwargs):
+        future = Future()
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("PriorityExecutor has been shut down.")
+            self._pending.append((priority, next(self._sequence), future, fn, args, kwargs))
+
+            # A new worker is started when the idle ones are not enough for the pending tasks
+            if len(self._pending) > self._idle and len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._run, name=f"{self.thread_name_prefix}-{len(self._workers)}", daemon=True
+                )
+                self._workers.append(worker)
+                worker.start()
+            self._condition.notify()
+        return future
+
+    # Takes the most urgent pending task (the caller must hold the condition lock)
+    def _take(self):
+        task = min(self._pending, key=lambda task: (task[0]() if callable(task[0]) else task[0], task[1]))
+        self._pending.remove(task)
+        return task
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._idle += 1
+                while self._running and not self._pending:
+                    self._condition.wait()
+                self._idle -= 1
+                if not self._pending:
+                    return
+                _, _, future, fn, args, kwargs = self._take()
+
+            # Tasks cancelled while pending are skipped
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def stats(self):
+        with self._condition:
+            return {"pending": len(self._pending), "workers": len(self._workers), "idle": self._idle}
+
+    # Stops the workers once the pending tasks have been run
+    def shutdown(self, wait=True):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
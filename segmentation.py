@@ -0,0 +1,189 @@
+import math
+import re
+
+# --- 1. Sentence-Aware Segmentation ---
+# A long article in a single chunking prompt is slow (the answer repeats the whole article twice, plain and highlighted,
+# and is decoded token after token) and can hit the output limit of the profile, truncating the last blocks.
+# segment_text splits such an article into windows below a token budget, which are chunked concurrently (they share the
+# batches of the scheduler) and merged back in order, so that the latency depends on the size of a window instead of the
+# size of the article. The split is deterministic and never cuts a sentence:
+# - paragraphs (separated by empty lines) are kept whole whenever they fit in the budget
+# - longer paragraphs are split on their sentence boundaries, recognized with the abbreviations of the language
+# - a single sentence longer than the budget is kept whole, in a window of its own
+# Windows are exact slices of the article, so the blocks of every window still reproduce its text verbatim.
+
+# Paragraph separator: an empty line (possibly with spaces)
+PARAGRAPH_BREAK_PATTERN = re.compile(r'\n[ \t]*\n\s*')
+
+# Candidate sentence end: terminal punctuation, optional closing quotes/brackets, then whitespace
+SENTENCE_END_PATTERN = re.compile(r'[.!?…]+["\'»”’)\]]*\s+')
+
+# Last word before a candidate sentence end
+LAST_WORD_PATTERN = re.compile(r'(\S+)$')
+
+# Abbreviations (lowercase, without the final period) that don't end a sentence, per language
+ABBREVIATIONS = {
+    "en": {
+        "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "inc", "ltd", "co", "corp", "no",
+        "fig", "approx", "dept", "est", "gen", "gov", "sen", "rep", "u.s", "u.k", "jan", "feb", "mar", "apr", "jun",
+        "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+    },
+    "it": {
+        "sig", "sigg", "sig.ra", "dott", "dott.ssa", "dr", "prof", "prof.ssa", "ing", "avv", "arch", "geom", "on", "sen",
+        "ecc", "pag", "pagg", "art", "artt", "n", "nn", "es", "cfr", "ca", "vol", "cap", "s.p.a", "s.r.l",
+    },
+    "es": {
+        "sr", "sra", "srta", "sres", "dr", "dra", "prof", "lic", "ing", "d", "da", "ud", "uds", "etc", "pág", "págs",
+        "art", "núm", "n", "aprox", "ee.uu", "cía", "s.a", "vol", "cap",
+    },
+    "fr": {
+        "m", "mm", "mme", "mmes", "mlle", "dr", "pr", "me", "st", "ste", "etc", "p", "pp", "art", "cf", "av", "bd", "n",
+        "no", "vol", "chap", "env", "éd", "s.a",
+    },
+    "de": {
+        "z.b", "d.h", "u.a", "o.ä", "u.ä", "usw", "bzw", "vgl", "ggf", "evtl", "ca", "dr", "prof", "hr", "fr", "nr", "str",
+        "s", "bd", "abs", "art", "jh", "mio", "mrd", "inkl", "zzgl", "gmbh", "st",
+    },
+}
+
+# Function that returns the (start, end) spans of the paragraphs of text, without their surrounding whitespaces
+def paragraph_spans(text):
+    spans, start = [], 0
+    for separator in list(PARAGRAPH_BREAK_PATTERN.finditer(text)) + [None]:
+        end = separator.start() if separator is not None else len(text)
+        paragraph = text[start:end]
+        if paragraph.strip():
+            leading = len(paragraph) - len(paragraph.lstrip())
+            spans.append((start + leading, start + len(paragraph.rstrip())))
+        if separator is not None:
+            start = separator.end()
+    return spans
+
+# Function that tells if the punctuation of a candidate sentence end (matched in text, at match_start) really ends a sentence
+def is_sentence_end(text, match_start, match_end, lang):
+
+    # The next sentence starts with an uppercase letter, a digit or an opening quote/bracket (a lowercase one continues the sentence)
+    next_char = text[match_end:match_end + 1]
+    if next_char and next_char.islower():
+        return False
+
+    # Abbreviations, initials (single letters) and, in German, ordinal numbers ("am 3. Oktober") don't end a sentence.
+    # Only a single period can be one of those: "!", "?", "..." always end the sentence.
+    if text[match_start] != "." or text[match_start:match_start + 2] == "..":
+        return True
+    word = LAST_WORD_PATTERN.search(text[:match_start])
+    if word is None:
+        return True
+    # Elided articles ("l'art.", "dell'on.") are not part of the abbreviation
+    word = re.split(r"['’]", word.group(1).lstrip("\"'(«“‘[").lower())[-1]
+    if len(word) == 1 and word.isalpha():
+        return False
+    if lang == "de" and word.isdigit():
+        return False
+    return word not in ABBREVIATIONS.get(lang, ABBREVIATIONS["en"])
+
+# Function that returns the (start, end) spans of the sentences of text[start:end], in the given language
+def sentence_spans(text, start, end, lang="en"):
+    spans, sentence_start = [], start
+    for match in SENTENCE_END_PATTERN.finditer(text, start, end):
+        if match.end() >= end or not is_sentence_end(text, match.start(), match.end(), lang):
+            continue
+        spans.append((sentence_start, match.end() - (len(match.group()) - len(match.group().rstrip()))))
+        sentence_start = match.end()
+    if text[sentence_start:end].strip():
+        spans.append((sentence_start, end))
+    return spans
+
+# Function that splits text into windows of at most max_tokens tokens (as counted by count_tokens).
+# It returns a list of {"text": ..., "continues_paragraph": ...} dictionaries, in the order of the text, where
+# continues_paragraph tells if the window starts in the middle of the last paragraph of the previous window.
+# A text within the budget is a single window. Windows are balanced: instead of filling every window up to the budget
+# (and leaving a small last one), windows are packed towards the average size of the fewest windows that could fit the text.
+def segment_text(text, lang="en", max_tokens=1024, count_tokens=None):
+    count_tokens = count_tokens or (lambda piece: len(piece.split()))
+    lang = lang.lower()
+
+    # Short texts (or disabled segmentation) stay whole
+    total_tokens = count_tokens(text)
+    if max_tokens <= 0 or total_tokens <= max_tokens:
+        return [{"text": text.strip(), "continues_paragraph": False}]
+
+    # Units: whole paragraphs, or the sentences of the paragraphs above the budget, as (start, end, paragraph, tokens)
+    units = []
+    for paragraph_index, (start, end) in enumerate(paragraph_spans(text)):
+        paragraph_tokens = count_tokens(text[start:end])
+        if paragraph_tokens <= max_tokens:
+            units.append((start, end, paragraph_index, paragraph_tokens))
+            continue
+        for sentence_start, sentence_end in sentence_spans(text, start, end, lang):
+            units.append((sentence_start, sentence_end, paragraph_index, count_tokens(text[sentence_start:sentence_end])))
+
+    # Greedy packing towards the average size: a window is closed before a unit that wouldn't fit in the budget, or that
+    # would take it further above the average size than it is below it now
+    target_tokens = total_tokens / math.ceil(total_tokens / max_tokens)
+    windows, current, current_tokens = [], [], 0
+    for unit in units:
+        if current and (current_tokens + unit[3] > max_tokens or current_tokens + unit[3] / 2 > target_tokens):
+            windows.append(current)
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit[3]
+    if current:
+        windows.append(current)
+
+    return [
+        {
+            "text": text[window[0][0]:window[-1][1]],
+            "continues_paragraph": index > 0 and windows[index - 1][-1][2] == window[0][2],
+        }
+        for index, window in enumerate(windows)
+    ]
+
+# --- 2. Window Merging ---
+# Every window is chunked on its own, so the blocks at the border of two windows were decided without seeing each other.
+# When a window ends between two paragraphs, its border is a natural block boundary and the blocks are kept as they are.
+# When it ends inside a paragraph, the last block of a window and the first block of the next one are usually two halves
+# of what the model would have written as one block: they are merged back, as long as the result isn't longer than the
+# longest block of the two windows (so that a window border never produces a block larger than the model would write).
+
+# Function that merges two blocks ("plain\nhighlighted", or a single line when the model didn't split them)
+def merge_blocks(first, second):
+    first_lines, second_lines = first.split('\n'), second.split('\n')
+    if len(first_lines) > 1 and len(second_lines) > 1:
+        return f"{first_lines[0]} {second_lines[0]}\n{first_lines[1]} {second_lines[1]}"
+    return f"{first_lines[0]} {second_lines[0]}"
+
+# Function that merges the chunking results of the windows (in order) into the result of the whole text.
+# window_results are the (parsed, plain, highlighted) triples of parse_chunked_output; a window whose output couldn't be
+# parsed (any other result) becomes a single block with its own text.
+# It returns the merged triple, or the same three lists in a list (which the result cache refuses) if any window had
+# to fall back to its own text.
+def merge_window_chunks(window_results, windows):
+    parsed, plain, highlighted = [], [], []
+    degraded = False
+    previous_words = 0
+
+    for result, window in zip(window_results, windows):
+
+        # Unparsed window: its own text, as a single block
+        if isinstance(result, tuple) and len(result) == 3:
+            window_parsed, window_plain, window_highlighted = (list(items) for items in result)
+        else:
+            degraded = True
+            window_parsed, window_plain, window_highlighted = [window["text"]], [window["text"]], [window["text"]]
+
+        # Reconcile the border with the previous window
+        window_words = max((len(block.split()) for block in window_plain), default=0)
+        if parsed and window["continues_paragraph"] and window_parsed:
+            merged_words = len(plain[-1].split()) + len(window_plain[0].split())
+            if merged_words <= max(previous_words, window_words):
+                parsed[-1] = merge_blocks(parsed[-1], window_parsed.pop(0))
+                plain[-1] = f"{plain[-1]} {window_plain.pop(0)}"
+                highlighted[-1] = f"{highlighted[-1]} {window_highlighted.pop(0)}"
+
+        parsed.extend(window_parsed)
+        plain.extend(window_plain)
+        highlighted.extend(window_highlighted)
+        previous_words = window_words
+
+    return [parsed, plain, highlighted] if degraded else (parsed, plain, highlighted)
@@ -1,6 +1,21 @@
-from flask import Flask, request, jsonify
+import hashlib
+import json
+import os
+import re
+import time
+import functools
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
-from model import chunk, simplify
+from model import chunk, simplify, stream_chunk, stream_simplify, result_cache, invalidate_cached_results
+from model import GENERATION_PROFILES, DEFAULT_GENERATION_PROFILE, backend_loader, start_backend_loading
+from model import iter_batch_results, MAX_BATCH_ITEMS, admission_controller, REQUEST_ABORT_ERRORS, LANGUAGE_MAP, lookup_cached_result
+from model import session_registry, schedule_precompute, precompute_queue, OPERATIONS
+from model import start_trace, finish_trace, profiling_window, trace_writer
+from metrics import registry
+from backends import BackendNotReadyError
+from admission import QueueFullError, RequestCancelledError, RequestContext, get_request_context, run_with_request_context
+from tracing import span, log
+from auth import admin_endpoint
 
 
 # --- 1. Initialize Flask App and Model Handler ---
@@ -12,13 +27,208 @@ app = Flask(__name__)
 # This allows web pages from different domains to make requests to this server.
 CORS(app)
 
-# --- 2. Flask API Endpoints ---
+# Starts loading the inference backend in the background: the server answers (health checks, cached results)
+# while the weights are loading, and /readyz tells when it is able to generate.
+start_backend_loading()
+
+# Seconds after which clients should retry when the backend is not ready yet
+BACKEND_RETRY_AFTER_SECONDS = 10
+
+# Deadline of the requests that use the model, in seconds (ADAPTEASE_REQUEST_TIMEOUT).
+# Clients can ask for a shorter one with the optional 'timeout_ms' field of the JSON payload.
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("ADAPTEASE_REQUEST_TIMEOUT", "120"))
+
+# Helper that builds the response of a request aborted before its result was ready:
+# - 503 + Retry-After: the model is not loaded (yet)
+# - 429 + Retry-After: too many requests are already generating or waiting (see model.admission_controller)
+# - 504: the deadline of the request expired
+def request_aborted_response(error):
+
+    if isinstance(error, BackendNotReadyError):
+        status_code, retry_after, body = 503, BACKEND_RETRY_AFTER_SECONDS, {"error": str(error), "backend": backend_loader.status()}
+    elif isinstance(error, QueueFullError):
+        status_code, retry_after, body = 429, error.retry_after, {"error": str(error)}
+    else:
+        status_code, retry_after, body = 504, None, {"error": str(error)}
+
+    response = jsonify(body)
+    response.status_code = status_code
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    return response
+
+# Decorator for the endpoints that use the model: the view runs with a RequestContext (see admission.py) as the
+# current one, carrying the deadline of the request, so that late requests leave the queue and stop generating.
+# The context also carries the trace of the request (see model.py section 1.4), which starts with the parsing of the
+# JSON payload and is finished when the response is closed (see record_request_metrics).
+def with_request_context(view):
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+
+        # The trace of the request, described by the fields of its payload (never by its texts)
+        trace = g.trace = start_trace(request.url_rule.rule, method=request.method)
+        with span("parse_json", trace=trace, bytes=request.content_length or 0):
+            data = request.get_json(silent=True)
+        data = data if isinstance(data, dict) else {}
+        trace.set(**{
+            key: value for key, value in {
+                "lang": data.get('lang'), "profile": data.get('profile'), "stream": bool(data.get('stream')),
+                "text_chars": len(data['text']) if isinstance(data.get('text'), str) else None,
+                "items": len(data['items']) if isinstance(data.get('items'), list) else None,
+            }.items() if value is not None
+        })
+
+        # Deadline of the request: the server one, or the shorter one asked by the client
+        timeout = REQUEST_TIMEOUT_SECONDS
+        requested_timeout_ms = data.get('timeout_ms')
+        if isinstance(requested_timeout_ms, (int, float)) and requested_timeout_ms > 0:
+            timeout = min(timeout, requested_timeout_ms / 1000.0)
+
+        return run_with_request_context(RequestContext(timeout=timeout, trace=trace), view, *args, **kwargs)
+
+    return wrapper
+
+# --- 1.1 Request Metrics ---
+# Every request is counted and timed per endpoint, language and status code (see the /metrics endpoint).
+# Streamed responses are timed until the stream is closed, so their latency covers the whole generation.
+# Languages outside of LANGUAGE_MAP are reported as "other" (and "none" without a language), to keep the label set bounded.
+requests_total = registry.counter(
+    "adaptease_requests_total", "HTTP requests served, by endpoint, language and status code.", ["endpoint", "lang", "status"]
+)
+request_duration_seconds = registry.histogram(
+    "adaptease_request_duration_seconds", "Time to serve an HTTP request (until the end of the stream for streamed responses).", ["endpoint", "lang"]
+)
+
+# Helper that returns the language label of the current request (from the JSON payload, the URL path or the query string)
+def request_language_label():
+    language = (request.get_json(silent=True) or {}).get('lang') if request.is_json else (request.view_args or {}).get('lang', request.args.get('lang'))
+    if not isinstance(language, str):
+        return "none"
+    return language.lower() if language.lower() in LANGUAGE_MAP else "other"
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.monotonic()
+
+@app.after_request
+def record_request_metrics(response):
+
+    # Labels are computed now, while the request is still available
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    language = request_language_label()
+    started = g.get("request_started", time.monotonic())
+
+    # Traced requests tell their trace id, so that a slow answer can be found in the traces
+    trace = g.get("trace")
+    if trace is not None:
+        response.headers['X-Trace-Id'] = trace.trace_id
+
+    # The response is complete only once it has been closed (which is when a stream ends)
+    def record():
+        requests_total.inc(endpoint=endpoint, lang=language, status=str(response.status_code))
+        request_duration_seconds.observe(time.monotonic() - started, endpoint=endpoint, lang=language)
+        if trace is not None:
+            finish_trace(trace, status=response.status_code)
+
+    response.call_on_close(record)
+    return response
+
+# --- 2. Streaming Helper ---
+# When the JSON payload contains "stream": true, the endpoints answer with JSON lines (application/x-ndjson)
+# instead of a single JSON document: every line is an event sent as soon as it is available (see model.stream_chunk),
+# so the widget can render each block while the rest of the text is still being generated.
+# The final "done" event carries the same "processed_text" of the non-streaming response.
+# Without processed_text_of, the events are sent as they are.
+# The events are produced while the response is being sent (after the view has returned), within the context of the
+# request. If the client disconnects, the WSGI server closes the generator and the request is cancelled, which stops its generation.
+def ndjson_stream_response(events, processed_text_of=None):
+
+    # The context of the request, captured while the view is running
+    request_context = get_request_context()
+
+    # Generator that serializes every event on its own line
+    def generate_lines():
+        try:
+            for event in iterate_in_context(events):
+
+                # The done event is converted to the shape of the non-streaming response
+                if event["event"] == "done" and processed_text_of is not None:
+                    event = {
+                        "event": "done", "processed_text": processed_text_of(event["result"]), "cached": event["cached"],
+                        "reuse": event.get("reuse")
+                    }
+
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+
+        except Exception as e:
+
+            # Headers are already sent, so errors are reported as a final error event
+            run_with_request_context(request_context, log, f"Error while streaming: {e}", level="error")
+            yield json.dumps({"event": "error", "error": f"An internal error occurred: {str(e)}"}) + "\n"
+
+        finally:
+
+            # Reached at the end of the stream, or when the client went away (GeneratorExit): nothing else has to be generated
+            if request_context is not None:
+                request_context.cancel()
+
+    # Generator that produces every event with the request context as the current one
+    # (closing the events generator as well when the stream ends early, so that it releases its generation slot).
+    def iterate_in_context(events_iterator):
+        events_iterator = iter(events_iterator)
+        try:
+            while True:
+                try:
+                    event = run_with_request_context(request_context, next, events_iterator)
+                except StopIteration:
+                    return
+                yield event
+        finally:
+            if hasattr(events_iterator, "close"):
+                events_iterator.close()
+
+    # stream_with_context keeps the request context alive while the generator runs.
+    # X-Accel-Buffering: no prevents reverse proxies (e.g. nginx) from buffering the stream.
+    return Response(
+        stream_with_context(generate_lines()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# The processed text of every operation, as sent by the endpoints.
+# For chunking, it is the third element of the chunk triple (or the error/fallback list as it is).
+PROCESSED_TEXT_OF = {
+    "chunk": lambda result: result[2] if isinstance(result, tuple) else result,
+    "simplify": lambda result: result,
+}
+
+# Helper that turns a result of model.iter_batch_results in the (id, response item) pairs of the items sharing it
+def batch_response_items(batch_result):
+
+    # The item was dropped (see /api/session/cancel), or the computation of the result failed
+    if isinstance(batch_result["result"], RequestCancelledError):
+        response_item = {"error": str(batch_result["result"]), "cancelled": True}
+    elif isinstance(batch_result["result"], Exception):
+        response_item = {"error": f"An internal error occurred: {str(batch_result['result'])}"}
+    else:
+        # cacheable tells the clients if they may keep the result (error/fallback lists must not stick in their caches)
+        response_item = {
+            "processed_text": PROCESSED_TEXT_OF[batch_result["operation"]](batch_result["result"]),
+            "cached": batch_result["cached"],
+            "cacheable": OPERATIONS[batch_result["operation"]][1](batch_result["result"]),
+        }
+
+    return [(str(item_id), response_item) for item_id in batch_result["ids"]]
+
+# --- 3. Flask API Endpoints ---
 # Defines a route for the API endpoint '/api/text-in-blocks'.
 # This decorator maps the URL path to the function below it.
 # It specifies that this endpoint only accepts HTTP POST requests.
 # We also define the function that will handle requests to the '/api/text-in-blocks' endpoint.
 # This function is responsible for receiving text, chunking it, and returning the result.
 @app.route('/api/text-in-blocks', methods=['POST'])
+@with_request_context
 def text_in_blocks_endpoint():
 
     # Checks if the incoming request's content type is JSON.
@@ -40,6 +250,13 @@ def text_in_blocks_endpoint():
     # If 'lang' is not provided, it defaults to 'en' (English).
     language = data.get('lang', 'en') # Get 'lang' or default to 'en'
 
+    # Extracts the optional generation profile (e.g. 'fast', 'balanced', 'quality'). None means the default one.
+    profile = data.get('profile')
+
+    # Checks if the requested generation profile exists.
+    if profile is not None and profile not in GENERATION_PROFILES:
+        return jsonify({"error": f"Unknown 'profile'. Available profiles: {', '.join(GENERATION_PROFILES)}"}), 400
+
     # Checks if the 'text' field is missing from the JSON payload (i.e., it's None).
     if original_text is None:
         
@@ -52,31 +269,53 @@ def text_in_blocks_endpoint():
         # If 'text' fails validation, returns an error message and a 400 Bad Request status code.
         return jsonify({"error": "'text' field must be a non-empty string"}), 400
 
+    # Checks if the language is a supported one (the prompts and the background jobs need it).
+    if not is_valid_language(language):
+        return jsonify({"error": f"Unknown 'lang'. Available languages: {', '.join(LANGUAGE_MAP)}"}), 400
+
+    # Queues the likely next requests on this text, computed while the server is idle (see model.py section 8)
+    schedule_precompute('chunk', original_text, lang=language, profile=profile)
+
     # Starts a try-except block to handle potential errors during the text processing.
     try:
 
         # Prints the received text block to the console for debugging purposes.
-        print(f"Received text block for chunking: OK")
+        log(f"Received text block for chunking: OK")
 
         # Prints the detected or provided language to the console for debugging.
-        print(f"Target Language: {language}")
+        log(f"Target Language: {language}")
+
+        # Streaming mode: the highlighted blocks are sent as soon as they are parsed.
+        # The processed text is the third element of the chunk triple (or the error/fallback list as it is).
+        if data.get('stream'):
+            return ndjson_stream_response(
+                stream_chunk(original_text, lang=language, profile=profile),
+                lambda result: result[2] if isinstance(result, tuple) else result
+            )
 
         # Calls the 'chunk_article' function from the model module.
         # It passes the 'original_text' and the 'language' to the function.
         # The [2] at the end indicates that the 'chunk_article' function returns a tuple or list,
         # and we are interested in the third element (index 2), which is assumed to be the chunked blocks.
-        chunked_blocks = chunk(original_text, lang=language)[2]
+        # The reuse report tells which paragraphs were served from the cache and which ones were generated.
+        reuse = {}
+        chunked_blocks = chunk(original_text, lang=language, profile=profile, report=reuse)[2]
 
         # Returns a JSON response containing the processed (chunked) text.
         # jsonify converts the Python dictionary into a JSON string.
         # The HTTP status code defaults to 200 OK if not specified.
-        return jsonify({"processed_text": chunked_blocks})
+        return jsonify({"processed_text": chunked_blocks, "reuse": reuse})
+
+    # The result wasn't cached and the model is not available (not loaded, busy) or the deadline expired
+    except REQUEST_ABORT_ERRORS as e:
+        log(f"Request aborted in /api/text-in-blocks: {e}", level="warning")
+        return request_aborted_response(e)
     
     # Catches any exception that occurs within the try block.
     except Exception as e:
 
         # Prints the specific error message to the console for debugging.
-        print(f"Error in /api/text-in-blocks: {e}")
+        log(f"Error in /api/text-in-blocks: {e}", level="error")
         
         # Returns a JSON response with a generic error message and the specific error details.
         # Sets the HTTP status code to 500 Internal Server Error, indicating a server-side issue.
@@ -88,6 +327,7 @@ def text_in_blocks_endpoint():
 # Defines the function that will handle requests to the '/api/simplify-text' endpoint.
 # This function is responsible for receiving text, simplifying it, and returning the result.
 @app.route('/api/simplify-text', methods=['POST'])
+@with_request_context
 def simplify_text_endpoint():
 
     # Checks if the incoming request's content type is JSON.
@@ -105,6 +345,13 @@ def simplify_text_endpoint():
     # Extracts the value associated with the 'lang' key from the JSON data, defaulting to 'en'.
     language = data.get('lang', 'en') # Get 'lang' or default to 'en'
 
+    # Extracts the optional generation profile, as above.
+    profile = data.get('profile')
+
+    # Checks if the requested generation profile exists.
+    if profile is not None and profile not in GENERATION_PROFILES:
+        return jsonify({"error": f"Unknown 'profile'. Available profiles: {', '.join(GENERATION_PROFILES)}"}), 400
+
     # Checks if the 'text' field is missing from the JSON payload.
     if original_text is None:
         
@@ -117,35 +364,364 @@ def simplify_text_endpoint():
         # If 'text' fails validation, returns an error message and a 400 Bad Request status code.
         return jsonify({"error": "'text' field must be a non-empty string"}), 400
 
+    # Checks if the language is a supported one, as above.
+    if not is_valid_language(language):
+        return jsonify({"error": f"Unknown 'lang'. Available languages: {', '.join(LANGUAGE_MAP)}"}), 400
+
+    # Queues the likely next requests on this text, as above
+    schedule_precompute('simplify', original_text, lang=language, profile=profile)
+
     # Starts a try-except block to handle potential errors during the text processing.
     try:
 
         # Prints the received text block to the console for debugging purposes.
-        print(f"Received text block for simplification: OK")
+        log(f"Received text block for simplification: OK")
         # Prints the detected or provided language to the console for debugging.
-        print(f"Target Language: {language}")
+        log(f"Target Language: {language}")
+
+        # Streaming mode: every simplified chunk is sent as soon as it is ready.
+        if data.get('stream'):
+            return ndjson_stream_response(stream_simplify(original_text, lang=language, profile=profile), lambda result: result)
 
         # Calls the 'simplify_text' function from the 'raw_qwen' module.
         # It passes the 'original_text' and the 'language' to the function.
-        simplified_text_output = simplify(original_text, lang=language)
+        # The reuse report tells which paragraphs were served from the cache and which ones were generated.
+        reuse = {}
+        simplified_text_output = simplify(original_text, lang=language, profile=profile, report=reuse)
 
         # Returns a JSON response containing the processed (simplified) text.
-        return jsonify({"processed_text": simplified_text_output})
+        return jsonify({"processed_text": simplified_text_output, "reuse": reuse})
+
+    # The result wasn't cached and the model is not available (not loaded, busy) or the deadline expired
+    except REQUEST_ABORT_ERRORS as e:
+        log(f"Request aborted in /api/simplify-text: {e}", level="warning")
+        return request_aborted_response(e)
     
     # Catches any exception that occurs within the try block.
     except Exception as e:
     
         # Prints the specific error message to the console for debugging.
-        print(f"Error in /api/simplify-text: {e}")
+        log(f"Error in /api/simplify-text: {e}", level="error")
     
         # Returns a JSON response with a generic error message and the specific error details.
         # Sets the HTTP status code to 500 Internal Server Error.
         return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
 
-# --- 3. Run Flask App ---
+# Defines a route for the API endpoint '/api/batch'.
+# It processes all the texts of a page in a single request. The JSON payload contains:
+# - 'items': a list of {"id", "text", "op", "lang"} objects, where 'op' is 'chunk' or 'simplify' and 'lang' defaults to 'en'
+# - 'profile': the optional generation profile, shared by all the items
+# - 'stream': if true, every result is sent as a JSON line as soon as it is ready (cached ones first)
+# - 'session': an optional session id (one per page view), under which the pending items can be promoted or dropped
+#   (see the '/api/session/...' endpoints below)
+# Every item may also carry a 'priority' (0 for the visible paragraphs, higher values for the ones further down the
+# page): the most urgent items are generated first. Identical texts are processed once, and the results come back keyed by id.
+@app.route('/api/batch', methods=['POST'])
+@with_request_context
+def batch_endpoint():
+
+    # Checks if the incoming request's content type is JSON.
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    # Parses the JSON data from the incoming request body.
+    data = request.get_json()
+    items = data.get('items')
+    profile = data.get('profile')
+    session = data.get('session')
+
+    # Checks the list of items and its size.
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "'items' field must be a non-empty list"}), 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({"error": f"Too many items: at most {MAX_BATCH_ITEMS} items per batch"}), 413
+
+    # Checks every item.
+    for item in items:
+        if not isinstance(item, dict) or item.get('id') is None:
+            return jsonify({"error": "Every item must be an object with an 'id' field"}), 400
+        if item.get('op') not in ('chunk', 'simplify'):
+            return jsonify({"error": f"Item {item['id']}: 'op' must be either 'chunk' or 'simplify'"}), 400
+        if not isinstance(item.get('text'), str) or not item['text'].strip():
+            return jsonify({"error": f"Item {item['id']}: 'text' field must be a non-empty string"}), 400
+        if not is_valid_language(item.get('lang') or 'en'):
+            return jsonify({"error": f"Item {item['id']}: unknown 'lang'. Available languages: {', '.join(LANGUAGE_MAP)}"}), 400
+        if not is_valid_priority(item.get('priority', 0)):
+            return jsonify({"error": f"Item {item['id']}: 'priority' must be a non-negative integer"}), 400
+
+    # Checks the session id and makes the item ids strings (as in the results), so they can be promoted or dropped
+    if session is not None and not is_valid_session(session):
+        return jsonify({"error": f"'session' must be a non-empty string of at most {MAX_SESSION_ID_LENGTH} characters"}), 400
+    items = [{**item, "id": str(item['id'])} for item in items]
+
+    # Checks if the requested generation profile exists.
+    if profile is not None and profile not in GENERATION_PROFILES:
+        return jsonify({"error": f"Unknown 'profile'. Available profiles: {', '.join(GENERATION_PROFILES)}"}), 400
+
+    log(f"Received batch of {len(items)} item(s): OK")
+
+    # Queues the likely next requests on every item, as above
+    for item in items:
+        schedule_precompute(item['op'], item['text'], lang=item.get('lang') or 'en', profile=profile)
+
+    # Streaming mode: a "result" event per item, then a final "done" event
+    if data.get('stream'):
+
+        def batch_events():
+            for batch_result in iter_batch_results(items, profile=profile, session=session):
+                for item_id, response_item in batch_response_items(batch_result):
+                    yield {"event": "result", "id": item_id, **response_item}
+            yield {"event": "done", "items": len(items)}
+
+        return ndjson_stream_response(batch_events())
+
+    try:
+
+        # Collects every result, keyed by id.
+        results = {}
+        for batch_result in iter_batch_results(items, profile=profile, session=session):
+            results.update(batch_response_items(batch_result))
+        return jsonify({"results": results})
+
+    except Exception as e:
+        log(f"Error in /api/batch: {e}", level="error")
+        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+
+# Helpers that validate the languages of the requests, and the session ids and the priorities of the batch items
+MAX_SESSION_ID_LENGTH = 128
+
+def is_valid_language(language):
+    return isinstance(language, str) and language.lower() in LANGUAGE_MAP
+
+def is_valid_session(session):
+    return isinstance(session, str) and 0 < len(session) <= MAX_SESSION_ID_LENGTH
+
+def is_valid_priority(priority):
+    return isinstance(priority, int) and not isinstance(priority, bool) and priority >= 0
+
+# Defines a route for the API endpoint '/api/session/promote'.
+# It raises the priority of pending batch items of a session (e.g. paragraphs that scrolled into view).
+# The JSON payload contains 'session' and 'priorities', an {item id: priority} object. Priorities only go up.
+@app.route('/api/session/promote', methods=['POST'])
+def session_promote_endpoint():
+    data = request.get_json(force=True, silent=True) or {}
+    session, priorities = data.get('session'), data.get('priorities')
+    if not is_valid_session(session):
+        return jsonify({"error": "Missing or invalid 'session'"}), 400
+    if not isinstance(priorities, dict) or not all(is_valid_priority(priority) for priority in priorities.values()):
+        return jsonify({"error": "'priorities' must be an object mapping item ids to non-negative integers"}), 400
+    return jsonify({"promoted": session_registry.promote(session, {str(item_id): priority for item_id, priority in priorities.items()})})
+
+# Defines a route for the API endpoint '/api/session/cancel'.
+# It drops pending batch items of a session: the ones in the optional 'ids' list, or all of them (e.g. the reader
+# switched language or left the page). Dropped items get a "cancelled" error in their batch response.
+# The body is parsed as JSON whatever its content type, since navigator.sendBeacon sends it as text/plain.
+@app.route('/api/session/cancel', methods=['POST'])
+def session_cancel_endpoint():
+    data = request.get_json(force=True, silent=True) or {}
+    session, item_ids = data.get('session'), data.get('ids')
+    if not is_valid_session(session):
+        return jsonify({"error": "Missing or invalid 'session'"}), 400
+    if item_ids is not None and not isinstance(item_ids, list):
+        return jsonify({"error": "'ids' must be a list of item ids"}), 400
+    cancelled = session_registry.cancel(session, None if item_ids is None else {str(item_id) for item_id in item_ids})
+    log(f"Session {session[:16]}: {cancelled} pending item(s) dropped")
+    return jsonify({"cancelled": cancelled})
+
+# Defines a route for the API endpoint '/api/results/<operation>/<lang>/<content_hash>'.
+# It serves an already computed result by the content hash of its text (the SHA-256 of the normalized text, see
+# cache.content_hash), with the optional 'profile' query parameter. It never uses the model: results that are not in the
+# cache answer 404, and the client falls back to the POST endpoints (which compute and store them).
+# Found results are HTTP-cacheable: they carry a strong ETag (the hash of the body), answer 304 to a matching
+# If-None-Match, and are public for ADAPTEASE_RESULT_MAX_AGE seconds, so that browsers and CDNs serve the popular
+# articles without reaching this process. Invalidated results may still be served by those caches until they expire.
+RESULT_MAX_AGE_SECONDS = int(os.getenv("ADAPTEASE_RESULT_MAX_AGE", "3600"))
+CONTENT_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+@app.route('/api/results/<operation>/<lang>/<content_hash>', methods=['GET'])
+def result_endpoint(operation, lang, content_hash):
+
+    # Validates the path and the optional profile
+    profile = request.args.get('profile')
+    if operation not in PROCESSED_TEXT_OF:
+        return jsonify({"error": "'operation' must be either 'chunk' or 'simplify'"}), 400
+    if not is_valid_language(lang):
+        return jsonify({"error": f"Unknown language. Available languages: {', '.join(LANGUAGE_MAP)}"}), 400
+    if not CONTENT_HASH_PATTERN.match(content_hash):
+        return jsonify({"error": "The content hash must be a lowercase hex SHA-256"}), 400
+    if profile is not None and profile not in GENERATION_PROFILES:
+        return jsonify({"error": f"Unknown 'profile'. Available profiles: {', '.join(GENERATION_PROFILES)}"}), 400
+
+    # Not computed yet: the miss must not be cached, the result may exist a moment later
+    result = lookup_cached_result(operation, content_hash, lang.lower(), profile)
+    if result is None:
+        response = jsonify({"error": "Result not found"})
+        response.status_code = 404
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    response = jsonify({"processed_text": PROCESSED_TEXT_OF[operation](result), "operation": operation, "lang": lang.lower(), "content_hash": content_hash})
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+    response.headers['Cache-Control'] = f"public, max-age={RESULT_MAX_AGE_SECONDS}"
+    return response.make_conditional(request)
+
+# Defines a route for the API endpoint '/api/profiles'.
+# It lists the available generation profiles, so that callers know which values 'profile' accepts.
+@app.route('/api/profiles', methods=['GET'])
+def profiles_endpoint():
+    return jsonify({"default": DEFAULT_GENERATION_PROFILE, "profiles": GENERATION_PROFILES})
+
+# Defines a route for the API endpoint '/api/cache/stats'.
+# It returns the hit/miss counters and the state of the server-side result cache.
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats_endpoint():
+
+    # The stats are already a JSON serializable dictionary
+    return jsonify(result_cache.stats())
+
+# Defines a route for the API endpoint '/api/prefix-cache/stats'.
+# It returns how many requests reused the KV-cache of a prompt prefix and how many prefill tokens they saved.
+@app.route('/api/prefix-cache/stats', methods=['GET'])
+def prefix_cache_stats_endpoint():
+
+    # The prefix cache is owned by the transformers backends, once loaded (and it can be disabled through ADAPTEASE_PREFIX_CACHE)
+    prefix_cache_stats = backend_loader.backend.stats().get("prefix_cache") if backend_loader.ready() else None
+    if prefix_cache_stats is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **prefix_cache_stats})
+
+# Defines the '/metrics' endpoint, in the Prometheus text exposition format: request counts and latencies,
+# prefill/decode times, token counts, tokens/sec, time-to-first-token, batch sizes, queue depths, cache efficiency
+# and fallbacks (see model.py section 1.3 and metrics.py).
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Defines the liveness probe '/healthz': the process is up and serving requests, even while the model is loading.
+@app.route('/healthz', methods=['GET'])
+def healthz_endpoint():
+    return jsonify({"status": "ok"})
+
+# Defines the readiness probe '/readyz': 200 once the inference backend is loaded, 503 while loading (or if loading failed).
+@app.route('/readyz', methods=['GET'])
+def readyz_endpoint():
+
+    # The status of the loading, and the backend stats once loaded
+    status = backend_loader.status()
+    if not backend_loader.ready():
+        return jsonify(status), 503
+    return jsonify({
+        **status, "stats": backend_loader.backend.stats(), "admission": admission_controller.stats(),
+        "precompute": precompute_queue.stats() if precompute_queue is not None else None,
+    })
+
+# Defines the admin endpoint '/api/admin/profile'.
+# POST opens a profiling window over the next 'requests' traced requests (see profiler.py): the Python stacks of every
+# thread are sampled ('sampling', default true) and the torch profiler runs ('torch', default true, when the backend
+# loaded torch) until they are over. The profiles are written to ADAPTEASE_PROFILE_DIR and the traces of the profiled
+# requests are always written. GET returns the state of the window, the report of the last one and the trace writer stats.
+# Only one window can be open at a time (409 otherwise). A window is closed after ADAPTEASE_PROFILE_MAX_SECONDS anyway,
+# and DELETE closes the open window right away, writing what was profiled so far.
+# It is an admin endpoint (see auth.py): disabled unless ADAPTEASE_ADMIN_TOKEN is set, and protected by that token.
+MAX_PROFILE_REQUESTS = 1000
+
+@app.route('/api/admin/profile', methods=['GET', 'POST', 'DELETE'])
+@admin_endpoint
+def admin_profile_endpoint():
+
+    if request.method == 'GET':
+        return jsonify({**profiling_window.status(), "traces": trace_writer.stats() if trace_writer is not None else None})
+
+    if request.method == 'DELETE':
+        closed = profiling_window.close()
+        if closed:
+            log("Profiling window closed on demand")
+        return jsonify({**profiling_window.status(), "closed": closed})
+
+    data = request.get_json(force=True, silent=True) or {}
+    requests_count = data.get('requests', 1)
+    if not isinstance(requests_count, int) or isinstance(requests_count, bool) or not 0 < requests_count <= MAX_PROFILE_REQUESTS:
+        return jsonify({"error": f"'requests' must be an integer between 1 and {MAX_PROFILE_REQUESTS}"}), 400
+    if not all(isinstance(data.get(key, True), bool) for key in ('torch', 'sampling')):
+        return jsonify({"error": "'torch' and 'sampling' must be booleans"}), 400
+
+    try:
+        status = profiling_window.arm(requests_count, torch_profiler=data.get('torch', True), sampling=data.get('sampling', True))
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    log(f"Profiling window armed for the next {requests_count} request(s)")
+    return jsonify(status)
+
+# Defines a route for the API endpoint '/api/cache/invalidate'.
+# It removes cached results, for example after an article has been edited or a prompt has been tuned.
+# The JSON payload may contain the optional fields:
+# - 'operation': 'chunk' or 'simplify'
+# - 'lang': the language of the results to remove
+# - 'text': the exact text whose results have to be removed
+# Clearing the whole cache (the pre-rendered results included) takes an explicit {"all": true} payload without filters.
+# It is an admin endpoint (see auth.py): disabled unless ADAPTEASE_ADMIN_TOKEN is set, and protected by that token.
+@app.route('/api/cache/invalidate', methods=['POST'])
+@admin_endpoint
+def cache_invalidate_endpoint():
+
+    # An empty body is allowed (then rejected below, as a full invalidation without "all"), but if present it must be JSON
+    data = request.get_json(silent=True) or {}
+
+    # Extracts the optional filters from the JSON data.
+    operation = data.get('operation')
+    language = data.get('lang')
+    original_text = data.get('text')
+    clear_all = data.get('all', False)
+
+    # Validates the operation filter, if provided.
+    if operation is not None and operation not in ('chunk', 'simplify'):
+        return jsonify({"error": "'operation' must be either 'chunk' or 'simplify'"}), 400
+
+    # Validates the language filter, if provided.
+    if language is not None and not is_valid_language(language):
+        return jsonify({"error": f"Unknown 'lang'. Available languages: {', '.join(LANGUAGE_MAP)}"}), 400
+
+    # Validates the text filter, if provided.
+    if original_text is not None and (not isinstance(original_text, str) or not original_text.strip()):
+        return jsonify({"error": "'text' field must be a non-empty string"}), 400
+
+    # A full invalidation must be asked for explicitly, and "all" can't be combined with filters
+    has_filters = any(value is not None for value in (operation, language, original_text))
+    if not isinstance(clear_all, bool) or clear_all == has_filters:
+        return jsonify({"error": "Give 'operation', 'lang' or 'text' filters, or {\"all\": true} (alone) to clear the whole cache"}), 400
+
+    # Removes the matching entries and returns how many of them were dropped
+    removed = invalidate_cached_results(operation=operation, lang=language, text=original_text)
+    log(f"Cache invalidation (operation: {operation}, lang: {language}, text: {original_text is not None}): {removed} entries removed")
+    return jsonify({"invalidated": removed})
+
+# --- 4. Run Flask App ---
 # This block ensures that the Flask development server only runs when the script is executed directly.
 # It will not run if the script is imported as a module into another script.
-if __name__ == '__main__':
+# ADAPTEASE_SERVER selects how the app is served:
+# - "dev" (default): the Flask development server, single process, no admission control of its own
+# - "production": the waitress WSGI server (pip install waitress) with a fixed pool of ADAPTEASE_SERVER_THREADS threads.
+#   The pool is larger than the admitted generations, so that requests beyond the queue get their 429 right away.
+#   Alternatively, run `gunicorn -w 1 -k gthread --threads 96 -b 0.0.0.0:5000 server:app` (one worker: the model lives in the process).
+SERVER_MODE = os.getenv("ADAPTEASE_SERVER", "dev")
+SERVER_PORT = int(os.getenv("ADAPTEASE_PORT", "5000"))
+SERVER_THREADS = int(os.getenv(
+    "ADAPTEASE_SERVER_THREADS", str(admission_controller.max_concurrent + admission_controller.max_queued + 16)
+))
+
+if __name__ == '__main__' and SERVER_MODE == 'production':
+
+    # waitress is an optional dependency, only needed for this mode
+    try:
+        from waitress import serve
+    except ImportError:
+        raise SystemExit("ADAPTEASE_SERVER=production requires waitress (pip install waitress).")
+
+    # channel_timeout closes idle connections, while the deadlines of the requests bound the generations
+    log(f"Serving in production mode on port {SERVER_PORT} with {SERVER_THREADS} threads.")
+    serve(app, host='0.0.0.0', port=SERVER_PORT, threads=SERVER_THREADS, channel_timeout=int(REQUEST_TIMEOUT_SECONDS) + 30)
+
+elif __name__ == '__main__':
 
     # This comment provides a reminder that for production deployments, a robust WSGI server
     # like Gunicorn or uWSGI should be used instead of Flask's built-in development server.
@@ -156,6 +732,6 @@ if __name__ == '__main__':
     # use_reloader=False: Prevents the server from starting twice, which can happen with debug=True.
     # host='0.0.0.0': Makes the server publicly accessible on the network.
     # port=5000: Specifies that the server should listen for requests on port 5000.
-    app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000)
+    app.run(debug=True, use_reloader=False, host='0.0.0.0', port=SERVER_PORT)
 
 
@@ -0,0 +1,87 @@
+import threading
+
+# --- 1. Speculative Decoding Selection ---
+# With assisted (speculative) decoding, a few draft tokens are proposed at every step and the main model verifies them
+# in a single forward pass: when the draft is right, several tokens are decoded for the price of one step of the main model.
+# Two methods propose the draft tokens:
+# - "draft_model": a small draft model of the same family (sharing the tokenizer of the main model)
+# - "prompt_lookup": the tokens that followed the last n-gram of the output where it appears in the prompt. No weights are
+#   needed, and it suits the rewrite tasks well: chunking copies the input verbatim (adding the <b>/<i> tags), and the
+#   simplification copies long spans of it.
+# When the draft is often wrong, though, drafting is pure overhead. SpeculativeDecodingSelector decides, request after
+# request, whether to use speculative decoding, from the decoding speed actually observed with and without it:
+# - "on": always speculative, "off": never
+# - "auto": both modes are tried until each has min_samples measures, then the fastest one (by the moving average of the
+#   output tokens per second) is used, with one request out of explore_every sent to the other mode to keep its measure fresh.
+SPECULATIVE_MODES = ("off", "on", "auto")
+SPECULATIVE_METHODS = ("draft_model", "prompt_lookup")
+
+class SpeculativeDecodingSelector:
+
+    def __init__(self, mode="auto", min_samples=5, explore_every=20, smoothing=0.2):
+
+        if mode not in SPECULATIVE_MODES:
+            raise ValueError(f"Unknown speculative decoding mode '{mode}'. Available modes: {', '.join(SPECULATIVE_MODES)}")
+        self.mode = mode
+        self.min_samples = max(1, int(min_samples))
+        self.explore_every = max(2, int(explore_every))
+        self.smoothing = smoothing
+
+        # Per decoding mode (True = speculative): number of measures, moving average of the tokens/sec and of the acceptance rate
+        self._samples = {True: 0, False: 0}
+        self._tokens_per_second = {True: None, False: None}
+        self._acceptance_rate = None
+        self._decisions = 0
+        self._lock = threading.Lock()
+
+    # Returns True if the next generation should use the draft model
+    def use_draft(self):
+        if self.mode != "auto":
+            return self.mode == "on"
+
+        with self._lock:
+            self._decisions += 1
+
+            # Not enough measures yet: the mode with fewer measures is tried
+            if min(self._samples.values()) < self.min_samples:
+                return self._samples[True] <= self._samples[False]
+
+            # Fastest mode, except for the periodic exploration of the other one
+            faster = self._tokens_per_second[True] >= self._tokens_per_second[False]
+            return (not faster) if self._decisions % self.explore_every == 0 else faster
+
+    # Records the output tokens per second of a generation, with (speculative=True) or without the draft model
+    def record(self, speculative, tokens_per_second, acceptance_rate=None):
+        with self._lock:
+            previous = self._tokens_per_second[speculative]
+            self._tokens_per_second[speculative] = tokens_per_second if previous is None else (
+                (1 - self.smoothing) * previous + self.smoothing * tokens_per_second
+            )
+            self._samples[speculative] += 1
+            if acceptance_rate is not None:
+                self._acceptance_rate = acceptance_rate if self._acceptance_rate is None else (
+                    (1 - self.smoothing) * self._acceptance_rate + self.smoothing * acceptance_rate
+                )
+
+    # Returns the measures of both modes
+    def stats(self):
+        with self._lock:
+            plain, speculative = self._tokens_per_second[False], self._tokens_per_second[True]
+            return {
+                "mode": self.mode,
+                "plain_samples": self._samples[False],
+                "speculative_samples": self._samples[True],
+                "plain_tokens_per_second": plain,
+                "speculative_tokens_per_second": speculative,
+                "speedup": (speculative / plain) if plain and speculative else None,
+                "average_acceptance_rate": self._acceptance_rate,
+            }
+
+# Function that estimates the acceptance rate of the draft tokens of a generation of a single sequence.
+# Every step of the main model verifies num_draft_tokens draft tokens and keeps the accepted ones plus one token of its own,
+# so output_tokens = steps + accepted tokens. With prompt lookup, steps without a matching n-gram have fewer (or no)
+# candidates, so the rate is relative to the max number of candidates.
+def acceptance_rate(output_tokens, steps, num_draft_tokens):
+    if steps <= 0 or num_draft_tokens <= 0:
+        return None
+    return min(1.0, max(0.0, (output_tokens - steps) / (steps * num_draft_tokens)))
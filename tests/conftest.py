@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# The modules of the server live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tiny causal LM used by the tests of the transformers code path (random weights, a few MB, runs on CPU).
+# The tests that need it are skipped when torch/transformers are not installed or the model can't be downloaded.
+TINY_MODEL_NAME = os.getenv("ADAPTEASE_TEST_TINY_MODEL", "hf-internal-testing/tiny-random-LlamaForCausalLM")
+
+# Greedy generation settings (see model.resolve_generation_profile)
+GREEDY_SETTINGS = {"do_sample": False, "temperature": None, "top_p": None, "enable_thinking": False, "thinking_budget": 0}
+
+@pytest.fixture(scope="session")
+def tiny_lm():
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    try:
+        tokenizer = transformers.AutoTokenizer.from_pretrained(TINY_MODEL_NAME)
+        model = transformers.AutoModelForCausalLM.from_pretrained(TINY_MODEL_NAME, torch_dtype=torch.float32)
+    except Exception as e:
+        pytest.skip(f"tiny model {TINY_MODEL_NAME} unavailable: {e}")
+
+    # Same pad token setup of HFBackend.load
+    if tokenizer.pad_token_id is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model.config.pad_token_id = tokenizer.pad_token_id
+    model.eval()
+    return model, tokenizer
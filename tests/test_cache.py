@@ -0,0 +1,167 @@
+import pytest
+
+import cache
+from cache import ResultCache, content_hash, make_cache_key
+
+# Clock of the cache module, moved by hand for the TTL tests
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache.time, "time", fake)
+    return fake
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "results.sqlite3")
+
+# --- Keys ---
+
+def test_keys_ignore_whitespace_differences():
+    assert content_hash("Hello  world.\r\n\r\n\r\nBye ") == content_hash("Hello world.\n\nBye")
+    assert content_hash("Hello world.\n\nBye") != content_hash("Hello world. Bye")
+
+def test_keys_depend_on_everything_that_changes_the_output():
+    key = make_cache_key("chunk", "en", "Some text.", "v1", {"temperature": 0.7})
+    assert key == make_cache_key("chunk", "EN", "Some  text.", "v1", {"temperature": 0.7})
+    assert key == make_cache_key("chunk", "en", None, "v1", {"temperature": 0.7}, text_hash=content_hash("Some text."))
+    assert len({
+        key,
+        make_cache_key("simplify", "en", "Some text.", "v1", {"temperature": 0.7}),
+        make_cache_key("chunk", "fr", "Some text.", "v1", {"temperature": 0.7}),
+        make_cache_key("chunk", "en", "Other text.", "v1", {"temperature": 0.7}),
+        make_cache_key("chunk", "en", "Some text.", "v2", {"temperature": 0.7}),
+        make_cache_key("chunk", "en", "Some text.", "v1", {"temperature": 0.2}),
+    }) == 6
+
+# --- Memory tier ---
+
+def test_least_recently_used_entries_are_evicted():
+    results = ResultCache(max_entries=2)
+    results.set("a", 1)
+    results.set("b", 2)
+    assert results.get("a") == 1
+    results.set("c", 3)
+
+    # "b" was the least recently used one ("a" was just read)
+    assert results.get("b") is None
+    assert (results.get("a"), results.get("c")) == (1, 3)
+    assert results.stats()["evictions"] == 1
+    assert results.stats()["memory_entries"] == 2
+
+def test_memory_entries_expire(clock):
+    results = ResultCache(ttl_seconds=60)
+    results.set("a", "value")
+    clock.now += 59
+    assert results.get("a") == "value"
+    clock.now += 2
+    assert results.get("a") is None
+    assert results.stats()["expirations"] == 1
+    assert results.stats()["memory_entries"] == 0
+
+def test_memory_entries_without_ttl_never_expire(clock):
+    results = ResultCache(ttl_seconds=0)
+    results.set("a", "value")
+    clock.now += 10 ** 9
+    assert results.get("a") == "value"
+
+def test_stats_count_hits_and_misses(store_path):
+    results = ResultCache(path=store_path)
+    results.set("a", [1, 2])
+    results.get("a")
+    results.get("missing")
+    stats = results.stats()
+    assert (stats["memory_hits"], stats["misses"], stats["sets"]) == (1, 1, 1)
+    assert stats["hit_ratio"] == 0.5
+    assert stats["disk_entries"] == 1
+
+# --- Disk tier ---
+
+def test_results_survive_a_restart(store_path):
+    ResultCache(path=store_path).set("a", ["parsed", ["plain"], {"lang": "fr"}], operation="chunk", lang="FR")
+
+    restarted = ResultCache(path=store_path)
+    assert restarted.get("a") == ["parsed", ["plain"], {"lang": "fr"}]
+    assert restarted.stats()["disk_hits"] == 1
+
+    # The disk hit is promoted to the memory tier
+    assert restarted.get("a") == ["parsed", ["plain"], {"lang": "fr"}]
+    assert restarted.stats()["memory_hits"] == 1
+
+def test_memory_expiry_falls_back_to_the_disk_tier(store_path, clock):
+    results = ResultCache(path=store_path, ttl_seconds=60)
+    results.set("a", "value")
+    clock.now += 120
+    assert results.get("a") == "value"
+    assert results.stats()["disk_hits"] == 1
+
+def test_disk_entries_expire(store_path, clock):
+    ResultCache(path=store_path).set("a", "value")
+    clock.now += 3600
+    assert ResultCache(path=store_path, disk_ttl_seconds=7200).get("a") == "value"
+
+    clock.now += 3600
+    results = ResultCache(path=store_path, disk_ttl_seconds=7200)
+    assert results.get("a") is None
+    assert results.stats()["disk_entries"] == 0
+
+def test_processes_share_the_disk_tier(store_path):
+    first, second = ResultCache(path=store_path), ResultCache(path=store_path)
+    first.set("a", "value")
+    assert second.get("a") == "value"
+
+# --- Invalidation ---
+
+# Cache with one entry per (operation, language) pair, in both tiers
+def filled_cache(path):
+    results = ResultCache(path=path)
+    for operation in ("chunk", "simplify"):
+        for lang in ("en", "fr"):
+            results.set(f"{operation}-{lang}", f"{operation} result in {lang}", operation=operation, lang=lang)
+    return results
+
+def test_invalidate_a_single_key(store_path):
+    results = filled_cache(store_path)
+    assert results.invalidate(key="chunk-en") == 1
+    assert results.invalidate(key="chunk-en") == 0
+    assert results.get("chunk-en") is None
+    assert ResultCache(path=store_path).get("chunk-en") is None
+    assert results.get("chunk-fr") == "chunk result in fr"
+
+@pytest.mark.parametrize("filters, removed", [
+    ({"operation": "chunk"}, {"chunk-en", "chunk-fr"}),
+    ({"lang": "FR"}, {"chunk-fr", "simplify-fr"}),
+    ({"operation": "simplify", "lang": "en"}, {"simplify-en"}),
+    ({"operation": "chunk", "lang": "de"}, set()),
+])
+def test_invalidate_with_filters(store_path, filters, removed):
+    results = filled_cache(store_path)
+    assert results.invalidate(**filters) == len(removed)
+
+    # The matching entries are gone from both tiers, the others are still in both
+    keys = {"chunk-en", "chunk-fr", "simplify-en", "simplify-fr"}
+    restarted = ResultCache(path=store_path)
+    for key in keys:
+        assert (results.get(key) is None) == (key in removed)
+        assert (restarted.get(key) is None) == (key in removed)
+    assert results.stats()["disk_entries"] == len(keys - removed)
+
+def test_invalidate_everything(store_path):
+    results = filled_cache(store_path)
+    assert results.invalidate() == 4
+    assert results.stats()["memory_entries"] == results.stats()["disk_entries"] == 0
+    assert results.stats()["invalidations"] == 4
+
+def test_invalidate_without_disk_tier_clears_the_memory():
+    results = ResultCache()
+    results.set("a", 1, operation="chunk", lang="en")
+    results.set("b", 2, operation="simplify", lang="en")
+    assert results.invalidate(operation="chunk") == 2
+    assert results.stats()["memory_entries"] == 0
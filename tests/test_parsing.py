@@ -0,0 +1,163 @@
+import re
+
+import pytest
+
+from parsing import ChunkStreamParser, OutputMonitor
+
+SOURCE_TEXT = (
+    "The city council approved the new budget on Monday after a long debate. "
+    "The plan adds funding for public transport and for the renovation of three schools. "
+    "Several members criticized the rise in local taxes, which will affect most families. "
+    "The mayor said that the first works will start in the spring and end before the next school year."
+)
+
+# Empty think block of a generation without thinking
+NO_THINKING = "<think>\n\n</think>\n\n"
+
+CHUNK_BLOCKS = [
+    "The <b>city council</b> approved the <b>new budget</b> on Monday after a long debate.",
+    "The plan adds funding for <b>public transport</b> and for the <i>renovation of three schools</i>.",
+    "Several members criticized the <b>rise in local taxes</b>, which will affect most families.",
+    "The mayor said that the <b>first works</b> will start in the <i>spring</i> and end before the next school year.",
+]
+
+SIMPLIFIED_TEXT = (
+    "The city council said yes to the new budget on Monday. "
+    "There will be more money for buses and trains. Three schools will be repaired. "
+    "Some council members do not like the higher local taxes. Most families will pay more. "
+    "The mayor says the works start in spring. They will be finished before the next school year."
+)
+
+# Feeds the output to the monitor in small pieces, as the decoder would (a few characters at a time), until it stops.
+# Returns the output fed so far.
+def feed(monitor, output, piece_size=3):
+    fed = ""
+    for start in range(0, len(output), piece_size):
+        piece = output[start:start + piece_size]
+        fed += piece
+        if monitor.feed(piece):
+            break
+    return fed
+
+# Blocks of a chunk answer, as the post-processing of chunk() reads them
+def answer_blocks(text):
+    parser = ChunkStreamParser()
+    return parser.feed(text) + parser.finish()
+
+# --- Chunking ---
+
+@pytest.mark.parametrize("piece_size", [1, 3, 7])
+def test_chunk_answer_stops_once_the_input_is_covered(piece_size):
+    monitor = OutputMonitor("chunk", SOURCE_TEXT)
+    output = NO_THINKING + "\n\n".join(CHUNK_BLOCKS) + "\n\nI hope this helps! Let me know if you need anything else."
+    fed = feed(monitor, output, piece_size)
+
+    # The commentary after the last block is never generated, and the last block is kept whole
+    assert monitor.stop_reason == "covered"
+    assert "I hope" not in fed
+    assert answer_blocks(monitor.accepted_text()) == CHUNK_BLOCKS
+
+def test_chunk_answer_with_plain_and_highlighted_lines_stops_after_the_last_highlighted_line():
+    monitor = OutputMonitor("chunk", SOURCE_TEXT)
+    blocks = [re.sub(r"</?[bi]>", "", block) + "\n" + block for block in CHUNK_BLOCKS]
+    fed = feed(monitor, NO_THINKING + "\n\n".join(blocks) + "\n\nNote: the text was split in four chunks.", piece_size=1)
+
+    # The last block counts as soon as its highlighted line is complete
+    assert monitor.stop_reason == "covered"
+    assert fed.endswith(CHUNK_BLOCKS[-1] + "\n")
+    assert answer_blocks(monitor.accepted_text()) == blocks
+
+def test_chunk_answer_covering_part_of_the_input_is_not_stopped():
+    monitor = OutputMonitor("chunk", SOURCE_TEXT)
+    output = NO_THINKING + "\n\n".join(CHUNK_BLOCKS[:3]) + "\n\n"
+    assert feed(monitor, output) == output
+    assert not monitor.stopped
+    assert monitor.accepted_text() == output
+
+def test_chunk_answer_repeating_its_last_block_is_cut_after_the_first_copy():
+    monitor = OutputMonitor("chunk", SOURCE_TEXT)
+    plain_block = "Several members criticized the rise in local taxes, which will affect most families."
+    feed(monitor, NO_THINKING + "\n\n".join(CHUNK_BLOCKS[:2] + [plain_block] * 5) + "\n\n")
+
+    # The block copies the input, so its n-grams may come back more often: the repeated span is detected first
+    assert monitor.stop_reason == "repetition"
+    assert answer_blocks(monitor.accepted_text()) == CHUNK_BLOCKS[:2] + [plain_block]
+
+def test_chunk_answer_looping_on_a_new_sentence_is_cut_after_its_last_complete_block():
+    monitor = OutputMonitor("chunk", SOURCE_TEXT)
+    feed(monitor, NO_THINKING + "\n\n".join(CHUNK_BLOCKS[:2]) + "\n\n" + "The works will start soon. " * 20)
+
+    assert monitor.stop_reason == "repeated_ngram"
+    assert answer_blocks(monitor.accepted_text()) == CHUNK_BLOCKS[:2]
+
+def test_chunk_answer_with_more_blocks_than_sentences_is_cut():
+    monitor = OutputMonitor("chunk", SOURCE_TEXT)
+    extra = [f"Extra remark number {index} about the <b>budget</b>." for index in range(10)]
+    feed(monitor, NO_THINKING + "\n\n".join(CHUNK_BLOCKS[:2] + extra) + "\n\n")
+
+    assert monitor.stop_reason == "excess_blocks"
+    assert answer_blocks(monitor.accepted_text()) == CHUNK_BLOCKS[:2] + extra[:4]
+
+# --- Simplification ---
+
+@pytest.mark.parametrize("piece_size", [1, 4])
+def test_simplify_answer_is_never_stopped(piece_size):
+    for output in (NO_THINKING + SIMPLIFIED_TEXT, SIMPLIFIED_TEXT, "<think>\nShort sentences, simple words.\n</think>\n\n" + SIMPLIFIED_TEXT):
+        monitor = OutputMonitor("simplify", SOURCE_TEXT)
+        assert feed(monitor, output, piece_size) == output
+        assert not monitor.stopped
+        assert monitor.accepted_text() == output
+
+@pytest.mark.parametrize("sentence", ["Buses will be faster.", "Buses and trains will get more money from the city."])
+def test_looping_simplify_answer_keeps_two_copies(sentence):
+    monitor = OutputMonitor("simplify", SOURCE_TEXT)
+    feed(monitor, NO_THINKING + SIMPLIFIED_TEXT + " " + " ".join([sentence] * 10))
+
+    # The n-grams of the loop come back a third time (they never occur in the input) at the start of its third copy
+    assert monitor.stop_reason == "repeated_ngram"
+    assert monitor.accepted_text() == NO_THINKING + SIMPLIFIED_TEXT + " " + " ".join([sentence] * 2)
+
+def test_simplify_answer_coming_back_to_the_same_ngram_is_cut():
+    monitor = OutputMonitor("simplify", SOURCE_TEXT)
+    fillers = ["Buses will run more often.", "Parents asked many questions.", "The debate was long.", "Taxes go up next year.", "Schools get new windows."]
+    answer = " ".join(f"The city council said yes to the budget. {filler}" for filler in fillers)
+    feed(monitor, NO_THINKING + answer)
+
+    # The n-gram may come back twice as often as in the input (where it never occurs), plus the slack: the answer is
+    # cut right before its next occurrence
+    assert monitor.stop_reason == "repeated_ngram"
+    kept = monitor.accepted_text()[len(NO_THINKING):]
+    assert OutputMonitor.NGRAM_SLACK == 2
+    assert kept == "The city council said yes to the budget. Buses will run more often. The city council said yes to the budget. Parents asked many questions."
+
+def test_runaway_list_is_cut_at_its_first_item():
+    monitor = OutputMonitor("simplify", SOURCE_TEXT)
+    items = "".join(f"- Detail {index * 7}.\n" for index in range(60))
+    feed(monitor, NO_THINKING + SIMPLIFIED_TEXT + "\n\nHere is a list of details:\n" + items)
+
+    assert monitor.stop_reason == "runaway_list"
+    assert monitor.accepted_text() == NO_THINKING + SIMPLIFIED_TEXT + "\n\nHere is a list of details:"
+
+def test_runaway_output_is_cut():
+    monitor = OutputMonitor("simplify", "A short text to simplify.")
+    words = " ".join(f"word{index}" for index in range(500))
+    feed(monitor, NO_THINKING + words)
+
+    assert monitor.stop_reason == "runaway_output"
+    assert len(monitor.accepted_text()[len(NO_THINKING):].split()) == int(OutputMonitor.LENGTH_RATIO["simplify"] * 5) + OutputMonitor.LENGTH_SLACK
+
+def test_degeneration_while_thinking_leaves_no_answer():
+    monitor = OutputMonitor("simplify", SOURCE_TEXT)
+    feed(monitor, "<think>\n" + "Wait, let me check the budget again. " * 20)
+
+    assert monitor.stop_reason == "repetition"
+    assert monitor.accepted_text() is None
+
+def test_reset_starts_over():
+    monitor = OutputMonitor("simplify", SOURCE_TEXT)
+    feed(monitor, NO_THINKING + "again " * 100)
+    assert monitor.stopped
+
+    monitor.reset()
+    assert not monitor.stopped
+    assert feed(monitor, NO_THINKING + SIMPLIFIED_TEXT) == NO_THINKING + SIMPLIFIED_TEXT
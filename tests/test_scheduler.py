@@ -0,0 +1,214 @@
+import threading
+import time
+
+import pytest
+
+from backends import StubBackend
+from scheduler import BatchScheduler
+from conftest import GREEDY_SETTINGS
+
+# generate_fn that records the batches it gets and answers every payload with its own upper-cased text
+class RecordingGenerate:
+
+    def __init__(self):
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, payloads, group):
+        with self._lock:
+            self.batches.append((list(payloads), group))
+        return [payload.upper() for payload in payloads]
+
+# Submits the requests while the worker is busy with a first (blocking) request, so that they all land in the same
+# collection window: the batches they form then depend on the batching rules only, not on the timing of the test.
+def submit_while_busy(scheduler, requests):
+    entered, release = threading.Event(), threading.Event()
+    generate_fn = scheduler.generate_fn
+
+    def gated_generate(payloads, group):
+        if group == "blocker":
+            entered.set()
+            release.wait(5)
+            return list(payloads)
+        return generate_fn(payloads, group)
+
+    scheduler.generate_fn = gated_generate
+    blocker = scheduler.submit("blocker", length=1, group="blocker")
+    assert entered.wait(5)
+    futures = [scheduler.submit(payload, length=length, group=group) for payload, length, group in requests]
+    release.set()
+    blocker.result(timeout=5)
+    return futures
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+    def make(generate_fn, **options):
+        schedulers.append(BatchScheduler(generate_fn, **options))
+        return schedulers[-1]
+    yield make
+    for scheduler in schedulers:
+        scheduler.shutdown()
+
+def test_every_caller_gets_its_own_result(make_scheduler):
+    scheduler = make_scheduler(RecordingGenerate(), max_batch_size=4, max_wait_ms=50)
+    results = {}
+
+    def call(index):
+        results[index] = scheduler.run(f"request {index}", length=10)
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert results == {index: f"REQUEST {index}" for index in range(12)}
+
+def test_batches_never_exceed_max_batch_size(make_scheduler):
+    generate = RecordingGenerate()
+    scheduler = make_scheduler(generate, max_batch_size=3, max_wait_ms=200)
+    futures = submit_while_busy(scheduler, [(f"request {index}", 10, None) for index in range(8)])
+
+    assert [future.result(timeout=5) for future in futures] == [f"REQUEST {index}" for index in range(8)]
+    assert [len(payloads) for payloads, _ in generate.batches] == [3, 3, 2]
+    assert scheduler.stats()["batch_sizes"] == {1: 1, 2: 1, 3: 2}
+
+def test_requests_are_grouped_by_length(make_scheduler):
+    generate = RecordingGenerate()
+    scheduler = make_scheduler(generate, max_batch_size=8, max_wait_ms=200, max_length_ratio=1.5)
+    futures = submit_while_busy(scheduler, [("short a", 10, None), ("long a", 100, None), ("short b", 12, None), ("long b", 120, None)])
+
+    assert [future.result(timeout=5) for future in futures] == ["SHORT A", "LONG A", "SHORT B", "LONG B"]
+    batches = sorted(sorted(payloads) for payloads, _ in generate.batches)
+    assert batches == [["long a", "long b"], ["short a", "short b"]]
+
+def test_requests_of_different_groups_are_not_batched_together(make_scheduler):
+    generate = RecordingGenerate()
+    scheduler = make_scheduler(generate, max_batch_size=8, max_wait_ms=200)
+    futures = submit_while_busy(scheduler, [("a", 10, "greedy"), ("b", 10, "sampling"), ("c", 10, "greedy")])
+
+    assert [future.result(timeout=5) for future in futures] == ["A", "B", "C"]
+    assert sorted((group, sorted(payloads)) for payloads, group in generate.batches) == [
+        ("greedy", ["a", "c"]), ("sampling", ["b"])
+    ]
+
+def test_collection_window_batches_close_requests(make_scheduler):
+    generate = RecordingGenerate()
+    scheduler = make_scheduler(generate, max_batch_size=8, max_wait_ms=300)
+    first = scheduler.submit("first", length=10)
+    time.sleep(0.05)
+    second = scheduler.submit("second", length=10)
+
+    assert (first.result(timeout=5), second.result(timeout=5)) == ("FIRST", "SECOND")
+    assert [payloads for payloads, _ in generate.batches] == [["first", "second"]]
+
+def test_lone_request_waits_at_most_max_wait(make_scheduler):
+    scheduler = make_scheduler(RecordingGenerate(), max_batch_size=8, max_wait_ms=100)
+    started = time.monotonic()
+    assert scheduler.run("alone", length=10) == "ALONE"
+    elapsed = time.monotonic() - started
+    assert 0.08 <= elapsed < 1.0
+
+def test_full_batch_does_not_wait_for_the_window(make_scheduler):
+    scheduler = make_scheduler(RecordingGenerate(), max_batch_size=2, max_wait_ms=5000)
+    started = time.monotonic()
+    futures = [scheduler.submit(payload, length=10) for payload in ("a", "b")]
+    assert [future.result(timeout=5) for future in futures] == ["A", "B"]
+    assert time.monotonic() - started < 1.0
+
+def test_failing_batch_is_retried_one_request_at_a_time(make_scheduler):
+    def generate(payloads, group):
+        if len(payloads) > 1:
+            raise RuntimeError("out of memory")
+        if payloads[0] == "faulty":
+            raise ValueError("faulty request")
+        return [payload.upper() for payload in payloads]
+
+    scheduler = make_scheduler(generate, max_batch_size=8, max_wait_ms=200)
+    futures = submit_while_busy(scheduler, [("ok", 10, None), ("faulty", 10, None), ("fine", 10, None)])
+
+    assert futures[0].result(timeout=5) == "OK"
+    assert futures[2].result(timeout=5) == "FINE"
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+
+def test_calls_run_in_the_worker_thread(make_scheduler):
+    threads = []
+    def generate(payloads, group):
+        threads.append(threading.current_thread())
+        return list(payloads)
+
+    scheduler = make_scheduler(generate, max_batch_size=8, max_wait_ms=50)
+    assert scheduler.run("request", length=1) == "request"
+    assert scheduler.call_in_worker(lambda value: (threading.current_thread(), value), 42).result(timeout=5) == (threads[0], 42)
+    with pytest.raises(ZeroDivisionError):
+        scheduler.call_in_worker(lambda: 1 / 0).result(timeout=5)
+
+def test_stub_backend_answers_are_routed_to_their_callers(make_scheduler):
+    stub = StubBackend()
+    scheduler = make_scheduler(
+        lambda payloads, group: stub.generate_batch(payloads, 64, GREEDY_SETTINGS), max_batch_size=4, max_wait_ms=50
+    )
+    prompts = [stub.build_prompt_text("", f"Answer number {index}.", enable_thinking=False) for index in range(10)]
+    futures = [scheduler.submit(prompt, length=stub.count_tokens(prompt)) for prompt in prompts]
+
+    assert [future.result(timeout=5) for future in futures] == [f"Answer number {index}." for index in range(10)]
+    assert stub.stats()["prompts"] == 10
+    assert stub.stats()["batches"] < 10
+
+def test_batched_prompts_are_left_padded(tiny_lm):
+    from generation import prepare_generation_inputs
+
+    model, tokenizer = tiny_lm
+    prompts = ["Hello", "A much longer prompt than the first one, with many more tokens in it"]
+    inputs, prompt_length = prepare_generation_inputs(model, tokenizer, prompts)
+
+    # Every row ends with its own tokens, and the padding (masked out) is on the left
+    assert prompt_length == inputs["input_ids"].shape[-1]
+    for row, prompt in enumerate(prompts):
+        ids = tokenizer(prompt).input_ids
+        assert inputs["input_ids"][row, -len(ids):].tolist() == ids
+        assert inputs["attention_mask"][row].tolist() == [0] * (prompt_length - len(ids)) + [1] * len(ids)
+
+def test_batched_prompts_can_be_tokenized_while_tokens_are_counted(tiny_lm):
+    from generation import prepare_generation_inputs
+
+    # The batches never change the padding state of the (shared) fast tokenizer, so the threads counting tokens at the
+    # same time never find it borrowed
+    model, tokenizer = tiny_lm
+    errors = []
+
+    def count_tokens():
+        try:
+            for _ in range(200):
+                assert len(tokenizer("Counting the tokens of a paragraph").input_ids) > 0
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=count_tokens) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for _ in range(50):
+        prepare_generation_inputs(model, tokenizer, ["Hello", "A longer prompt, to be padded against the first one"])
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert errors == []
+    assert getattr(tokenizer, "_tokenizer", None) is None or tokenizer._tokenizer.padding is None
+
+def test_scheduled_batches_match_single_generations(tiny_lm, make_scheduler):
+    from generation import generate_batch
+
+    model, tokenizer = tiny_lm
+    eos_token_id = tokenizer.eos_token_id
+    generate = lambda prompt_texts: generate_batch(model, tokenizer, prompt_texts, 8, GREEDY_SETTINGS, eos_token_id)
+    scheduler = make_scheduler(lambda payloads, group: generate(payloads), max_batch_size=4, max_wait_ms=200, max_length_ratio=10)
+
+    prompts = ["Hello", "The quick brown fox", "One two three four five six", "Left padding"]
+    futures = [scheduler.submit(prompt, length=len(tokenizer(prompt).input_ids)) for prompt in prompts]
+    results = [future.result(timeout=60) for future in futures]
+
+    # The prompts shared a left-padded batch, and every caller got the answer of its own prompt
+    assert scheduler.stats()["batches"] == 1
+    assert results == [generate([prompt])[0] for prompt in prompts]
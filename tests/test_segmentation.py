@@ -0,0 +1,161 @@
+import re
+
+import pytest
+
+from segmentation import merge_window_chunks, segment_text, sentence_spans
+
+# Sentences of text, in the given language
+def sentences(text, lang):
+    return [text[start:end] for start, end in sentence_spans(text, 0, len(text), lang)]
+
+# Whitespace-insensitive form of a text (the windows drop the paragraph breaks between them)
+def squeezed(text):
+    return " ".join(text.split())
+
+# --- Sentence boundaries ---
+
+@pytest.mark.parametrize("lang, text, expected", [
+    ("en", "Mr. Smith met Dr. Jones on Jan. 5. They talked about the budget, e.g. the new schools.",
+     ["Mr. Smith met Dr. Jones on Jan. 5.", "They talked about the budget, e.g. the new schools."]),
+    ("it", "Il dott. Rossi ha letto l'art. 3 della legge. Poi è partito per Roma.",
+     ["Il dott. Rossi ha letto l'art. 3 della legge.", "Poi è partito per Roma."]),
+    ("es", "La Sra. García vive en EE.UU. desde hace años. Luego se mudó.",
+     ["La Sra. García vive en EE.UU. desde hace años.", "Luego se mudó."]),
+    ("fr", "Mme Martin a rencontré M. Dupont, cf. le rapport. Il est parti.",
+     ["Mme Martin a rencontré M. Dupont, cf. le rapport.", "Il est parti."]),
+    ("de", "Am 3. Oktober kam Dr. Müller, z.B. mit dem Zug. Dann ging er nach Hause.",
+     ["Am 3. Oktober kam Dr. Müller, z.B. mit dem Zug.", "Dann ging er nach Hause."]),
+])
+def test_abbreviations_do_not_end_sentences(lang, text, expected):
+    assert sentences(text, lang) == expected
+
+def test_initials_do_not_end_sentences():
+    assert sentences("The novel by J. K. Rowling sold well. It was translated.", "en") == [
+        "The novel by J. K. Rowling sold well.", "It was translated."
+    ]
+
+def test_abbreviations_depend_on_the_language():
+    text = "Wir kaufen Brot, Milch usw. Dann gehen wir nach Hause."
+    assert len(sentences(text, "de")) == 1
+    assert len(sentences(text, "en")) == 2
+
+def test_other_punctuation_always_ends_sentences():
+    assert sentences("Is it Dr. Who? Yes! He came... Then he left.", "en") == ["Is it Dr. Who?", "Yes!", "He came...", "Then he left."]
+
+def test_lowercase_continuation_does_not_end_a_sentence():
+    assert len(sentences("The plan costs approx. ten million euros. It was approved.", "en")) == 2
+    assert len(sentences("The unknown abbr. continues here. It was approved.", "en")) == 2
+
+# --- Windows ---
+
+ARTICLE = "\n\n".join([
+    "The city council approved the new budget on Monday. The debate lasted six hours.",
+    " ".join(f"Sentence number {index} of the long paragraph adds a few more words to it." for index in range(12)),
+    "Dr. Smith said the plan was fair. Mrs. Jones disagreed.",
+    "The works will start in the spring.",
+])
+
+def test_short_text_is_a_single_window():
+    assert segment_text("  A short text.  ", max_tokens=100) == [{"text": "A short text.", "continues_paragraph": False}]
+    assert len(segment_text(ARTICLE, max_tokens=0)) == 1
+
+@pytest.mark.parametrize("max_tokens", [20, 40, 64, 100])
+def test_windows_are_exact_slices_under_the_budget(max_tokens):
+    windows = segment_text(ARTICLE, max_tokens=max_tokens)
+    assert len(windows) > 1
+
+    # Every window is a verbatim slice of the article, the windows follow each other and cover the whole text
+    position = 0
+    for window in windows:
+        start = ARTICLE.find(window["text"], position)
+        assert start >= position and ARTICLE[position:start].strip() == ""
+        position = start + len(window["text"])
+        assert len(window["text"].split()) <= max_tokens
+    assert ARTICLE[position:].strip() == ""
+    assert squeezed(" ".join(window["text"] for window in windows)) == squeezed(ARTICLE)
+
+def test_windows_never_cut_a_sentence():
+    all_sentences = {squeezed(sentence) for paragraph in ARTICLE.split("\n\n") for sentence in sentences(paragraph, "en")}
+    for window in segment_text(ARTICLE, max_tokens=40):
+        for paragraph in window["text"].split("\n\n"):
+            assert all(squeezed(sentence) in all_sentences for sentence in sentences(paragraph, "en"))
+
+def test_windows_tell_when_they_continue_a_paragraph():
+    windows = segment_text(ARTICLE, max_tokens=40)
+    for previous, window in zip(windows, windows[1:]):
+        starts_paragraph = any(paragraph.startswith(window["text"][:30]) for paragraph in ARTICLE.split("\n\n"))
+        assert window["continues_paragraph"] == (not starts_paragraph)
+    assert windows[0]["continues_paragraph"] is False
+    assert any(window["continues_paragraph"] for window in windows)
+
+def test_sentence_above_the_budget_gets_its_own_window():
+    long_sentence = " ".join(["Word"] * 30) + "."
+    text = f"A first short sentence. {long_sentence} A last short sentence."
+    windows = segment_text(text, max_tokens=10)
+    assert long_sentence in [window["text"] for window in windows]
+
+def test_windows_are_balanced():
+    text = "\n\n".join(f"Paragraph {index} has exactly ten words in it, no more." for index in range(10))
+
+    # 100 words in windows of 60: two windows of 50 words rather than 60 + 40
+    windows = segment_text(text, max_tokens=60)
+    assert [len(window["text"].split()) for window in windows] == [50, 50]
+
+def test_windows_use_the_given_token_counter():
+    windows = segment_text(ARTICLE, max_tokens=300, count_tokens=len)
+    assert all(len(window["text"]) <= 300 for window in windows)
+
+# --- Merging ---
+
+# Chunking result of a window, as parse_chunked_output returns it: (parsed, plain, highlighted)
+def window_result(*blocks):
+    highlighted = [re.sub(r"\b(\w+)$", r"<b>\1</b>", block) for block in blocks]
+    return ([f"{plain}\n{high}" for plain, high in zip(blocks, highlighted)], list(blocks), highlighted)
+
+def test_blocks_at_a_paragraph_border_are_kept():
+    windows = [{"text": "A. B.", "continues_paragraph": False}, {"text": "C. D.", "continues_paragraph": False}]
+    parsed, plain, highlighted = merge_window_chunks([window_result("one two", "three"), window_result("four", "five six")], windows)
+    assert plain == ["one two", "three", "four", "five six"]
+    assert len(parsed) == len(highlighted) == 4
+
+def test_blocks_split_by_a_window_border_are_merged():
+    windows = [{"text": "A. B.", "continues_paragraph": False}, {"text": "C. D.", "continues_paragraph": True}]
+    merged = merge_window_chunks(
+        [window_result("one two three four", "five six"), window_result("seven eight", "nine ten eleven twelve")], windows
+    )
+
+    # The last block of the first window and the first block of the second one are two halves of the same block
+    assert isinstance(merged, tuple)
+    parsed, plain, highlighted = merged
+    assert plain == ["one two three four", "five six seven eight", "nine ten eleven twelve"]
+    assert highlighted[1] == "five <b>six</b> seven <b>eight</b>"
+    assert parsed[1] == "five six seven eight\nfive <b>six</b> seven <b>eight</b>"
+
+def test_border_merge_never_makes_the_longest_block():
+    windows = [{"text": "A. B.", "continues_paragraph": False}, {"text": "C. D.", "continues_paragraph": True}]
+    _, plain, _ = merge_window_chunks([window_result("one two", "three four five"), window_result("six seven", "eight")], windows)
+    assert plain == ["one two", "three four five", "six seven", "eight"]
+
+def test_single_line_blocks_are_merged_on_one_line():
+    windows = [{"text": "A.", "continues_paragraph": False}, {"text": "B.", "continues_paragraph": True}]
+    parsed, _, _ = merge_window_chunks(
+        [(["a b c d e f", "one <b>two</b>"], ["a b c d e f", "one two"], ["a b c d e f", "one <b>two</b>"]), (["three"], ["three"], ["three"])],
+        windows
+    )
+    assert parsed == ["a b c d e f", "one <b>two</b> three"]
+
+def test_unparsed_window_degrades_to_its_own_text():
+    windows = [
+        {"text": "First window.", "continues_paragraph": False},
+        {"text": "Second window, unparsed.", "continues_paragraph": True},
+        {"text": "Third window.", "continues_paragraph": True},
+    ]
+    error_result = ["[Error during chunking: boom]", "Second window, unparsed."]
+    merged = merge_window_chunks([window_result("one two three"), error_result, window_result("four")], windows)
+
+    # The three lists are returned in a list (not a triple), so the result cache refuses them
+    assert isinstance(merged, list) and len(merged) == 3
+    parsed, plain, highlighted = merged
+    assert plain == ["one two three", "Second window, unparsed.", "four"]
+    assert highlighted == ["one two <b>three</b>", "Second window, unparsed.", "<b>four</b>"]
+    assert parsed == ["one two three\none two <b>three</b>", "Second window, unparsed.", "four\n<b>four</b>"]
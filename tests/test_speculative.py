@@ -0,0 +1,104 @@
+import copy
+
+import pytest
+
+from backends import HFBackend
+from speculative import SpeculativeDecodingSelector, acceptance_rate
+from conftest import GREEDY_SETTINGS
+
+# Feeds the selector with measures until both modes have min_samples of them, following its own decisions
+def warm_up(selector, speculative_speed, plain_speed):
+    while min(selector.stats()["plain_samples"], selector.stats()["speculative_samples"]) < selector.min_samples:
+        speculative = selector.use_draft()
+        selector.record(speculative, speculative_speed if speculative else plain_speed)
+
+def test_fixed_modes_ignore_the_measures():
+    on, off = SpeculativeDecodingSelector("on"), SpeculativeDecodingSelector("off")
+    for selector in (on, off):
+        selector.record(True, 1.0)
+        selector.record(False, 100.0)
+    assert all(on.use_draft() for _ in range(50))
+    assert not any(off.use_draft() for _ in range(50))
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        SpeculativeDecodingSelector("sometimes")
+
+def test_auto_mode_tries_both_modes_first():
+    selector = SpeculativeDecodingSelector("auto", min_samples=3)
+    warm_up(selector, speculative_speed=10.0, plain_speed=10.0)
+    assert selector.stats()["plain_samples"] == selector.stats()["speculative_samples"] == 3
+
+def test_auto_mode_follows_the_observed_speedup():
+    selector = SpeculativeDecodingSelector("auto", min_samples=3, explore_every=10, smoothing=0.5)
+
+    # Speculative decoding is twice as fast: it is used, except for the periodic exploration of plain decoding
+    warm_up(selector, speculative_speed=40.0, plain_speed=20.0)
+    assert selector.stats()["speedup"] == pytest.approx(2.0)
+    decisions = [selector.use_draft() for _ in range(20)]
+    assert decisions.count(True) == 18
+
+    # The drafts stop being accepted: once the speculative measures fall below the plain ones, plain decoding wins
+    for _ in range(5):
+        selector.record(True, 5.0)
+    assert selector.stats()["speedup"] < 1.0
+    decisions = [selector.use_draft() for _ in range(20)]
+    assert decisions.count(False) == 18
+
+def test_acceptance_rate():
+    assert acceptance_rate(output_tokens=30, steps=10, num_draft_tokens=5) == pytest.approx(0.4)
+    assert acceptance_rate(output_tokens=10, steps=10, num_draft_tokens=5) == 0.0
+    assert acceptance_rate(output_tokens=100, steps=10, num_draft_tokens=5) == 1.0
+    assert acceptance_rate(output_tokens=10, steps=0, num_draft_tokens=5) is None
+
+def test_backend_switches_decoding_mode_from_the_measured_speed():
+    backend = HFBackend(speculative="auto", speculative_method="prompt_lookup", prompt_lookup_tokens=4)
+    prefix = (("chunk", "en", False), "")
+    selector = backend._speculative_selector(prefix)
+
+    # Batches always use plain decoding
+    assert backend._speculative_kwargs(2, selector) is None
+
+    # Single prompts: the measures of both modes (here, speculative decoding is faster) drive the choice
+    for _ in range(2 * selector.min_samples):
+        speculative = backend._speculative_kwargs(1, selector) is not None
+        stats = {"output_tokens": 40, "prefill_seconds": 0.0, "decode_seconds": 1.0 if speculative else 2.0, "decode_steps": 19 if speculative else 39}
+        backend._record_decoding(speculative, stats, 1, selector)
+        assert stats["decoding_mode"] == ("prompt_lookup" if speculative else "plain")
+    assert backend._speculative_kwargs(1, selector) == {"prompt_lookup_num_tokens": 4, "max_matching_ngram_size": 3}
+    assert backend.stats()["speculative"]["operations"]["chunk"]["speedup"] == pytest.approx(2.0)
+
+# Backend around an already loaded model (load() would download the production models)
+def loaded_backend(model, tokenizer, draft_model=None, **options):
+    backend = HFBackend(prefix_cache_size=0, **options)
+    backend.model, backend.tokenizer, backend.device = model, tokenizer, "cpu"
+    backend.terminator_ids = tokenizer.eos_token_id
+    backend.draft_model = draft_model
+    return backend
+
+@pytest.fixture(scope="module")
+def tiny_draft_model(tiny_lm):
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    # A smaller model of the same family built from the configuration of the main one: it shares its tokenizer
+    model, _ = tiny_lm
+    config = copy.deepcopy(model.config)
+    config.num_hidden_layers = 1
+    torch.manual_seed(0)
+    draft_model = AutoModelForCausalLM.from_config(config).eval()
+    draft_model.generation_config.num_assistant_tokens = 3
+    draft_model.generation_config.num_assistant_tokens_schedule = "constant"
+    return draft_model
+
+@pytest.mark.parametrize("method", ["draft_model", "prompt_lookup"])
+def test_assisted_decoding_matches_greedy_decoding(tiny_lm, tiny_draft_model, method):
+    model, tokenizer = tiny_lm
+    plain = loaded_backend(model, tokenizer)
+    assisted = loaded_backend(model, tokenizer, tiny_draft_model, speculative="on", speculative_method=method, num_draft_tokens=3)
+
+    for prompt in ["Hello", "The quick brown fox jumps over the lazy dog. The quick brown fox"]:
+        stats = {}
+        expected = plain.generate_batch([prompt], 12, GREEDY_SETTINGS)
+        assert assisted.generate_batch([prompt], 12, GREEDY_SETTINGS, stats=stats) == expected
+        assert stats["decoding_mode"] == method
@@ -0,0 +1,32 @@
+import pytest
+
+import tracing
+from admission import RequestContext, run_with_request_context
+from tracing import Trace, log, set_console_level
+
+@pytest.fixture
+def console_level():
+    level = tracing.console_level
+    yield set_console_level
+    set_console_level(level)
+
+def test_console_level_applies_outside_of_a_trace(capsys, console_level):
+    console_level("error")
+    log("--- Cache MISS ---")
+    log("Warning: slow backend", level="warning")
+    log("Error: backend crashed", level="error")
+    assert capsys.readouterr().out == "Error: backend crashed\n"
+
+def test_traced_messages_are_recorded_and_prefixed(capsys, console_level):
+    console_level("warning")
+    trace = Trace("request")
+    run_with_request_context(RequestContext(trace=trace), log, "Calling LLM")
+    run_with_request_context(RequestContext(trace=trace), log, "Warning: retrying", level="warning")
+
+    # Every message is in the trace, only the ones at the console level are printed (with the trace id)
+    assert [(event["level"], event["message"]) for event in trace.events] == [("info", "Calling LLM"), ("warning", "Warning: retrying")]
+    assert capsys.readouterr().out == f"[{trace.trace_id}] Warning: retrying\n"
+
+def test_unknown_console_level_is_rejected(console_level):
+    with pytest.raises(ValueError):
+        console_level("debug")
@@ -0,0 +1,217 @@
+import contextvars
+import functools
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from admission import get_request_context
+
+# --- 1. Request Traces ---
+# The metrics (see metrics.py) tell how the server behaves on average, not why one particular paragraph took 90 seconds.
+# Every API request (and every background precomputation) carries a Trace: the spans of the work done for it (JSON
+# parsing, cache lookups, prompt formatting, chat template, waits for a generation slot and for a batch, tokenization,
+# prefill, decode, detokenization, post-processing), its token counts and cache/batch metadata, and the diagnostic
+# messages logged while serving it. Finished traces are written as JSON lines (see TraceWriter).
+# The trace of a request lives on its RequestContext (see admission.py), so it follows the request wherever the context
+# goes: child contexts of the batch items share the trace of their request, and the batch scheduler records the
+# generation spans in the trace of every request of a batch.
+# Spans are {"id", "name", "start_ms", "duration_ms", "thread", "parent", "attributes"} dictionaries, where start_ms is
+# relative to the start of the trace and parent is the id of the enclosing span (in the same thread), if any.
+class Trace:
+
+    def __init__(self, name, **attributes):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.attributes = dict(attributes)
+        self.counters = {}
+        self.spans = []
+        self.events = []
+        self.duration = None
+        self._span_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # Records a span that ran from start to end (time.monotonic based) and returns its id
+    def add_span(self, name, start, end, span_id=None, **attributes):
+        span_id = span_id or next(self._span_ids)
+        parent = current_span.get()
+        span = {
+            "id": span_id,
+            "name": name,
+            "start_ms": round((start - self.started) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+            "thread": threading.current_thread().name,
+        }
+        if parent is not None and parent[0] is self and parent[1] != span_id:
+            span["parent"] = parent[1]
+        if attributes:
+            span["attributes"] = attributes
+        with self._lock:
+            self.spans.append(span)
+        return span_id
+
+    # Records a diagnostic message (see log)
+    def add_event(self, message, level="info", **fields):
+        event = {"at_ms": round((time.monotonic() - self.started) * 1000, 3), "level": level, "message": message}
+        if fields:
+            event["fields"] = fields
+        with self._lock:
+            self.events.append(event)
+
+    # Sets attributes of the request (e.g. the endpoint, the status code)
+    def set(self, **attributes):
+        with self._lock:
+            self.attributes.update(attributes)
+
+    # Adds to the counters of the request (e.g. tokens, cache hits)
+    def count(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    # Ends the trace and returns its record, or None if it had already been finished
+    def finish(self, **attributes):
+        with self._lock:
+            if self.duration is not None:
+                return None
+            self.duration = time.monotonic() - self.started
+            self.attributes.update(attributes)
+        return self.to_dict()
+
+    def to_dict(self):
+        with self._lock:
+            duration = self.duration if self.duration is not None else time.monotonic() - self.started
+            return {
+                "trace_id": self.trace_id,
+                "name": self.name,
+                "started_at": round(self.started_at, 3),
+                "duration_ms": round(duration * 1000, 3),
+                "attributes": dict(self.attributes),
+                "counters": dict(self.counters),
+                "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+                "events": list(self.events),
+            }
+
+# The (trace, span id) of the span enclosing the running code, if any
+current_span = contextvars.ContextVar("adaptease_current_span", default=None)
+
+# The trace of the current request (None outside of a traced request)
+def current_trace():
+    request_context = get_request_context()
+    return getattr(request_context, "trace", None)
+
+# Context manager that records the enclosed block as a span of the current trace (or of the given one), yielding its
+# attributes dictionary, so that the block can add attributes known only at its end (e.g. the outcome of a lookup).
+# Without a trace, nothing is recorded.
+@contextmanager
+def span(name, trace=None, **attributes):
+    trace = trace or current_trace()
+    if trace is None:
+        yield attributes
+        return
+    span_id = next(trace._span_ids)
+    token = current_span.set((trace, span_id))
+    start = time.monotonic()
+    try:
+        yield attributes
+    finally:
+        current_span.reset(token)
+        trace.add_span(name, start, time.monotonic(), span_id=span_id, **attributes)
+
+# Decorator that records every call of the decorated function as a span of the current trace
+def traced(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, function=function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Function that records a span measured by the caller (from start to end, time.monotonic based) in the current trace
+def record_span(name, start, end=None, trace=None, **attributes):
+    trace = trace or current_trace()
+    if trace is not None:
+        trace.add_span(name, start, time.monotonic() if end is None else end, **attributes)
+
+# Functions that add counters and attributes to the current trace (nothing without a trace)
+def count(**counts):
+    trace = current_trace()
+    if trace is not None:
+        trace.count(**counts)
+
+def annotate(**attributes):
+    trace = current_trace()
+    if trace is not None:
+        trace.set(**attributes)
+
+# --- 2. Diagnostic Messages ---
+# log replaces the print() diagnostics of the server modules: the message is recorded as an event of the current trace,
+# and printed on the console if its level is at least the console level ("info" prints everything, as the prints did),
+# inside a trace or not (the batch worker, direct chunk()/simplify() calls, the command line tools). The messages of a
+# trace are prefixed by its id, to find the trace of a message.
+# What every generation used to print (input length, token limit, reused prefix, speculative acceptance) goes to the
+# attributes of its spans instead (see model.record_generation_trace).
+LOG_LEVELS = {"info": 0, "warning": 1, "error": 2}
+console_level = "info"
+
+def set_console_level(level):
+    global console_level
+    if level not in LOG_LEVELS:
+        raise ValueError(f"Unknown log level '{level}'. Available: {', '.join(LOG_LEVELS)}")
+    console_level = level
+
+def log(message, level="info", **fields):
+    trace = current_trace()
+    if trace is not None:
+        trace.add_event(message, level, **fields)
+    if LOG_LEVELS[level] >= LOG_LEVELS[console_level]:
+        print(f"[{trace.trace_id}] {message}" if trace is not None else message)
+
+# --- 3. Trace Writer ---
+# TraceWriter appends the finished traces to a JSON lines file: every request slower than slow_ms, a sample_rate share
+# of the others, and every request that was profiled (see profiler.py). The file is rotated (to <path>.1) once it
+# exceeds max_bytes, so it never grows without bounds.
+class TraceWriter:
+
+    def __init__(self, path, slow_ms=10000, sample_rate=0.0, max_bytes=100 * 2 ** 20):
+        self.path = path
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {"finished": 0, "written": 0, "slow": 0, "errors": 0}
+
+    # Writes the record of a finished trace, if it has to be kept. Returns True if it was written.
+    def write(self, record):
+        slow = record["duration_ms"] >= self.slow_ms
+        keep = slow or "profile" in record["attributes"] or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n" if keep else None
+        with self._lock:
+            self._counters["finished"] += 1
+            self._counters["slow"] += slow
+            if not keep:
+                return False
+            try:
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                self._counters["errors"] += 1
+                log(f"Error writing a trace to {self.path}: {e}", level="error")
+                return False
+            self._counters["written"] += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"path": self.path, "slow_ms": self.slow_ms, "sample_rate": self.sample_rate, **self._counters}
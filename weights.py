@@ -0,0 +1,118 @@
+import glob
+import json
+import os
+import struct
+
+# --- 1. Memory-Mapped Weights ---
+# from_pretrained reads the checkpoint into private memory: every server process holds its own copy of the weights,
+# so N replicas on a host (see replicas.py) need N times the RAM, and every cold start reads the whole checkpoint again.
+# load_mapped_model builds the model around the safetensors files mapped in memory instead: every tensor is a view of a
+# private, copy-on-write file mapping (inference never writes the weights), so its pages are the ones of the OS page cache.
+# Every process mapping the same files shares them: the weights are in RAM once for the whole host, and a restarted
+# replica finds them already cached, paying only for the construction of the model.
+# Only weights stored in the compute dtype can be mapped: the others are converted, i.e. copied in private memory.
+# torch and transformers are passed in or imported lazily, as in backends.py.
+
+# safetensors dtype names, by torch dtype attribute name
+SAFETENSORS_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+
+# Function that returns the safetensors files of a model: a local folder, or the files of a Hub model (downloaded once,
+# then read from the local Hub cache). It returns an empty list when the model has no safetensors checkpoint.
+def checkpoint_files(model_name, token=None):
+    folder = model_name
+    if not os.path.isdir(folder):
+        from huggingface_hub import snapshot_download
+        folder = snapshot_download(model_name, token=token, allow_patterns=["*.safetensors", "*.json"])
+    return sorted(glob.glob(os.path.join(folder, "*.safetensors")))
+
+# Function that reads the header of a safetensors file: the {name: {"dtype", "shape", "data_offsets"}} entries of its
+# tensors, and the offset of their data in the file
+def read_safetensors_header(path):
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+    return header, 8 + header_size
+
+# Function that maps the tensors of safetensors files, returning the state dict and the bytes mapped and copied.
+# Floating point tensors in another dtype than compute_dtype are converted (copied); tensors whose offset in the file is
+# not aligned to their element size can't be viewed in place and are copied as well.
+def load_mapped_state_dict(paths, torch, compute_dtype=None):
+    state_dict, mapped_bytes, copied_bytes = {}, 0, 0
+    for path in paths:
+        header, data_start = read_safetensors_header(path)
+        size = os.path.getsize(path)
+
+        # shared=False: a private (copy-on-write) mapping, the file is never modified
+        storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=size)
+        file_bytes = torch.empty(0, dtype=torch.uint8).set_(storage, 0, (size,), (1,))
+
+        for name, entry in header.items():
+            dtype = getattr(torch, SAFETENSORS_DTYPES[entry["dtype"]])
+            start, end = (data_start + offset for offset in entry["data_offsets"])
+            raw = file_bytes[start:end]
+            try:
+                tensor = raw.view(dtype).reshape(entry["shape"])
+            except RuntimeError:
+                tensor = raw.clone().view(dtype).reshape(entry["shape"])
+                copied_bytes += end - start
+            else:
+                mapped_bytes += end - start
+
+            if compute_dtype is not None and tensor.is_floating_point() and tensor.dtype != compute_dtype:
+                tensor = tensor.to(compute_dtype)
+                copied_bytes += tensor.numel() * tensor.element_size()
+            state_dict[name] = tensor
+
+    return state_dict, mapped_bytes, copied_bytes
+
+# Function that builds a model (on CPU) whose weights are the mapped tensors of its checkpoint.
+# It returns the model and its {"mapped_mb", "copied_mb"} report, and raises when the checkpoint can't be used this way
+# (no safetensors files, or weights of the model missing from them): the caller then loads the model as usual.
+def load_mapped_model(model_name, torch, compute_dtype, token=None, trust_remote_code=True):
+    from accelerate import init_empty_weights
+    from transformers import AutoConfig, AutoModelForCausalLM
+
+    paths = checkpoint_files(model_name, token=token)
+    if not paths:
+        raise RuntimeError(f"{model_name} has no safetensors checkpoint to map.")
+
+    # The parameters are created on the meta device (no memory at all), the buffers (e.g. rotary tables) as usual
+    config = AutoConfig.from_pretrained(model_name, token=token, trust_remote_code=trust_remote_code)
+    with init_empty_weights(include_buffers=False):
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=compute_dtype, trust_remote_code=trust_remote_code)
+
+    # assign=True makes the mapped tensors the parameters themselves, instead of copying them into the module
+    state_dict, mapped_bytes, copied_bytes = load_mapped_state_dict(paths, torch, compute_dtype)
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+
+    missing = [name for name, parameter in model.named_parameters() if parameter.is_meta]
+    if missing:
+        raise RuntimeError(f"{len(missing)} weight(s) of {model_name} not found in its checkpoint (e.g. {missing[0]}).")
+
+    return model, {"mapped_mb": round(mapped_bytes / 2 ** 20, 1), "copied_mb": round(copied_bytes / 2 ** 20, 1)}
+
+# --- 2. Process Memory ---
+# With mapped weights, the resident memory (RSS) of a process counts the pages it shares with the other replicas as well.
+# process_memory_mb splits it (Linux only, from /proc/self/smaps_rollup):
+# - unique: pages only this process uses (what stopping it would give back)
+# - shared: pages shared with other processes (e.g. the mapped weights of the other replicas)
+# - proportional: every shared page divided by the number of processes sharing it (the sum over the replicas is the
+#   actual memory used by the host)
+def process_memory_mb():
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.rstrip().endswith("kB")}
+    except (OSError, ValueError, IndexError):
+        return None
+
+    return {
+        "resident": round(fields.get("Rss", 0) / 1024, 1),
+        "unique": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+        "shared": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1),
+        "proportional": round(fields.get("Pss", 0) / 1024, 1),
+    }